@@ -1,21 +1,31 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import pandas as pd
 import logging
-from invoker import ReadExcelCommand, CombineDataCommand, GenerateKeyCommand, DeleteFileCommand, EncryptFileCommand, DecryptFileCommand, Invoker
+from invoker import ReadExcelCommand, CombineDataCommand, IncrementalCombineDataCommand, DiffExtractsCommand, GenerateKeyCommand, DeleteFileCommand, EncryptFileCommand, DecryptFileCommand, Invoker, NurseAssignmentCommand
 import tkinter.ttk as ttk  # for treeview
 import os
 import tempfile
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.units import inch
+from lazy_imports import lazy_import
 from app_crypto import *
+from metrics import REGISTRY, timed, measure
+from log_pipeline import configure_logging
+from treeview_loader import populate_treeview
+from nurse_roster import NurseRoster, CapacityError, ROSTER_PATH, DEFAULT_CAPACITY
+from auto_assign import plan_assignments
+from proximity import ProximityIndex
+from bulk_import import plan_import
+from data_ops import search_mask, find_child_index, batch_filter_mask, report_statistics, iter_row_values, combined_name_rows, date_strings, detail_lines, UNMATCHED_PRIMARY_COLUMNS
+from snapshot import read_snapshot, write_snapshot
+from schema import apply_schema
+from persistence import CombinedDataSaver
+from records import BROWSE_COLUMNS, LazyRecords
+from formats import read_table, SOURCE_FILETYPES
+from matching import RECORD_KEY
 import platform
 from datetime import datetime
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# pandas loads on first use; reportlab is imported by the PDF exports only
+pd = lazy_import('pandas')
 
 class App:
     """
@@ -47,6 +57,19 @@ class App:
                 messagebox.WARNING("Warning!", "Error generating encryption key.")
 
         self._combined_data = None
+        self.__combined_data = None
+        # Fetches the columns left out of the projected combined data, None when it is complete
+        self.__records = None
+        # Assignments are saved in the background, once per burst of changes
+        self.__saver = CombinedDataSaver('combined_matched_data.xlsx', lambda: self.__combined_data,
+                                         self.full_combined_data)
+        # Unmatched rows of the last combine, None until known
+        self.__unmatched_data = None
+        # Nurses and the index of their caseloads, read on first use
+        self.__roster = None
+        self.__proximity = None
+        # Assignments that can be undone and redone
+        self.__history = Invoker()
         self.__data_frames = []
 
     def on_closing(self):
@@ -56,15 +79,203 @@ class App:
         Preconditions:
             - Combined data exists and needs to be encrypted.
         Postconditions:
-            - The combined data is encrypted, and the application exits.
+            - Pending changes are saved, the combined data is encrypted, and the application exits.
+            - The session snapshot mirrors the encrypted combined data file.
         """
         logging.info("Closing App")
         filepath = 'combined_matched_data.xlsx'
-        #encrypt combined data files
-        command = EncryptFileCommand(self)
-        command.execute(filepath)
+        self.__saver.flush()
+        #encrypt combined data files, unless a restored session left them encrypted
+        if os.path.exists(filepath) and not Crypto.is_encrypted(filepath):
+            command = EncryptFileCommand(self)
+            command.execute(filepath)
+        self.save_session_snapshot(filepath)
         root.destroy()
 
+    def save_session_snapshot(self, filepath='combined_matched_data.xlsx'):
+        """
+        Save the combined data as an encrypted session snapshot for a fast restore.
+
+        Preconditions:
+            - `filepath` holds the combined data in its final state.
+        Postconditions:
+            - The snapshot is written when combined data is loaded; failures are logged only,
+              the workbook remains the fallback.
+        """
+        if self.__combined_data is None or not os.path.exists(filepath):
+            return
+        try:
+            write_snapshot(self.full_combined_data(), filepath, Crypto.loadKey())
+        except Exception as e:
+            logging.error("Failed to save the session snapshot: %s", e)
+
+    def open_combined_data(self, file_path, key):
+        """
+        Load the combined data projected on the browse columns; the other columns are fetched on demand.
+
+        Preconditions:
+            - `file_path` holds the combined data, encrypted or not.
+        Postconditions:
+            - `self.__combined_data` holds the BROWSE_COLUMNS of the combined data and
+              `self.__records` fetches the remaining columns from the session snapshot.
+            - A missing or stale snapshot is rewritten from the workbook first. openpyxl parses
+              every cell whatever the projection, so the workbook is read once, in full, and the
+              columns not browsed are left in the snapshot instead of in memory.
+        """
+        combined_data = read_snapshot(file_path, key, columns=BROWSE_COLUMNS)
+        if combined_data is None:
+            if Crypto.is_encrypted(file_path):
+                command = DecryptFileCommand(self)
+                command.execute(file_path)
+            full_data, _ = apply_schema(read_table(file_path), file_path)
+            try:
+                write_snapshot(full_data, file_path, key)
+            except Exception as e:
+                logging.warning("Keeping every column in memory, the session snapshot cannot be written: %s", e)
+                self.__combined_data = full_data
+                self.__records = None
+                return
+            combined_data = full_data[[col for col in full_data.columns if col in BROWSE_COLUMNS]]
+            logging.info("Successfully loaded combined data from '%s'", file_path)
+        self.__combined_data = combined_data
+        # The snapshot may be rewritten later in the session, so its staleness is not checked again
+        self.__records = LazyRecords(lambda: read_snapshot(None, key))
+
+    def full_combined_data(self, combined_data=None):
+        """
+        The combined data with every column, e.g. to write it back to the workbook.
+
+        Postconditions:
+            - The columns left out by `open_combined_data` are fetched once, and joined with the
+              in-memory columns (assignments and derived columns included).
+
+        Args:
+            combined_data (DataFrame, optional): A copy of the in-memory combined data to complete
+                instead of the data itself, e.g. taken by the background saver.
+        Returns:
+            DataFrame: The complete combined data, or None when none is loaded.
+        """
+        if combined_data is None:
+            combined_data = self.__combined_data
+        # Read once: the saver thread must not see the accessor replaced halfway
+        records = self.__records
+        if records is None or combined_data is None:
+            return combined_data
+        return records.full_frame(combined_data)
+
+    def complete_record(self, row):
+        """
+        Complete a row of the combined data with the columns left out of memory, e.g. for a profile.
+
+        Returns:
+            Series: Every column of the record.
+        """
+        if self.__records is None:
+            return row
+        return self.__records.record(self.__combined_data, row)
+
+    def roster(self):
+        """
+        The nurse roster, read from 'nurse_roster.csv' on first use.
+
+        Returns:
+            NurseRoster: The roster, indexing the assignments of the combined data in memory.
+        """
+        if self.__roster is None:
+            self.__roster = NurseRoster.load(ROSTER_PATH)
+            self.warn_added_nurses(self.index_assignments())
+        return self.__roster
+
+    def proximity(self):
+        """
+        The proximity index of the children, rebuilt on first use after the combined data is replaced.
+
+        Returns:
+            ProximityIndex: The index of the combined data in memory.
+        """
+        if self.__proximity is None or self.__proximity.data is not self.__combined_data:
+            self.__proximity = ProximityIndex(self.__combined_data)
+        return self.__proximity
+
+    def index_assignments(self):
+        """
+        Rebuild the caseload index after the combined data was loaded or combined.
+
+        Postconditions:
+            - Nurses of the combined data missing from the roster are added and saved.
+            - Assignments made on the previous data can no longer be undone.
+
+        Returns:
+            list: The names of the nurses added to the roster, for `warn_added_nurses`.
+        """
+        self.__history.clear_history()
+        if self.__roster is None:
+            return []
+        added = self.__roster.build_index(self.__combined_data)
+        if added:
+            try:
+                self.__roster.save()
+            except Exception as e:
+                logging.error("Failed to save the nurse roster: %s", e)
+        return [nurse.name for nurse in added]
+
+    def warn_added_nurses(self, names):
+        """
+        Tell the user which nurses of the combined data were added to the roster, so typos can
+        be merged or corrected before more children are assigned to them.
+
+        Args:
+            names (list): The names returned by `index_assignments`; nothing is shown when empty.
+        """
+        if names:
+            messagebox.showwarning(
+                "Nurse Roster",
+                f"{len(names)} nurses of the combined data were not on the roster and were added:\n"
+                + "\n".join(names))
+
+    def unmatched_data(self):
+        """
+        The unmatched rows of the last combine, kept in memory by the app.
+
+        Postconditions:
+            - Before any combine in this session, 'unmatched_data.xlsx' is read once and kept.
+
+        Returns:
+            DataFrame: The unmatched rows, empty when there are none.
+        """
+        if self.__unmatched_data is None:
+            file_path = 'unmatched_data.xlsx'
+            try:
+                self.__unmatched_data = read_table(file_path) if os.path.exists(file_path) else pd.DataFrame()
+            except Exception as e:
+                logging.error("Failed to read %s: %s", file_path, e)
+                return pd.DataFrame()
+        return self.__unmatched_data
+
+    def restore_session(self):
+        """
+        Restore the combined data of the previous session from its snapshot, if it is up to date.
+
+        Postconditions:
+            - The combined data is loaded and displayed when the snapshot matches the combined
+              data file; otherwise nothing happens and the file can be loaded manually.
+
+        Returns:
+            bool: True if the session was restored.
+        """
+        if not os.path.exists("key.txt"):
+            return False
+        key = Crypto.loadKey()
+        combined_data = read_snapshot('combined_matched_data.xlsx', key, columns=BROWSE_COLUMNS)
+        if combined_data is None:
+            return False
+        self.__combined_data = combined_data
+        self.__records = LazyRecords(lambda: read_snapshot(None, key))
+        added = self.index_assignments()
+        self.show_combined_data()
+        self.warn_added_nurses(added)
+        return True
+
     def create_widgets(self):
         """
         Create and display the main UI components including buttons.
@@ -74,8 +285,8 @@ class App:
         Postconditions:
             - Buttons for reading files, combining data, and loading existing data are created.
         """
-        self.__root.geometry("500x600")
-        self.__root.minsize(500, 600)
+        self.__root.geometry("500x770")
+        self.__root.minsize(500, 770)
 
         button_frame = tk.Frame(self.__root, padx=20, pady=20)
         button_frame.pack(expand=True)
@@ -92,6 +303,15 @@ class App:
         self.upload_existing_button = tk.Button(button_frame, text="Load Existing File", command=self.load_combined_data, width=30, height=2)
         self.upload_existing_button.pack(pady=10)
 
+        self.update_button = tk.Button(button_frame, text="Update Combined Data", command=self.update_combined_data, width=30, height=2)
+        self.update_button.pack(pady=10)
+
+        self.compare_button = tk.Button(button_frame, text="Compare Extracts", command=self.compare_extracts, width=30, height=2)
+        self.compare_button.pack(pady=10)
+
+        self.performance_button = tk.Button(button_frame, text="Performance", command=self.show_performance, width=30, height=2)
+        self.performance_button.pack(pady=10)
+
         logging.info("UI widgets created.")
 
     def decrypt_file(self, filepath = None):
@@ -109,7 +329,7 @@ class App:
         logging.info("Attempting to decrypt file.")
 
         if filepath == None:
-            filepath = filepath = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx *.xls")])
+            filepath = filepath = filedialog.askopenfilename(filetypes=SOURCE_FILETYPES)
 
         if not os.path.exists("key.txt"):
             messagebox.showwarning("Error!", "Key does not exist")
@@ -128,8 +348,27 @@ class App:
         """
         
         logging.info("Selecting File")
-        filepath = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx *.xls")])
+        filepath = filedialog.askopenfilename(filetypes=SOURCE_FILETYPES)
+
+        data_frame = self.read_data_file(filepath)
+        if data_frame is not None:
+            self.__data_frames.append(data_frame)
+            logging.info("Data from %s successfully read and added to data frames.", filepath)
+        else:
+            logging.warning("No data frame returned from the file read.")
+
+    def read_data_file(self, filepath):
+        """
+        Read an Excel file into a DataFrame, decrypting it first and re-encrypting it afterwards.
 
+        Preconditions:
+            - `filepath` is the path of an Excel file, encrypted or not.
+        Postconditions:
+            - The file is left encrypted on disk.
+
+        Returns:
+            DataFrame: The file's data, or None if reading fails.
+        """
         #decrypt files
         logging.info("Checking if file is already encrypted.")
         if Crypto.is_encrypted(filepath):
@@ -145,13 +384,7 @@ class App:
             logging.info("File is not encrypted.")
 
         command = ReadExcelCommand(self)
-
         data_frame = command.execute(filepath)
-        if data_frame is not None:
-            self.__data_frames.append(data_frame)
-            logging.info(f"Data from {filepath} successfully read and added to data frames.")
-        else:
-            logging.warning("No data frame returned from the file read.")
 
         try:
             #reencrypt files
@@ -159,6 +392,45 @@ class App:
             command.execute(filepath)
         except:
             messagebox.showwarning("Warning", "Error reencrypting files.")
+        return data_frame
+
+    def compare_extracts(self):
+        """
+        Compare two versions of an extract chosen by the user and report the changed families.
+
+        Preconditions:
+            - The user selects the previous and the current version of the same extract.
+        Postconditions:
+            - Added, removed and changed records are saved to 'extract_changes.xlsx'.
+            - A summary of the changes is displayed.
+        """
+        logging.info("Selecting extracts to compare.")
+        old_path = filedialog.askopenfilename(title="Select Previous Extract", filetypes=SOURCE_FILETYPES)
+        new_path = filedialog.askopenfilename(title="Select Current Extract", filetypes=SOURCE_FILETYPES)
+        if not old_path or not new_path:
+            messagebox.showwarning("Warning", "Please select two versions of the extract.")
+            logging.warning("Extract comparison cancelled.")
+            return
+
+        old_data = self.read_data_file(old_path)
+        new_data = self.read_data_file(new_path)
+        if old_data is None or new_data is None:
+            return
+
+        side = 'database' if 'DOB' in new_data.columns else 'medicaid'
+        command = DiffExtractsCommand(self, old_data, new_data, side)
+        diff = command.execute()
+        if diff is None:
+            return
+
+        summary = diff.summary()
+        changed_columns = "\n".join(f"  {col}: {count}" for col, count in summary['changed_columns'].items())
+        messagebox.showinfo(
+            "Extract Changes",
+            f"Added: {summary['added']}\nRemoved: {summary['removed']}\nChanged: {summary['changed']}\n"
+            f"Unchanged: {summary['unchanged']}\n" + (f"Changed columns:\n{changed_columns}\n" if changed_columns else "") +
+            f"\nDetails saved to {command.report_file_path}"
+        )
     
     def load_combined_data(self):
         """
@@ -176,20 +448,19 @@ class App:
             return
 
         try:
-            if Crypto.is_encrypted(file_path):
-                command = DecryptFileCommand(self) 
-                result = command.execute(file_path)
-
-            # Load the existing combined data
-            self.__combined_data = pd.read_excel(file_path)
-            logging.info("Successfully loaded combined data from 'combined_matched_data.xlsx'")
+            with measure('App.load_combined_data'):
+                self.__saver.flush()
+                # The session snapshot is much faster to load than the workbook while it is up to date
+                self.open_combined_data(file_path, Crypto.loadKey())
+                added = self.index_assignments()
 
             # Display the combined data
             self.show_combined_data()
+            self.warn_added_nurses(added)
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load combined data file: {e}")
-            logging.error(f"Failed to load combined data file: {e}")
+            logging.error("Failed to load combined data file: %s", e)
 
     def combine_data(self):
         """
@@ -202,24 +473,85 @@ class App:
         """
         if len(self.__data_frames) >= 2:
             logging.info("Attempting to combine data from two Excel files.")
-            command = CombineDataCommand(self, self.__data_frames)
-            combined_data = command.execute()
+            added = []
+            with measure('App.combine_data'):
+                # No pending save may replace the file the command writes
+                dropped = self.__saver.cancel()
+                command = CombineDataCommand(self, self.__data_frames)
+                combined_data = command.execute()
+
+                if combined_data is None and dropped:
+                    self.__saver.mark_dirty()
+                elif combined_data is not None:
+                    # The command already saved the combined data to 'combined_matched_data.xlsx'
+                    self.__combined_data = combined_data
+                    self.__records = None
+                    self.__unmatched_data = command.unmatched_data if command.unmatched_data is not None else pd.DataFrame()
+                    added = self.index_assignments()
 
             if combined_data is not None:
-                self.__combined_data = combined_data
-                # Save combined data to an Excel file
-                filepath = 'combined_matched_data.xlsx'
-                self.__combined_data.to_excel(filepath, index=False)
-                logging.info("Combined data saved to 'combined_matched_data.xlsx'")
-
                 # Display the combined data
                 self.show_combined_data()
+                self.warn_added_nurses(added)
             else:
                 logging.error("Failed to combine data.")
         else:
             messagebox.showwarning("Warning", "Please read two Excel files first.")
             logging.warning("Attempted to combine data with less than two files.")
 
+    def update_combined_data(self):
+        """
+        Re-combine the two Excel files read by the user against the previous combined data.
+
+        Preconditions:
+            - At least two Excel files have been read and stored in __data_frames.
+        Postconditions:
+            - Only the families changed since the last update are matched again, the other rows
+              come from the state of that update (`combine_state.pkl`); removed records are retired
+              and the nurse assignments are carried forward from the previous combined data,
+              projected or not.
+            - Combined data is saved to 'combined_matched_data.xlsx' and displayed.
+        """
+        if len(self.__data_frames) < 2:
+            messagebox.showwarning("Warning", "Please read two Excel files first.")
+            logging.warning("Attempted to update combined data with less than two files.")
+            return
+
+        added = []
+        with measure('App.update_combined_data'):
+            previous_data = self.__combined_data
+            file_path = 'combined_matched_data.xlsx'
+            if previous_data is None and os.path.exists(file_path):
+                try:
+                    if Crypto.is_encrypted(file_path):
+                        command = DecryptFileCommand(self)
+                        command.execute(file_path)
+                    # Only the record keys and the assignments are read from the previous data
+                    previous_data = read_table(file_path, [RECORD_KEY, 'Assigned Nurse'])
+                except Exception as e:
+                    logging.warning("Could not load previous combined data, running a full combine: %s", e)
+
+            logging.info("Attempting to update combined data incrementally.")
+            # No pending save may replace the file the command writes
+            dropped = self.__saver.cancel()
+            command = IncrementalCombineDataCommand(self, self.__data_frames, previous_data)
+            combined_data = command.execute()
+
+            if combined_data is None and dropped:
+                self.__saver.mark_dirty()
+            elif combined_data is not None:
+                # The command saved the updated data, the assignments in memory included
+                self.__combined_data = combined_data
+                self.__records = None
+                self.__unmatched_data = command.unmatched_data if command.unmatched_data is not None else pd.DataFrame()
+                added = self.index_assignments()
+
+        if combined_data is not None:
+            self.show_combined_data()
+            self.warn_added_nurses(added)
+        else:
+            logging.error("Failed to update combined data.")
+
     def show_combined_data(self):
         """
         Display the combined data in a new window.
@@ -238,6 +570,7 @@ class App:
         self.display_combined_names()
 
 
+    @timed()
     def generate_report(self):
         """
         Generate a statistical report for the combined data and display it in a new window.
@@ -254,15 +587,17 @@ class App:
             return
 
         # Prepare data
-        total_children = len(self.__combined_data)
-        unassigned_children_list = self.__combined_data[self.__combined_data['Assigned Nurse'].isna()]
+        today = datetime.today()
+        statistics = report_statistics(self.__combined_data, today)
+        total_children = statistics['total_children']
+        unassigned_children_list = statistics['unassigned_children']
         unassigned_children_count = len(unassigned_children_list)
-        assigned_nurses = self.__combined_data['Assigned Nurse'].value_counts()
-        
+        # Read from the caseload index rather than counted again
+        assigned_nurses = self.roster().counts()
 
         # Age-related statistics
-        today = datetime.today()
-        self.__combined_data['Child_Date_of_Birth'] = pd.to_datetime(self.__combined_data['Child_Date_of_Birth'], errors='coerce')
+        with self.__saver.lock:
+            self.__combined_data['Child_Date_of_Birth'] = statistics['child_dob']
 
         def calculate_age(dob):
             """
@@ -288,13 +623,14 @@ class App:
             else:
                 return f"{years} years, {months} months"
 
-        self.__combined_data['Age'] = self.__combined_data['Child_Date_of_Birth'].apply(calculate_age)
-        avg_age = self.__combined_data['Child_Date_of_Birth'].apply(lambda dob: (today - dob).days // 365 if pd.notnull(dob) else None).mean()
-        youngest_child = self.__combined_data.loc[self.__combined_data['Child_Date_of_Birth'].idxmax()] if not self.__combined_data['Child_Date_of_Birth'].isna().all() else None
-        oldest_child = self.__combined_data.loc[self.__combined_data['Child_Date_of_Birth'].idxmin()] if not self.__combined_data['Child_Date_of_Birth'].isna().all() else None
+        with self.__saver.lock:
+            self.__combined_data['Age'] = statistics['ages']
+        avg_age = statistics['average_age']
+        youngest_child = statistics['youngest_child']
+        oldest_child = statistics['oldest_child']
 
         # State statistics
-        children_per_state = self.__combined_data['State'].value_counts()
+        children_per_state = statistics['children_per_state']
 
         # Create a new window for the report
         report_window = tk.Toplevel(self.__root)
@@ -326,8 +662,7 @@ class App:
         nurse_tree.heading("Count", text="Assigned Children")
         nurse_tree.pack(fill=tk.BOTH, expand=True)
 
-        for nurse, count in assigned_nurses.items():
-            nurse_tree.insert("", "end", values=(nurse, count))
+        populate_treeview(nurse_tree, assigned_nurses.items())
 
         # Display children per state
         tk.Label(report_window, text="Children per State:", font=("Arial", 12, "bold")).pack(pady=10)
@@ -336,8 +671,7 @@ class App:
         state_tree.heading("Count", text="Children")
         state_tree.pack(fill=tk.BOTH, expand=True)
 
-        for state, count in children_per_state.items():
-            state_tree.insert("", "end", values=(state, count))
+        populate_treeview(state_tree, children_per_state.items())
 
         # Display unassigned children
         tk.Label(report_window, text="Unassigned Children:", font=("Arial", 12, "bold")).pack(pady=10)
@@ -347,11 +681,16 @@ class App:
         unassigned_tree.heading("Age", text="Age")
         unassigned_tree.pack(fill=tk.BOTH, expand=True)
 
-        for _, row in unassigned_children_list.iterrows():
-            child_name = f"{row['Child_First_Name']} {row['Child_Last_Name']}"
-            child_dob = row['Child_Date_of_Birth'].strftime('%Y-%m-%d') if pd.notnull(row['Child_Date_of_Birth']) else "N/A"
-            child_age = calculate_age(row['Child_Date_of_Birth']) if pd.notnull(row['Child_Date_of_Birth']) else "N/A"
-            unassigned_tree.insert("", "end", values=(child_name, child_dob, child_age))
+        def child_rows(children):
+            """
+            Lazily yield the name, date of birth and age of each child.
+            """
+            for first_name, last_name, dob in zip(children['Child_First_Name'], children['Child_Last_Name'], children['Child_Date_of_Birth']):
+                child_dob = dob.strftime('%Y-%m-%d') if pd.notnull(dob) else "N/A"
+                child_age = calculate_age(dob) if pd.notnull(dob) else "N/A"
+                yield (f"{first_name} {last_name}", child_dob, child_age)
+
+        populate_treeview(unassigned_tree, child_rows(unassigned_children_list))
 
 
         def show_children(event, category):
@@ -374,7 +713,8 @@ class App:
 
             # Filter children based on the category
             if category == "nurse":
-                children = self.__combined_data[self.__combined_data['Assigned Nurse'] == selected_value]
+                nurse = self.roster().find(selected_value)
+                children = self.__combined_data.loc[sorted(self.roster().caseload(nurse.nurse_id))] if nurse else self.__combined_data.iloc[:0]
             elif category == "state":
                 children = self.__combined_data[self.__combined_data['State'] == selected_value]
             elif category == "unassigned":
@@ -398,11 +738,7 @@ class App:
             child_tree.pack(fill=tk.BOTH, expand=True)
 
             # Populate the tree with children's data
-            for _, row in children.iterrows():
-                child_name = f"{row['Child_First_Name']} {row['Child_Last_Name']}"
-                child_dob = row['Child_Date_of_Birth'].strftime('%Y-%m-%d') if pd.notnull(row['Child_Date_of_Birth']) else "N/A"
-                child_age = calculate_age(row['Child_Date_of_Birth']) if pd.notnull(row['Child_Date_of_Birth']) else "N/A"
-                child_tree.insert("", "end", values=(child_name, child_dob, child_age))
+            populate_treeview(child_tree, child_rows(children))
 
             # Show profile when a child is double-clicked
             def show_profile(event):
@@ -423,10 +759,10 @@ class App:
                 child_dob = selected_values[1]
                 child_data = self.__combined_data[
                     (self.__combined_data['Child_First_Name'] + " " + self.__combined_data['Child_Last_Name'] == child_name) &
-                    (self.__combined_data['Child_Date_of_Birth'].dt.strftime('%Y-%m-%d') == child_dob)
+                    (date_strings(self.__combined_data['Child_Date_of_Birth']) == child_dob)
                 ]
                 if not child_data.empty:
-                    self.show_child_profile_from_data(child_data.iloc[0])
+                    self.show_child_profile_from_data(self.complete_record(child_data.iloc[0]))
 
             child_tree.bind("<Double-1>", show_profile)
 
@@ -456,6 +792,9 @@ class App:
                 if not pdf_path:  # User canceled the save dialog
                     return
 
+                from reportlab.lib.pagesizes import letter
+                from reportlab.pdfgen import canvas
+
                 # Create PDF report
                 c = canvas.Canvas(pdf_path, pagesize=letter)
                 c.setFont("Helvetica-Bold", 14)
@@ -523,9 +862,9 @@ class App:
 
                 c.save()
                 messagebox.showinfo("Success", f"Report saved successfully at {pdf_path}")
-                logging.info(f"Report saved to {pdf_path}")
+                logging.info("Report saved to %s", pdf_path)
             except Exception as e:
-                logging.error(f"Failed to export report: {e}")
+                logging.error("Failed to export report: %s", e)
                 messagebox.showerror("Error", f"Failed to export report: {e}")
 
         export_button = tk.Button(report_window, text="Export as PDF", command=export_report)
@@ -543,6 +882,17 @@ class App:
         Postconditions:
             - A new window is opened with the combined data displayed in a Treeview.
         """
+        combined_names_window = self.open_combined_names_window()
+        combined_names_window.mainloop()
+
+    @timed('App.display_combined_names')
+    def open_combined_names_window(self):
+        """
+        Build the combined data window; measured without the time the user keeps it open.
+
+        Returns:
+            Toplevel: The window, ready for its event loop.
+        """
         combined_names_window = tk.Toplevel(self.__root)
         combined_names_window.title("Combined Data")
 
@@ -598,11 +948,12 @@ class App:
             self.treeview.heading(col, text=col)
             self.treeview.column(col, anchor="center", width=150)
 
+        # Kept in memory only, the column is saved with the first assignment
         if 'Assigned Nurse' not in self.__combined_data.columns:
-            self.__combined_data['Assigned Nurse'] = 'None'
+            with self.__saver.lock:
+                self.__combined_data['Assigned Nurse'] = 'None'
 
         self.update_combined_names()
-        self.__combined_data.to_excel('combined_matched_data.xlsx', index=False)
 
         self.treeview.pack(fill=tk.BOTH, expand=True)
         self.treeview.bind('<Double-1>', lambda event: self.show_child_profile(event))
@@ -617,27 +968,42 @@ class App:
         batch_assign_button = tk.Button(buttons_frame, text="Batch Assign Nurses", command=self.batch_assign_nurses)
         batch_assign_button.pack(side=tk.LEFT, padx=10)
 
+        roster_button = tk.Button(buttons_frame, text="Nurse Roster", command=self.manage_roster)
+        roster_button.pack(side=tk.LEFT, padx=10)
+
+        auto_assign_button = tk.Button(buttons_frame, text="Auto Assign Nurses", command=self.auto_assign_nurses)
+        auto_assign_button.pack(side=tk.LEFT, padx=10)
+
+        import_button = tk.Button(buttons_frame, text="Import Assignments", command=self.import_assignments)
+        import_button.pack(side=tk.LEFT, padx=10)
+
+        undo_button = tk.Button(buttons_frame, text="Undo", command=self.undo_assignment)
+        undo_button.pack(side=tk.LEFT, padx=10)
+        redo_button = tk.Button(buttons_frame, text="Redo", command=self.redo_assignment)
+        redo_button.pack(side=tk.LEFT, padx=10)
+        combined_names_window.bind("<Control-z>", self.undo_assignment)
+        combined_names_window.bind("<Control-y>", self.redo_assignment)
+
         # Generates Overall Report
         generate_report_button = tk.Button(buttons_frame, text="Generate Report", command=self.generate_report)
         generate_report_button.pack(side=tk.LEFT, padx=10)  
 
 
-        unmatched_data_path = 'unmatched_data.xlsx'
-        if os.path.exists(unmatched_data_path):
-            unmatched_data = pd.read_excel(unmatched_data_path)
-            unmatched_count = len(unmatched_data)
-            if unmatched_count > 0:
-                unmatched_button = tk.Button(
-                    buttons_frame,
-                    text="View Unmatched Data",
-                    command=lambda: self.display_unmatched_data(unmatched_data)
-                )
-                unmatched_button.pack(side=tk.LEFT, padx=10)
-                count_label = tk.Label(unmatched_button, text=str(unmatched_count), bg="red", fg="white", font=("Arial", 10, "bold"))
-                count_label.place(relx=1.0, rely=0.0, anchor="ne")
+        unmatched_data = self.unmatched_data()
+        unmatched_count = len(unmatched_data)
+        if unmatched_count > 0:
+            unmatched_button = tk.Button(
+                buttons_frame,
+                text="View Unmatched Data",
+                command=lambda: self.display_unmatched_data(unmatched_data)
+            )
+            unmatched_button.pack(side=tk.LEFT, padx=10)
+            count_label = tk.Label(unmatched_button, text=str(unmatched_count), bg="red", fg="white", font=("Arial", 10, "bold"))
+            count_label.place(relx=1.0, rely=0.0, anchor="ne")
 
-        combined_names_window.mainloop()
+        return combined_names_window
 
+    @timed()
     def sort_combined_data(self, combined_names_window, sort_button):
         """
         Sort the combined data by Child_Date_of_Birth and refresh the Treeview.
@@ -666,8 +1032,9 @@ class App:
         sort_button.config(text=f"Sort by DOB {'▲' if self.sort_ascending else '▼'}")
 
         # Sort data
-        self.__combined_data.sort_values(by='Child_Date_of_Birth', ascending=self.sort_ascending, inplace=True)
-        logging.info(f"Sorted data by Child_Date_of_Birth in {sort_order} order.")
+        with self.__saver.lock:
+            self.__combined_data.sort_values(by='Child_Date_of_Birth', ascending=self.sort_ascending, inplace=True)
+        logging.info("Sorted data by Child_Date_of_Birth in %s order.", sort_order)
 
         # Refresh Treeview
         self.update_combined_names()
@@ -751,41 +1118,29 @@ class App:
         Postconditions:
             - Treeview is populated with combined data entries that match the search term.
         """
-        self.treeview.delete(*self.treeview.get_children())
-        search_term = self.search_var.get().lower()
-        for index, row in self.__combined_data.iterrows():
-            child_name = f"{row['Child_First_Name']} {row['Child_Last_Name']}"
-            assigned_nurse = row.get('Assigned Nurse', 'None')
-            if search_term in f"{row['Mother_ID']} {child_name}".lower():
-                self.treeview.insert("", "end", values=(row['Mother_ID'], child_name, row['Child_Date_of_Birth'], assigned_nurse))
-
-        logging.info("Treeview updated with filtered names.")
+        matches = self.__combined_data[search_mask(self.__combined_data, self.search_var.get())]
+        # Replaces the rows of a previous search still being inserted
+        populate_treeview(self.treeview, combined_name_rows(matches),
+                          on_complete=lambda count: logging.info("Treeview updated with %s filtered names.", count))
 
+    @timed()
     def show_nurse_statistics(self):
         """
         Display statistics on nurse assignments from the combined data.
         
         Preconditions:
-            - 'combined_matched_data.xlsx' exists and contains valid nurse assignment data.
+            - The combined data is loaded.
         Postconditions:
             - A new window is opened displaying statistics on most and least assigned nurses.
+            - The counts are read from the caseload index of the roster, not from the file.
         """
-        try:
-            if os.path.exists('combined_matched_data.xlsx'):
-                self._combined_data = pd.read_excel('combined_matched_data.xlsx')
-                logging.info("Successfully reloaded the combined data for statistics.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to reload combined data: {e}")
-            logging.error(f"Failed to reload combined data: {e}")
-            return
-
-        if self._combined_data is None or 'Assigned Nurse' not in self._combined_data.columns:
+        if self.__combined_data is None or 'Assigned Nurse' not in self.__combined_data.columns:
             messagebox.showwarning("No Data", "Nurse statistics could not be displayed because the data is not available or not combined.")
             logging.error("Nurse statistics could not be displayed because the data is not available or not combined.")
             return
 
-        nurse_counts = self._combined_data['Assigned Nurse'].value_counts()
-        nurse_counts = nurse_counts[nurse_counts.index != 'None']
+        roster = self.roster()
+        nurse_counts = roster.counts()
 
         if nurse_counts.empty:
             messagebox.showinfo("No Nurse Data", "No nurse assignment data to display statistics.")
@@ -822,16 +1177,16 @@ class App:
 
             Preconditions:
                 - `nurse_name` is a valid string representing the nurse's name.
-                - `self._combined_data` contains a DataFrame with child and nurse assignment data.
+                - `nurse_name` is on the roster, whose index holds the rows assigned to the nurse.
             Postconditions:
                 - A new window is opened, showing a list of children assigned to the specified nurse.
                 - Each child in the list is displayed with their name and date of birth in a Treeview widget.
                 - Double-clicking on a child opens their detailed profile.
             """
-            assigned_children = self._combined_data[self._combined_data['Assigned Nurse'] == nurse_name]
+            assigned_children = self.__combined_data.loc[sorted(roster.caseload(roster.find(nurse_name).nurse_id))]
             children_window = tk.Toplevel(stats_window)
             children_window.title(f"Children assigned to {nurse_name}")
-            children_window.geometry("500x700")
+            children_window.geometry("500x770")
 
             tk.Label(children_window, text=f"Children assigned to {nurse_name}:", font=("Arial", 12, "bold")).pack(pady=5)
 
@@ -841,10 +1196,11 @@ class App:
             tree.heading("DOB", text="Date of Birth")
             tree.pack(fill=tk.BOTH, expand=True)
 
-            # Populate tree with children data
-            for _, row in assigned_children.iterrows():
-                child_name = f"{row['Child_First_Name']} {row['Child_Last_Name']}"
-                tree.insert("", "end", values=(child_name, row['Child_Date_of_Birth']))
+            # Populate tree with children data, each item named by its row label
+            populate_treeview(tree, ((f"{first_name} {last_name}", dob) for first_name, last_name, dob in
+                                     zip(assigned_children['Child_First_Name'], assigned_children['Child_Last_Name'],
+                                         date_strings(assigned_children['Child_Date_of_Birth']))),
+                              iids=map(str, range(len(assigned_children))))
 
              # Bind double-click to show profile
             def on_child_double_click(event):
@@ -858,18 +1214,8 @@ class App:
                 """
                 selected_item = tree.selection()
                 if selected_item:
-                    item_data = tree.item(selected_item)["values"]
-                    child_name = item_data[0]
-                    child_dob = item_data[1]
-
-                    # Locate the child's data in the combined DataFrame
-                    child_data = self._combined_data[
-                        (self._combined_data['Child_First_Name'] + " " + self._combined_data['Child_Last_Name'] == child_name) &
-                        (self._combined_data['Child_Date_of_Birth'] == child_dob)
-                    ]
-
-                    if not child_data.empty:
-                        self.show_child_profile_from_data(child_data.iloc[0])
+                    # Items are named by their position among the children of the nurse
+                    self.show_child_profile_from_data(self.complete_record(assigned_children.iloc[int(selected_item[0])]))
 
             tree.bind("<Double-1>", on_child_double_click)
 
@@ -940,7 +1286,7 @@ class App:
         export_button = tk.Button(profile_frame, text="Export to PDF", command=lambda: self.export_profile_to_pdf(mother_info_text, child_info_text, address_info_text, nurse_info_text))
         export_button.pack(pady=(10, 5))
 
-        logging.info(f"Profile for {child_data['Child_First_Name']} {child_data['Child_Last_Name']} displayed successfully.")
+        logging.info("Profile for %s %s displayed successfully.", child_data['Child_First_Name'], child_data['Child_Last_Name'])
 
     def display_unmatched_data(self, unmatched_data):
         """
@@ -951,6 +1297,18 @@ class App:
         Postconditions:
             - A new window is opened, displaying the unmatched data in a Treeview.
             - Each unmatched entry is displayed in the primary columns, with additional details expandable.
+            - Rows are inserted in time slices between UI events.
+        """
+        unmatched_data_window = self.open_unmatched_data_window(unmatched_data)
+        unmatched_data_window.mainloop()
+
+    @timed('App.display_unmatched_data')
+    def open_unmatched_data_window(self, unmatched_data):
+        """
+        Build the unmatched data window; measured without the time the user keeps it open.
+
+        Returns:
+            Toplevel: The window, ready for its event loop.
         """
         logging.info("Opening unmatched data window.")
 
@@ -958,9 +1316,7 @@ class App:
         unmatched_data_window.title("Unmatched Data")
         unmatched_data_window.geometry("800x400")
 
-        # Define primary columns to show initially
-        primary_columns = ["Source", "Child_ID", "Mother_First_Name", "Mother_Last_Name"]
-        all_columns = list(unmatched_data.columns)
+        primary_columns = UNMATCHED_PRIMARY_COLUMNS
 
         # Create the Treeview widget with primary columns
         treeview = ttk.Treeview(unmatched_data_window, columns=primary_columns, show="headings")
@@ -971,27 +1327,10 @@ class App:
             treeview.heading(col, text=col)
             treeview.column(col, anchor="center", width=150)
 
-        # Dictionary to store whether a row is expanded or collapsed
-        expanded_rows = {}
-
-        # Insert the unmatched data into the Treeview with only primary columns initially
-        for index, row in unmatched_data.iterrows():
-            # Extract primary column values for the main row
-            main_values = [row.get(col, "") for col in primary_columns]
-            row_id = treeview.insert("", "end", values=main_values, open=False)
-            logging.info(f"Inserted unmatched row with ID {row_id} and data: {main_values}")
-            
-            # Prepare additional information as separate rows under the main row
-            additional_info_rows = []
-            for col in all_columns:
-                if col not in primary_columns:
-                    additional_info_rows.append(f"{col}: {row.get(col, '')}")
-            
-            # Store the additional rows data in a hidden structure under each main row
-            expanded_rows[row_id] = {
-                "expanded": False,
-                "details": additional_info_rows
-            }
+        # Rows are inserted in time slices, so the window opens at once; each item is named by
+        # the position of its row in `unmatched_data`
+        populate_treeview(treeview, iter_row_values(unmatched_data, primary_columns), iids=map(str, range(len(unmatched_data))),
+                          on_complete=lambda count: logging.info("Showing %s unmatched rows.", count))
 
         def toggle_expand(event):
             """
@@ -1000,33 +1339,26 @@ class App:
             Preconditions:
                 - The Treeview item is selected.
             Postconditions:
-                - Additional details for the selected row are displayed or hidden.
+                - The details of the selected row are built when it is expanded and removed when
+                  it is collapsed.
             """
             selected_items = treeview.selection()
             if not selected_items:
                 logging.warning("No row selected for expansion/collapse.")
                 return
 
-            selected_item = selected_items[0]
-            row_data = expanded_rows.get(selected_item, {})
-            is_expanded = row_data.get("expanded", False)
-
-            if not is_expanded:
-                detail_items = []
-                for detail in row_data["details"]:
-                    detail_item = treeview.insert(selected_item, "end", values=[detail], tags=("additional",))
-                    detail_items.append(detail_item)
-                row_data["expanded"] = True
-                row_data["detail_items"] = detail_items  # Store detail items for future collapse
-                logging.info(f"Expanded row with ID {selected_item} to show details.")
-            else:
-                for child in row_data.get("detail_items", []):
-                    treeview.delete(child)
-                row_data["expanded"] = False
-                row_data["detail_items"] = []
-                logging.info(f"Collapsed row with ID {selected_item} to hide details.")
+            # A detail line toggles the row it belongs to
+            selected_item = treeview.parent(selected_items[0]) or selected_items[0]
+            detail_items = treeview.get_children(selected_item)
 
-            expanded_rows[selected_item] = row_data  # Update the expanded_rows dictionary
+            if not detail_items:
+                for detail in detail_lines(unmatched_data, int(selected_item), primary_columns):
+                    treeview.insert(selected_item, "end", values=[detail], tags=("additional",))
+                treeview.item(selected_item, open=True)
+                logging.debug("Expanded unmatched row %s.", selected_item)
+            else:
+                treeview.delete(*detail_items)
+                logging.debug("Collapsed unmatched row %s.", selected_item)
 
         # Bind the double-click event to expand/collapse rows
         treeview.bind("<Double-1>", toggle_expand)
@@ -1046,14 +1378,15 @@ class App:
                     logging.error("The unmatched data file does not exist.")
             except Exception as e:
                 messagebox.showerror("Error", f"Error opening unmatched data Excel file: {e}")
-                logging.error(f"Error opening unmatched data Excel file: {e}")
+                logging.error("Error opening unmatched data Excel file: %s", e)
 
         view_excel_button = tk.Button(unmatched_data_window, text="View in Excel", command=view_in_excel)
         view_excel_button.pack(pady=10)
 
         logging.info("Unmatched data window initialized and ready for user interaction.")
-        unmatched_data_window.mainloop()
+        return unmatched_data_window
 
+    @timed()
     def search_combined_names(self):
         """
         Initiates a search operation for the combined data based on user input.
@@ -1065,7 +1398,7 @@ class App:
             - Logs the search term used.
             - Triggers an update in the Treeview to display filtered names based on the search term.
         """
-        logging.info(f"Searching names with term: {self.search_var.get()}")
+        logging.info("Searching names with term: %s", self.search_var.get())
         self.update_combined_names()
 
     def show_child_profile(self, event):
@@ -1092,7 +1425,7 @@ class App:
         child_last_name = child_name_parts[1]
         child_dob = selected_values[2]
 
-        logging.info(f"Viewing profile for Mother ID: {mother_id}, Child: {child_first_name} {child_last_name}, DOB: {child_dob}")
+        logging.info("Viewing profile for Mother ID: %s, Child: %s %s, DOB: %s", mother_id, child_first_name, child_last_name, child_dob)
 
         # Query the child's profile from the combined data
         try:
@@ -1100,16 +1433,16 @@ class App:
                 (self.__combined_data['Mother_ID'].astype(str) == str(mother_id)) &
                 (self.__combined_data['Child_First_Name'].str.lower() == child_first_name.lower()) &
                 (self.__combined_data['Child_Last_Name'].str.lower() == child_last_name.lower()) &
-                (self.__combined_data['Child_Date_of_Birth'] == child_dob)
+                (date_strings(self.__combined_data['Child_Date_of_Birth']) == child_dob)
             ]
 
             if child_data.empty:
                 messagebox.showerror("Error", f"No data found for {child_first_name} {child_last_name}.")
-                logging.error(f"No data found for Mother ID: {mother_id}, Child: {child_first_name} {child_last_name}, DOB: {child_dob}")
+                logging.error("No data found for Mother ID: %s, Child: %s %s, DOB: %s", mother_id, child_first_name, child_last_name, child_dob)
                 return
 
-            # Get the first matching row
-            child_data = child_data.iloc[0]
+            # Get the first matching row, with the columns left out of memory
+            child_data = self.complete_record(child_data.iloc[0])
 
             # Show profile window
             profile_window = tk.Toplevel(self.__root)
@@ -1178,11 +1511,11 @@ class App:
             export_button = tk.Button(profile_frame, text="Export to PDF", command=lambda: self.export_profile_to_pdf(mother_info_text, child_info.cget("text"), address_info_text, nurse_info.cget("text")))
             export_button.pack(pady=(10, 5))
 
-            logging.info(f"Profile for {child_first_name} {child_last_name} displayed successfully.")
+            logging.info("Profile for %s %s displayed successfully.", child_first_name, child_last_name)
 
         except Exception as e:
             messagebox.showerror("Error", f"Error loading profile: {e}")
-            logging.error(f"Error loading profile for {child_first_name} {child_last_name}: {e}")
+            logging.error("Error loading profile for %s %s: %s", child_first_name, child_last_name, e)
 
     def assign_nurse(self, child_data, profile_window, nurse_info_label):
         """
@@ -1217,20 +1550,22 @@ class App:
             """
             nurse_name = nurse_name_var.get().strip()
             if nurse_name:
+                nurse = self.resolve_nurse(nurse_name)
+                if nurse is None:
+                    return
+                nurse_name = nurse.name
+
                 # Update combined data DataFrame
-                index = self.__combined_data[
-                    (self.__combined_data['Mother_ID'].astype(str) == str(child_data['Mother_ID'])) &
-                    (self.__combined_data['Child_First_Name'].str.lower() == child_data['Child_First_Name'].lower()) &
-                    (self.__combined_data['Child_Last_Name'].str.lower() == child_data['Child_Last_Name'].lower()) &
-                    (self.__combined_data['Child_Date_of_Birth'] == child_data['Child_Date_of_Birth'])
-                ].index
+                index = find_child_index(self.__combined_data, child_data)
 
                 if not index.empty:
-                    self.__combined_data.at[index[0], 'Assigned Nurse'] = nurse_name
-
-                    # Update the Excel file
-                    self.__combined_data.to_excel('combined_matched_data.xlsx', index=False)
-                    logging.info(f"Assigned Nurse '{nurse_name}' to {child_data['Child_First_Name']} {child_data['Child_Last_Name']}.")
+                    # The Excel file is updated in the background
+                    try:
+                        self.assign_nurses({index[0]: nurse.nurse_id}, f"Assignment of nurse '{nurse_name}'")
+                    except CapacityError as e:
+                        messagebox.showerror("Error", str(e))
+                        return
+                    logging.info("Assigned Nurse '%s' to %s %s.", nurse_name, child_data['Child_First_Name'], child_data['Child_Last_Name'])
 
                     # Update the nurse section in the profile display
                     updated_nurse_text = f"Name: {nurse_name}"
@@ -1247,9 +1582,11 @@ class App:
 
         tk.Button(assign_window, text="Add", command=save_nurse).pack(pady=10)
 
+    @timed()
     def batch_assign_nurses(self):
         """
-        Assign a nurse to multiple children at once based on user-defined filters.
+        Assign a nurse to multiple children at once based on user-defined filters: City, State
+        and ZIP Code, or the children within some miles of the ZIP Code.
 
         Preconditions:
             - `self.__combined_data` contains the combined data.
@@ -1265,7 +1602,7 @@ class App:
         # Create a new window for batch assignment
         batch_window = tk.Toplevel(self.__root)
         batch_window.title("Batch Assign Nurses")
-        batch_window.geometry("400x400")
+        batch_window.geometry("400x560")
 
         # Filter input fields
         tk.Label(batch_window, text="Filter by City:").pack(pady=5)
@@ -1283,11 +1620,67 @@ class App:
         zip_entry = tk.Entry(batch_window, textvariable=zip_var)
         zip_entry.pack(pady=5)
 
+        tk.Label(batch_window, text="Within Miles of the ZIP Code (optional):").pack(pady=5)
+        miles_var = tk.StringVar()
+        miles_entry = tk.Entry(batch_window, textvariable=miles_var)
+        miles_entry.pack(pady=5)
+
+        unassigned_var = tk.BooleanVar()
+        tk.Checkbutton(batch_window, text="Only unassigned children", variable=unassigned_var).pack(pady=5)
+
         tk.Label(batch_window, text="Enter Nurse Name:").pack(pady=5)
         nurse_name_var = tk.StringVar()
         nurse_entry = tk.Entry(batch_window, textvariable=nurse_name_var)
         nurse_entry.pack(pady=5)
 
+        matches_label = tk.Label(batch_window, text="")
+        matches_label.pack(pady=5)
+
+        def matching_rows():
+            """
+            Find the rows matching the filters: exact City, State and ZIP Code, or the children
+            within the given miles of the ZIP Code.
+
+            Returns:
+                tuple: (rows, distances) with the distances in miles of a radius search or None,
+                    or None after showing an error.
+            """
+            city = city_var.get().strip().lower()
+            state = state_var.get().strip().lower()
+            zip_code = zip_var.get().strip()
+            miles = miles_var.get().strip()
+
+            if not (city or state or zip_code):
+                messagebox.showerror("Error", "At least one filter is required.")
+                return None
+
+            mask = batch_filter_mask(self.__combined_data, city, state, '' if miles else zip_code)
+            if unassigned_var.get():
+                mask &= ~self.__combined_data.index.isin(list(self.roster().assignments()))
+            if not miles:
+                return self.__combined_data.index[mask], None
+
+            try:
+                distances = self.proximity().within(zip_code, float(miles), mask.to_numpy())
+            except ValueError as e:
+                message = str(e) if zip_code else "A ZIP Code is required to search within miles."
+                messagebox.showerror("Error", message)
+                return None
+            return distances.index, distances
+
+        def preview_matches():
+            """
+            Show how many children match the filters, and how far they are for a radius search.
+            """
+            matches = matching_rows()
+            if matches is None:
+                return
+            rows, distances = matches
+            text = f"{len(rows)} children match."
+            if distances is not None and len(distances):
+                text += f" Nearest {distances.iloc[0]:.1f} mi, farthest {distances.iloc[-1]:.1f} mi."
+            matches_label.config(text=text)
+
         def apply_batch_assignment():
             """
             Applies the nurse assignment to all rows matching the filters.
@@ -1298,44 +1691,344 @@ class App:
                 - Updates the `Assigned Nurse` field for matching rows.
                 - Saves the updated data to the Excel file.
             """
-            city = city_var.get().strip().lower()
-            state = state_var.get().strip().lower()
-            zip_code = zip_var.get().strip()
             nurse_name = nurse_name_var.get().strip()
 
             if not nurse_name:
                 messagebox.showerror("Error", "Nurse name is required.")
                 return
 
-            # Apply filters to the combined data
-            filtered_data = self.__combined_data[
-                ((self.__combined_data['City'].str.lower() == city) if city else True) &
-                ((self.__combined_data['State'].str.lower() == state) if state else True) &
-                ((self.__combined_data['ZIP'].astype(str) == zip_code) if zip_code else True)
-            ]
-
-            if filtered_data.empty:
-                messagebox.showinfo("No Matches", "No records match the specified filters.")
+            # Apply filters to the combined data and update the `Assigned Nurse` field
+            matches = matching_rows()
+            if matches is None:
                 return
+            rows = matches[0]
 
-            # Update the `Assigned Nurse` field
-            for index in filtered_data.index:
-                self.__combined_data.at[index, 'Assigned Nurse'] = nurse_name
+            nurse = self.resolve_nurse(nurse_name)
+            if nurse is None:
+                return
+            nurse_name = nurse.name
 
-            # Save the updated data
-            self.__combined_data.to_excel('combined_matched_data.xlsx', index=False)
-            logging.info(f"Nurse '{nurse_name}' assigned to {len(filtered_data)} children.")
+            if rows.empty:
+                messagebox.showinfo("No Matches", "No records match the specified filters.")
+                return
+            # The updated data is saved in the background
+            try:
+                self.assign_nurses(dict.fromkeys(rows, nurse.nurse_id), f"Batch assignment of nurse '{nurse_name}'")
+            except CapacityError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            assigned_count = len(rows)
+            logging.info("Nurse '%s' assigned to %s children.", nurse_name, assigned_count)
 
             # Update the Treeview display
             self.update_combined_names()
 
-            messagebox.showinfo("Success", f"Nurse '{nurse_name}' assigned to {len(filtered_data)} children.")
+            messagebox.showinfo("Success", f"Nurse '{nurse_name}' assigned to {assigned_count} children.")
             batch_window.destroy()
 
+        buttons = tk.Frame(batch_window)
+        buttons.pack(pady=10)
+        tk.Button(buttons, text="Preview Matches", command=preview_matches).pack(side=tk.LEFT, padx=10)
         # Apply button
-        apply_button = tk.Button(batch_window, text="Apply", command=apply_batch_assignment)
-        apply_button.pack(pady=10)
+        apply_button = tk.Button(buttons, text="Apply", command=apply_batch_assignment)
+        apply_button.pack(side=tk.LEFT, padx=10)
+
+
+    def assign_nurses(self, nurse_ids, description):
+        """
+        Assign rows of the combined data to nurses as one step that can be undone.
+
+        Postconditions:
+            - The roster index and the `Assigned Nurse` column hold the assignments, saved in
+              the background.
+
+        Args:
+            nurse_ids (dict or Series): Row label -> ID of the nurse to assign.
+            description (str): Names the step in the undo and redo messages.
+        Raises:
+            CapacityError: When a nurse is inactive or would exceed their capacity; nothing is assigned then.
+        Returns:
+            int: The number of children whose nurse changed.
+        """
+        command = NurseAssignmentCommand(self, self.__combined_data, self.roster(), nurse_ids, description)
+        with self.__saver.lock:
+            changed = self.__history.execute_command(command)
+        if changed:
+            self.__saver.mark_dirty()
+        return changed
+
+    def undo_assignment(self, event=None):
+        """
+        Undo the last nurse assignment step: single, batch, automatic or imported.
 
+        Postconditions:
+            - The children of the step get their previous nurse back, and the change is saved
+              in the background.
+        """
+        with self.__saver.lock:
+            command = self.__history.undo()
+        if command is None:
+            messagebox.showinfo("Undo", "Nothing to undo.")
+            return
+        self.__saver.mark_dirty()
+        self.update_combined_names()
+        messagebox.showinfo("Undo", f"Undone: {command.description} ({len(command.rows)} children).")
+
+    def redo_assignment(self, event=None):
+        """
+        Redo the last nurse assignment step undone.
+
+        Postconditions:
+            - Nothing changes when a nurse can no longer take the children of the step.
+        """
+        try:
+            with self.__saver.lock:
+                command = self.__history.redo()
+        except CapacityError as e:
+            messagebox.showerror("Error", f"Cannot redo: {e}")
+            return
+        if command is None:
+            messagebox.showinfo("Redo", "Nothing to redo.")
+            return
+        self.__saver.mark_dirty()
+        self.update_combined_names()
+        messagebox.showinfo("Redo", f"Redone: {command.description} ({len(command.rows)} children).")
+
+    def auto_assign_nurses(self):
+        """
+        Distribute the unassigned children across the active nurses of the roster, after a preview.
+
+        Preconditions:
+            - `self.__combined_data` contains the combined data.
+        Postconditions:
+            - A preview lists the caseload of every nurse before and after, and each planned
+              assignment; nothing changes until the user applies it.
+            - Applied assignments are saved in the background.
+        """
+        if self.__combined_data is None or self.__combined_data.empty:
+            messagebox.showerror("Error", "No data available for automatic assignment.")
+            logging.error("No data available for automatic assignment.")
+            return
+        roster = self.roster()
+        if not any(nurse.active for nurse in roster):
+            messagebox.showerror("Error", "Add active nurses to the roster first.")
+            return
+
+        with measure('App.auto_assign_nurses'):
+            plan = plan_assignments(self.__combined_data, roster)
+        logging.info("Automatic assignment plan: %s", plan.summary())
+        if plan.changes.empty:
+            messagebox.showinfo("Auto Assign", "No unassigned child can be assigned: " + plan.summary() + ".")
+            return
+
+        preview_window = tk.Toplevel(self.__root)
+        preview_window.title("Auto Assign Nurses - Preview")
+        preview_window.geometry("900x650")
+        tk.Label(preview_window, text=plan.summary(), font=("Arial", 12, "bold")).pack(pady=5)
+
+        tk.Label(preview_window, text="Caseloads:", font=("Arial", 12, "bold")).pack(pady=5)
+        caseload_columns = ("Nurse", "Before", "Added", "After", "Capacity")
+        caseload_tree = ttk.Treeview(preview_window, columns=caseload_columns, show="headings", height=8)
+        for col in caseload_columns:
+            caseload_tree.heading(col, text=col)
+            caseload_tree.column(col, anchor="center", width=120)
+        caseload_tree.pack(fill=tk.BOTH, expand=True)
+        populate_treeview(caseload_tree, ((nurse, *counts) for nurse, counts in
+                                          zip(plan.caseloads.index, plan.caseloads.itertuples(index=False, name=None))))
+
+        tk.Label(preview_window, text="Assignments:", font=("Arial", 12, "bold")).pack(pady=5)
+        change_columns = ("Child", "Mother ID", "ZIP", "Nurse", "Nurse ZIP")
+        change_tree = ttk.Treeview(preview_window, columns=change_columns, show="headings")
+        for col in change_columns:
+            change_tree.heading(col, text=col)
+            change_tree.column(col, anchor="center", width=150)
+        change_tree.pack(fill=tk.BOTH, expand=True)
+        changes = plan.changes
+        populate_treeview(change_tree, ((f"{first_name} {last_name}", mother_id, zip_code, nurse, nurse_zip)
+                                        for first_name, last_name, mother_id, zip_code, nurse, nurse_zip in
+                                        zip(changes['Child_First_Name'], changes['Child_Last_Name'], changes['Mother_ID'],
+                                            changes['ZIP'], changes['Nurse'], changes['Nurse_ZIP'])))
+
+        def apply():
+            """
+            Commit the previewed assignments.
+            """
+            try:
+                # Children assigned since the preview keep their nurse
+                assigned_count = self.assign_nurses(plan.pending(roster), "Automatic assignment")
+            except CapacityError as e:
+                messagebox.showerror("Error", f"The roster changed since the preview: {e}")
+                return
+            logging.info("Automatically assigned %s children.", assigned_count)
+            self.update_combined_names()
+            messagebox.showinfo("Success", f"{assigned_count} children assigned.")
+            preview_window.destroy()
+
+        buttons = tk.Frame(preview_window)
+        buttons.pack(pady=10)
+        tk.Button(buttons, text="Apply", command=apply).pack(side=tk.LEFT, padx=10)
+        tk.Button(buttons, text="Cancel", command=preview_window.destroy).pack(side=tk.LEFT, padx=10)
+
+    def import_assignments(self):
+        """
+        Apply the nurse assignments of a sheet (Excel, CSV, Parquet or Arrow) in one transaction.
+
+        Preconditions:
+            - `self.__combined_data` contains the combined data.
+            - The sheet has a nurse column, and a Record_Key column or Mother_ID and child name columns.
+        Postconditions:
+            - When a row of the sheet has a problem (unknown child or nurse, ...), the problems
+              are listed and nothing changes.
+            - Otherwise, after confirmation, every child of the sheet gets their nurse, or none
+              does when a nurse would exceed their capacity; the combined data is saved once.
+        """
+        if self.__combined_data is None or self.__combined_data.empty:
+            messagebox.showerror("Error", "No data available to import assignments into.")
+            logging.error("No data available to import assignments into.")
+            return
+        filepath = filedialog.askopenfilename(title="Select Assignment Sheet", filetypes=SOURCE_FILETYPES)
+        if not filepath:
+            logging.warning("Assignment import cancelled.")
+            return
+        sheet = self.read_data_file(filepath)
+        if sheet is None:
+            return
+
+        roster = self.roster()
+        try:
+            with measure('App.import_assignments'):
+                assignment_import = plan_import(self.__combined_data, roster, sheet)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            logging.error("Assignment import failed: %s", e)
+            return
+        logging.info("Assignment import: %s", assignment_import.summary())
+
+        if len(assignment_import.problems):
+            problems_window = tk.Toplevel(self.__root)
+            problems_window.title("Import Assignments - Problems")
+            problems_window.geometry("700x400")
+            tk.Label(problems_window, text=f"Nothing was imported: {assignment_import.summary()}.",
+                     font=("Arial", 12, "bold")).pack(pady=5)
+            problems_tree = ttk.Treeview(problems_window, columns=("Row", "Problem"), show="headings")
+            problems_tree.heading("Row", text="Row")
+            problems_tree.heading("Problem", text="Problem")
+            problems_tree.column("Row", anchor="center", width=80)
+            problems_tree.column("Problem", anchor="w", width=580)
+            problems_tree.pack(fill=tk.BOTH, expand=True)
+            populate_treeview(problems_tree, assignment_import.problems.itertuples(index=False, name=None))
+            return
+
+        if not messagebox.askyesno("Import Assignments", f"Apply the import? {assignment_import.summary()}."):
+            return
+        try:
+            changed = self.assign_nurses(assignment_import.nurse_ids, "Assignment import")
+        except CapacityError as e:
+            messagebox.showerror("Error", f"Nothing was imported: {e}")
+            return
+        self.update_combined_names()
+        messagebox.showinfo("Success", f"{changed} children reassigned.")
+
+    def manage_roster(self):
+        """
+        Display the nurse roster with the caseload of each nurse, and add or edit nurses.
+
+        Postconditions:
+            - Added and edited nurses are saved to 'nurse_roster.csv'.
+            - A nurse's name is not editable, since it identifies them in the combined data.
+        """
+        roster = self.roster()
+        roster_window = tk.Toplevel(self.__root)
+        roster_window.title("Nurse Roster")
+        roster_window.geometry("700x450")
+
+        columns = ("ID", "Name", "Home ZIP", "Assigned", "Capacity", "Active")
+        tree = ttk.Treeview(roster_window, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, anchor="center", width=100)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        def refresh():
+            populate_treeview(tree, ((nurse.nurse_id, nurse.name, nurse.home_zip, len(roster.caseload(nurse.nurse_id)),
+                                      nurse.capacity, "Yes" if nurse.active else "No") for nurse in roster),
+                              iids=(str(nurse.nurse_id) for nurse in roster))
+
+        form = tk.Frame(roster_window)
+        form.pack(fill=tk.X, pady=5)
+        name_var, zip_var, capacity_var, active_var = tk.StringVar(), tk.StringVar(), tk.StringVar(value=str(DEFAULT_CAPACITY)), tk.BooleanVar(value=True)
+        for label, variable in (("Name:", name_var), ("Home ZIP:", zip_var), ("Capacity:", capacity_var)):
+            tk.Label(form, text=label).pack(side=tk.LEFT, padx=2)
+            tk.Entry(form, textvariable=variable, width=15).pack(side=tk.LEFT, padx=2)
+        tk.Checkbutton(form, text="Active", variable=active_var).pack(side=tk.LEFT, padx=2)
+
+        def on_select(event):
+            selected = tree.selection()
+            if selected:
+                nurse = roster.get(int(selected[0]))
+                name_var.set(nurse.name)
+                zip_var.set(nurse.home_zip)
+                capacity_var.set(str(nurse.capacity))
+                active_var.set(nurse.active)
+
+        def save():
+            """
+            Update the nurse named in the form, or add them when they are not on the roster.
+            """
+            try:
+                capacity = int(capacity_var.get())
+                nurse = roster.find(name_var.get())
+                if nurse is None:
+                    nurse = roster.add_nurse(name_var.get(), zip_var.get().strip(), capacity, active_var.get())
+                    logging.info("Added nurse '%s' to the roster.", nurse.name)
+                else:
+                    roster.update_nurse(nurse.nurse_id, zip_var.get().strip(), capacity, active_var.get())
+                    logging.info("Updated nurse '%s' on the roster.", nurse.name)
+                roster.save()
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save the nurse: {e}")
+                logging.error("Failed to save the nurse: %s", e)
+                return
+            refresh()
+
+        tk.Button(form, text="Save", command=save).pack(side=tk.LEFT, padx=5)
+        tree.bind("<<TreeviewSelect>>", on_select)
+        refresh()
+
+    def resolve_nurse(self, nurse_name):
+        """
+        Find a nurse of the roster by name, offering the closest names or a new nurse otherwise.
+
+        Postconditions:
+            - A nurse the user adds is saved to the roster with the default capacity.
+
+        Returns:
+            Nurse: The nurse to assign, or None when the user cancelled.
+        """
+        roster = self.roster()
+        nurse = roster.find(nurse_name)
+        if nurse is not None:
+            return nurse
+        suggestions = roster.suggest(nurse_name)
+        if suggestions:
+            answer = messagebox.askyesnocancel(
+                "Unknown Nurse",
+                f"'{nurse_name}' is not on the roster. Did you mean '{suggestions[0]}'?\n\n"
+                f"Yes: assign '{suggestions[0]}'. No: add '{nurse_name}' to the roster.")
+            if answer is None:
+                return None
+            if answer:
+                return roster.find(suggestions[0])
+        elif not messagebox.askyesno(
+                "New Nurse", f"'{nurse_name}' is not on the roster. Add them with a capacity of {DEFAULT_CAPACITY} children?"):
+            return None
+        nurse = roster.add_nurse(nurse_name)
+        try:
+            roster.save()
+        except Exception as e:
+            logging.error("Failed to save the nurse roster: %s", e)
+        logging.info("Added nurse '%s' to the roster.", nurse.name)
+        return nurse
 
     def copy_to_clipboard(self, mother_info_text, child_info_text, address_info_text=None):
         """
@@ -1376,6 +2069,11 @@ class App:
             - A PDF with profile information is generated and opened in the default viewer.
         """
         try:
+            from reportlab.lib.pagesizes import letter
+            from reportlab.pdfgen import canvas
+            from reportlab.lib import colors
+            from reportlab.lib.units import inch
+
             # Create a temporary file for the PDF
             pdf_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
             c = canvas.Canvas(pdf_file.name, pagesize=letter)
@@ -1427,12 +2125,84 @@ class App:
 
             # Open the generated PDF
             os.system(f"open {pdf_file.name}")
-            logging.info(f"Profile exported to PDF: {pdf_file.name}")
+            logging.info("Profile exported to PDF: %s", pdf_file.name)
 
         except Exception as e:
             messagebox.showerror("Error", f"Error exporting profile: {e}")
-            logging.error(f"Error exporting profile to PDF: {e}")
+            logging.error("Error exporting profile to PDF: %s", e)
+
+    def show_performance(self):
+        """
+        Display the metrics recorded for every command and handler in a new window.
+
+        Preconditions:
+            - None; the window is empty until a measured stage has run.
+        Postconditions:
+            - A new window lists the wall time, CPU time, rows and peak memory per stage.
+            - The metrics can be refreshed, cleared, and exported to JSON or CSV.
+        """
+        logging.info("Opening performance window.")
+
+        performance_window = tk.Toplevel(self.__root)
+        performance_window.title("Performance")
+        performance_window.geometry("900x400")
+
+        columns = ["Stage", "Calls", "Total (s)", "Mean (s)", "Max (s)", "CPU (s)", "Rows", "Peak Memory (MB)", "Errors"]
+        tree = ttk.Treeview(performance_window, columns=columns, show='headings')
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=220 if col == "Stage" else 80, anchor=tk.W if col == "Stage" else tk.E)
+        tree.pack(expand=True, fill=tk.BOTH)
+
+        def stage_rows(summary):
+            for stage in summary:
+                peak = stage['peak_memory_max']
+                yield (stage['stage'], stage['calls'], f"{stage['wall_total']:.3f}", f"{stage['wall_mean']:.3f}",
+                       f"{stage['wall_max']:.3f}", f"{stage['cpu_total']:.3f}",
+                       "" if stage['rows_total'] is None else stage['rows_total'],
+                       "" if peak is None else f"{peak / 1024 ** 2:.1f}", stage['errors'])
+
+        def refresh():
+            populate_treeview(tree, stage_rows(REGISTRY.summary()))
+
+        def export(extension):
+            path = filedialog.asksaveasfilename(defaultextension=f".{extension}",
+                                                filetypes=[(f"{extension.upper()} Files", f"*.{extension}")],
+                                                title="Export Metrics As")
+            if not path:
+                return
+            try:
+                if extension == 'json':
+                    REGISTRY.export_json(path)
+                else:
+                    REGISTRY.export_csv(path)
+                messagebox.showinfo("Export Successful", f"Metrics exported to {path}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to export metrics: {e}")
+                logging.error("Failed to export metrics: %s", e)
+
+        def clear():
+            REGISTRY.clear()
+            refresh()
+
+        trace_memory = tk.BooleanVar(value=REGISTRY.trace_memory)
+
+        def toggle_trace_memory():
+            REGISTRY.trace_memory = trace_memory.get()
+            logging.info("Memory tracing %s.", 'enabled' if REGISTRY.trace_memory else 'disabled')
+
+        button_frame = tk.Frame(performance_window)
+        button_frame.pack(fill=tk.X, pady=5)
+        tk.Button(button_frame, text="Refresh", command=refresh).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Export JSON", command=lambda: export('json')).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Export CSV", command=lambda: export('csv')).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Clear", command=clear).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Trace peak memory (slower)", variable=trace_memory,
+                       command=toggle_trace_memory).pack(side=tk.LEFT, padx=5)
+
+        refresh()
 
+    @timed()
     def display_in_excel(self):
         """
         Open the combined data Excel file in the default Excel application.
@@ -1443,7 +2213,11 @@ class App:
             - The Excel file opens in the default application if available.
         """
         try:
+            self.__saver.flush()
             if os.path.exists('combined_matched_data.xlsx'):
+                # A session restored from its snapshot leaves the workbook encrypted
+                if Crypto.is_encrypted('combined_matched_data.xlsx'):
+                    DecryptFileCommand(self).execute('combined_matched_data.xlsx')
                 # Check the OS and use the appropriate command
                 if platform.system() == "Darwin":  # macOS
                     os.system("open combined_matched_data.xlsx")
@@ -1458,12 +2232,14 @@ class App:
                 logging.error("The combined data file does not exist.")
         except Exception as e:
             messagebox.showerror("Error", f"Error opening Excel file: {e}")
-            logging.error(f"Error opening Excel file: {e}")
+            logging.error("Error opening Excel file: %s", e)
     
 
 if __name__ == "__main__":
+    configure_logging()
     root = tk.Tk()
     app = App(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
+    root.after_idle(app.restore_session)
     root.mainloop()
 
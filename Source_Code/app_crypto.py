@@ -1,10 +1,13 @@
-from cryptography.fernet import Fernet
 import os
+from lazy_imports import lazy_import
+
+# Loaded on the first encryption, decryption or key generation
+fernet_module = lazy_import('cryptography.fernet')
 
 class Crypto:
     def generateKey():
             """Generates a new Fernet key and saves it to a file"""
-            key = Fernet.generate_key()
+            key = fernet_module.Fernet.generate_key()
             with open("key.txt", "wb") as key_file:
                 key_file.write(key)
 
@@ -15,7 +18,7 @@ class Crypto:
         return key
     @staticmethod
     def encrypt_file(file_path, key):
-        fernet = Fernet(key)
+        fernet = fernet_module.Fernet(key)
         """encrypts the given file using the provided Fernet key"""
         with open(file_path, "rb") as file:
               
@@ -31,7 +34,7 @@ class Crypto:
     def decrypt_file(file_path, key):
         """Decrypts the given file using the provided Fernet key"""
 
-        fernet = Fernet(key)
+        fernet = fernet_module.Fernet(key)
 
         with open(file_path, "rb") as file:
             encrypted_data = file.read()
@@ -42,6 +45,16 @@ class Crypto:
         with open(file_path, "wb") as file:
             file.write(decrypted_data)
 
+    @staticmethod
+    def encrypt_bytes(data, key):
+        """Encrypts bytes in memory using the provided Fernet key"""
+        return fernet_module.Fernet(key).encrypt(data)
+
+    @staticmethod
+    def decrypt_bytes(data, key):
+        """Decrypts bytes in memory using the provided Fernet key"""
+        return fernet_module.Fernet(key).decrypt(data)
+
     def is_encrypted(filepath):
         """
         Checks if a file is encrypted with Fernet.
@@ -56,7 +69,7 @@ class Crypto:
 
         key = Crypto.loadKey()
 
-        fernet = Fernet(key)
+        fernet = fernet_module.Fernet(key)
 
         try:
             with open(filepath, 'rb') as file:
@@ -0,0 +1,237 @@
+"""
+Automatic, load-balanced assignment of the unassigned children to the nurses of the roster.
+
+Children of the same mother form a family that always goes to one nurse: to the nurse of
+an already assigned sibling when they have room, otherwise as a whole to the nearest
+nurse with room. Distances are computed in miles between ZIP code centroids (see
+`proximity.py`), not children, so the cost matrix has one row per distinct ZIP whatever
+the number of children. A family whose ZIP code cannot be located is never ranked against
+the nurses: it is left unassigned and reported (`AssignmentPlan.unlocated`), as is a nurse
+whose home ZIP code cannot be located, who gets no family by proximity.
+
+The families are placed greedily, nearest pairs first: a heap holds, for each ZIP, the
+distance to its nearest nurse not tried yet. Popping the smallest distance places the
+families of that ZIP that fit with the nurse, then pushes the next nearest nurse for the
+families left. A first pass fills every nurse to the same share of their capacity, so
+caseloads stay balanced; a second pass places the families left up to full capacity.
+100k children and 100 nurses are planned in about a second.
+
+`plan_assignments` only computes a plan, shown as a preview; the App commits the children
+still pending (`AssignmentPlan.pending`) as one undoable `NurseAssignmentCommand`.
+"""
+import heapq
+import logging
+import math
+from lazy_imports import lazy_import
+from proximity import zip_codes, zip_distances, UNKNOWN_DISTANCE
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Columns of the planned assignments shown in the preview
+PLAN_COLUMNS = ['Mother_ID', 'Child_First_Name', 'Child_Last_Name', 'ZIP', 'Nurse', 'Nurse_ZIP', 'Distance']
+
+
+class AssignmentPlan:
+    """
+    Proposed assignments of the unassigned children, to preview before they are applied.
+
+    Attributes:
+        changes (DataFrame): One row per child to assign, indexed by row label, with the PLAN_COLUMNS.
+        nurse_ids (Series): The nurse ID of every child to assign, aligned with `changes`.
+        caseloads (DataFrame): Before, Added, After and Capacity per nurse name.
+        unplaced (Index): Labels of the children no nurse had room for.
+        unlocated (Index): Labels of the children left unassigned because their ZIP code, or
+            that of every active nurse, cannot be located.
+    """
+    def __init__(self, changes, nurse_ids, caseloads, unplaced, unlocated):
+        """
+        Initialize the plan.
+        """
+        self.changes = changes
+        self.nurse_ids = nurse_ids
+        self.caseloads = caseloads
+        self.unplaced = unplaced
+        self.unlocated = unlocated
+
+    def pending(self, roster):
+        """
+        The nurse IDs of the children of the plan still unassigned in the roster.
+
+        Returns:
+            Series: Nurse IDs indexed by row label.
+        """
+        assigned = roster.assignments()
+        return self.nurse_ids[[label not in assigned for label in self.nurse_ids.index]]
+
+    def summary(self):
+        """
+        Describe the plan in one sentence.
+        """
+        text = f"{len(self.changes)} children assigned to {self.nurse_ids.nunique()} nurses"
+        if len(self.unplaced):
+            text += f", {len(self.unplaced)} children left unassigned (no capacity left)"
+        if len(self.unlocated):
+            text += f", {len(self.unlocated)} children left unassigned (ZIP code not located)"
+        return text
+
+
+def _place(heap_distances, order, pending, sizes, limits, nurse_ids, family_nurse):
+    """
+    Greedily place the pending families of every ZIP, nearest nurse first, within `limits`.
+
+    Pairs at UNKNOWN_DISTANCE are never tried, so a family is only placed with a nurse
+    both located.
+
+    Args:
+        heap_distances (ndarray): Distance between every ZIP (rows) and nurse (columns).
+        order (ndarray): The nurse columns of every ZIP, nearest first.
+        pending (dict): ZIP row -> family numbers left, largest family first; updated.
+        sizes (ndarray): Children per family.
+        limits (dict): Nurse ID -> children the nurse may still take; updated.
+        family_nurse (ndarray): Nurse ID of every family, -1 while unplaced; updated.
+    """
+    heap = [(heap_distances[zip_row, order[zip_row, 0]], zip_row, 0) for zip_row in pending if pending[zip_row]]
+    heapq.heapify(heap)
+    while heap:
+        distance, zip_row, rank = heapq.heappop(heap)
+        if distance >= UNKNOWN_DISTANCE:
+            # The nearest pairs left are all unknown
+            break
+        nurse_id = nurse_ids[order[zip_row, rank]]
+        room = limits[nurse_id]
+        families = pending[zip_row]
+        if room > 0 and sizes[families[-1]] <= room:
+            left = []
+            for position, family in enumerate(families):
+                if sizes[family] <= room:
+                    family_nurse[family] = nurse_id
+                    room -= sizes[family]
+                    if room == 0:
+                        left.extend(families[position + 1:])
+                        break
+                else:
+                    left.append(family)
+            pending[zip_row] = families = left
+            limits[nurse_id] = room
+        if families and rank + 1 < order.shape[1]:
+            heapq.heappush(heap, (heap_distances[zip_row, order[zip_row, rank + 1]], zip_row, rank + 1))
+
+
+def plan_assignments(combined_data, roster, distances=zip_distances, balance=True):
+    """
+    Plan the assignment of every unassigned child to an active nurse of the roster.
+
+    Preconditions:
+        - The roster indexes the assignments of `combined_data`.
+    Postconditions:
+        - Nothing is modified; children of the same Mother_ID get the same nurse, and no
+          nurse exceeds their capacity.
+        - With `balance`, every nurse is first filled to the same share of their capacity.
+        - Families whose ZIP code cannot be located are left unassigned and reported as
+          `unlocated`, never placed by an unknown distance.
+
+    Args:
+        distances (callable): Returns the distance matrix between child and nurse ZIP codes.
+    Returns:
+        AssignmentPlan: The proposed assignments.
+    """
+    assigned = roster.assignments()
+    nurses = [nurse for nurse in roster if nurse.active]
+    nurse_ids = np.array([nurse.nurse_id for nurse in nurses], dtype=int)
+    children = combined_data[~combined_data.index.isin(list(assigned))]
+
+    # Families: the children of one mother; a child without Mother_ID is a family of its own
+    mothers = children['Mother_ID'] if 'Mother_ID' in children.columns else pd.Series(np.nan, index=children.index)
+    family_codes, family_mothers = pd.factorize(mothers)
+    orphans = family_codes < 0
+    family_codes[orphans] = len(family_mothers) + np.arange(orphans.sum())
+    families = len(family_mothers) + int(orphans.sum())
+    sizes = np.bincount(family_codes, minlength=families)
+    child_zips = zip_codes(children['ZIP'] if 'ZIP' in children.columns else [''] * len(children))
+    family_zips = child_zips[np.unique(family_codes, return_index=True)[1]] if len(children) else child_zips
+
+    family_nurse = np.full(families, -1, dtype=int)
+    family_unlocated = np.zeros(families, dtype=bool)
+    # Children each nurse can still take
+    room = {nurse.nurse_id: max(roster.remaining_capacity(nurse.nurse_id), 0) for nurse in nurses}
+
+    # Siblings of an assigned child join the same nurse when the nurse has room
+    if assigned and 'Mother_ID' in combined_data.columns:
+        labels = list(assigned)
+        nurse_of_mother = dict(zip(combined_data.loc[labels, 'Mother_ID'], (assigned[label] for label in labels)))
+        for family, mother in enumerate(family_mothers):
+            nurse_id = nurse_of_mother.get(mother)
+            if nurse_id in room and room[nurse_id] >= sizes[family]:
+                family_nurse[family] = nurse_id
+                room[nurse_id] -= sizes[family]
+
+    if nurses and (family_nurse < 0).any():
+        zip_values, family_zip_rows = np.unique(family_zips.astype(str), return_inverse=True)
+        matrix = distances(zip_values, zip_codes([nurse.home_zip for nurse in nurses]))
+        order = np.argsort(matrix, axis=1, kind='stable')
+        known = matrix < UNKNOWN_DISTANCE
+        family_unlocated = ~known.any(axis=1)[family_zip_rows] & (family_nurse < 0)
+        located_nurses = [nurse for nurse, located in zip(nurses, known.any(axis=0)) if located]
+        if len(located_nurses) < len(nurses):
+            logging.warning("Home ZIP code of %s nurses cannot be located; they get no children by proximity",
+                            len(nurses) - len(located_nurses))
+
+        def pending_families():
+            pending = {}
+            for family in np.argsort(-sizes, kind='stable'):
+                if family_nurse[family] < 0:
+                    pending.setdefault(family_zip_rows[family], []).append(family)
+            return pending
+
+        if balance:
+            # Every located nurse is first filled up to the same share of their capacity
+            load = (sum(nurse.capacity - room[nurse.nurse_id] for nurse in located_nurses) +
+                    int(sizes[(family_nurse < 0) & ~family_unlocated].sum()))
+            capacity = sum(nurse.capacity for nurse in located_nurses)
+            share = min(load / capacity, 1.0) if capacity else 0.0
+            targets = {nurse.nurse_id: max(0, min(room[nurse.nurse_id], math.ceil(share * nurse.capacity) -
+                                                  (nurse.capacity - room[nurse.nurse_id]))) for nurse in nurses}
+            limits = dict(targets)
+            _place(matrix, order, pending_families(), sizes, limits, nurse_ids, family_nurse)
+            for nurse_id in room:
+                room[nurse_id] -= targets[nurse_id] - limits[nurse_id]
+        _place(matrix, order, pending_families(), sizes, room, nurse_ids, family_nurse)
+
+    child_nurse = family_nurse[family_codes] if len(children) else np.array([], dtype=int)
+    child_unlocated = family_unlocated[family_codes] if len(children) else np.array([], dtype=bool)
+    return _build_plan(children, roster, child_nurse, child_unlocated, child_zips, distances)
+
+
+def _build_plan(children, roster, child_nurse, child_unlocated, child_zips, distances):
+    """
+    Describe the placed children and the resulting caseloads as an AssignmentPlan.
+    """
+    placed = child_nurse >= 0
+    nurse_ids = pd.Series(child_nurse[placed], index=children.index[placed], dtype=int)
+    changes = pd.DataFrame(index=nurse_ids.index)
+    for col in ['Mother_ID', 'Child_First_Name', 'Child_Last_Name']:
+        changes[col] = children.loc[placed, col] if col in children.columns else ''
+    changes['ZIP'] = child_zips[placed]
+    changes['Nurse'] = nurse_ids.map({nurse.nurse_id: nurse.name for nurse in roster})
+    nurse_zips = nurse_ids.map({nurse.nurse_id: zip_codes([nurse.home_zip])[0] for nurse in roster})
+    changes['Nurse_ZIP'] = nurse_zips
+    if len(changes):
+        # One distance matrix between the distinct child and nurse ZIP codes
+        child_values, child_rows = np.unique(changes['ZIP'].to_numpy(dtype=str), return_inverse=True)
+        nurse_values, nurse_columns = np.unique(nurse_zips.to_numpy(dtype=str), return_inverse=True)
+        changes['Distance'] = distances(child_values, nurse_values)[child_rows, nurse_columns]
+    else:
+        changes['Distance'] = pd.Series(dtype=float)
+
+    added = nurse_ids.value_counts()
+    caseloads = pd.DataFrame([
+        {'Nurse': nurse.name, 'Before': len(roster.caseload(nurse.nurse_id)), 'Added': int(added.get(nurse.nurse_id, 0)),
+         'Capacity': nurse.capacity}
+        for nurse in roster if nurse.active or nurse.nurse_id in added.index
+    ], columns=['Nurse', 'Before', 'Added', 'Capacity']).set_index('Nurse')
+    caseloads.insert(2, 'After', caseloads['Before'] + caseloads['Added'])
+    unlocated = ~placed & child_unlocated
+    return AssignmentPlan(changes[PLAN_COLUMNS], nurse_ids, caseloads, children.index[~placed & ~unlocated],
+                          children.index[unlocated])
+
@@ -0,0 +1,530 @@
+"""
+Reproducible benchmark suite for the combine pipeline and the combined data operations.
+
+Synthetic database and Medicaid extracts are generated with the vectorized `sheetgenerator`
+mode from a fixed seed, then reading (.xlsx, .csv and .parquet), combining, searching, single and batch nurse assignment,
+automatic nurse assignment, report statistics and file encryption/decryption are timed at every requested size.
+Results are written to a JSON file that can serve as the baseline of a later run; comparing two runs
+flags every case that became slower than the baseline by more than a threshold.
+
+The start-up benchmark imports the GUI and command-line modules in fresh interpreters
+with `-X importtime`, and opens the first window when a display is available, to keep
+the heavy dependencies off the start-up path.
+
+Usage:
+    python benchmark.py run --sizes 1000 10000 --output baseline.json
+    python benchmark.py run --sizes 1000 10000 --baseline baseline.json --threshold 0.25
+    python benchmark.py compare baseline.json current.json
+    python benchmark.py startup --output startup.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from cryptography.fernet import Fernet
+import sheetgenerator
+from formats import EXCEL_MAX_ROWS, write_table
+from app_crypto import Crypto
+from data_ops import search_mask, assign_nurse, batch_assign, report_statistics
+from invoker import ReadExcelCommand, CombineDataCommand
+from nurse_roster import NurseRoster
+from auto_assign import plan_assignments
+from metrics import MetricsRegistry
+from log_pipeline import configure_logging
+
+# Row counts benchmarked by default
+SIZES = [1000, 10000, 100000, 1000000]
+
+# Benchmark cases, in the order they run at every size
+CASES = ['read', 'read_csv', 'read_parquet', 'combine', 'search', 'assign_single', 'assign_batch', 'auto_assign', 'report', 'encrypt', 'decrypt']
+
+# Fixed "today" of the generated extracts, so ages do not change from one day to the next
+REFERENCE_DATE = date(2024, 1, 1)
+
+# Slowdowns smaller than this are timer noise and never reported as regressions
+NOISE_FLOOR_SECONDS = 0.005
+
+# Modules whose import time is measured, with their target in seconds
+STARTUP_TARGETS = {'app': 0.3, 'cli': 0.3}
+
+# Target from launching the interpreter to the first drawn window, in seconds
+FIRST_WINDOW_TARGET_SECONDS = 1.0
+
+# Dependencies that must not be imported before they are used
+HEAVY_MODULES = ['pandas', 'numpy', 'reportlab', 'cryptography.fernet', 'openpyxl', 'pyarrow']
+
+# Opens the main window once and exits, run in a fresh interpreter
+FIRST_WINDOW_SCRIPT = (
+    "import tkinter as tk\n"
+    "from app import App\n"
+    "root = tk.Tk()\n"
+    "App(root)\n"
+    "root.update()\n"
+    "root.destroy()\n"
+)
+
+# Directory of the application modules, the working directory of the start-up runs
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+class BenchmarkApp:
+    """
+    Minimal application state for the commands under benchmark.
+    """
+    def __init__(self):
+        self.combined_data = None
+
+    def show_error(self, title, message):
+        logging.error("%s: %s", title, message)
+
+
+def generate_inputs(rows, seed=0, unmatched_ratio=0.1, noise=None):
+    """
+    Generate a database and a Medicaid extract with the vectorized `sheetgenerator` mode.
+
+    Preconditions:
+        - `rows` is the number of families present in both extracts.
+    Postconditions:
+        - Both extracts have `rows * (1 + unmatched_ratio)` rows and underscore separated
+          column names, as returned by ReadExcelCommand.
+        - The same seed always generates the same extracts.
+        - With a noise model (see `sheetgenerator.apply_noise`), twins and duplicate rows are
+          added on top and the ground-truth match labels are returned as well.
+
+    Returns:
+        tuple: (database_data, medicaid_data), followed by the labels when `noise` is given.
+    """
+    data = sheetgenerator.generate_data(rows, unmatched_ratio, seed=seed, reference_date=REFERENCE_DATE, noise=noise)
+    for df in data[:2]:
+        df.columns = [col.replace(" ", "_") for col in df.columns]
+    return data
+
+
+def write_source_file(df, directory, name, output_format=None):
+    """
+    Write an extract the way users receive it: .xlsx with spaces in the column names.
+
+    Postconditions:
+        - Extracts too large for one worksheet are written as .csv instead.
+        - With an `output_format`, the extract is written in that format.
+
+    Returns:
+        str: The path of the written file.
+    """
+    df = df.rename(columns=lambda col: col.replace("_", " "))
+    if output_format is not None:
+        path = os.path.join(directory, f"{name}.{output_format}")
+        write_table(df, path, output_format)
+    elif len(df) <= EXCEL_MAX_ROWS:
+        path = os.path.join(directory, f"{name}.xlsx")
+        df.to_excel(path, index=False)
+    else:
+        path = os.path.join(directory, f"{name}.csv")
+        df.to_csv(path, index=False)
+    return path
+
+
+def make_roster(combined_data, seed, nurses=100):
+    """
+    A roster of `nurses` nurses living in ZIP codes of the children, with room for all of them.
+
+    Returns:
+        NurseRoster: The roster, indexing the assignments of `combined_data`.
+    """
+    rng = np.random.default_rng(seed)
+    zips = combined_data['ZIP'].dropna().astype(str).unique()
+    capacity = len(combined_data) // nurses + 10
+    roster = NurseRoster()
+    for number in range(nurses):
+        roster.add_nurse(f"Nurse {number}", rng.choice(zips) if len(zips) else '', capacity)
+    roster.build_index(combined_data)
+    return roster
+
+
+class BenchmarkRunner:
+    """
+    Runs the benchmark cases and collects their timings.
+
+    Attributes:
+        results (list): One result dict per (case, size), in run order.
+        match_quality (list): Precision and recall of the combine per size, measured against the
+            ground-truth labels when a noise rate is set.
+    """
+    def __init__(self, repeat=3, seed=0, unmatched_ratio=0.1, cases=None, trace_memory=False, noise_rate=0.0):
+        """
+        Initialize the runner.
+
+        Postconditions:
+            - Every case is timed `repeat` times; the median is the headline number.
+        """
+        self.repeat = repeat
+        self.seed = seed
+        self.unmatched_ratio = unmatched_ratio
+        self.noise_rate = noise_rate
+        self.cases = cases or CASES
+        self.registry = MetricsRegistry()
+        self.registry.trace_memory = trace_memory
+        self.results = []
+        self.match_quality = []
+
+    def time_case(self, case, rows, function, setup=None):
+        """
+        Time a benchmark case `repeat` times and store its result.
+
+        Args:
+            case (str): The case name.
+            rows (int): The size of the extracts.
+            function (callable): Called with the value returned by `setup` (or without arguments).
+            setup (callable, optional): Prepares the input of every repetition, outside the timing.
+        """
+        if case not in self.cases:
+            return
+        records = []
+        for _ in range(self.repeat):
+            argument = setup() if setup else None
+            with self.registry.measure(f"{case}@{rows}", rows) as record:
+                if setup:
+                    function(argument)
+                else:
+                    function()
+            records.append(record)
+
+        walls = [record['wall_seconds'] for record in records]
+        peaks = [record['peak_memory_bytes'] for record in records if record['peak_memory_bytes'] is not None]
+        self.results.append({
+            'case': case, 'rows': rows, 'status': 'ok', 'repeat': self.repeat,
+            'wall_median': statistics.median(walls), 'wall_min': min(walls),
+            'cpu_median': statistics.median(record['cpu_seconds'] for record in records),
+            'peak_memory_bytes': max(peaks) if peaks else None,
+        })
+        print(f"{case} @ {rows} rows: {statistics.median(walls):.4f}s", file=sys.stderr)
+
+    def skip_case(self, case, rows, reason):
+        """
+        Record a case that cannot run at this size.
+        """
+        if case in self.cases:
+            self.results.append({'case': case, 'rows': rows, 'status': 'skipped', 'reason': reason})
+
+    def run_size(self, rows):
+        """
+        Generate the extracts of one size and run every case on them.
+        """
+        app = BenchmarkApp()
+        noise = {noise_type: self.noise_rate for noise_type in sheetgenerator.NOISE_TYPES} if self.noise_rate else None
+        database_data, medicaid_data, *labels = generate_inputs(rows, self.seed, self.unmatched_ratio, noise)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                source_path = None
+                if {'read', 'encrypt', 'decrypt'} & set(self.cases):
+                    source_path = write_source_file(database_data, directory, 'database_data')
+
+                if source_path and source_path.endswith('.xlsx'):
+                    self.time_case('read', rows, lambda: ReadExcelCommand(app).execute(source_path))
+                elif source_path:
+                    self.skip_case('read', rows, f"more than {EXCEL_MAX_ROWS} rows do not fit in an .xlsx worksheet")
+                for case, output_format in [('read_csv', 'csv'), ('read_parquet', 'parquet')]:
+                    if case in self.cases:
+                        path = write_source_file(database_data, directory, f"database_data_{output_format}", output_format)
+                        self.time_case(case, rows, lambda: ReadExcelCommand(app).execute(path))
+
+                # Every combine gets fresh copies because the command normalizes its inputs in place
+                self.time_case('combine', rows, lambda frames: CombineDataCommand(app, frames).execute(),
+                               setup=lambda: [database_data.copy(), medicaid_data.copy()])
+                combined_data = CombineDataCommand(app, [database_data.copy(), medicaid_data.copy()]).execute()
+                combined_data['Assigned Nurse'] = None
+                if labels:
+                    scores = sheetgenerator.score_matches(combined_data, labels[0])
+                    self.match_quality.append({'rows': rows, **scores})
+                    print(f"match quality @ {rows} rows: precision {scores['precision']:.3f}, "
+                          f"recall {scores['recall']:.3f}", file=sys.stderr)
+
+                child = combined_data.iloc[len(combined_data) // 2]
+                search_term = str(child['Child_First_Name'])[:3]
+                city = combined_data['City'].mode().iloc[0]
+                self.time_case('search', rows, lambda: search_mask(combined_data, search_term))
+                self.time_case('assign_single', rows, lambda: assign_nurse(combined_data, child, 'Benchmark Nurse'))
+                self.time_case('assign_batch', rows, lambda: batch_assign(combined_data, 'Batch Nurse', city=city.lower()))
+                self.time_case('auto_assign', rows, lambda roster: plan_assignments(combined_data, roster),
+                               setup=lambda: make_roster(combined_data, self.seed))
+                self.time_case('report', rows, lambda: report_statistics(combined_data))
+
+                if source_path:
+                    self.run_crypto_cases(rows, source_path)
+            finally:
+                os.chdir(cwd)
+
+    def run_crypto_cases(self, rows, path):
+        """
+        Time the encryption and decryption of a source file with a throwaway key.
+        """
+        key = Fernet.generate_key()
+        encrypted = [False]
+
+        def encrypt(_):
+            Crypto.encrypt_file(path, key)
+            encrypted[0] = True
+
+        def decrypt(_):
+            Crypto.decrypt_file(path, key)
+            encrypted[0] = False
+
+        self.time_case('encrypt', rows, encrypt, setup=lambda: encrypted[0] and decrypt(None))
+        self.time_case('decrypt', rows, decrypt, setup=lambda: encrypted[0] or encrypt(None))
+
+    def run(self, sizes):
+        """
+        Run every case at every size.
+
+        Returns:
+            dict: The benchmark document (environment, settings and results).
+        """
+        for rows in sizes:
+            self.run_size(rows)
+        return {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+            },
+            'settings': {'seed': self.seed, 'repeat': self.repeat, 'unmatched_ratio': self.unmatched_ratio,
+                         'noise_rate': self.noise_rate},
+            'results': self.results,
+            'match_quality': self.match_quality,
+        }
+
+
+def parse_importtime(output):
+    """
+    Parse the report written to stderr by `python -X importtime`.
+
+    Returns:
+        list: One dict per imported module with its name, nesting level and self and
+        cumulative import times in seconds, in import order.
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        modules.append({'module': name.strip(), 'level': (len(name) - len(name.lstrip()) - 1) // 2,
+                        'self_seconds': int(self_time) / 1e6, 'cumulative_seconds': int(cumulative) / 1e6})
+    return modules
+
+
+def measure_import(module, repeat=3):
+    """
+    Import a module in fresh interpreters with `-X importtime`.
+
+    Returns:
+        dict: The median and minimum cumulative import time, the slowest imports of the median
+        run and the heavy dependencies it imported.
+    """
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=SOURCE_DIRECTORY,
+                                   capture_output=True, text=True, check=True)
+        modules = parse_importtime(completed.stderr)
+        runs.append((sum(entry['cumulative_seconds'] for entry in modules if entry['level'] == 0), modules))
+    runs.sort(key=lambda run: run[0])
+    total, modules = runs[len(runs) // 2]
+    return {
+        'wall_median': total,
+        'wall_min': runs[0][0],
+        'slowest': sorted(({'module': entry['module'], 'self_seconds': entry['self_seconds']} for entry in modules),
+                          key=lambda entry: entry['self_seconds'], reverse=True)[:10],
+        'heavy_modules': [heavy for heavy in HEAVY_MODULES
+                          if any(entry['module'] == heavy or entry['module'].startswith(heavy + '.') for entry in modules)],
+    }
+
+
+def measure_first_window(repeat=3):
+    """
+    Time fresh interpreters from launch until the main window is drawn.
+
+    Returns:
+        dict: The median and minimum wall times, or None without a display.
+    """
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        return None
+    walls = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", FIRST_WINDOW_SCRIPT], cwd=SOURCE_DIRECTORY, capture_output=True, check=True)
+        walls.append(time.perf_counter() - start)
+    return {'wall_median': statistics.median(walls), 'wall_min': min(walls)}
+
+
+def run_startup(repeat=3):
+    """
+    Run the start-up benchmark.
+
+    Returns:
+        dict: A benchmark document whose results are the `import_<module>` and `first_window`
+        cases; each result records its target and whether it was met.
+    """
+    results = []
+    for module, target in STARTUP_TARGETS.items():
+        measured = measure_import(module, repeat)
+        results.append({'case': f"import_{module}", 'rows': 0, 'status': 'ok', 'repeat': repeat, 'target': target,
+                        'within_target': measured['wall_median'] <= target, **measured})
+        print(f"import {module}: {measured['wall_median']:.3f}s (target {target:.2f}s)", file=sys.stderr)
+
+    window = measure_first_window(repeat)
+    if window is None:
+        results.append({'case': 'first_window', 'rows': 0, 'status': 'skipped', 'reason': "no display available"})
+    else:
+        results.append({'case': 'first_window', 'rows': 0, 'status': 'ok', 'repeat': repeat,
+                        'target': FIRST_WINDOW_TARGET_SECONDS,
+                        'within_target': window['wall_median'] <= FIRST_WINDOW_TARGET_SECONDS, **window})
+        print(f"first window: {window['wall_median']:.3f}s (target {FIRST_WINDOW_TARGET_SECONDS:.2f}s)", file=sys.stderr)
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'settings': {'repeat': repeat},
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=0.2, noise_floor=NOISE_FLOOR_SECONDS):
+    """
+    Compare the median wall times of two benchmark documents.
+
+    Postconditions:
+        - Only cases that ran in both documents are compared.
+
+    Returns:
+        list: One dict per compared case with the baseline and current medians, their ratio and
+        whether it is a regression (slower by more than `threshold` and by more than `noise_floor`).
+    """
+    baseline_results = {(result['case'], result['rows']): result for result in baseline['results']
+                        if result['status'] == 'ok'}
+    comparison = []
+    for result in current['results']:
+        previous = baseline_results.get((result['case'], result['rows']))
+        if result['status'] != 'ok' or previous is None:
+            continue
+        before, after = previous['wall_median'], result['wall_median']
+        ratio = after / before if before else float('inf')
+        comparison.append({
+            'case': result['case'], 'rows': result['rows'], 'baseline': before, 'current': after, 'ratio': ratio,
+            'regression': after > before * (1 + threshold) and after - before > noise_floor,
+        })
+    return comparison
+
+
+def format_comparison(comparison):
+    """
+    Format a comparison as a plain text table.
+    """
+    lines = [f"{'case':<15}{'rows':>10}{'baseline':>12}{'current':>12}{'ratio':>8}"]
+    for row in comparison:
+        flag = "  REGRESSION" if row['regression'] else ""
+        lines.append(f"{row['case']:<15}{row['rows']:>10}{row['baseline']:>12.4f}{row['current']:>12.4f}"
+                     f"{row['ratio']:>8.2f}{flag}")
+    return "\n".join(lines)
+
+
+def load_results(path):
+    """
+    Load a benchmark document written by `run`.
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def build_parser():
+    """
+    Build the command-line argument parser.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the combine pipeline and the combined data operations.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help="Run the benchmarks.")
+    run.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="Numbers of families to generate.")
+    run.add_argument('--cases', nargs='+', choices=CASES, default=CASES, help="Cases to run.")
+    run.add_argument('--repeat', type=int, default=3, help="Repetitions of every case.")
+    run.add_argument('--seed', type=int, default=0, help="Seed of the synthetic extracts.")
+    run.add_argument('--unmatched-ratio', type=float, default=0.1, help="Share of unmatched rows on each side.")
+    run.add_argument('--noise-rate', type=float, default=0.0,
+                     help="Rate of every sheetgenerator error type; also scores the matches against the true labels.")
+    run.add_argument('--trace-memory', action='store_true', help="Also measure the peak memory of every case.")
+    run.add_argument('--output', default='benchmark_results.json', help="Where to write the results.")
+    run.add_argument('--baseline', default=None, help="Baseline results to compare against.")
+    run.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown before flagging a regression.")
+
+    startup = subparsers.add_parser('startup', help="Measure the import time and the time to the first window.")
+    startup.add_argument('--repeat', type=int, default=3, help="Fresh interpreters launched per measurement.")
+    startup.add_argument('--output', default='startup_results.json', help="Where to write the results.")
+    startup.add_argument('--baseline', default=None, help="Baseline results to compare against.")
+    startup.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown before flagging a regression.")
+
+    compare = subparsers.add_parser('compare', help="Compare two result files.")
+    compare.add_argument('baseline', help="Baseline results.")
+    compare.add_argument('current', help="Current results.")
+    compare.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown before flagging a regression.")
+    return parser
+
+
+def main(argv=None):
+    """
+    Run the benchmark command line.
+
+    Returns:
+        int: The process exit code, 1 when a regression is found or a start-up target is missed.
+    """
+    args = build_parser().parse_args(argv)
+    # Keep the per-command info logs out of the timings output
+    configure_logging(logging.WARNING)
+
+    if args.command == 'run':
+        runner = BenchmarkRunner(args.repeat, args.seed, args.unmatched_ratio, args.cases, args.trace_memory, args.noise_rate)
+        current = runner.run(args.sizes)
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+        print(f"Results written to {args.output}")
+        if not args.baseline:
+            return 0
+        baseline = load_results(args.baseline)
+    elif args.command == 'startup':
+        current = run_startup(args.repeat)
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+        print(f"Results written to {args.output}")
+        missed = [result['case'] for result in current['results'] if result.get('within_target') is False]
+        for result in current['results']:
+            if result['status'] == 'ok':
+                print(f"{result['case']:<15}{result['wall_median']:>10.3f}s  target {result['target']:.2f}s"
+                      f"{'' if result['within_target'] else '  MISSED'}")
+        if not args.baseline:
+            return 1 if missed else 0
+        baseline = load_results(args.baseline)
+    else:
+        baseline, current = load_results(args.baseline), load_results(args.current)
+
+    comparison = compare_results(baseline, current, args.threshold)
+    print(format_comparison(comparison))
+    regressions = [row for row in comparison if row['regression']]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
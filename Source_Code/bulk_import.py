@@ -0,0 +1,185 @@
+"""
+Bulk import of nurse assignments from a spreadsheet.
+
+Supervisors rebalancing caseloads send sheets of thousands of (Mother_ID, child, nurse)
+rows, which used to be entered one at a time. `plan_import` joins the whole sheet to the
+combined data with one merge on stable keys: the Record_Key when the sheet has it,
+otherwise Mother_ID and the child's first name, with the child's last name and date of
+birth when the sheet gives them. Every problem (missing keys, unknown or ambiguous child,
+unknown nurse, a child given two nurses) is reported with its row in the sheet.
+
+Only an import without problems is applied, by the App, as one undoable
+`NurseAssignmentCommand`: capacities are checked against the caseloads after every move,
+then the roster index and the ASSIGNED_NURSE column are updated, and the combined data is
+saved once.
+"""
+import logging
+from lazy_imports import lazy_import
+from matching import RECORD_KEY
+from nurse_roster import UNASSIGNED_VALUES
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Sheet columns recognised, compared ignoring case, spaces and underscores, by their name in the combined data
+COLUMN_ALIASES = {
+    RECORD_KEY: [RECORD_KEY],
+    'Mother_ID': ['Mother_ID'],
+    'Child_First_Name': ['Child_First_Name'],
+    'Child_Last_Name': ['Child_Last_Name'],
+    'Child_Date_of_Birth': ['Child_Date_of_Birth', 'Child_DOB', 'DOB'],
+    'Nurse': ['Nurse', 'Assigned_Nurse', 'Nurse_Name'],
+}
+
+# Keys of a child when the sheet has no RECORD_KEY; the optional ones are matched when present
+CHILD_KEYS = ['Mother_ID', 'Child_First_Name']
+OPTIONAL_CHILD_KEYS = ['Child_Last_Name', 'Child_Date_of_Birth']
+
+# Row of the first record of a sheet, as numbered by a spreadsheet below the header
+FIRST_SHEET_ROW = 2
+
+
+def _column_key(name):
+    """
+    The key a sheet column name is recognised by.
+    """
+    return str(name).replace(' ', '').replace('_', '').casefold()
+
+
+def normalize_columns(sheet):
+    """
+    Rename the columns of a sheet recognised by COLUMN_ALIASES to their name in the combined data.
+    """
+    aliases = {_column_key(alias): column for column, names in COLUMN_ALIASES.items() for alias in names}
+    renames = {}
+    for name in sheet.columns:
+        column = aliases.get(_column_key(name))
+        if column is not None and column not in renames.values():
+            renames[name] = column
+    return sheet.rename(columns=renames)
+
+
+def key_values(values, column):
+    """
+    The comparable text of a key column: dates as YYYY-MM-DD, IDs without a trailing '.0',
+    names without case or repeated spaces; '' for missing values.
+
+    Returns:
+        ndarray: One text per value.
+    """
+    if column == 'Child_Date_of_Birth':
+        if not pd.api.types.is_datetime64_any_dtype(values):
+            dates = pd.to_datetime(values, errors='coerce')
+            # Dates written in another format than the first one are parsed one by one
+            retry = dates.isna() & values.notna()
+            if retry.any():
+                dates[retry] = pd.to_datetime(values[retry].astype(str), errors='coerce', format='mixed')
+            values = dates
+        return values.dt.strftime('%Y-%m-%d').fillna('').to_numpy(dtype=object)
+    text = values.astype(object).where(values.notna(), '').astype(str).str.strip()
+    if column == 'Mother_ID':
+        return text.str.replace(r'\.0$', '', regex=True).to_numpy(dtype=object)
+    if column == RECORD_KEY:
+        return text.to_numpy(dtype=object)
+    return text.str.replace(r'\s+', ' ', regex=True).str.casefold().to_numpy(dtype=object)
+
+
+class AssignmentImport:
+    """
+    Assignments read from a sheet, to review before they are applied.
+
+    Attributes:
+        nurse_ids (Series): The nurse ID of every child of the sheet, indexed by row label.
+        problems (DataFrame): Row of the sheet and Problem, for every row that cannot be applied.
+        keys (list): The columns the sheet was matched on.
+        unchanged (int): Children already assigned to the nurse of the sheet.
+    """
+    def __init__(self, nurse_ids, problems, keys, unchanged):
+        """
+        Initialize the import.
+        """
+        self.nurse_ids = nurse_ids
+        self.problems = problems
+        self.keys = keys
+        self.unchanged = unchanged
+
+    def summary(self):
+        """
+        Describe the import in one sentence.
+        """
+        text = (f"{len(self.nurse_ids) - self.unchanged} children to reassign to {self.nurse_ids.nunique()} nurses, "
+                f"{self.unchanged} already assigned")
+        if len(self.problems):
+            text += f", {len(self.problems)} rows with problems"
+        return text
+
+
+def plan_import(combined_data, roster, sheet):
+    """
+    Match the rows of an assignment sheet with the children of the combined data and the nurses of the roster.
+
+    Preconditions:
+        - The roster indexes the assignments of `combined_data`.
+    Postconditions:
+        - Nothing is modified.
+
+    Args:
+        sheet (DataFrame): One row per child, with a nurse column and the key columns.
+    Raises:
+        ValueError: When the sheet has no nurse column, or not enough key columns.
+    Returns:
+        AssignmentImport: The assignments, and the problems found.
+    """
+    sheet = normalize_columns(sheet)
+    if 'Nurse' not in sheet.columns:
+        raise ValueError("The sheet has no Nurse column")
+    if RECORD_KEY in sheet.columns and RECORD_KEY in combined_data.columns:
+        keys = [RECORD_KEY]
+    elif set(CHILD_KEYS) <= set(sheet.columns) and set(CHILD_KEYS) <= set(combined_data.columns):
+        keys = CHILD_KEYS + [col for col in OPTIONAL_CHILD_KEYS if col in sheet.columns and col in combined_data.columns]
+    else:
+        raise ValueError(f"The sheet needs a {RECORD_KEY} column, or {' and '.join(CHILD_KEYS)} columns")
+
+    sheet_rows = np.arange(len(sheet)) + FIRST_SHEET_ROW
+    left = pd.DataFrame({col: key_values(sheet[col], col) for col in keys})
+    left['Row'] = sheet_rows
+    right = pd.DataFrame({col: key_values(combined_data[col], col) for col in keys})
+    right['Position'] = np.arange(len(combined_data))
+    missing_keys = (left[keys] == '').any(axis=1).to_numpy()
+    joined = left[~missing_keys].merge(right[~(right[keys] == '').any(axis=1)], on=keys, how='left')
+    match_counts = joined.groupby('Row')['Position'].count().reindex(sheet_rows, fill_value=0).to_numpy()
+
+    # Nurses, looked up once per distinct name
+    names = sheet['Nurse'].astype(object).where(sheet['Nurse'].notna(), '').astype(str).str.strip()
+    nurses = {name: roster.find(name) for name in names.unique() if name not in UNASSIGNED_VALUES}
+    sheet_nurse_ids = names.map(lambda name: -1 if nurses.get(name) is None else nurses[name].nurse_id).to_numpy()
+
+    problems = [pd.DataFrame({'Row': sheet_rows[missing_keys], 'Problem': f"Missing a key value ({', '.join(keys)})"})]
+    for mask, problem in [(~missing_keys & (match_counts == 0), "No child matches the keys"),
+                          (match_counts > 1, "Several children match the keys")]:
+        problems.append(pd.DataFrame({'Row': sheet_rows[mask], 'Problem': problem}))
+    for name in names[sheet_nurse_ids < 0].unique():
+        if name in UNASSIGNED_VALUES:
+            problem = "No nurse given"
+        else:
+            suggestions = roster.suggest(name)
+            problem = f"Nurse '{name}' is not on the roster"
+            if suggestions:
+                problem += f" (did you mean {', '.join(suggestions)}?)"
+        problems.append(pd.DataFrame({'Row': sheet_rows[(names == name).to_numpy()], 'Problem': problem}))
+
+    # Children given several nurses by the sheet
+    valid = (match_counts == 1) & (sheet_nurse_ids >= 0)
+    rows = joined[joined['Row'].isin(sheet_rows[valid])][['Row', 'Position']].astype(int)
+    rows['Nurse_ID'] = sheet_nurse_ids[rows['Row'].to_numpy() - FIRST_SHEET_ROW]
+    conflicting = rows.groupby('Position')['Nurse_ID'].transform('nunique') > 1
+    problems.append(pd.DataFrame({'Row': rows.loc[conflicting, 'Row'], 'Problem': "The child is given another nurse too"}))
+    rows = rows[~conflicting].drop_duplicates('Position')
+
+    nurse_ids = pd.Series(rows['Nurse_ID'].to_numpy(), index=combined_data.index[rows['Position'].to_numpy()], dtype=int)
+    assigned = roster.assignments()
+    unchanged = sum(assigned.get(label) == nurse_id for label, nurse_id in nurse_ids.items())
+    problems = pd.concat(problems, ignore_index=True).sort_values('Row', kind='stable', ignore_index=True)
+    logging.info("Matched %s of %s sheet rows on %s", len(nurse_ids), len(sheet), ", ".join(keys))
+    return AssignmentImport(nurse_ids, problems, keys, unchanged)
+
@@ -0,0 +1,302 @@
+"""
+Headless command-line entry point for the combine pipeline.
+
+Runs the same commands as the GUI buttons (decrypt, read, combine, write the outputs,
+re-encrypt) without importing tkinter, and prints the statistics of the run to stdout
+as one JSON document. Logs go to stderr, so the output can be piped or parsed by cron jobs.
+
+Usage:
+    python cli.py combine database_data.xlsx medicaid_data.xlsx
+    python cli.py combine database_data.xlsx medicaid_data.xlsx --mode partitioned --partitions 32
+    python cli.py combine database_data.csv medicaid_data.parquet --output-format parquet
+    python cli.py centroids 2023_Gaz_zcta_national.txt
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from app_crypto import Crypto
+from metrics import REGISTRY, measure
+from log_pipeline import configure_logging
+from data_ops import report_statistics
+from formats import OUTPUT_FORMATS, output_path, read_table
+from proximity import SERVICE_AREA_PREFIXES, build_centroid_table
+from invoker import (ReadExcelCommand, CombineDataCommand, IncrementalCombineDataCommand, PartitionedCombineDataCommand,
+                     ParallelCombineDataCommand, GenerateKeyCommand, EncryptFileCommand, DecryptFileCommand)
+
+# Output files written by the combine commands, relative to the working directory, without
+# the extension of the output format
+MATCHED_FILE_NAME = 'combined_matched_data'
+UNMATCHED_FILE_NAME = 'unmatched_data'
+
+COMBINE_MODES = ['memory', 'partitioned', 'parallel', 'incremental']
+
+
+class HeadlessApp:
+    """
+    Application state handed to the commands when no GUI is running.
+
+    Errors reported by the commands are logged and collected instead of shown in message boxes.
+    """
+    def __init__(self):
+        """
+        Initialize an empty application state.
+
+        Postconditions:
+            - No combined data is loaded and no error is recorded.
+        """
+        self.combined_data = None
+        self.errors = []
+
+    def show_error(self, title, message):
+        """
+        Record an error reported by a command.
+        """
+        logging.error("%s: %s", title, message)
+        self.errors.append(message)
+
+
+class StageTimer:
+    """
+    Metrics of the named stages of a run, measured in the shared metrics registry.
+
+    Attributes:
+        stages (dict): Wall time, CPU time and peak memory of every stage, in the order the stages ran.
+    """
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measure the enclosed block as the stage `cli.<name>`.
+        """
+        with measure(f"cli.{name}") as record:
+            try:
+                yield record
+            finally:
+                self.stages[name] = record
+
+    def report(self):
+        """
+        Summarize the measured stages for the JSON output.
+
+        Returns:
+            dict: Wall time, CPU time and peak memory (or None) of every stage.
+        """
+        return {name: {'wall_seconds': round(record['wall_seconds'], 4), 'cpu_seconds': round(record['cpu_seconds'], 4),
+                       'peak_memory_bytes': record['peak_memory_bytes']}
+                for name, record in self.stages.items()}
+
+
+def decrypt_if_encrypted(app, path):
+    """
+    Decrypt a file in place when it is encrypted with the key in the working directory.
+
+    Returns:
+        bool: True if the file was decrypted.
+    """
+    if not os.path.exists('key.txt') or not os.path.exists(path) or not Crypto.is_encrypted(path):
+        return False
+    logging.info("Decrypting %s", path)
+    return DecryptFileCommand(app).execute(path)
+
+
+def encrypt_if_plain(app, path):
+    """
+    Encrypt a file in place unless it is missing or already encrypted.
+
+    Returns:
+        bool: True if the file was encrypted.
+    """
+    if not os.path.exists(path) or Crypto.is_encrypted(path):
+        return False
+    return bool(EncryptFileCommand(app).execute(path))
+
+
+def report_summary(combined_data):
+    """
+    Compute the headline numbers of the statistical report for the combined data.
+
+    Returns:
+        dict: Total children, unassigned children and children per nurse, or None without data.
+    """
+    if combined_data is None:
+        return None
+    statistics = report_statistics(combined_data)
+    return {
+        'total_children': statistics['total_children'],
+        'unassigned_children': len(statistics['unassigned_children']),
+        'assigned_nurses': {str(nurse): int(count) for nurse, count in statistics['assigned_nurses'].items()},
+    }
+
+
+def run_combine(args):
+    """
+    Run the combine pipeline for the parsed command-line arguments.
+
+    Preconditions:
+        - `args.database` and `args.medicaid` are paths to the source files, in any format
+          supported by `formats.read_table`.
+    Postconditions:
+        - The combined and unmatched data are written to the working directory, in `args.output_format`.
+        - Unless `args.no_encrypt` is set, the sources and outputs are left encrypted on disk.
+
+    Returns:
+        dict: The metrics of the run; `status` is 'ok' or 'error'.
+    """
+    app = HeadlessApp()
+    timer = StageTimer()
+    metrics = {'status': 'error', 'mode': args.mode}
+    sources = [args.database, args.medicaid]
+    matched_file_path = output_path(MATCHED_FILE_NAME, args.output_format)
+    unmatched_file_path = output_path(UNMATCHED_FILE_NAME, args.output_format)
+    encrypt = not args.no_encrypt
+    start = time.perf_counter()
+
+    try:
+        with timer.stage('decrypt'):
+            if encrypt and not os.path.exists('key.txt'):
+                logging.info("Encryption key does not exist. Generating new key")
+                GenerateKeyCommand(app).execute()
+            for path in sources:
+                decrypt_if_encrypted(app, path)
+            previous_data = None
+            if args.mode == 'incremental' and os.path.exists(matched_file_path):
+                decrypt_if_encrypted(app, matched_file_path)
+                previous_data = read_table(matched_file_path)
+
+        if args.mode == 'partitioned':
+            # Sources are streamed from disk by the combine itself
+            data_frames = sources
+        else:
+            with timer.stage('read'):
+                data_frames = [ReadExcelCommand(app).execute(path) for path in sources]
+            if any(df is None for df in data_frames):
+                metrics['errors'] = app.errors
+                return metrics
+            metrics['rows_in'] = {'database': len(data_frames[0]), 'medicaid': len(data_frames[1])}
+
+        with timer.stage('combine'):
+            if args.mode == 'memory':
+                command = CombineDataCommand(app, data_frames, output_format=args.output_format)
+            elif args.mode == 'incremental':
+                command = IncrementalCombineDataCommand(app, data_frames, previous_data, state_file_path=args.state_file,
+                                                        output_format=args.output_format)
+            elif args.mode == 'parallel':
+                command = ParallelCombineDataCommand(app, data_frames, max_workers=args.workers,
+                                                     num_partitions=args.partitions, workdir=args.workdir,
+                                                     output_format=args.output_format)
+            else:
+                command = PartitionedCombineDataCommand(app, data_frames, num_partitions=args.partitions or 16,
+                                                        workdir=args.workdir, matched_file_path=matched_file_path,
+                                                        unmatched_file_path=unmatched_file_path)
+            result = command.execute()
+        if result is None:
+            metrics['errors'] = app.errors
+            return metrics
+
+        if args.mode == 'partitioned':
+            metrics['rows_in'] = {'database': result['database_rows'], 'medicaid': result['medicaid_rows']}
+            metrics['rows_out'] = {'matched': result['matched_rows'], 'unmatched': result['unmatched_rows']}
+        else:
+            unmatched_data = command.unmatched_data
+            metrics['rows_out'] = {'matched': len(result),
+                                   'unmatched': 0 if unmatched_data is None else len(unmatched_data)}
+            metrics['memory'] = command.memory_report
+            with timer.stage('report'):
+                metrics['report'] = report_summary(result)
+        metrics['duplicates'] = command.duplicate_report
+        if args.mode == 'incremental':
+            metrics['delta'] = command.delta
+        metrics['status'] = 'ok'
+        return metrics
+
+    except Exception as e:
+        logging.error("Combine pipeline failed: %s", e)
+        app.errors.append(str(e))
+        metrics['errors'] = app.errors
+        return metrics
+
+    finally:
+        if encrypt:
+            with timer.stage('encrypt'):
+                for path in sources + [matched_file_path, unmatched_file_path]:
+                    encrypt_if_plain(app, path)
+        metrics['stages'] = timer.report()
+        metrics['total_seconds'] = round(time.perf_counter() - start, 4)
+
+
+def build_parser():
+    """
+    Build the command-line argument parser.
+    """
+    parser = argparse.ArgumentParser(description="Combine hospital and Medicaid extracts without the GUI.")
+    parser.add_argument('--log-level', default='INFO', help="Logging level of the messages written to stderr.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    combine = subparsers.add_parser('combine', help="Combine a database extract with a Medicaid extract.")
+    combine.add_argument('database', help="Path to the hospital database extract.")
+    combine.add_argument('medicaid', help="Path to the Medicaid extract.")
+    combine.add_argument('--mode', choices=COMBINE_MODES, default='memory', help="Combine strategy to use.")
+    combine.add_argument('--output-format', choices=OUTPUT_FORMATS, default='xlsx',
+                         help="File format of the matched and unmatched outputs.")
+    combine.add_argument('--no-encrypt', action='store_true', help="Leave the sources and outputs unencrypted.")
+    combine.add_argument('--workers', type=int, default=None, help="Worker processes of the parallel mode.")
+    combine.add_argument('--partitions', type=int, default=None, help="Partitions of the partitioned and parallel modes.")
+    combine.add_argument('--workdir', default=None, help="Directory for the temporary partition files.")
+    combine.add_argument('--state-file', default='combine_state.pkl', help="Fingerprint file of the incremental mode.")
+    combine.add_argument('--trace-memory', action='store_true', help="Measure the peak memory of every stage (slower).")
+    combine.add_argument('--metrics-file', default=None,
+                         help="Also export every measured stage, including the commands, to this .json or .csv file.")
+
+    centroids = subparsers.add_parser('centroids', help="Rebuild the bundled ZIP code centroids from the Census Gazetteer.")
+    centroids.add_argument('gazetteer', help="Path to the Census ZCTA Gazetteer file.")
+    centroids.add_argument('--prefixes', nargs='+', default=list(SERVICE_AREA_PREFIXES),
+                           help="3-digit ZIP prefixes of the service area to keep.")
+    return parser
+
+
+def run_centroids(args):
+    """
+    Rebuild the bundled centroid table for the parsed command-line arguments.
+
+    Returns:
+        dict: The status of the run, the number of ZIP codes written and any error.
+    """
+    try:
+        return {'status': 'ok', 'zip_codes': build_centroid_table(args.gazetteer, args.prefixes), 'errors': []}
+    except (OSError, ValueError) as e:
+        logging.error("Could not build the ZIP code centroids: %s", e)
+        return {'status': 'error', 'zip_codes': 0, 'errors': [str(e)]}
+
+
+def main(argv=None):
+    """
+    Run the command line and print the metrics as JSON.
+
+    Returns:
+        int: The process exit code, 0 on success and 1 on failure.
+    """
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level.upper())
+    REGISTRY.trace_memory = REGISTRY.trace_memory or args.trace_memory
+    if args.command == 'centroids':
+        metrics = run_centroids(args)
+        print(json.dumps(metrics, indent=2, default=int))
+        return 0 if metrics['status'] == 'ok' else 1
+    metrics = run_combine(args)
+    if args.metrics_file:
+        if args.metrics_file.lower().endswith('.csv'):
+            REGISTRY.export_csv(args.metrics_file)
+        else:
+            REGISTRY.export_json(args.metrics_file)
+    print(json.dumps(metrics, indent=2, default=int))
+    return 0 if metrics['status'] == 'ok' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Data operations behind the combined data views.
+
+Search, child lookup, nurse assignment and report statistics used to be computed inline
+in the App handlers. They are kept here, free of any Tk dependency, so the GUI, the
+command line and the benchmark suite run exactly the same code.
+"""
+from datetime import datetime
+from lazy_imports import lazy_import
+from schema import set_values
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Column holding the nurse assigned to a child
+ASSIGNED_NURSE = 'Assigned Nurse'
+
+# Columns of the unmatched data window; the other columns are shown when a row is expanded
+UNMATCHED_PRIMARY_COLUMNS = ['Source', 'Child_ID', 'Mother_First_Name', 'Mother_Last_Name']
+
+
+def search_mask(combined_data, search_term):
+    """
+    Select the rows whose Mother ID or child name contains the search term.
+
+    Preconditions:
+        - `combined_data` has Mother_ID, Child_First_Name and Child_Last_Name columns.
+    Postconditions:
+        - The match is case-insensitive and literal, like the Treeview search box.
+
+    Returns:
+        Series: Boolean mask aligned with `combined_data`.
+    """
+    search_term = search_term.lower()
+    if not search_term:
+        return pd.Series(True, index=combined_data.index)
+    text = (combined_data['Mother_ID'].astype(str) + " " + combined_data['Child_First_Name'].astype(str) + " " +
+            combined_data['Child_Last_Name'].astype(str))
+    return text.str.lower().str.contains(search_term, regex=False)
+
+
+def find_child_index(combined_data, child_data):
+    """
+    Find the row of a child in the combined data.
+
+    Preconditions:
+        - `child_data` maps Mother_ID, Child_First_Name, Child_Last_Name and Child_Date_of_Birth.
+
+    Returns:
+        Index: The labels of the matching rows, empty when the child is not found.
+    """
+    return combined_data[
+        (combined_data['Mother_ID'].astype(str) == str(child_data['Mother_ID'])) &
+        (combined_data['Child_First_Name'].str.lower() == child_data['Child_First_Name'].lower()) &
+        (combined_data['Child_Last_Name'].str.lower() == child_data['Child_Last_Name'].lower()) &
+        (combined_data['Child_Date_of_Birth'] == child_data['Child_Date_of_Birth'])
+    ].index
+
+
+def assign_nurse(combined_data, child_data, nurse_name):
+    """
+    Assign a nurse to one child.
+
+    Postconditions:
+        - The first row matching `child_data` has `nurse_name` in the ASSIGNED_NURSE column.
+
+    Returns:
+        The label of the updated row, or None when the child is not found.
+    """
+    index = find_child_index(combined_data, child_data)
+    if index.empty:
+        return None
+    set_values(combined_data, [index[0]], ASSIGNED_NURSE, nurse_name)
+    return index[0]
+
+
+def batch_filter_mask(combined_data, city='', state='', zip_code=''):
+    """
+    Select the rows matching the batch assignment filters; empty filters match every row.
+
+    Preconditions:
+        - `city` and `state` are lower case, `zip_code` is compared as text.
+
+    Returns:
+        Series: Boolean mask aligned with `combined_data`.
+    """
+    mask = pd.Series(True, index=combined_data.index)
+    if city:
+        mask &= combined_data['City'].str.lower() == city
+    if state:
+        mask &= combined_data['State'].str.lower() == state
+    if zip_code:
+        mask &= combined_data['ZIP'].astype(str) == zip_code
+    return mask
+
+
+def batch_assign(combined_data, nurse_name, city='', state='', zip_code=''):
+    """
+    Assign a nurse to every child matching the batch assignment filters.
+
+    Postconditions:
+        - Matching rows have `nurse_name` in the ASSIGNED_NURSE column.
+
+    Returns:
+        int: The number of children assigned.
+    """
+    mask = batch_filter_mask(combined_data, city, state, zip_code)
+    set_values(combined_data, mask, ASSIGNED_NURSE, nurse_name)
+    return int(mask.sum())
+
+
+def describe_ages(dates_of_birth, today):
+    """
+    Describe the age of every child, e.g. "2 years, 3 months", vectorized.
+
+    Preconditions:
+        - `dates_of_birth` is a datetime Series.
+    Postconditions:
+        - Missing dates are described as "Unknown".
+
+    Returns:
+        Series: The age descriptions aligned with `dates_of_birth`.
+    """
+    days_old = (pd.Timestamp(today) - dates_of_birth).dt.days
+    unknown = days_old.isna().to_numpy()
+    days_old = days_old.fillna(0).astype('int64')
+    years, months, days = days_old // 365, (days_old % 365) // 30, days_old % 30
+    young = (days_old < 365).to_numpy()
+    descriptions = np.select(
+        [unknown, young & (months < 1).to_numpy(), young, (months == 0).to_numpy()],
+        [np.full(len(days_old), "Unknown", dtype=object), days.astype(str) + " days", months.astype(str) + " months",
+         years.astype(str) + " years"],
+        default=years.astype(str) + " years, " + months.astype(str) + " months")
+    return pd.Series(descriptions, index=dates_of_birth.index, dtype=object)
+
+
+def _value_counts(column):
+    """
+    Count the rows of every value, without the unused categories a categorical column lists.
+    """
+    counts = column.value_counts()
+    return counts[counts > 0]
+
+
+def report_statistics(combined_data, today=None):
+    """
+    Compute the statistics of the statistical report.
+
+    Postconditions:
+        - `combined_data` is not modified.
+
+    Returns:
+        dict: total_children, unassigned_children (rows), assigned_nurses (counts per nurse),
+        child_dob (parsed dates), ages (descriptions), average_age, youngest_child, oldest_child
+        (rows or None) and children_per_state (counts per state). Returned rows carry the parsed
+        Child_Date_of_Birth.
+    """
+    today = today or datetime.today()
+    if ASSIGNED_NURSE in combined_data.columns:
+        nurses = combined_data[ASSIGNED_NURSE]
+    else:
+        nurses = pd.Series(None, index=combined_data.index, dtype=object)
+    child_dob = pd.to_datetime(combined_data['Child_Date_of_Birth'], errors='coerce')
+    unassigned = nurses.isna()
+
+    def child_row(label):
+        row = combined_data.loc[label].copy()
+        row['Child_Date_of_Birth'] = child_dob[label]
+        return row
+
+    has_dob = child_dob.notna().any()
+    return {
+        'total_children': len(combined_data),
+        'unassigned_children': combined_data[unassigned].assign(Child_Date_of_Birth=child_dob[unassigned]),
+        'assigned_nurses': _value_counts(nurses),
+        'child_dob': child_dob,
+        'ages': describe_ages(child_dob, today),
+        'average_age': ((pd.Timestamp(today) - child_dob).dt.days // 365).mean(),
+        'youngest_child': child_row(child_dob.idxmax()) if has_dob else None,
+        'oldest_child': child_row(child_dob.idxmin()) if has_dob else None,
+        'children_per_state': _value_counts(combined_data['State']) if 'State' in combined_data.columns else pd.Series(dtype=int),
+    }
+
+
+def row_values(df, columns, start, stop):
+    """
+    Display values of a slice of rows, e.g. a batch of Treeview rows.
+
+    Postconditions:
+        - Missing columns and missing values are shown as empty strings.
+
+    Returns:
+        list: One tuple of values per row from position `start` to `stop`.
+    """
+    rows = df.iloc[start:stop].reindex(columns=columns).astype(object)
+    return list(rows.where(rows.notna(), "").itertuples(index=False, name=None))
+
+
+def detail_lines(df, position, exclude=()):
+    """
+    Describe the columns of one row as "Column: value" lines, e.g. when a row is expanded.
+
+    Returns:
+        list: One line per column not in `exclude`; missing values are empty.
+    """
+    row = df.iloc[position]
+    return [f"{col}: {'' if pd.isna(value) else value}" for col, value in row.items() if col not in exclude]
+
+
+def iter_row_values(df, columns, chunksize=1000):
+    """
+    Lazily yield the display values of every row, converting `chunksize` rows at a time.
+
+    Yields:
+        tuple: The values of the next row, as returned by `row_values`.
+    """
+    for start in range(0, len(df), chunksize):
+        yield from row_values(df, columns, start, start + chunksize)
+
+
+def date_strings(values):
+    """
+    Show dates as 'YYYY-MM-DD', as they appear in the source files.
+
+    Args:
+        values (Series): Datetime column, or text left as is.
+    Returns:
+        Series: The dates as text, '' for a missing date.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime('%Y-%m-%d').fillna('')
+    return values
+
+
+def combined_name_rows(combined_data, chunksize=1000):
+    """
+    Lazily yield the rows of the combined data window: Mother ID, child name, date of birth
+    ('YYYY-MM-DD') and assigned nurse ('None' when the column is missing).
+
+    Yields:
+        tuple: The values of the next row.
+    """
+    for start in range(0, len(combined_data), chunksize):
+        chunk = combined_data.iloc[start:start + chunksize]
+        names = [f"{first} {last}" for first, last in zip(chunk['Child_First_Name'], chunk['Child_Last_Name'])]
+        nurses = chunk[ASSIGNED_NURSE] if ASSIGNED_NURSE in chunk.columns else ['None'] * len(chunk)
+        yield from zip(chunk['Mother_ID'], names, date_strings(chunk['Child_Date_of_Birth']), nurses)
@@ -0,0 +1,135 @@
+"""
+Export layer writing the matched and unmatched outputs of a combine.
+
+`DataFrame.to_excel` builds every cell of the workbook in memory with openpyxl before
+saving it, which takes as long as the combine itself on large runs. The outputs are
+instead streamed to disk chunk by chunk, with XlsxWriter's constant-memory mode when it
+is installed and openpyxl's write-only mode otherwise, and the matched and unmatched
+files are written concurrently, each exactly once per combine.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from lazy_imports import lazy_import, is_available
+
+pd = lazy_import('pandas')
+
+# Optional, faster constant-memory .xlsx writer; checked without importing it
+HAS_XLSXWRITER = is_available('xlsxwriter')
+
+# Rows converted to Python values and written at once
+EXPORT_CHUNK_ROWS = 10000
+
+# Number format of the date cells, as written by DataFrame.to_excel
+DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+
+
+class StreamingExcelWriter:
+    """
+    Append-only Excel writer that streams rows to disk without keeping the worksheet in memory.
+
+    The header is taken from the first frame written; later frames are reindexed to it.
+    Text is written as is, never interpreted as a formula or a link.
+    """
+    def __init__(self, path):
+        """
+        Initialize the writer for the given output path.
+
+        Postconditions:
+            - Nothing is written until the first call to `write_frame`.
+        """
+        self.path = path
+        self.columns = None
+        self.rows_written = 0
+        if HAS_XLSXWRITER:
+            import xlsxwriter
+            self._workbook = xlsxwriter.Workbook(path, {
+                'constant_memory': True, 'default_date_format': DATETIME_FORMAT,
+                'strings_to_formulas': False, 'strings_to_urls': False, 'nan_inf_to_errors': True})
+            self._sheet = self._workbook.add_worksheet()
+        else:
+            from openpyxl import Workbook
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet()
+
+    def _append_rows(self, rows):
+        """
+        Write rows below the rows already written (the header included).
+
+        Both libraries only take one row per call; the rows come as plain lists so the loop
+        does nothing else.
+        """
+        if HAS_XLSXWRITER:
+            write_row = self._sheet.write_row
+            first = self.rows_written + (self.columns is not None)
+            for offset, row in enumerate(rows):
+                write_row(first + offset, 0, row)
+        else:
+            append = self._sheet.append
+            for row in rows:
+                append(row)
+
+    def write_frame(self, df):
+        """
+        Append the rows of a data frame to the worksheet.
+
+        Postconditions:
+            - Missing values are written as empty cells, like DataFrame.to_excel.
+        """
+        if self.columns is None:
+            self._append_rows([list(df.columns)])
+            self.columns = list(df.columns)
+        df = df.reindex(columns=self.columns).astype(object)
+        rows = df.where(df.notna(), None).to_numpy(dtype=object).tolist()
+        self._append_rows(rows)
+        self.rows_written += len(rows)
+
+    def close(self):
+        """
+        Save the workbook to `path`.
+        """
+        if HAS_XLSXWRITER:
+            self._workbook.close()
+            return
+        if self.columns is None:
+            self._sheet.append([])
+        self._workbook.save(self.path)
+
+
+def write_output(df, path, chunksize=EXPORT_CHUNK_ROWS):
+    """
+    Stream a data frame to a file in the format of its extension, chunk by chunk.
+
+    Returns:
+        int: The number of rows written.
+    """
+    from formats import ChunkedFileWriter
+
+    writer = ChunkedFileWriter(path)
+    try:
+        for start in range(0, max(len(df), 1), chunksize):
+            writer.write(df.iloc[start:start + chunksize])
+    finally:
+        writer.close()
+    logging.info("Saved %s rows to %s", writer.rows_written, path)
+    return writer.rows_written
+
+
+def export_outputs(outputs, chunksize=EXPORT_CHUNK_ROWS):
+    """
+    Write several outputs concurrently, one thread per file.
+
+    Preconditions:
+        - `outputs` maps each output path to its data frame; None data frames are skipped.
+    Postconditions:
+        - Every output is written exactly once; the first error is raised after every
+          writer finished.
+
+    Returns:
+        dict: The rows written to each path.
+    """
+    outputs = {path: df for path, df in outputs.items() if df is not None}
+    if len(outputs) <= 1:
+        return {path: write_output(df, path, chunksize) for path, df in outputs.items()}
+    with ThreadPoolExecutor(max_workers=len(outputs)) as executor:
+        futures = {path: executor.submit(write_output, df, path, chunksize) for path, df in outputs.items()}
+    return {path: future.result() for path, future in futures.items()}
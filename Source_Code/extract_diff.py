@@ -0,0 +1,213 @@
+"""
+Change-data-capture diff between two versions of a source extract.
+
+Both versions are keyed with the same normalization as the combine (normalized match keys
+plus the occurrence number within the key group), joined once with an outer join, and split
+into added, removed and changed records with a per-column change mask. Everything is
+vectorized so month-over-month Medicaid lists of a million rows diff in seconds.
+"""
+from lazy_imports import lazy_import
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+from matching import (RECORD_KEY, SEQUENCE_COLUMN, DATABASE_RENAMES, MEDICAID_RENAMES, normalize_keys,
+                      duplicate_join_keys, add_occurrence_numbers, record_hashes, hash_keys, group_hashes)
+
+# Rename map for each kind of extract
+SIDE_RENAMES = {'database': DATABASE_RENAMES, 'medicaid': MEDICAID_RENAMES}
+
+# Numeric form of the record key, used for the join because integer keys join much faster
+HASH_COLUMN = '_Record_Hash'
+
+
+def key_extract(df, side='medicaid', keys=None):
+    """
+    Normalize an extract and compute the record key of every row.
+
+    Preconditions:
+        - `df` has underscore separated column names, as returned by ReadExcelCommand.
+        - `side` is 'database' or 'medicaid'.
+    Postconditions:
+        - The input data frame is not modified.
+        - With the default keys, HASH_COLUMN is the hash of the combine's RECORD_KEY.
+
+    Args:
+        keys (list, optional): Match keys. Defaults to the join keys of the combine, `duplicate_join_keys`.
+    Returns:
+        DataFrame: The normalized rows with SEQUENCE_COLUMN and HASH_COLUMN columns.
+    """
+    join_keys = extract_join_keys(keys)
+    df = normalize_keys(df.rename(columns=SIDE_RENAMES[side]))
+    df = add_occurrence_numbers(df.drop_duplicates(), join_keys[:-1])
+    df[HASH_COLUMN] = record_hashes(df, join_keys)
+    return df
+
+
+def extract_join_keys(keys=None):
+    """
+    The columns hashed into the record key of an extract: the match keys and the occurrence number.
+
+    Returns:
+        list: `duplicate_join_keys` when `keys` is None, so the record keys equal those of the combine.
+    """
+    return duplicate_join_keys() if keys is None else list(keys) + [SEQUENCE_COLUMN]
+
+
+def _with_record_keys(df):
+    """
+    Replace the numeric record hash of a result frame by the RECORD_KEY string used in the combined data.
+    """
+    df = df.reset_index(drop=True)
+    df[RECORD_KEY] = hash_keys(df.pop(HASH_COLUMN).to_numpy())
+    return df
+
+
+class ExtractDiff:
+    """
+    Result of diffing two versions of an extract.
+
+    Attributes:
+        added (DataFrame): Rows only present in the new extract.
+        removed (DataFrame): Rows only present in the old extract.
+        changed (DataFrame): New version of the rows present in both extracts with at least one changed column.
+        change_mask (DataFrame): One boolean column per compared column, aligned with `changed`.
+        unchanged_count (int): Number of records present in both extracts without changes.
+        keys (list): The columns hashed into the record keys; the keys only match a combine joined on them.
+    """
+    def __init__(self, added, removed, changed, change_mask, unchanged_count, keys):
+        """
+        Initialize the diff result.
+        """
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.change_mask = change_mask
+        self.unchanged_count = unchanged_count
+        self.keys = keys
+
+    def touched_keys(self):
+        """
+        Record keys of every added, removed or changed record.
+
+        Returns:
+            tuple: (added keys, removed keys, changed keys) as numpy arrays.
+        """
+        return (self.added[RECORD_KEY].to_numpy(), self.removed[RECORD_KEY].to_numpy(),
+                self.changed[RECORD_KEY].to_numpy())
+
+    def touched_groups(self):
+        """
+        Match key groups of every added, removed or changed record.
+
+        Returns:
+            tuple: (groups as a uint64 array, dict of the added, removed and changed record
+            counts), the format of `incremental.changed_groups`.
+        """
+        keys = self.keys[:-1]
+        groups = np.concatenate([group_hashes(frame, keys) for frame in (self.added, self.removed, self.changed)])
+        return np.unique(groups), {'added': len(self.added), 'removed': len(self.removed), 'changed': len(self.changed)}
+
+    def column_change_counts(self):
+        """
+        Count the changed records per compared column.
+
+        Returns:
+            Series: Number of changed records, indexed by column name.
+        """
+        return self.change_mask.sum()
+
+    def summary(self):
+        """
+        Summarize the diff as plain counts.
+
+        Returns:
+            dict: Added, removed, changed and unchanged record counts plus the changes per column.
+        """
+        return {
+            'added': len(self.added),
+            'removed': len(self.removed),
+            'changed': len(self.changed),
+            'unchanged': self.unchanged_count,
+            'changed_columns': {col: int(count) for col, count in self.column_change_counts().items() if count},
+        }
+
+    def to_excel(self, path):
+        """
+        Write the added, removed and changed records to one sheet each.
+
+        Postconditions:
+            - The Changed sheet lists the names of the changed columns of every record.
+        """
+        changed = self.changed.copy()
+        changed['Changed_Columns'] = changed_column_names(self.change_mask)
+        with pd.ExcelWriter(path) as writer:
+            self.added.drop(columns=[SEQUENCE_COLUMN]).to_excel(writer, sheet_name='Added', index=False)
+            self.removed.drop(columns=[SEQUENCE_COLUMN]).to_excel(writer, sheet_name='Removed', index=False)
+            changed.drop(columns=[SEQUENCE_COLUMN]).to_excel(writer, sheet_name='Changed', index=False)
+
+
+def changed_column_names(change_mask):
+    """
+    Join the names of the changed columns of every row, vectorized.
+
+    Returns:
+        Series: Comma separated column names aligned with `change_mask`.
+    """
+    if change_mask.empty or len(change_mask.columns) == 0:
+        return pd.Series('', index=change_mask.index, dtype=object)
+    return change_mask.dot(change_mask.columns + ', ').str.rstrip(', ')
+
+
+def diff_extracts(old_data, new_data, side='medicaid', compare_columns=None, keys=None):
+    """
+    Diff two versions of an extract.
+
+    Preconditions:
+        - Both data frames come from the same kind of extract (`side`).
+    Postconditions:
+        - Neither input data frame is modified.
+
+    Args:
+        old_data (DataFrame): The previous version of the extract.
+        new_data (DataFrame): The current version of the extract.
+        side (str): 'database' or 'medicaid'.
+        compare_columns (list, optional): Columns checked for changes. Defaults to every shared non-key column.
+        keys (list, optional): Match keys. Defaults to the join keys of the combine.
+    Returns:
+        ExtractDiff: The added, removed and changed records.
+    """
+    keys = extract_join_keys(keys)[:-1]
+    old_keyed = key_extract(old_data, side, keys)
+    new_keyed = key_extract(new_data, side, keys)
+
+    internal = set(keys) | {SEQUENCE_COLUMN, HASH_COLUMN}
+    if compare_columns is None:
+        compare_columns = [col for col in new_keyed.columns if col in old_keyed.columns and col not in internal]
+
+    joined = old_keyed[[HASH_COLUMN] + compare_columns].merge(
+        new_keyed[[HASH_COLUMN] + compare_columns], on=HASH_COLUMN, how='outer', sort=False,
+        suffixes=('_old', ''), indicator=True)
+
+    removed_hashes = joined.loc[joined['_merge'] == 'left_only', HASH_COLUMN]
+    added_hashes = joined.loc[joined['_merge'] == 'right_only', HASH_COLUMN]
+
+    both = joined[joined['_merge'] == 'both']
+    change_mask = pd.DataFrame(index=both.index)
+    for col in compare_columns:
+        old_values, new_values = both[f"{col}_old"], both[col]
+        if isinstance(old_values.dtype, pd.CategoricalDtype) or isinstance(new_values.dtype, pd.CategoricalDtype):
+            # The two extracts rarely share the same categories, which categoricals require to be compared
+            old_values, new_values = old_values.astype(object), new_values.astype(object)
+        change_mask[col] = (old_values != new_values) & ~(old_values.isna() & new_values.isna())
+    is_changed = change_mask.any(axis=1) if compare_columns else pd.Series(False, index=both.index)
+
+    changed = new_keyed.set_index(HASH_COLUMN, drop=False).loc[both.loc[is_changed, HASH_COLUMN]]
+    change_mask = change_mask[is_changed].reset_index(drop=True)
+
+    return ExtractDiff(
+        added=_with_record_keys(new_keyed[new_keyed[HASH_COLUMN].isin(added_hashes)]),
+        removed=_with_record_keys(old_keyed[old_keyed[HASH_COLUMN].isin(removed_hashes)]),
+        changed=_with_record_keys(changed),
+        change_mask=change_mask,
+        unchanged_count=int(len(both) - is_changed.sum()),
+        keys=extract_join_keys(keys),
+    )
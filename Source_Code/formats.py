@@ -0,0 +1,280 @@
+"""
+Detection, reading and writing of the supported data file formats.
+
+Besides Excel workbooks, the upstream systems can export CSV, Parquet and Arrow IPC
+(Feather v2) files, which parse one to two orders of magnitude faster than openpyxl.
+The format of a source is detected from the first bytes of the file, so a Parquet export
+saved with a .xlsx name is still read correctly; the extension is only used when the
+content says nothing (empty or encrypted files). Column names are left as they are in the
+file: the callers normalize them exactly as for Excel sources.
+"""
+import logging
+import os
+from lazy_imports import lazy_import, is_available
+from schema import CATEGORY_COLUMNS
+
+pd = lazy_import('pandas')
+
+# Formats the matched and unmatched outputs can be written in
+OUTPUT_FORMATS = ['xlsx', 'csv', 'parquet', 'arrow']
+
+# Rows of an .xlsx worksheet, the header row excluded
+EXCEL_MAX_ROWS = 1048575
+
+# Leading bytes identifying the binary formats
+MAGIC_NUMBERS = [
+    (b'PK\x03\x04', 'xlsx'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'xls'),
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'arrow'),
+]
+
+# Format of each known extension, used when the content is not recognized
+EXTENSION_FORMATS = {'.xlsx': 'xlsx', '.xls': 'xls', '.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow',
+                     '.feather': 'arrow'}
+
+# Extension of the files written in each output format
+FORMAT_EXTENSIONS = {'xlsx': '.xlsx', 'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+# File dialog filter of the source files
+SOURCE_FILETYPES = [("Data files", "*.xlsx *.xls *.csv *.parquet *.arrow *.feather"), ("Excel files", "*.xlsx *.xls"),
+                    ("CSV files", "*.csv"), ("Parquet files", "*.parquet"), ("Arrow files", "*.arrow *.feather")]
+
+
+def detect_format(path):
+    """
+    Detect the format of a data file from its content.
+
+    Postconditions:
+        - Binary formats are recognized by their magic number; a file that is neither one of
+          them nor a known extension is read as CSV when its first bytes are text.
+
+    Returns:
+        str: 'xlsx', 'xls', 'csv', 'parquet' or 'arrow'.
+    Raises:
+        ValueError: When the format cannot be recognized.
+    """
+    with open(path, 'rb') as file:
+        head = file.read(1024)
+    for magic, file_format in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return file_format
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension in EXTENSION_FORMATS:
+        return EXTENSION_FORMATS[extension]
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError:
+        raise ValueError(f"Unsupported file format of '{path}'")
+    return 'csv'
+
+
+def output_path(name, output_format):
+    """
+    The path of an output file in the given format, e.g. 'combined_matched_data.parquet'.
+    """
+    if output_format not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown output format '{output_format}'")
+    return name + FORMAT_EXTENSIONS[output_format]
+
+
+def column_names(path, file_format=None):
+    """
+    Read the column names of a data file without reading its rows.
+    """
+    file_format = file_format or detect_format(path)
+    if file_format == 'csv':
+        return list(pd.read_csv(path, nrows=0).columns)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if file_format == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(str(path)) as source:
+            return pa.ipc.open_file(source).schema.names
+    return list(pd.read_excel(path, nrows=0).columns)
+
+
+def csv_dtypes(names):
+    """
+    Explicit dtypes of the CSV columns: the low-cardinality text columns are parsed straight
+    into categoricals instead of one Python string per cell.
+    """
+    return {name: 'category' for name in names if str(name).replace(" ", "_") in CATEGORY_COLUMNS}
+
+
+def read_table(path, columns=None):
+    """
+    Read a data file of any supported format, optionally projected on some columns.
+
+    Preconditions:
+        - `path` is not encrypted; callers decrypt it first, as for Excel files.
+    Postconditions:
+        - Only the requested columns present in the file are returned, in file order; missing
+          columns are ignored. Column names are not normalized.
+        - CSV files are parsed by the pyarrow engine when it is installed, the C engine otherwise.
+
+    Returns:
+        DataFrame: The file's rows, indexed by their position in the file.
+    """
+    file_format = detect_format(path)
+    wanted = None if columns is None else set(columns)
+    if file_format in ('xlsx', 'xls'):
+        return pd.read_excel(path, usecols=None if wanted is None else lambda name: name in wanted)
+
+    names = column_names(path, file_format)
+    selected = names if wanted is None else [name for name in names if name in wanted]
+    if file_format == 'csv':
+        return pd.read_csv(path, usecols=selected, dtype=csv_dtypes(selected),
+                           engine='pyarrow' if is_available('pyarrow') else 'c')
+    if file_format == 'parquet':
+        return pd.read_parquet(path, columns=selected)
+    return pd.read_feather(path, columns=selected)
+
+
+def iter_table_chunks(path, chunksize=50000):
+    """
+    Yield the rows of a CSV, Parquet or Arrow IPC file in chunks without reading it whole.
+
+    Yields:
+        DataFrame: The next chunk of at most `chunksize` rows, column names not normalized.
+    """
+    file_format = detect_format(path)
+    if file_format == 'csv':
+        names = column_names(path, file_format)
+        yield from pd.read_csv(path, chunksize=chunksize, dtype=csv_dtypes(names))
+    elif file_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    elif file_format == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                batch = reader.get_batch(index)
+                for start in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(start, chunksize).to_pandas()
+    else:
+        raise ValueError(f"Cannot stream {file_format} files in chunks")
+
+
+def arrow_compatible(df):
+    """
+    Make a data frame writable to Parquet and Arrow files.
+
+    Object columns mixing types cannot be converted to an Arrow type. The empty strings
+    padding the unmatched rows are written as missing values, and the columns still mixing
+    types (e.g. numeric and text Case IDs) are written as text.
+
+    Returns:
+        DataFrame: `df`, or a copy with the object columns converted.
+    """
+    converted = {}
+    for name in df.columns:
+        column = df[name]
+        if column.dtype != object or pd.api.types.infer_dtype(column, skipna=True) in ('string', 'empty'):
+            continue
+        column = column.mask(column.astype(object) == '')
+        if pd.api.types.infer_dtype(column, skipna=True) in ('mixed', 'mixed-integer'):
+            column = column.map(str, na_action='ignore')
+        converted[name] = column.infer_objects()
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def write_table(df, path, output_format=None):
+    """
+    Write a data frame without its index, in the format given or implied by the extension.
+
+    Postconditions:
+        - Parquet and Arrow files hold the columns of `arrow_compatible(df)`.
+    """
+    output_format = output_format or EXTENSION_FORMATS.get(os.path.splitext(str(path))[1].lower())
+    if output_format == 'xlsx':
+        df.to_excel(path, index=False)
+    elif output_format == 'csv':
+        df.to_csv(path, index=False)
+    elif output_format == 'parquet':
+        arrow_compatible(df).to_parquet(path, index=False)
+    elif output_format == 'arrow':
+        arrow_compatible(df).reset_index(drop=True).to_feather(path)
+    else:
+        raise ValueError(f"Unknown output format '{output_format}'")
+    logging.info("Saved %s rows to %s", len(df), path)
+
+
+class ChunkedFileWriter:
+    """
+    Append data frame chunks to a .xlsx, .csv, .parquet or .arrow file without keeping them in memory.
+
+    The header is taken from the first chunk written; later chunks are reindexed to it.
+
+    Attributes:
+        columns (list): The columns of the file, None until the first chunk.
+        rows_written (int): Rows appended so far.
+    """
+    def __init__(self, path, output_format=None):
+        """
+        Initialize the writer; the file is created with the first non-empty chunk.
+        """
+        output_format = output_format or EXTENSION_FORMATS.get(os.path.splitext(str(path))[1].lower())
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'")
+        self.path = path
+        self.output_format = output_format
+        self.columns = None
+        self.rows_written = 0
+        self._writer = None
+        self._schema = None
+
+    def write(self, chunk):
+        """
+        Append the rows of a chunk to the file.
+        """
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        if chunk.empty:
+            return
+        chunk = chunk.reindex(columns=self.columns)
+        if self.output_format == 'csv':
+            chunk.to_csv(self.path, mode='a' if self.rows_written else 'w', header=not self.rows_written, index=False)
+        elif self.output_format == 'xlsx':
+            if self.rows_written + len(chunk) > EXCEL_MAX_ROWS:
+                raise ValueError(f"More than {EXCEL_MAX_ROWS} rows do not fit in an .xlsx worksheet; use csv or parquet")
+            if self._writer is None:
+                from exporter import StreamingExcelWriter
+                self._writer = StreamingExcelWriter(self.path)
+            self._writer.write_frame(chunk)
+        else:
+            import pyarrow as pa
+            chunk = arrow_compatible(chunk)
+            if self._schema is not None:
+                # Chunks follow the types of the first one, e.g. a column only holding padding here
+                padded = {field.name: chunk[field.name].mask(chunk[field.name].astype(object) == '')
+                          for field in self._schema if not pa.types.is_string(field.type) and chunk[field.name].dtype == object}
+                chunk = chunk.assign(**padded)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                # Columns without any value in the first chunk are text in the later ones, and every
+                # chunk has its own categories: the file stores the decoded values
+                self._schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else
+                                          pa.field(field.name, field.type.value_type) if pa.types.is_dictionary(field.type) else
+                                          field for field in table.schema])
+                if self.output_format == 'parquet':
+                    import pyarrow.parquet as pq
+                    self._writer = pq.ParquetWriter(self.path, self._schema)
+                else:
+                    self._writer = pa.ipc.new_file(self.path, self._schema)
+            self._writer.write_table(table.cast(self._schema))
+        self.rows_written += len(chunk)
+
+    def close(self):
+        """
+        Finish the file; a writer that only saw empty chunks writes the header alone.
+        """
+        if self.rows_written == 0 and self.columns is not None:
+            write_table(pd.DataFrame(columns=self.columns), self.path, self.output_format)
+        elif self._writer is not None:
+            self._writer.close()
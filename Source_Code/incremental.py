@@ -0,0 +1,158 @@
+"""
+Source fingerprints and change detection for incremental re-combines.
+
+Rows are only ever paired with rows of the same match key group (see
+`matching.group_hashes`), so a group whose rows did not change on either side combines
+exactly as before. Every combine run stores, for both sources, the group and a
+fingerprint (hash of all columns) of each row, together with the combined and unmatched
+rows it produced. The next run compares the new sources with these fingerprints, matches
+the rows of the touched groups only, and reuses the stored rows of every other group, so
+the matching work is proportional to the delta.
+"""
+import os
+import logging
+from lazy_imports import lazy_import
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+from matching import RECORD_KEY, group_hashes, match_frames, capitalize_names
+from data_ops import ASSIGNED_NURSE
+
+# Bumped when the stored state changes; other versions are ignored
+COMBINE_STATE_VERSION = 3
+
+# Column of the stored combined and unmatched rows holding the hash of their match key group
+GROUP_COLUMN = '_Match_Group'
+
+
+def source_fingerprints(df, keys):
+    """
+    Fingerprint every row of a normalized source.
+
+    Preconditions:
+        - `df` went through `matching.standardize_columns` and `matching.normalize_keys`.
+    Postconditions:
+        - Returns a data frame with the Group and Fingerprint (both uint64) of every row,
+          aligned with `df`.
+    """
+    columns = sorted(df.columns)
+    fingerprints = pd.util.hash_pandas_object(df[columns].astype(object), index=False)
+    return pd.DataFrame({'Group': group_hashes(df, keys), 'Fingerprint': fingerprints.to_numpy()})
+
+
+def changed_groups(previous_fingerprints, fingerprints):
+    """
+    Find the groups of one side with added, removed or changed rows.
+
+    A row whose fingerprint disappeared and a new row of the same group count as one
+    changed row; a row whose match keys changed moves to another group, so it counts as
+    removed from its old group and added to its new one.
+
+    Returns:
+        tuple: (groups touched as a uint64 array, dict of the added, removed and changed row counts)
+    """
+    previous, current = previous_fingerprints['Fingerprint'].to_numpy(), fingerprints['Fingerprint'].to_numpy()
+    added = fingerprints['Group'].to_numpy()[~np.isin(current, previous)]
+    removed = previous_fingerprints['Group'].to_numpy()[~np.isin(previous, current)]
+    groups, inverse = np.unique(np.concatenate([added, removed]), return_inverse=True)
+    added_counts = np.bincount(inverse[:len(added)], minlength=len(groups))
+    removed_counts = np.bincount(inverse[len(added):], minlength=len(groups))
+    changed = np.minimum(added_counts, removed_counts)
+    return groups, {'added': int((added_counts - changed).sum()), 'removed': int((removed_counts - changed).sum()),
+                    'changed': int(changed.sum())}
+
+
+def match_groups(database_data, medicaid_data, keys):
+    """
+    Match the rows of some groups of both sources, tagging every result row with its group.
+
+    Preconditions:
+        - Both data frames hold whole groups: every row of a group they contain.
+    Postconditions:
+        - The combined rows have capitalized names; the unmatched rows keep the normalized
+          keys, as `matching.build_unmatched` expects.
+
+    Returns:
+        tuple: (combined rows, {'database': unmatched rows, 'medicaid': unmatched rows}, duplicate report)
+    """
+    combined_data, unmatched_database, unmatched_medicaid, report = match_frames(database_data, medicaid_data)
+    combined_data[GROUP_COLUMN] = group_hashes(combined_data, keys)
+    unmatched = {}
+    for side, rows in [('database', unmatched_database), ('medicaid', unmatched_medicaid)]:
+        rows[GROUP_COLUMN] = group_hashes(rows, keys)
+        unmatched[side] = rows
+    return capitalize_names(combined_data), unmatched, report
+
+
+def reuse_rows(stored, matched, touched):
+    """
+    Complete the rows matched again with the stored rows of the groups left untouched.
+
+    Returns:
+        DataFrame: The stored rows of the untouched groups followed by `matched`.
+    """
+    kept = stored[~np.isin(stored[GROUP_COLUMN].to_numpy(), touched)]
+    if matched.empty:
+        return kept.reset_index(drop=True)
+    if kept.empty:
+        return matched.reset_index(drop=True)
+    return pd.concat([kept, matched], ignore_index=True)
+
+
+def load_combine_state(path, keys):
+    """
+    Load the state stored by the previous combine run.
+
+    Returns:
+        dict: The stored state, or None when there is no state file, or it was written by
+        another version or with other join keys.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        state = pd.read_pickle(path)
+    except Exception as e:
+        logging.warning("Could not read combine state '%s': %s", path, e)
+        return None
+    if not isinstance(state, dict) or state.get('version') != COMBINE_STATE_VERSION or state.get('keys') != list(keys):
+        logging.info("Ignoring combine state '%s' written by another version or with other keys.", path)
+        return None
+    return state
+
+
+def save_combine_state(path, keys, fingerprints, combined_data, unmatched):
+    """
+    Store the join keys, source fingerprints and result rows of this combine run.
+
+    Preconditions:
+        - `combined_data` and the frames of `unmatched` carry GROUP_COLUMN, and no nurse
+          assignments (they are carried forward from the previous combined data instead).
+    Postconditions:
+        - `path` holds the state used by the next incremental combine.
+    """
+    pd.to_pickle({'version': COMBINE_STATE_VERSION, 'keys': list(keys), 'fingerprints': fingerprints,
+                  'combined': combined_data, 'unmatched': unmatched}, path)
+    logging.info("Combine state saved to %s", path)
+
+
+def carry_forward_assignments(combined_data, previous_data):
+    """
+    Copy the nurse assignments of the previous combined data onto matching record keys.
+
+    Postconditions:
+        - `combined_data` has an ASSIGNED_NURSE column; rows whose record key was assigned
+          in `previous_data` keep that nurse.
+
+    Returns:
+        int: The number of assignments carried forward.
+    """
+    if ASSIGNED_NURSE not in combined_data.columns:
+        combined_data[ASSIGNED_NURSE] = None
+    if previous_data is None or RECORD_KEY not in previous_data.columns or ASSIGNED_NURSE not in previous_data.columns:
+        return 0
+
+    previous = previous_data[[RECORD_KEY, ASSIGNED_NURSE]].dropna()
+    previous = previous[previous[ASSIGNED_NURSE] != 'None'].drop_duplicates(RECORD_KEY)
+    carried = combined_data[RECORD_KEY].map(previous.set_index(RECORD_KEY)[ASSIGNED_NURSE])
+    has_assignment = carried.notna() & combined_data[ASSIGNED_NURSE].isna()
+    combined_data.loc[has_assignment, ASSIGNED_NURSE] = carried[has_assignment]
+    return int(has_assignment.sum())
@@ -1,16 +1,42 @@
-import pandas as pd
-from tkinter import filedialog, messagebox
 import logging
+import tempfile
+from collections import deque
+from lazy_imports import lazy_import
 from app_crypto import *
-
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from metrics import timed
+from schema import apply_schema, set_values
+from data_ops import ASSIGNED_NURSE
+from formats import read_table, output_path, ChunkedFileWriter, SOURCE_FILETYPES
+from exporter import export_outputs
+from matching import (RECORD_KEY, standardize_columns, normalize_keys, match_frames, duplicate_join_keys,
+                      build_unmatched, capitalize_names, merge_duplicate_reports, describe_duplicate_report)
+from extract_diff import diff_extracts
+from incremental import (GROUP_COLUMN, source_fingerprints, changed_groups, match_groups, reuse_rows,
+                         load_combine_state, save_combine_state, carry_forward_assignments)
+from partitioning import (PartitionStore, partition_source, iter_source_chunks, read_pieces,
+                          normalize_and_partition_worker, combine_partition_worker)
+
+# Loaded on first use, so importing the commands does not slow the window down
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 class Command:
     """
     Command Interface:
     Abstract Command inherited by other commands invoked by tkinter buttons.
+
+    The `execute` method of every subclass is measured as a stage of the shared metrics registry,
+    named after the command class.
     """
+    def __init_subclass__(cls, **kwargs):
+        """
+        Wrap the `execute` method defined by a subclass with the metrics instrumentation.
+        """
+        super().__init_subclass__(**kwargs)
+        execute = cls.__dict__.get('execute')
+        if execute is not None and not hasattr(execute, '__wrapped_stage__'):
+            cls.execute = timed(cls.__name__)(execute)
+
     def execute(self):
         """
         Abstract method that contains the logic of the sub-commands.
@@ -22,10 +48,27 @@ class Command:
         """
         raise NotImplementedError("Subclasses must implement the 'execute' method")
 
+    def notify_error(self, title, message):
+        """
+        Report an error to the user.
+
+        Preconditions:
+            - None; commands without an app or with a GUI app fall back to a Tk message box.
+        Postconditions:
+            - The error is passed to `app.show_error` when the app provides one (headless runs),
+              otherwise it is shown in a Tk message box. Tk is only imported in that case.
+        """
+        show_error = getattr(getattr(self, 'app', None), 'show_error', None)
+        if show_error is not None:
+            show_error(title, message)
+            return
+        from tkinter import messagebox
+        messagebox.showerror(title, message)
+
 class ReadExcelCommand(Command):
     """
-    Command to read Excel files.
-    This command prompts a file explorer for selecting Excel files.
+    Command to read source files.
+    Excel, CSV, Parquet and Arrow IPC files are accepted; the format is detected from the content.
     
     Args:
         app: The application object that holds the application state.
@@ -40,35 +83,37 @@ class ReadExcelCommand(Command):
             - The command is initialized with a reference to the application object.
         """
         self.app = app
+        self.memory_report = None
 
     def execute(self, filepath):
         """
-        Execute the command to read the selected Excel file into a pandas DataFrame.
+        Execute the command to read the selected file into a pandas DataFrame.
 
         Preconditions:
-            - `filepath` is a valid string representing the file path to an Excel file.
+            - `filepath` is a valid string representing the file path to an unencrypted data file.
         Postconditions:
             - Returns a pandas DataFrame containing the file's data or None if reading fails.
 
         Args:
-            filepath (str): The path to the Excel file to read.
+            filepath (str): The path to the file to read.
         Returns:
             DataFrame: A pandas DataFrame containing the file's data.
         """
         if not filepath:
             logging.error("No file selected.")
-            messagebox.showerror("Error", "No file selected.")
+            self.notify_error("Error", "No file selected.")
             return None
 
         try:
-            # Read the Excel file into a DataFrame and normalize column names
-            data = pd.read_excel(filepath)
+            # Read the file into a DataFrame and normalize column names
+            data = read_table(filepath)
             data.columns = [column.replace(" ", "_") for column in data.columns]
-            logging.info(f"Successfully read file: {filepath}")
+            logging.info("Successfully read file: %s", filepath)
+            data, self.memory_report = apply_schema(data, filepath)
             return (data)
         except Exception as e:
-            logging.error(f"Error reading file '{filepath}': {e}")
-            messagebox.showerror("Error", f"Error reading file '{filepath}': {e}")
+            logging.error("Error reading file '%s': %s", filepath, e)
+            self.notify_error("Error", f"Error reading file '{filepath}': {e}")
             return None
 
 
@@ -76,18 +121,56 @@ class CombineDataCommand(Command):
     """
     Command to combine two datasets (Excel files) based on Mother's Name and Child's Date of Birth.
     """
-    def __init__(self, app, data_frames):
+    def __init__(self, app, data_frames, output_format='xlsx'):
         """
         Initialize the command with the application state and data frames to combine.
 
         Preconditions:
             - `app` is a valid application object.
             - `data_frames` is a list of pandas DataFrames containing the data to combine.
+            - `output_format` is one of formats.OUTPUT_FORMATS.
         Postconditions:
             - The command is initialized with the application state and data frames.
         """
         self.app = app
         self.data_frames = data_frames
+        self.matched_file_path = output_path('combined_matched_data', output_format)
+        self.unmatched_file_path = output_path('unmatched_data', output_format)
+        self.duplicate_report = None
+        self.unmatched_data = None
+        self.memory_report = None
+
+    def write_outputs(self, combined_data):
+        """
+        Write the matched data and the unmatched data, if any, to their files.
+
+        Postconditions:
+            - Both files are streamed concurrently, each exactly once per combine.
+        """
+        export_outputs({self.matched_file_path: combined_data, self.unmatched_file_path: self.unmatched_data})
+        logging.info("Matched data saved to %s", self.matched_file_path)
+        if self.unmatched_data is not None:
+            logging.info("Unmatched data saved to %s", self.unmatched_file_path)
+        else:
+            logging.info("No unmatched data found; skipping unmatched data file creation.")
+
+    def compact_outputs(self, combined_data):
+        """
+        Convert the combined and unmatched data to the compact dtypes of the schema.
+
+        Preconditions:
+            - The outputs were already written to their files.
+        Postconditions:
+            - `self.unmatched_data` is compacted and `self.memory_report` holds the memory of the
+              combined data before and after.
+
+        Returns:
+            DataFrame: The compacted combined data.
+        """
+        combined_data, self.memory_report = apply_schema(combined_data, 'combined data')
+        if self.unmatched_data is not None:
+            self.unmatched_data, _ = apply_schema(self.unmatched_data, 'unmatched data')
+        return combined_data
 
     def execute(self):
         """
@@ -96,8 +179,8 @@ class CombineDataCommand(Command):
         Preconditions:
             - The data frames provided contain the required columns for merging.
         Postconditions:
-            - Combined matched data is saved to an Excel file.
-            - Unmatched data, if any, is saved to a separate Excel file.
+            - Combined matched data is saved to `matched_file_path`, in the output format.
+            - Unmatched data, if any, is saved to `unmatched_file_path`.
             - Returns the combined data as a pandas DataFrame.
 
         Returns:
@@ -108,82 +191,384 @@ class CombineDataCommand(Command):
             database_data = self.data_frames[0]
             medicaid_data = self.data_frames[1]
 
-            # Standardize columns for merging
-            database_data.rename(columns={'DOB': 'Child_Date_of_Birth'}, inplace=True)
-            medicaid_data.rename(columns={'Child_DOB': 'Child_Date_of_Birth', 'Last_Name': 'Mother_Last_Name'}, inplace=True)
-
-            # Normalize the names for matching
-            for df in [database_data, medicaid_data]:
-                for col in ['Mother_First_Name', 'Mother_Last_Name']:
-                    df[col] = df[col].str.lower().str.replace(r'\W', '', regex=True)
-
-            # Convert DOB columns to consistent date format
-            database_data['Child_Date_of_Birth'] = pd.to_datetime(database_data['Child_Date_of_Birth'], errors='coerce').dt.strftime('%Y-%m-%d')
-            medicaid_data['Child_Date_of_Birth'] = pd.to_datetime(medicaid_data['Child_Date_of_Birth'], errors='coerce').dt.strftime('%Y-%m-%d')
-
-            # Merge to get combined data
-            combined_data = pd.merge(
-                database_data,
-                medicaid_data,
-                on=['Mother_First_Name', 'Mother_Last_Name', 'Child_Date_of_Birth'],
-                how='inner',
-                suffixes=('_db', '_medicaid')
-            )
+            # Standardize columns and normalize the match keys
+            standardize_columns(database_data, medicaid_data)
+            normalize_keys(database_data)
+            normalize_keys(medicaid_data)
+
+            # Merge to get combined data and identify unmatched data
+            combined_data, unmatched_database, unmatched_medicaid, self.duplicate_report = match_frames(database_data, medicaid_data)
             logging.info("Matched data combined successfully.")
+            logging.info(describe_duplicate_report(self.duplicate_report))
 
-            
-            # Identify unmatched data
-            unmatched_database = database_data[~database_data.apply(
-                lambda row: ((combined_data['Mother_First_Name'] == row['Mother_First_Name']) &
-                            (combined_data['Mother_Last_Name'] == row['Mother_Last_Name']) &
-                            (combined_data['Child_Date_of_Birth'] == row['Child_Date_of_Birth'])).any(), axis=1)].copy()
-            unmatched_database['Source'] = 'Database'
-
-            unmatched_medicaid = medicaid_data[~medicaid_data.apply(
-                lambda row: ((combined_data['Mother_First_Name'] == row['Mother_First_Name']) &
-                            (combined_data['Mother_Last_Name'] == row['Mother_Last_Name']) &
-                            (combined_data['Child_Date_of_Birth'] == row['Child_Date_of_Birth'])).any(), axis=1)].copy()
-            unmatched_medicaid['Source'] = 'Medicaid'
-
-
-            # Check if there are unmatched rows in either data frame
-            if not unmatched_database.empty or not unmatched_medicaid.empty:
-                # Standardize unmatched data columns to align with combined_data
-                unmatched_database = unmatched_database.reindex(columns=combined_data.columns.tolist() + ['Source'], fill_value='')
-                unmatched_medicaid = unmatched_medicaid.reindex(columns=combined_data.columns.tolist() + ['Source'], fill_value='')
-
-                # Concatenate unmatched records
-                unmatched_data = pd.concat([unmatched_database, unmatched_medicaid], ignore_index=True)
-
-                # Capitalize all names in unmatched data
-                for col in ['Mother_First_Name', 'Mother_Last_Name', 'Child_First_Name', 'Child_Last_Name']:
-                    if col in unmatched_data.columns:
-                        unmatched_data[col] = unmatched_data[col].str.capitalize()
-
-                # Save the unmatched data to an Excel file
-                unmatched_file_path = 'unmatched_data.xlsx'
-                unmatched_data.to_excel(unmatched_file_path, index=False)
-                logging.info(f"Unmatched data saved to {unmatched_file_path}")
-            else:
-                logging.info("No unmatched data found; skipping unmatched data file creation.")
+            unmatched_data = build_unmatched(combined_data.columns, unmatched_database, unmatched_medicaid)
+            self.unmatched_data = unmatched_data
 
             # Capitalize all names in matched data
-            for col in ['Mother_First_Name', 'Mother_Last_Name', 'Child_First_Name', 'Child_Last_Name']:
-                if col in combined_data.columns:
-                    combined_data[col] = combined_data[col].str.capitalize()
+            capitalize_names(combined_data)
 
-            # Save the matched data
-            matched_file_path = 'combined_matched_data.xlsx'
-            combined_data.to_excel(matched_file_path, index=False)
-            logging.info(f"Matched data saved to {matched_file_path}")
+            # Save the matched and unmatched data
+            self.write_outputs(combined_data)
+            combined_data = self.compact_outputs(combined_data)
 
             # Return matched data to the app for display
             self.app.combined_data = combined_data
             return combined_data
 
         except Exception as e:
-            logging.error(f"Error combining data: {e}")
-            messagebox.showerror("Error", f"Error combining data: {e}")
+            logging.error("Error combining data: %s", e)
+            self.notify_error("Error", f"Error combining data: {e}")
+            return None
+
+
+class IncrementalCombineDataCommand(CombineDataCommand):
+    """
+    Command to re-combine new extracts against the previous combined snapshot.
+
+    The new sources are fingerprinted and compared with the fingerprints stored by the previous run
+    (or with extract diffs) to find the match key groups with added, changed or removed records. Only
+    the rows of those groups are matched again; the combined and unmatched rows of every other group
+    are reused from the previous run. Nurse assignments are carried forward from the previous combined
+    data by stable record key. Without a usable previous state the command runs a full combine.
+    """
+    def __init__(self, app, data_frames, previous_data=None, state_file_path='combine_state.pkl', diffs=None,
+                 output_format='xlsx'):
+        """
+        Initialize the command with the new data frames and the previous combined data.
+
+        Preconditions:
+            - `data_frames` is a list of the new database and Medicaid DataFrames.
+            - `previous_data` is the previous combined DataFrame or None; only its `Record_Key` and
+              `Assigned Nurse` columns are read, so a projection of them is enough.
+            - `diffs`, when given, maps 'database' and 'medicaid' to the ExtractDiff of the previous
+              and new extracts, keyed on the join keys of the combine; it is used instead of the stored
+              fingerprints to find the touched groups.
+        Postconditions:
+            - The command is initialized with the application state and data frames.
+        """
+        super().__init__(app, data_frames, output_format)
+        self.previous_data = previous_data
+        self.state_file_path = state_file_path
+        self.diffs = diffs
+        self.delta = None
+
+    def execute(self):
+        """
+        Execute the incremental combination of the new data frames.
+
+        Preconditions:
+            - The data frames provided contain the required columns for merging.
+        Postconditions:
+            - Combined matched data and unmatched data are saved in the output format.
+            - The source fingerprints and result rows are saved to `state_file_path` for the next run.
+            - `delta` holds the counts of added, removed, changed, re-matched and retired records;
+              `duplicate_report` covers the rows matched again.
+
+        Returns:
+            DataFrame: A pandas DataFrame containing the combined matched data.
+        """
+        try:
+            database_data = self.data_frames[0]
+            medicaid_data = self.data_frames[1]
+            standardize_columns(database_data, medicaid_data)
+            normalize_keys(database_data)
+            normalize_keys(medicaid_data)
+
+            keys = duplicate_join_keys()
+            match_keys = keys[:-1]
+            sources = {'database': database_data, 'medicaid': medicaid_data}
+            fingerprints = {side: source_fingerprints(df, match_keys) for side, df in sources.items()}
+
+            diffs = self.diffs
+            if diffs is not None and any(diff.keys != keys for diff in diffs.values()):
+                logging.warning("The extract diffs were keyed on other columns than %s; using the stored state.", keys)
+                diffs = None
+            previous_state = load_combine_state(self.state_file_path, keys)
+
+            touched = None
+            if diffs is not None or previous_state is not None:
+                self.delta = {}
+                touched = []
+                for side in sources:
+                    if diffs is not None:
+                        groups, counts = diffs[side].touched_groups()
+                    else:
+                        groups, counts = changed_groups(previous_state['fingerprints'][side], fingerprints[side])
+                    for name, count in counts.items():
+                        self.delta[f"{side}_{name}"] = count
+                    touched.append(groups)
+                touched = np.unique(np.concatenate(touched))
+            else:
+                logging.info("No usable previous combine state; running a full combine.")
+
+            if previous_state is not None:
+                # Only the rows of the touched groups are matched again
+                selected = {side: df[np.isin(fingerprints[side]['Group'].to_numpy(), touched)]
+                            for side, df in sources.items()}
+            else:
+                selected = sources
+            if previous_state is None or any(len(df) for df in selected.values()):
+                combined_data, unmatched, self.duplicate_report = match_groups(
+                    selected['database'], selected['medicaid'], match_keys)
+                logging.info(describe_duplicate_report(self.duplicate_report))
+            else:
+                combined_data, unmatched = None, None
+
+            if touched is not None:
+                self.delta['rematched_rows'] = 0 if combined_data is None else int(
+                    np.isin(combined_data[GROUP_COLUMN].to_numpy(), touched).sum())
+            if previous_state is not None:
+                if combined_data is None:
+                    combined_data = previous_state['combined'].iloc[:0]
+                    unmatched = {side: rows.iloc[:0] for side, rows in previous_state['unmatched'].items()}
+                combined_data = reuse_rows(previous_state['combined'], combined_data, touched)
+                unmatched = {side: reuse_rows(previous_state['unmatched'][side], rows, touched)
+                             for side, rows in unmatched.items()}
+            if previous_state is None or len(touched):
+                save_combine_state(self.state_file_path, keys, fingerprints, combined_data, unmatched)
+
+            combined_data = combined_data.drop(columns=GROUP_COLUMN)
+            if self.delta is not None:
+                previous_data = self.previous_data
+                retired = 0
+                if previous_data is not None and RECORD_KEY in previous_data.columns:
+                    retired = int((~previous_data[RECORD_KEY].isin(combined_data[RECORD_KEY])).sum())
+                self.delta['retired_rows'] = retired
+                logging.info("Incremental combine: %s", self.delta)
+
+            carried = carry_forward_assignments(combined_data, self.previous_data)
+            logging.info("Carried %s nurse assignments forward.", carried)
+
+            self.unmatched_data = build_unmatched(combined_data.columns, unmatched['database'], unmatched['medicaid'])
+            self.write_outputs(combined_data)
+            combined_data = self.compact_outputs(combined_data)
+
+            self.app.combined_data = combined_data
+            return combined_data
+
+        except Exception as e:
+            logging.error("Error combining data: %s", e)
+            self.notify_error("Error", f"Error combining data: {e}")
+            return None
+
+
+class DiffExtractsCommand(Command):
+    """
+    Command to find the families added, removed or changed between two versions of an extract.
+    """
+    def __init__(self, app, old_data, new_data, side='medicaid', report_file_path='extract_changes.xlsx'):
+        """
+        Initialize the command with the two versions of the extract.
+
+        Preconditions:
+            - `old_data` and `new_data` are DataFrames read by ReadExcelCommand from the same kind of extract.
+            - `side` is 'database' or 'medicaid'.
+        Postconditions:
+            - The command is initialized with the application state and both extracts.
+        """
+        self.app = app
+        self.old_data = old_data
+        self.new_data = new_data
+        self.side = side
+        self.report_file_path = report_file_path
+
+    def execute(self):
+        """
+        Diff the two extracts and save the changes to an Excel report.
+
+        Postconditions:
+            - The Added, Removed and Changed sheets are saved to `report_file_path` if it is set.
+
+        Returns:
+            ExtractDiff: The diff result, or None if the diff fails.
+        """
+        try:
+            diff = diff_extracts(self.old_data, self.new_data, self.side)
+            logging.info("Extract diff: %s", diff.summary())
+            if self.report_file_path:
+                diff.to_excel(self.report_file_path)
+                logging.info("Extract changes saved to %s", self.report_file_path)
+            return diff
+        except Exception as e:
+            logging.error("Error comparing extracts: %s", e)
+            self.notify_error("Error", f"Error comparing extracts: {e}")
+            return None
+
+
+class PartitionedCombineDataCommand(CombineDataCommand):
+    """
+    Out-of-core variant of CombineDataCommand for extracts larger than memory.
+
+    Both sources are hash-partitioned by match key (or by child DOB month) into files on disk,
+    partition pairs are merged one at a time, and the matched and unmatched rows are streamed
+    to their files. Peak memory depends on the partition size, not on the dataset size.
+    """
+    def __init__(self, app, sources, num_partitions=16, partition_by='key', chunksize=50000, workdir=None,
+                 matched_file_path='combined_matched_data.xlsx', unmatched_file_path='unmatched_data.xlsx'):
+        """
+        Initialize the command with the sources to combine and the partitioning settings.
+
+        Preconditions:
+            - `sources` holds the database source and the Medicaid source, each a DataFrame
+              or a path to a .csv/.parquet/.arrow/.xlsx/.xls file.
+            - `partition_by` is 'key' or 'dob_month'.
+            - The output format is given by the extension of the output paths.
+        Postconditions:
+            - The command is initialized; nothing is read until `execute` is called.
+        """
+        super().__init__(app, sources)
+        self.num_partitions = num_partitions
+        self.partition_by = partition_by
+        self.chunksize = chunksize
+        self.workdir = workdir
+        self.matched_file_path = matched_file_path
+        self.unmatched_file_path = unmatched_file_path
+
+    def execute(self):
+        """
+        Execute the partitioned combination of the two sources.
+
+        Preconditions:
+            - The sources contain the required columns for merging.
+        Postconditions:
+            - Matched rows are streamed to `matched_file_path`.
+            - Unmatched rows, if any, are streamed to `unmatched_file_path`.
+            - The combined data is not kept in memory or set on the app.
+
+        Returns:
+            dict: Row counts and output paths, or None if the combine fails.
+        """
+        try:
+            with tempfile.TemporaryDirectory(dir=self.workdir) as directory:
+                store = PartitionStore(directory)
+                database_rows = partition_source(self.data_frames[0], 'database', store, self.num_partitions, self.partition_by, self.chunksize)
+                medicaid_rows = partition_source(self.data_frames[1], 'medicaid', store, self.num_partitions, self.partition_by, self.chunksize)
+
+                matched_writer = ChunkedFileWriter(self.matched_file_path)
+                unmatched_writer = None
+                duplicate_reports = []
+                for partition in range(self.num_partitions):
+                    database_data = store.read('database', partition)
+                    medicaid_data = store.read('medicaid', partition)
+                    combined_data, unmatched_database, unmatched_medicaid, duplicate_report = match_frames(database_data, medicaid_data)
+                    duplicate_reports.append(duplicate_report)
+
+                    unmatched_data = build_unmatched(matched_writer.columns or combined_data.columns, unmatched_database, unmatched_medicaid)
+                    if unmatched_data is not None:
+                        if unmatched_writer is None:
+                            unmatched_writer = ChunkedFileWriter(self.unmatched_file_path)
+                        unmatched_writer.write(unmatched_data)
+
+                    matched_writer.write(capitalize_names(combined_data))
+
+                self.duplicate_report = merge_duplicate_reports(duplicate_reports)
+                logging.info(describe_duplicate_report(self.duplicate_report))
+
+                matched_writer.close()
+                logging.info("Matched data saved to %s", self.matched_file_path)
+                if unmatched_writer is not None:
+                    unmatched_writer.close()
+                    logging.info("Unmatched data saved to %s", self.unmatched_file_path)
+                else:
+                    logging.info("No unmatched data found; skipping unmatched data file creation.")
+
+            return {
+                'database_rows': database_rows,
+                'medicaid_rows': medicaid_rows,
+                'matched_rows': matched_writer.rows_written,
+                'unmatched_rows': unmatched_writer.rows_written if unmatched_writer is not None else 0,
+                'partitions': self.num_partitions,
+                'duplicates': self.duplicate_report,
+                'matched_file_path': self.matched_file_path,
+                'unmatched_file_path': self.unmatched_file_path if unmatched_writer is not None else None,
+            }
+
+        except Exception as e:
+            logging.error("Error combining data: %s", e)
+            self.notify_error("Error", f"Error combining data: {e}")
+            return None
+
+
+class ParallelCombineDataCommand(CombineDataCommand):
+    """
+    Multi-process variant of CombineDataCommand.
+
+    The sources are split into raw shards, then normalized and hash-partitioned by match key in a
+    ProcessPoolExecutor. A second round of tasks merges each partition pair and detects its unmatched
+    rows. Shards and results move between processes as Arrow IPC files (pickles when pyarrow is not
+    installed), never as pickled DataFrames.
+    """
+    def __init__(self, app, data_frames, max_workers=None, num_partitions=None, chunksize=100000, workdir=None,
+                 output_format='xlsx'):
+        """
+        Initialize the command with the data to combine and the pool settings.
+
+        Preconditions:
+            - `data_frames` holds the database source and the Medicaid source, each a DataFrame
+              or a path to a .csv/.parquet/.arrow/.xlsx/.xls file.
+        Postconditions:
+            - The command is initialized; no process is started until `execute` is called.
+        """
+        super().__init__(app, data_frames, output_format)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.num_partitions = num_partitions or self.max_workers * 4
+        self.chunksize = chunksize
+        self.workdir = workdir
+
+    def execute(self):
+        """
+        Execute the sharded combination of the two sources across worker processes.
+
+        Preconditions:
+            - The sources contain the required columns for merging.
+        Postconditions:
+            - Combined matched data is saved to `matched_file_path`, in the output format.
+            - Unmatched data, if any, is saved to `unmatched_file_path`.
+            - Returns the combined data as a pandas DataFrame.
+
+        Returns:
+            DataFrame: A pandas DataFrame containing the combined matched data.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        try:
+            with tempfile.TemporaryDirectory(dir=self.workdir) as directory, \
+                    ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                store = PartitionStore(directory)
+
+                # Write raw shards and normalize/partition them in the pool
+                futures = []
+                for side, source in zip(['database', 'medicaid'], self.data_frames):
+                    for chunk_number, chunk in enumerate(iter_source_chunks(source, self.chunksize)):
+                        input_path = store.write(f"raw_{side}", 0, chunk_number, chunk)
+                        futures.append(executor.submit(normalize_and_partition_worker, directory, input_path, side,
+                                                       chunk_number, self.num_partitions, 'key'))
+                columns = {}
+                for future in futures:
+                    side, _, side_columns = future.result()
+                    columns.setdefault(side, side_columns)
+
+                # Merge partition pairs and detect unmatched rows in the pool
+                results = list(executor.map(combine_partition_worker, [directory] * self.num_partitions,
+                                            range(self.num_partitions),
+                                            [columns.get('database', [])] * self.num_partitions,
+                                            [columns.get('medicaid', [])] * self.num_partitions))
+                combined_data = read_pieces([matched for matched, _, _ in results], [])
+                unmatched_data = read_pieces([unmatched for _, unmatched, _ in results if unmatched], [])
+            self.duplicate_report = merge_duplicate_reports([report for _, _, report in results])
+            logging.info("Matched data combined successfully across %s processes.", self.max_workers)
+            logging.info(describe_duplicate_report(self.duplicate_report))
+
+            self.unmatched_data = None if unmatched_data.empty else unmatched_data
+            self.write_outputs(combined_data)
+            combined_data = self.compact_outputs(combined_data)
+
+            self.app.combined_data = combined_data
+            return combined_data
+
+        except Exception as e:
+            logging.error("Error combining data: %s", e)
+            self.notify_error("Error", f"Error combining data: {e}")
             return None
 
 
@@ -275,9 +660,10 @@ class EncryptFileCommand(Command):
             logging.info("Attempting to encrypt files.")
             if filepath == None:
                 logging.info("Browsing file.")
-                filepath = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx *.xls")])
+                from tkinter import filedialog
+                filepath = filedialog.askopenfilename(filetypes=SOURCE_FILETYPES)
             if not os.path.exists(filepath):
-                logging.warning(f"Filepath {filepath} does not exist, cannot encrypt")
+                logging.warning("Filepath %s does not exist, cannot encrypt", filepath)
                 return
             key = Crypto.loadKey()
             Crypto.encrypt_file(filepath, key)
@@ -325,23 +711,163 @@ class DecryptFileCommand(Command):
             return False
         
 
+class UndoableCommand(Command):
+    """
+    Command whose effect can be undone, then redone, through the Invoker history.
+    """
+    def has_effect(self):
+        """
+        Whether the executed command changed anything, and so is worth undoing.
+        """
+        return True
+
+    def undo(self):
+        """
+        Revert the effect of `execute`.
+
+        Preconditions:
+            - `execute` or `redo` was the last call.
+        """
+        raise NotImplementedError("Subclasses must implement the 'undo' method")
+
+    def redo(self):
+        """
+        Apply again the effect reverted by `undo`.
+
+        Preconditions:
+            - `undo` was the last call.
+        """
+        raise NotImplementedError("Subclasses must implement the 'redo' method")
+
+
+class NurseAssignmentCommand(UndoableCommand):
+    """
+    Undoable assignment of rows of the combined data to nurses of the roster.
+
+    Only the delta is recorded: the labels of the rows whose nurse changes, with their
+    previous and new nurse IDs (-1 for no nurse), as arrays. Undoing or redoing a batch
+    touches those rows only, in the roster index and the ASSIGNED_NURSE column, without
+    copying the data frame.
+
+    Attributes:
+        rows (ndarray): Labels of the rows changed, once executed.
+        previous (ndarray): Nurse ID of each row before the command, -1 for none.
+        current (ndarray): Nurse ID of each row after the command.
+    """
+    # Nurse ID recorded for a row without nurse
+    NO_NURSE = -1
+
+    def __init__(self, app, combined_data, roster, nurse_ids, description="Nurse assignment"):
+        """
+        Initialize the command with the application state.
+
+        Args:
+            app: The application object, or None when the command is used without the UI.
+            combined_data (DataFrame): The combined data whose ASSIGNED_NURSE column is changed.
+            roster (NurseRoster): The roster indexing the assignments of `combined_data`.
+            nurse_ids (dict or Series): Row label -> ID of the nurse to assign.
+            description (str): Shown in the logs and the undo/redo messages.
+        """
+        self.app = app
+        self.combined_data = combined_data
+        self.roster = roster
+        self.nurse_ids = nurse_ids
+        self.description = description
+        self.rows = self.previous = self.current = None
+
+    def execute(self):
+        """
+        Assign the rows to their nurses, all or none.
+
+        Postconditions:
+            - Capacities are checked on the caseloads after every move (see
+              `NurseRoster.check_reassignment`); nothing is assigned when one is exceeded.
+            - The rows already assigned to their nurse are not part of the delta.
+
+        Raises:
+            CapacityError: When a nurse is inactive or would exceed their capacity.
+        Returns:
+            int: The number of rows whose nurse changed.
+        """
+        moves = self.roster.check_reassignment(self.nurse_ids)
+        assignments = self.roster.assignments()
+        self.rows = np.array(list(moves))
+        self.current = np.fromiter(moves.values(), dtype=np.int32, count=len(moves))
+        self.previous = np.fromiter((assignments.get(row, self.NO_NURSE) for row in moves),
+                                    dtype=np.int32, count=len(moves))
+        self.nurse_ids = None
+        self._apply(self.current)
+        logging.info("%s: %s rows", self.description, len(self.rows))
+        return len(self.rows)
+
+    def has_effect(self):
+        """
+        Whether the nurse of any row changed.
+        """
+        return self.rows is not None and len(self.rows) > 0
+
+    def undo(self):
+        """
+        Give every row of the delta its previous nurse back, whatever the capacities.
+        """
+        self._apply(self.previous)
+        logging.info("Undone %s: %s rows", self.description, len(self.rows))
+
+    def redo(self):
+        """
+        Assign the rows of the delta to their nurses again.
+
+        Raises:
+            CapacityError: When a capacity changed since and would be exceeded; nothing is assigned then.
+        """
+        self.roster.check_reassignment(dict(zip(self.rows.tolist(), self.current.tolist())))
+        self._apply(self.current)
+        logging.info("Redone %s: %s rows", self.description, len(self.rows))
+
+    def _apply(self, nurse_ids):
+        """
+        Set the nurse of every row of the delta, one group of rows per nurse, in O(delta).
+        """
+        order = np.argsort(nurse_ids, kind='stable')
+        sorted_ids = nurse_ids[order]
+        boundaries = np.flatnonzero(np.diff(sorted_ids)) + 1
+        for positions in np.split(order, boundaries):
+            if not len(positions):
+                continue
+            nurse_id = int(nurse_ids[positions[0]])
+            rows = self.rows[positions].tolist()
+            if nurse_id == self.NO_NURSE:
+                for row in rows:
+                    self.roster.unassign(row)
+                set_values(self.combined_data, rows, ASSIGNED_NURSE, None)
+            else:
+                for row in rows:
+                    self.roster.assign(row, nurse_id, enforce_capacity=False)
+                set_values(self.combined_data, rows, ASSIGNED_NURSE, self.roster.get(nurse_id).name)
+
+
 class Invoker:
     """
-    Invoker class to store and execute commands sequentially.
+    Invoker class to store and execute commands sequentially, and to undo and redo them.
 
     Attributes:
         commands (list): A list of commands to execute.
+        undo_stack (deque): Undoable commands executed, the last one at the end.
+        redo_stack (list): Undone commands, the last undone at the end.
     """
-    def __init__(self):
+    def __init__(self, history_limit=100):
         """
-        Initialize the invoker with an empty command list.
+        Initialize the invoker with an empty command list and an empty history.
 
         Preconditions:
             - No arguments are required.
         Postconditions:
             - An empty list of commands is initialized.
+            - At most `history_limit` commands can be undone; older ones are forgotten.
         """
         self.commands = []
+        self.undo_stack = deque(maxlen=history_limit)
+        self.redo_stack = []
 
     def add_command(self, command):
         """
@@ -356,7 +882,7 @@ class Invoker:
             command (Command): The command to add to the list.
         """
         self.commands.append(command)
-        logging.info(f"Command added: {command.__class__.__name__}")
+        logging.info("Command added: %s", command.__class__.__name__)
 
     def execute_commands(self):
         """
@@ -369,4 +895,59 @@ class Invoker:
         """
         for command in self.commands:
             command.execute()
-            logging.info(f"Executed command: {command.__class__.__name__}")
+            logging.info("Executed command: %s", command.__class__.__name__)
+
+    def execute_command(self, command):
+        """
+        Execute a command now, recording it in the history when it can be undone.
+
+        Postconditions:
+            - An executed UndoableCommand that changed something can be undone; the commands
+              undone before can no longer be redone.
+
+        Returns:
+            The value returned by the command.
+        """
+        result = command.execute()
+        if isinstance(command, UndoableCommand) and command.has_effect():
+            self.undo_stack.append(command)
+            self.redo_stack.clear()
+        return result
+
+    def undo(self):
+        """
+        Undo the last command executed or redone.
+
+        Returns:
+            UndoableCommand: The command undone, or None when there is nothing to undo.
+        """
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        command.undo()
+        self.redo_stack.append(command)
+        return command
+
+    def redo(self):
+        """
+        Redo the last command undone.
+
+        Postconditions:
+            - A command that fails to redo stays on the redo stack.
+
+        Returns:
+            UndoableCommand: The command redone, or None when there is nothing to redo.
+        """
+        if not self.redo_stack:
+            return None
+        self.redo_stack[-1].redo()
+        command = self.redo_stack.pop()
+        self.undo_stack.append(command)
+        return command
+
+    def clear_history(self):
+        """
+        Forget every command that could be undone or redone, e.g. when their data is replaced.
+        """
+        self.undo_stack.clear()
+        self.redo_stack.clear()
@@ -0,0 +1,44 @@
+"""
+Deferred imports of the heavy dependencies.
+
+pandas and NumPy take most of the start-up time of the application, yet the first
+window only needs tkinter. Modules bind these libraries through `lazy_import`, which
+returns the module object right away and executes it on the first attribute access,
+so the window opens before the data libraries are loaded.
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Import a module on the first access to one of its attributes.
+
+    Postconditions:
+        - A module that is already imported is returned as is.
+        - Otherwise a lazy module is registered in `sys.modules`, so a later plain `import`
+          of the same name shares it.
+
+    Returns:
+        module: The (possibly not yet executed) module.
+    Raises:
+        ModuleNotFoundError: If the module is not installed.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def is_available(name):
+    """
+    Check whether an optional module is installed without importing it.
+    """
+    return name in sys.modules or importlib.util.find_spec(name) is not None
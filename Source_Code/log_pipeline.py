@@ -0,0 +1,179 @@
+"""
+Asynchronous logging pipeline of the application, the command line and the benchmarks.
+
+Records used to be formatted and written to stderr by the thread logging them, e.g. the
+UI thread in the middle of a combine. `configure_logging` instead installs a
+`QueueHandler` on the root logger: logging a message only enqueues its record, and a
+`QueueListener` thread formats and writes it. Messages pass their values as lazy
+%-style arguments, so a record that is filtered out is never formatted.
+
+Hot paths are sampled: a call site logging below WARNING more than `RATE_LIMIT_BURST`
+times within `RATE_LIMIT_SECONDS` has its extra records dropped, and the next record
+written reports how many were suppressed. Warnings and errors are never dropped.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+# Format of every log line
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Records a call site may log per period before it is sampled
+RATE_LIMIT_BURST = 20
+
+# Length of the rate limiting period, in seconds
+RATE_LIMIT_SECONDS = 1.0
+
+# The running listener and the handler feeding it, None until `configure_logging`
+_listener = None
+_queue_handler = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Filter sampling the records of call sites that log too often.
+
+    Attributes:
+        burst (int): Records let through per call site and period.
+        period (float): Length of a period, in seconds.
+    """
+    def __init__(self, burst=RATE_LIMIT_BURST, period=RATE_LIMIT_SECONDS):
+        """
+        Initialize the filter without any call site seen.
+        """
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        # (path, line) -> [period start, records let through, records suppressed]
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        """
+        Decide whether a record is logged.
+
+        Postconditions:
+            - The first record let through after records were suppressed carries their number
+              in its `suppressed` attribute.
+
+        Returns:
+            bool: False when the record is dropped.
+        """
+        if record.levelno >= logging.WARNING:
+            return True
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or record.created - state[0] >= self.period:
+                suppressed = state[2] if state is not None else 0
+                self._sites[site] = [record.created, 1, 0]
+            elif state[1] >= self.burst:
+                state[2] += 1
+                return False
+            else:
+                state[1] += 1
+                suppressed = 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class SampledFormatter(logging.Formatter):
+    """
+    Formatter noting how many similar records were suppressed before a record.
+    """
+    def format(self, record):
+        """
+        Format the record, followed by the number of records suppressed at its call site.
+        """
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f" ({suppressed} similar messages suppressed)"
+        return text
+
+
+class StderrHandler(logging.StreamHandler):
+    """
+    Stream handler writing to the current `sys.stderr`, even once it was redirected.
+    """
+    def __init__(self):
+        """
+        Initialize the handler without binding a stream.
+        """
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        """
+        The stream written to.
+        """
+        return sys.stderr
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler leaving the formatting of its records to the listener thread.
+
+    `QueueHandler.prepare` formats the message in the logging thread, so that the record
+    can be pickled. The queue never leaves the process, so the record is enqueued as is.
+    The arguments of a message are therefore read when it is written: log immutable values
+    (numbers, strings), not data frames modified afterwards.
+    """
+    def prepare(self, record):
+        """
+        Enqueue the record unformatted.
+        """
+        return record
+
+
+def configure_logging(level=logging.INFO, stream=None):
+    """
+    Route the records of the root logger through the background listener.
+
+    Args:
+        level (int or str): Level of the root logger, e.g. logging.INFO or 'DEBUG'.
+        stream (file, optional): Where the log lines are written, stderr by default.
+    Postconditions:
+        - The listener is started once; later calls only change the level.
+        - The pending records are written when the interpreter exits.
+
+    Returns:
+        QueueListener: The running listener.
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return _listener
+
+    handler = StderrHandler() if stream is None else logging.StreamHandler(stream)
+    handler.setFormatter(SampledFormatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+    _queue_handler = DeferredQueueHandler(log_queue)
+    _queue_handler.addFilter(RateLimitFilter())
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """
+    Write the pending records and stop the listener.
+
+    Postconditions:
+        - The root logger no longer enqueues records; `configure_logging` may start a new listener.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
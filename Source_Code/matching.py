@@ -0,0 +1,354 @@
+"""
+Matching helpers shared by every combine mode.
+
+The column standardization, key normalization and merge logic used to live inside
+CombineDataCommand. It is kept here so the in-memory, partitioned and parallel
+combines all produce the same matched and unmatched rows.
+"""
+from lazy_imports import lazy_import
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Columns used to match a hospital record with a Medicaid record
+MATCH_KEYS = ['Mother_First_Name', 'Mother_Last_Name', 'Child_Date_of_Birth']
+
+# Name columns that are capitalized in the combined outputs
+NAME_COLUMNS = ['Mother_First_Name', 'Mother_Last_Name', 'Child_First_Name', 'Child_Last_Name']
+
+# Columns used to tell apart rows sharing the same match keys (twins, siblings, re-sent rows)
+SECONDARY_KEYS = ['Child_First_Name', 'Child_ID']
+
+# Occurrence number of a row within its key group, used to pair duplicates one to one
+SEQUENCE_COLUMN = '_Match_Sequence'
+
+# Stable identifier of a matched child, carried between combine runs
+RECORD_KEY = 'Record_Key'
+
+# Source specific column names mapped to the shared match key names
+DATABASE_RENAMES = {'DOB': 'Child_Date_of_Birth'}
+MEDICAID_RENAMES = {'Child_DOB': 'Child_Date_of_Birth', 'Last_Name': 'Mother_Last_Name'}
+
+
+def standardize_columns(database_data, medicaid_data):
+    """
+    Rename the source specific columns so both data frames share the match keys.
+
+    Preconditions:
+        - `database_data` and `medicaid_data` are DataFrames with underscore separated column names.
+    Postconditions:
+        - Both data frames are renamed in place to use `Child_Date_of_Birth` and `Mother_Last_Name`.
+    """
+    database_data.rename(columns=DATABASE_RENAMES, inplace=True)
+    medicaid_data.rename(columns=MEDICAID_RENAMES, inplace=True)
+
+
+def normalize_keys(df):
+    """
+    Normalize the match key columns of a data frame in place.
+
+    Preconditions:
+        - `df` contains the columns listed in MATCH_KEYS.
+    Postconditions:
+        - Mother names are lower case with non-word characters removed.
+        - `Child_Date_of_Birth` is a 'YYYY-MM-DD' string (NaN when unparseable).
+
+    Returns:
+        DataFrame: The same data frame, for chaining.
+    """
+    for col in ['Mother_First_Name', 'Mother_Last_Name']:
+        df[col] = _map_unique(df[col], lambda values: values.str.lower().str.replace(r'\W', '', regex=True))
+    df['Child_Date_of_Birth'] = _map_unique(
+        df['Child_Date_of_Birth'],
+        lambda values: pd.to_datetime(values, errors='coerce').dt.strftime('%Y-%m-%d'))
+    return df
+
+
+def _map_unique(column, transform):
+    """
+    Apply an element-wise transform to the distinct values of a column only.
+
+    Names and birth dates repeat a lot, so normalizing the distinct values and mapping
+    them back by code is much cheaper than normalizing every row.
+
+    Returns:
+        ndarray: The transformed values aligned with `column`, NaN where the value was missing.
+    """
+    codes, uniques = pd.factorize(column)
+    if len(uniques) == 0:
+        return column.to_numpy()
+    values = transform(pd.Series(uniques)).to_numpy(dtype=object).take(codes)
+    values[codes < 0] = np.nan
+    return values
+
+
+def duplicate_join_keys():
+    """
+    Pick the columns used to join the two sides once duplicates are taken into account.
+
+    The match keys are followed by the occurrence number of each row within its key group.
+    Secondary keys are not joined on: they only order the rows of a duplicate group before
+    they are numbered (see `add_occurrence_numbers`), so a child's name typed differently on
+    the two sides never unmatches a family.
+
+    Returns:
+        list: The join key columns.
+    """
+    return MATCH_KEYS + [SEQUENCE_COLUMN]
+
+
+def _secondary_order(values):
+    """
+    The value a secondary key column is ordered by: names compared like the mother names are matched.
+    """
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.Series(_map_unique(values, lambda names: names.astype(str).str.lower().str.replace(r'\W', '', regex=True)),
+                     index=values.index)
+
+
+def add_occurrence_numbers(df, keys):
+    """
+    Number the rows of every key group 0, 1, 2, ... so duplicates pair one to one.
+
+    Rows are ordered by the secondary keys available on this side, normalized like the
+    match keys, so the numbering does not depend on the order of the input file.
+
+    Postconditions:
+        - Returns a copy of `df` with a SEQUENCE_COLUMN column and a fresh RangeIndex.
+    """
+    df = df.reset_index(drop=True)
+    order_by = [col for col in SECONDARY_KEYS if col in df.columns]
+    ordered = df.sort_values(order_by, kind='stable', key=_secondary_order) if order_by else df
+    df[SEQUENCE_COLUMN] = ordered.groupby(keys, dropna=False, sort=False).cumcount().reindex(df.index)
+    return df
+
+
+def analyze_duplicates(database_data, medicaid_data, keys):
+    """
+    Measure the duplicate keys of both sides and the fan-out a plain merge on them would produce.
+
+    Preconditions:
+        - Exact duplicate rows were already removed from both sides.
+    Postconditions:
+        - Returns a dict of counts that can be summed across partitions with `merge_duplicate_reports`.
+    """
+    database_sizes = database_data.groupby(keys, dropna=False, sort=False).size()
+    medicaid_sizes = medicaid_data.groupby(keys, dropna=False, sort=False).size()
+    overlap = database_sizes.to_frame('database').join(medicaid_sizes.to_frame('medicaid'), how='inner')
+
+    return {
+        'database_duplicate_keys': int((database_sizes > 1).sum()),
+        'database_duplicate_rows': int(database_sizes[database_sizes > 1].sum()),
+        'medicaid_duplicate_keys': int((medicaid_sizes > 1).sum()),
+        'medicaid_duplicate_rows': int(medicaid_sizes[medicaid_sizes > 1].sum()),
+        'cartesian_rows': int((overlap['database'] * overlap['medicaid']).sum()),
+        'bounded_rows': int(np.minimum(overlap['database'], overlap['medicaid']).sum()),
+    }
+
+
+def merge_duplicate_reports(reports):
+    """
+    Sum the duplicate reports of several partitions into one report.
+    """
+    total = {}
+    for report in reports:
+        for name, value in report.items():
+            total[name] = total.get(name, 0) + value
+    return total
+
+
+def record_keys(df, keys):
+    """
+    Compute the stable record key of every row, see `record_hashes`.
+
+    Returns:
+        Series: 16 character hexadecimal strings aligned with `df`.
+    """
+    return pd.Series(hash_keys(record_hashes(df, keys)), index=df.index, dtype=object)
+
+
+def record_hashes(df, keys):
+    """
+    Hash the identity of every row, the numeric form of `record_keys`.
+
+    The identity is the normalized match keys and the first secondary key of the side (the
+    child's first name, else Child_ID), normalized like the rows are ordered. The occurrence
+    number only breaks the ties left between rows equal on all of them, so a twin or sibling
+    arriving in a later extract does not change the key, nor the nurse, of the others.
+
+    Preconditions:
+        - `df` went through `add_occurrence_numbers`; the last of `keys` is SEQUENCE_COLUMN.
+
+    Returns:
+        ndarray: uint64 hashes aligned with `df`.
+    """
+    identity = df[keys[:-1]].astype(object)
+    secondary = next((col for col in SECONDARY_KEYS if col in df.columns), None)
+    if secondary is not None:
+        identity[secondary] = pd.Series(_secondary_order(df[secondary]), index=df.index).astype(object)
+    ordered = identity.iloc[np.argsort(df[keys[-1]].to_numpy(), kind='stable')]
+    identity['_Tie'] = ordered.groupby(list(ordered.columns), dropna=False, sort=False).cumcount().reindex(identity.index)
+    return pd.util.hash_pandas_object(identity, index=False).to_numpy()
+
+
+def group_hashes(df, keys):
+    """
+    Hash the normalized match keys of every row. Rows are only ever paired with rows of the
+    same group, so a group whose rows did not change on either side matches the same way.
+
+    Returns:
+        ndarray: uint64 hashes aligned with `df`.
+    """
+    return pd.util.hash_pandas_object(df[keys].astype(object), index=False).to_numpy()
+
+
+def hash_keys(hashes):
+    """
+    Format uint64 hashes as the 16 character hexadecimal RECORD_KEY strings, vectorized.
+
+    Returns:
+        ndarray: One key per hash, as Python strings.
+    """
+    text = np.asarray(hashes, dtype='>u8').tobytes().hex()
+    return np.frombuffer(text.encode('ascii'), dtype='S16').astype(str).astype(object)
+
+
+def prepare_frames(database_data, medicaid_data):
+    """
+    Drop exact duplicates, analyze duplicate keys and number the rows of every key group.
+
+    Preconditions:
+        - Both data frames were passed through `standardize_columns` and `normalize_keys`.
+    Postconditions:
+        - The input data frames are not modified.
+        - The returned frames carry SEQUENCE_COLUMN and RECORD_KEY columns.
+
+    Returns:
+        tuple: (database_data, medicaid_data, join keys, duplicate_report)
+    """
+    database_rows, medicaid_rows = len(database_data), len(medicaid_data)
+    database_data = database_data.drop_duplicates()
+    medicaid_data = medicaid_data.drop_duplicates()
+
+    keys = duplicate_join_keys()
+    report = analyze_duplicates(database_data, medicaid_data, keys[:-1])
+    report['database_exact_duplicates'] = database_rows - len(database_data)
+    report['medicaid_exact_duplicates'] = medicaid_rows - len(medicaid_data)
+
+    database_data = add_occurrence_numbers(database_data, keys[:-1])
+    medicaid_data = add_occurrence_numbers(medicaid_data, keys[:-1])
+    database_data[RECORD_KEY] = record_keys(database_data, keys)
+    medicaid_data[RECORD_KEY] = record_keys(medicaid_data, keys)
+    return database_data, medicaid_data, keys, report
+
+
+def merge_prepared(database_data, medicaid_data, keys):
+    """
+    Merge two prepared data frames, pairing duplicates one to one.
+
+    Postconditions:
+        - The combined data has a RECORD_KEY column as its last column and no SEQUENCE_COLUMN.
+
+    Returns:
+        DataFrame: The combined matched data.
+    """
+    combined_data = pd.merge(
+        database_data,
+        medicaid_data.drop(columns=RECORD_KEY),
+        on=keys,
+        how='inner',
+        suffixes=('_db', '_medicaid')
+    )
+    columns = [col for col in combined_data.columns if col not in (SEQUENCE_COLUMN, RECORD_KEY)]
+    return combined_data[columns + [RECORD_KEY]]
+
+
+def split_unmatched(df, other, keys, source):
+    """
+    Select the rows of one prepared side without a partner on the other side.
+
+    The sides are paired on the join keys, not on their record keys, which depend on the
+    secondary keys each side has.
+
+    Returns:
+        DataFrame: The unmatched rows tagged with a `Source` column.
+    """
+    paired = np.isin(pd.util.hash_pandas_object(df[keys].astype(object), index=False).to_numpy(),
+                     pd.util.hash_pandas_object(other[keys].astype(object), index=False).to_numpy())
+    unmatched = df[~paired].drop(columns=SEQUENCE_COLUMN)
+    unmatched['Source'] = source
+    return unmatched
+
+
+def match_frames(database_data, medicaid_data):
+    """
+    Merge two normalized data frames and split out the rows without a match.
+
+    Exact duplicate rows are dropped, and rows sharing the same match keys are paired one to
+    one (ordered by their secondary keys) instead of producing a Cartesian product.
+
+    Preconditions:
+        - Both data frames were passed through `standardize_columns` and `normalize_keys`.
+    Postconditions:
+        - Returns the merge of the two frames, the unmatched rows of each side tagged with a
+          `Source` column, and the duplicate report of the merge.
+        - The input data frames are not modified.
+
+    Returns:
+        tuple: (combined_data, unmatched_database, unmatched_medicaid, duplicate_report)
+    """
+    database_data, medicaid_data, keys, report = prepare_frames(database_data, medicaid_data)
+    combined_data = merge_prepared(database_data, medicaid_data, keys)
+    unmatched_database = split_unmatched(database_data, medicaid_data, keys, 'Database')
+    unmatched_medicaid = split_unmatched(medicaid_data, database_data, keys, 'Medicaid')
+
+    report['matched_rows'] = len(combined_data)
+    report['fan_out_avoided'] = report['cartesian_rows'] - report['bounded_rows']
+    return combined_data, unmatched_database, unmatched_medicaid, report
+
+
+def describe_duplicate_report(report):
+    """
+    Summarize a duplicate report in one line for the logs.
+    """
+    return (f"Duplicate analysis: {report.get('database_exact_duplicates', 0)} exact duplicate database rows and "
+            f"{report.get('medicaid_exact_duplicates', 0)} exact duplicate Medicaid rows dropped; "
+            f"{report.get('database_duplicate_keys', 0)} database and {report.get('medicaid_duplicate_keys', 0)} "
+            f"Medicaid keys shared by several rows; {report.get('matched_rows', 0)} matched rows instead of "
+            f"{report.get('cartesian_rows', 0)} from a plain merge.")
+
+
+def build_unmatched(columns, unmatched_database, unmatched_medicaid):
+    """
+    Align the unmatched rows of both sources with the combined data columns.
+
+    Preconditions:
+        - `columns` is the list of columns of the combined data.
+    Postconditions:
+        - Returns a single data frame with the unmatched rows of both sources and capitalized names,
+          or None when there are no unmatched rows.
+    """
+    if unmatched_database.empty and unmatched_medicaid.empty:
+        return None
+
+    columns = list(columns) + ['Source']
+    unmatched_database = unmatched_database.reindex(columns=columns, fill_value='')
+    unmatched_medicaid = unmatched_medicaid.reindex(columns=columns, fill_value='')
+    unmatched_data = pd.concat([unmatched_database, unmatched_medicaid], ignore_index=True)
+    return capitalize_names(unmatched_data)
+
+
+def capitalize_names(df):
+    """
+    Capitalize the name columns of a data frame in place.
+
+    Postconditions:
+        - Every column of NAME_COLUMNS present in `df` is capitalized.
+
+    Returns:
+        DataFrame: The same data frame, for chaining.
+    """
+    for col in NAME_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].str.capitalize()
+    return df
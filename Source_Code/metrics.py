@@ -0,0 +1,223 @@
+"""
+In-process performance metrics for commands and application handlers.
+
+Every measured stage records its wall time, CPU time, rows processed and, when memory
+tracing is enabled, the peak memory allocated during the stage (tracemalloc). Records
+are kept in a bounded registry that the Performance window displays and that can be
+exported to JSON or CSV to compare releases and data volumes.
+"""
+import csv
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+# Columns of a metrics record, in export order
+RECORD_FIELDS = ['stage', 'started_at', 'wall_seconds', 'cpu_seconds', 'rows', 'peak_memory_bytes', 'status']
+
+
+def count_rows(result):
+    """
+    Guess the number of rows processed from the value returned by a stage.
+
+    Returns:
+        int: The row count, or None when the result does not carry one.
+    """
+    if result is None or isinstance(result, (bool, str, bytes)):
+        return None
+    if isinstance(result, dict):
+        if 'rows' in result:
+            return result['rows']
+        if 'database_rows' in result:
+            return result['database_rows'] + result.get('medicaid_rows', 0)
+        return None
+    if hasattr(result, 'shape') or isinstance(result, (list, tuple)):
+        return len(result)
+    return None
+
+
+class MetricsRegistry:
+    """
+    Bounded, thread-safe store of stage metrics.
+
+    Attributes:
+        records (deque): The most recent metrics records, oldest first.
+        trace_memory (bool): Whether stages measure their peak memory with tracemalloc. Tracing
+            slows Python allocations down, so it is off unless enabled here or through the
+            METRICS_TRACE_MEMORY environment variable.
+    """
+    def __init__(self, max_records=10000):
+        """
+        Initialize an empty registry.
+
+        Postconditions:
+            - At most `max_records` records are kept; older records are dropped first.
+        """
+        self.records = deque(maxlen=max_records)
+        self.trace_memory = bool(os.environ.get('METRICS_TRACE_MEMORY'))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self, record):
+        """
+        Store a finished metrics record.
+        """
+        with self._lock:
+            self.records.append(record)
+
+    @contextmanager
+    def measure(self, stage, rows=None):
+        """
+        Measure the enclosed block as the stage `stage`.
+
+        The yielded record can be updated inside the block, e.g. to set `rows` once known.
+        Nested stages are measured independently; an inner stage does not hide its memory
+        peak from the outer one.
+
+        Yields:
+            dict: The record of the stage, stored in the registry when the block exits.
+        """
+        record = {'stage': stage, 'started_at': datetime.now().isoformat(timespec='seconds'),
+                  'rows': rows, 'peak_memory_bytes': None, 'status': 'ok'}
+        peaks = self._peak_stack()
+        tracing = self.trace_memory and threading.current_thread() is threading.main_thread()
+        started_tracing = False
+        if tracing:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            tracemalloc.reset_peak()
+            peaks.append(0)
+            start_memory = current
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException:
+            record['status'] = 'error'
+            raise
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - wall_start, 6)
+            record['cpu_seconds'] = round(time.process_time() - cpu_start, 6)
+            if tracing:
+                peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+                record['peak_memory_bytes'] = max(peak - start_memory, 0)
+                if peaks:
+                    peaks[-1] = max(peaks[-1], peak)
+                if started_tracing:
+                    tracemalloc.stop()
+            self.add(record)
+            logging.debug("Stage %s took %.3fs wall, %.3fs CPU", stage, record['wall_seconds'], record['cpu_seconds'])
+
+    def _peak_stack(self):
+        """
+        Memory peaks of the stages currently measured by this thread, innermost last.
+        """
+        if not hasattr(self._local, 'peaks'):
+            self._local.peaks = []
+        return self._local.peaks
+
+    def snapshot(self):
+        """
+        Copy the current records.
+
+        Returns:
+            list: The records as dicts, oldest first.
+        """
+        with self._lock:
+            return [dict(record) for record in self.records]
+
+    def summary(self):
+        """
+        Aggregate the records per stage.
+
+        Returns:
+            list: One dict per stage with the call count, total/mean/max wall time, total CPU
+            time, total rows and the largest memory peak, slowest stage first.
+        """
+        stages = {}
+        for record in self.snapshot():
+            stage = stages.setdefault(record['stage'], {
+                'stage': record['stage'], 'calls': 0, 'wall_total': 0.0, 'wall_max': 0.0, 'cpu_total': 0.0,
+                'rows_total': None, 'peak_memory_max': None, 'errors': 0})
+            stage['calls'] += 1
+            stage['wall_total'] += record['wall_seconds']
+            stage['wall_max'] = max(stage['wall_max'], record['wall_seconds'])
+            stage['cpu_total'] += record['cpu_seconds']
+            if record['rows'] is not None:
+                stage['rows_total'] = (stage['rows_total'] or 0) + record['rows']
+            if record['peak_memory_bytes'] is not None:
+                stage['peak_memory_max'] = max(stage['peak_memory_max'] or 0, record['peak_memory_bytes'])
+            if record['status'] != 'ok':
+                stage['errors'] += 1
+        for stage in stages.values():
+            stage['wall_mean'] = stage['wall_total'] / stage['calls']
+        return sorted(stages.values(), key=lambda stage: stage['wall_total'], reverse=True)
+
+    def export_json(self, path):
+        """
+        Write the records and the per-stage summary to a JSON file.
+        """
+        with open(path, 'w') as file:
+            json.dump({'records': self.snapshot(), 'summary': self.summary()}, file, indent=2, default=int)
+        logging.info("Metrics exported to %s", path)
+
+    def export_csv(self, path):
+        """
+        Write the records to a CSV file, one row per measured stage.
+        """
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=RECORD_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.snapshot())
+        logging.info("Metrics exported to %s", path)
+
+    def clear(self):
+        """
+        Remove every record.
+        """
+        with self._lock:
+            self.records.clear()
+
+
+# Registry shared by the commands, the GUI and the command line
+REGISTRY = MetricsRegistry()
+
+
+def measure(stage, rows=None):
+    """
+    Measure the enclosed block in the shared registry, see `MetricsRegistry.measure`.
+    """
+    return REGISTRY.measure(stage, rows)
+
+
+def timed(stage=None):
+    """
+    Decorator measuring every call of a function as a stage of the shared registry.
+
+    Args:
+        stage (str, optional): Stage name. Defaults to the function's qualified name.
+    Returns:
+        callable: The decorator. The rows of the stage are taken from the returned value.
+    """
+    def decorator(function):
+        name = stage or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with REGISTRY.measure(name) as record:
+                result = function(*args, **kwargs)
+                record['rows'] = count_rows(result)
+                return result
+        wrapper.__wrapped_stage__ = name
+        return wrapper
+    return decorator
@@ -0,0 +1,387 @@
+"""
+Roster of the nurses children are assigned to, with their caseloads.
+
+Nurses used to exist only as the free text of the `Assigned Nurse` column: a typo created
+a new nurse, every statistic rescanned the whole column and nothing limited a caseload.
+The roster registers each nurse once (ID, name, home ZIP, capacity, active flag) in
+`nurse_roster.csv`, next to the combined data, and keeps an index from each nurse to the
+rows assigned to them. The index is built once when combined data is loaded, then
+updated in O(1) per assigned or unassigned row, and the statistics, the children of a
+nurse and the capacity checks read it instead of scanning the data frame.
+
+The `Assigned Nurse` column stays the saved record of the assignments; the index mirrors
+it for the data in memory, keyed by the row labels of the combined data.
+"""
+import difflib
+import logging
+import os
+from lazy_imports import lazy_import
+from schema import set_values
+from data_ops import ASSIGNED_NURSE
+
+pd = lazy_import('pandas')
+
+# Roster file, next to the combined data
+ROSTER_PATH = 'nurse_roster.csv'
+
+# Columns of the roster file
+ROSTER_COLUMNS = ['Nurse_ID', 'Name', 'Home_ZIP', 'Capacity', 'Active']
+
+# Children a nurse may be assigned unless the roster says otherwise
+DEFAULT_CAPACITY = 25
+
+# Values of the ASSIGNED_NURSE column meaning that no nurse is assigned
+UNASSIGNED_VALUES = ('', 'None', 'nan')
+
+
+class CapacityError(ValueError):
+    """
+    Raised when an assignment would exceed the capacity of a nurse, or targets an inactive nurse.
+    """
+
+
+def normalize_name(name):
+    """
+    The key a nurse name is looked up by: case and repeated spaces do not make another nurse.
+    """
+    return " ".join(str(name).split()).casefold()
+
+
+class Nurse:
+    """
+    A nurse of the roster.
+
+    Attributes:
+        nurse_id (int): Identifier of the nurse, unique in the roster.
+        name (str): Name shown and saved in the ASSIGNED_NURSE column.
+        home_zip (str): ZIP code the nurse works from, '' when unknown.
+        capacity (int): Maximum number of children assigned to the nurse.
+        active (bool): Whether children may be assigned to the nurse.
+    """
+    def __init__(self, nurse_id, name, home_zip='', capacity=DEFAULT_CAPACITY, active=True):
+        """
+        Initialize a nurse.
+        """
+        self.nurse_id = nurse_id
+        self.name = name
+        self.home_zip = home_zip
+        self.capacity = capacity
+        self.active = active
+
+    def __repr__(self):
+        return f"Nurse({self.nurse_id}, {self.name!r}, capacity={self.capacity}, active={self.active})"
+
+
+class NurseRoster:
+    """
+    The nurses and the index of the rows assigned to each of them.
+
+    Attributes:
+        path (str): The roster file, or None for a roster kept in memory only.
+    """
+    def __init__(self, path=None):
+        """
+        Initialize an empty roster with an empty index.
+        """
+        self.path = path
+        self._nurses = {}
+        self._ids_by_name = {}
+        # Nurse ID -> labels of the rows assigned to the nurse, and back
+        self._caseloads = {}
+        self._assignments = {}
+
+    def __len__(self):
+        return len(self._nurses)
+
+    def __iter__(self):
+        return iter(self._nurses.values())
+
+    def add_nurse(self, name, home_zip='', capacity=DEFAULT_CAPACITY, active=True, nurse_id=None):
+        """
+        Register a nurse.
+
+        Raises:
+            ValueError: When the name is empty or already on the roster.
+        Returns:
+            Nurse: The new nurse.
+        """
+        name = " ".join(str(name).split())
+        if not name:
+            raise ValueError("A nurse needs a name")
+        if normalize_name(name) in self._ids_by_name:
+            raise ValueError(f"Nurse '{name}' is already on the roster")
+        if nurse_id is None:
+            nurse_id = max(self._nurses, default=0) + 1
+        nurse = Nurse(int(nurse_id), name, home_zip, int(capacity), bool(active))
+        self._nurses[nurse.nurse_id] = nurse
+        self._ids_by_name[normalize_name(name)] = nurse.nurse_id
+        self._caseloads[nurse.nurse_id] = set()
+        return nurse
+
+    def update_nurse(self, nurse_id, home_zip=None, capacity=None, active=None):
+        """
+        Change the details of a nurse. The name is not changed, since it identifies the nurse
+        in the ASSIGNED_NURSE column; lowering the capacity keeps the rows already assigned.
+
+        Raises:
+            KeyError: When the nurse is not on the roster.
+        Returns:
+            Nurse: The updated nurse.
+        """
+        nurse = self._nurses[nurse_id]
+        if home_zip is not None:
+            nurse.home_zip = home_zip
+        if capacity is not None:
+            nurse.capacity = int(capacity)
+        if active is not None:
+            nurse.active = bool(active)
+        return nurse
+
+    def get(self, nurse_id):
+        """
+        The nurse with this ID, or None.
+        """
+        return self._nurses.get(nurse_id)
+
+    def find(self, name):
+        """
+        The nurse with this name, ignoring case and repeated spaces, or None.
+        """
+        nurse_id = self._ids_by_name.get(normalize_name(name))
+        return None if nurse_id is None else self._nurses[nurse_id]
+
+    def suggest(self, name, limit=3):
+        """
+        Names on the roster close to a name that is not, e.g. a misspelled one.
+
+        Returns:
+            list: Up to `limit` nurse names, the closest first.
+        """
+        matches = difflib.get_close_matches(normalize_name(name), list(self._ids_by_name), n=limit, cutoff=0.75)
+        return [self._nurses[self._ids_by_name[match]].name for match in matches]
+
+    def nurse_of(self, row):
+        """
+        The nurse assigned to a row, or None.
+        """
+        nurse_id = self._assignments.get(row)
+        return None if nurse_id is None else self._nurses[nurse_id]
+
+    def assignments(self):
+        """
+        The nurse ID of every assigned row, by row label; the mapping must not be modified.
+        """
+        return self._assignments
+
+    def caseload(self, nurse_id):
+        """
+        The labels of the rows assigned to a nurse; the set must not be modified.
+        """
+        return self._caseloads.get(nurse_id, frozenset())
+
+    def remaining_capacity(self, nurse_id):
+        """
+        The number of children that can still be assigned to a nurse.
+        """
+        return self._nurses[nurse_id].capacity - len(self._caseloads[nurse_id])
+
+    def counts(self):
+        """
+        The number of children assigned to each nurse having at least one.
+
+        Returns:
+            Series: Counts indexed by nurse name, the largest first.
+        """
+        counts = {self._nurses[nurse_id].name: len(rows) for nurse_id, rows in self._caseloads.items() if rows}
+        return pd.Series(counts, dtype=int).sort_values(ascending=False, kind='stable')
+
+    def check_assignment(self, nurse_id, rows):
+        """
+        Check that rows can be assigned to a nurse without exceeding their capacity.
+
+        Raises:
+            KeyError: When the nurse is not on the roster.
+            CapacityError: When the nurse is inactive or would exceed their capacity.
+        Returns:
+            list: The rows not already assigned to the nurse.
+        """
+        nurse = self._nurses[nurse_id]
+        if not nurse.active:
+            raise CapacityError(f"Nurse '{nurse.name}' is inactive")
+        new_rows = [row for row in dict.fromkeys(rows) if self._assignments.get(row) != nurse_id]
+        if len(new_rows) > self.remaining_capacity(nurse_id):
+            raise CapacityError(f"Nurse '{nurse.name}' can take {max(self.remaining_capacity(nurse_id), 0)} more "
+                                f"children, not {len(new_rows)} (capacity {nurse.capacity})")
+        return new_rows
+
+    def assign(self, row, nurse_id, enforce_capacity=True):
+        """
+        Assign a row to a nurse in the index, in O(1).
+
+        Postconditions:
+            - The row leaves the caseload of the nurse it was assigned to.
+
+        Raises:
+            CapacityError: When `enforce_capacity` and the nurse cannot take the row.
+        """
+        if enforce_capacity:
+            self.check_assignment(nurse_id, [row])
+        self.unassign(row)
+        self._caseloads[nurse_id].add(row)
+        self._assignments[row] = nurse_id
+
+    def unassign(self, row):
+        """
+        Remove a row from the caseload of its nurse, in O(1).
+
+        Returns:
+            The ID of the nurse the row was assigned to, or None.
+        """
+        nurse_id = self._assignments.pop(row, None)
+        if nurse_id is not None:
+            self._caseloads[nurse_id].discard(row)
+        return nurse_id
+
+    def assign_rows(self, rows, nurse_id):
+        """
+        Assign several rows to a nurse, all or none.
+
+        Raises:
+            CapacityError: When the nurse cannot take every row; nothing is assigned then.
+        Returns:
+            list: The rows newly assigned to the nurse.
+        """
+        new_rows = self.check_assignment(nurse_id, rows)
+        for row in new_rows:
+            self.assign(row, nurse_id, enforce_capacity=False)
+        return new_rows
+
+    def check_reassignment(self, nurse_ids):
+        """
+        Check that rows can be moved to other nurses at once, e.g. to rebalance caseloads.
+
+        Capacities are checked against the caseloads after every move, so nurses at full
+        capacity can swap children.
+
+        Args:
+            nurse_ids (dict): Row label -> ID of the nurse the row goes to.
+        Raises:
+            KeyError: When a nurse is not on the roster.
+            CapacityError: When a nurse receiving rows is inactive or would exceed their capacity.
+        Returns:
+            dict: The rows not already assigned to their nurse, with their nurse ID.
+        """
+        moves = {row: nurse_id for row, nurse_id in nurse_ids.items() if self._assignments.get(row) != nurse_id}
+        caseloads = {nurse_id: len(rows) for nurse_id, rows in self._caseloads.items()}
+        for row, nurse_id in moves.items():
+            previous = self._assignments.get(row)
+            if previous is not None:
+                caseloads[previous] -= 1
+            caseloads[nurse_id] += 1
+        for nurse_id in set(moves.values()):
+            nurse = self._nurses[nurse_id]
+            if not nurse.active:
+                raise CapacityError(f"Nurse '{nurse.name}' is inactive")
+            if caseloads[nurse_id] > nurse.capacity:
+                raise CapacityError(f"Nurse '{nurse.name}' would have {caseloads[nurse_id]} children "
+                                    f"(capacity {nurse.capacity})")
+        return moves
+
+    def reassign(self, nurse_ids):
+        """
+        Move rows to other nurses, all or none.
+
+        Raises:
+            CapacityError: See `check_reassignment`; nothing is assigned then.
+        Returns:
+            dict: The rows moved, with their nurse ID.
+        """
+        moves = self.check_reassignment(nurse_ids)
+        for row, nurse_id in moves.items():
+            self.assign(row, nurse_id, enforce_capacity=False)
+        return moves
+
+    def build_index(self, combined_data):
+        """
+        Rebuild the index from the ASSIGNED_NURSE column of freshly loaded combined data.
+
+        Postconditions:
+            - Names missing from the roster are registered with the default capacity, or their
+              caseload when it is larger, so no saved assignment is lost and the nurse can still
+              be assigned; the caller shows them so they can be merged or corrected.
+            - Capacities are not enforced on the assignments loaded.
+
+        Returns:
+            list: The nurses added to the roster.
+        """
+        self._caseloads = {nurse_id: set() for nurse_id in self._nurses}
+        self._assignments = {}
+        added = []
+        if combined_data is None or ASSIGNED_NURSE not in combined_data.columns:
+            return added
+        column = combined_data[ASSIGNED_NURSE]
+        assigned = column[column.notna()].astype(str)
+        assigned = assigned[~assigned.str.strip().isin(UNASSIGNED_VALUES)]
+        for name, labels in assigned.groupby(assigned, observed=True, sort=False).groups.items():
+            nurse = self.find(name)
+            if nurse is None:
+                nurse = self.add_nurse(name, capacity=max(DEFAULT_CAPACITY, len(labels)))
+                added.append(nurse)
+            self._caseloads[nurse.nurse_id].update(labels)
+            self._assignments.update(dict.fromkeys(labels, nurse.nurse_id))
+        if added:
+            logging.warning("Added %s nurses missing from the roster: %s", len(added),
+                            ", ".join(nurse.name for nurse in added))
+        logging.info("Indexed %s assignments of %s nurses", len(self._assignments), len(self._nurses))
+        return added
+
+    def to_frame(self):
+        """
+        The roster as a data frame with the ROSTER_COLUMNS.
+        """
+        return pd.DataFrame([[nurse.nurse_id, nurse.name, nurse.home_zip, nurse.capacity, nurse.active]
+                             for nurse in self._nurses.values()], columns=ROSTER_COLUMNS)
+
+    def save(self, path=None):
+        """
+        Write the roster, atomically, to `path` or the roster file.
+        """
+        path = path or self.path
+        temporary_path = f"{path}.tmp"
+        self.to_frame().to_csv(temporary_path, index=False)
+        os.replace(temporary_path, path)
+        logging.info("Saved %s nurses to %s", len(self._nurses), path)
+
+    @classmethod
+    def load(cls, path=ROSTER_PATH):
+        """
+        Read the roster file; a missing file gives an empty roster saved to `path` later.
+
+        Returns:
+            NurseRoster: The roster, without any assignment indexed.
+        """
+        roster = cls(path)
+        if not os.path.exists(path):
+            return roster
+        nurses = pd.read_csv(path, dtype={'Home_ZIP': str}, keep_default_na=False)
+        for row in nurses.itertuples(index=False):
+            roster.add_nurse(row.Name, row.Home_ZIP, row.Capacity, str(row.Active).lower() == 'true', row.Nurse_ID)
+        return roster
+
+
+def assign_children(combined_data, roster, rows, nurse_id):
+    """
+    Assign rows of the combined data to a nurse of the roster, checking their capacity.
+
+    Postconditions:
+        - The index and the ASSIGNED_NURSE column both hold the assignment.
+
+    Raises:
+        CapacityError: When the nurse cannot take every row; nothing is assigned then.
+    Returns:
+        list: The rows newly assigned to the nurse.
+    """
+    new_rows = roster.assign_rows(rows, nurse_id)
+    if new_rows:
+        set_values(combined_data, new_rows, ASSIGNED_NURSE, roster.get(nurse_id).name)
+    return new_rows
@@ -0,0 +1,265 @@
+"""
+On-disk partitioning helpers for combining extracts that do not fit in memory.
+
+Sources are read in chunks, their match keys are normalized, and every chunk is
+hash-partitioned (by match key or by child DOB month) into piece files on disk.
+Partition pairs are then loaded and merged one at a time, so peak memory depends
+on the partition size rather than on the size of the whole extract.
+"""
+import os
+import glob
+import logging
+from lazy_imports import lazy_import, is_available
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+from matching import (MATCH_KEYS, DATABASE_RENAMES, MEDICAID_RENAMES, normalize_keys, match_frames,
+                      build_unmatched, capitalize_names)
+from formats import detect_format, iter_table_chunks
+
+# Optional, partitions are stored as Arrow IPC when available; checked without importing it
+HAS_ARROW = is_available('pyarrow')
+
+# Rename map for each side of the combine
+SIDE_RENAMES = {'database': DATABASE_RENAMES, 'medicaid': MEDICAID_RENAMES}
+
+
+def iter_source_chunks(source, chunksize=50000):
+    """
+    Yield a source in chunks of at most `chunksize` rows with normalized column names.
+
+    Preconditions:
+        - `source` is a DataFrame or a path to a .csv, .parquet, .arrow, .xlsx or .xls file; the
+          format of a file is detected from its content.
+    Postconditions:
+        - Column names have spaces replaced by underscores, as in ReadExcelCommand.
+
+    Args:
+        source (DataFrame or str): The data to split.
+        chunksize (int): Maximum number of rows per chunk.
+    Yields:
+        DataFrame: The next chunk of rows.
+    """
+    if isinstance(source, pd.DataFrame):
+        chunks = (source.iloc[start:start + chunksize].copy() for start in range(0, len(source), chunksize))
+    else:
+        file_format = detect_format(source)
+        if file_format in ('csv', 'parquet', 'arrow'):
+            chunks = iter_table_chunks(source, chunksize)
+        elif file_format == 'xlsx':
+            chunks = _iter_excel_chunks(source, chunksize)
+        else:
+            # Legacy formats cannot be streamed, read them whole
+            chunks = iter([pd.read_excel(source)])
+
+    for chunk in chunks:
+        chunk.columns = [str(column).replace(" ", "_") for column in chunk.columns]
+        yield chunk
+
+
+def _iter_excel_chunks(path, chunksize):
+    """
+    Stream the first worksheet of an .xlsx file with openpyxl in read-only mode.
+
+    Yields:
+        DataFrame: The next chunk of rows, using the first row as header.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(column) for column in header]
+        width = len(columns)
+
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def partition_ids(df, num_partitions, partition_by='key'):
+    """
+    Compute the partition number of every row of a normalized data frame.
+
+    Preconditions:
+        - `df` went through `normalize_keys`.
+        - `partition_by` is 'key' (hash of the match keys) or 'dob_month'.
+    Postconditions:
+        - Rows with equal match keys always land in the same partition, in every process.
+
+    Returns:
+        ndarray: Partition numbers in the range [0, num_partitions).
+    """
+    if partition_by == 'dob_month':
+        dob = pd.to_datetime(df['Child_Date_of_Birth'], errors='coerce')
+        months = (dob.dt.year * 12 + dob.dt.month).fillna(0).astype('int64').to_numpy()
+        return months % num_partitions
+    if partition_by != 'key':
+        raise ValueError(f"Unknown partitioning '{partition_by}'")
+
+    hashes = pd.util.hash_pandas_object(df[MATCH_KEYS], index=False).to_numpy()
+    return (hashes % np.uint64(num_partitions)).astype(np.int64)
+
+
+class PartitionStore:
+    """
+    Directory of partition piece files, one piece per (side, partition, chunk).
+
+    Pieces are written as Arrow IPC (feather) files when pyarrow is installed and the
+    frame converts cleanly, and as pickles otherwise.
+
+    Attributes:
+        directory (str): Directory holding the piece files.
+        columns (dict): Column names of each side, used to build empty partitions.
+    """
+    def __init__(self, directory):
+        """
+        Initialize the store in an existing directory.
+
+        Preconditions:
+            - `directory` exists and is writable.
+        Postconditions:
+            - The store is empty and ready to receive pieces.
+        """
+        self.directory = directory
+        self.columns = {}
+
+    def _piece_path(self, side, partition, chunk_number, extension):
+        return os.path.join(self.directory, f"{side}-{partition:05d}-{chunk_number:06d}.{extension}")
+
+    def write(self, side, partition, chunk_number, df):
+        """
+        Write one piece of a partition to disk.
+
+        Returns:
+            str: The path of the written piece.
+        """
+        self.columns.setdefault(side, list(df.columns))
+        df = df.reset_index(drop=True)
+        if HAS_ARROW:
+            path = self._piece_path(side, partition, chunk_number, 'arrow')
+            try:
+                df.to_feather(path)
+                return path
+            except Exception:
+                # Mixed type object columns cannot be converted to Arrow
+                if os.path.exists(path):
+                    os.remove(path)
+        path = self._piece_path(side, partition, chunk_number, 'pkl')
+        df.to_pickle(path)
+        return path
+
+    def read(self, side, partition):
+        """
+        Load every piece of a partition into a single data frame.
+
+        Postconditions:
+            - Returns an empty data frame with the side's columns when the partition has no rows.
+        """
+        return read_pieces(self.partition_paths(side, partition), self.columns.get(side, []))
+
+    def partition_paths(self, side, partition):
+        """
+        List the piece files of a partition.
+        """
+        return sorted(glob.glob(os.path.join(self.directory, f"{side}-{partition:05d}-*")))
+
+
+def read_pieces(paths, columns):
+    """
+    Read and concatenate piece files written by a PartitionStore.
+
+    Returns:
+        DataFrame: The concatenated pieces, or an empty frame with `columns`.
+    """
+    frames = [pd.read_feather(path) if path.endswith('.arrow') else pd.read_pickle(path) for path in paths]
+    if not frames:
+        return pd.DataFrame(columns=columns, dtype=object)
+    return pd.concat(frames, ignore_index=True)
+
+
+def partition_source(source, side, store, num_partitions, partition_by='key', chunksize=50000):
+    """
+    Split a source into normalized partitions on disk.
+
+    Preconditions:
+        - `side` is 'database' or 'medicaid'.
+    Postconditions:
+        - Every row of the source is written to exactly one partition of `store`.
+
+    Returns:
+        int: The number of rows partitioned.
+    """
+    total_rows = 0
+    for chunk_number, chunk in enumerate(iter_source_chunks(source, chunksize)):
+        partition_chunk(chunk, side, store, chunk_number, num_partitions, partition_by)
+        total_rows += len(chunk)
+    logging.info("Partitioned %s %s rows into %s partitions.", total_rows, side, num_partitions)
+    return total_rows
+
+
+def partition_chunk(chunk, side, store, chunk_number, num_partitions, partition_by='key'):
+    """
+    Normalize one chunk of a source and write its rows to their partitions.
+
+    Postconditions:
+        - The chunk's columns are renamed for `side` and its match keys are normalized.
+
+    Returns:
+        list: The column names of the normalized chunk.
+    """
+    chunk = chunk.rename(columns=SIDE_RENAMES[side])
+    normalize_keys(chunk)
+    ids = partition_ids(chunk, num_partitions, partition_by)
+    for partition, piece in chunk.groupby(ids, sort=False):
+        store.write(side, int(partition), chunk_number, piece)
+    return list(chunk.columns)
+
+
+def normalize_and_partition_worker(directory, input_path, side, chunk_number, num_partitions, partition_by):
+    """
+    Process pool task: normalize a raw shard written by the parent and partition it by match key.
+
+    Data is exchanged through piece files in `directory` (Arrow IPC when available), so only
+    paths and column names cross the process boundary.
+
+    Returns:
+        tuple: (side, row count, column names)
+    """
+    chunk = read_pieces([input_path], [])
+    columns = partition_chunk(chunk, side, PartitionStore(directory), chunk_number, num_partitions, partition_by)
+    return side, len(chunk), columns
+
+
+def combine_partition_worker(directory, partition, database_columns, medicaid_columns):
+    """
+    Process pool task: merge one partition pair and detect its unmatched rows.
+
+    Postconditions:
+        - The matched and unmatched rows of the partition are written to `directory`.
+
+    Returns:
+        tuple: (path of the matched piece, path of the unmatched piece or None, duplicate report)
+    """
+    store = PartitionStore(directory)
+    store.columns = {'database': database_columns, 'medicaid': medicaid_columns}
+    combined_data, unmatched_database, unmatched_medicaid, duplicate_report = match_frames(
+        store.read('database', partition), store.read('medicaid', partition))
+
+    unmatched_data = build_unmatched(combined_data.columns, unmatched_database, unmatched_medicaid)
+    unmatched_path = None
+    if unmatched_data is not None:
+        unmatched_path = store.write('unmatched', partition, 0, unmatched_data)
+    matched_path = store.write('matched', partition, 0, capitalize_names(combined_data))
+    return matched_path, unmatched_path, duplicate_report
@@ -0,0 +1,149 @@
+"""
+Write-behind persistence of the combined data.
+
+Every nurse assignment used to rewrite the whole combined workbook on the UI thread. The
+saver instead marks the data dirty and writes it once, in a background thread, after no
+change happened for `SAVE_DELAY_SECONDS`: twenty rapid assignments cost one write. The
+workbook is written next to its final path and renamed over it, so a crash during a
+write leaves the previous version in place. `flush` writes pending changes immediately,
+e.g. before the workbook is encrypted on close or opened in another program.
+
+The data is copied under `lock` before it is written, and the UI thread holds the same
+lock while it changes the data, so a write never sees a half-applied change.
+"""
+import logging
+import os
+import threading
+from exporter import write_output
+
+# Quiet period after the last change before the combined data is written
+SAVE_DELAY_SECONDS = 2.0
+
+
+class CombinedDataSaver:
+    """
+    Debounced, atomic, background writer of the combined data.
+
+    Attributes:
+        path (str): The file holding the combined data.
+        source (callable): Returns the data frame to write, or None when nothing is loaded;
+            called under `lock`, so it should be quick.
+        complete (callable): Completes the copy of the data before it is written, outside
+            the lock and on the saver thread, so it must only read state the UI thread does
+            not change, e.g. the columns left on disk (see `LazyRecords`); None to write the
+            copy as is.
+        delay (float): Seconds without change before a write starts.
+        writes (int): Number of completed writes.
+        lock (Lock): Held while the data is copied for a write; hold it to change the data.
+    """
+    def __init__(self, path, source, complete=None, delay=SAVE_DELAY_SECONDS):
+        """
+        Initialize the saver; nothing is written until the data is marked dirty.
+        """
+        self.path = path
+        self.source = source
+        self.complete = complete
+        self.delay = delay
+        self.writes = 0
+        self.lock = threading.Lock()
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.Lock()
+        # Held during a write, so flush waits for a write already running
+        self._write_lock = threading.Lock()
+
+    @property
+    def dirty(self):
+        """
+        Whether changes are waiting to be written.
+        """
+        return self._dirty
+
+    def mark_dirty(self):
+        """
+        Record a change and (re)start the quiet period.
+
+        Postconditions:
+            - The data is written `delay` seconds after the last call, in a background thread.
+        """
+        with self._lock:
+            self._dirty = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self._write)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        """
+        Drop the pending changes and wait for a write already running, e.g. before a combine
+        replaces the file.
+
+        Postconditions:
+            - No write of the data dropped can replace the file after this returns.
+
+        Returns:
+            bool: Whether pending changes were dropped.
+        """
+        with self._lock:
+            dropped = self._dirty
+            self._dirty = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        # The lock flush waits on: a write already running finishes before the file is replaced
+        with self._write_lock:
+            return dropped
+
+    def flush(self):
+        """
+        Write the pending changes now and wait for any write in progress.
+
+        Returns:
+            bool: True unless the last write failed.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return self._write()
+
+    def _write(self):
+        """
+        Write the data if it is dirty: to a temporary file first, then renamed over `path`.
+
+        Postconditions:
+            - A change made after the data is copied is picked up by the next write, since it
+              marks the data dirty again.
+            - A failed write is logged and leaves the data dirty.
+
+        Returns:
+            bool: True unless the write failed.
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return True
+                self._dirty = False
+            root, extension = os.path.splitext(self.path)
+            temporary_path = f"{root}.saving{extension}"
+            try:
+                with self.lock:
+                    data = self.source()
+                    data = None if data is None else data.copy()
+                if data is None:
+                    return True
+                if self.complete is not None:
+                    data = self.complete(data)
+                write_output(data, temporary_path)
+                os.replace(temporary_path, self.path)
+            except Exception as e:
+                logging.error("Failed to save %s: %s", self.path, e)
+                with self._lock:
+                    self._dirty = True
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+                return False
+            self.writes += 1
+            logging.info("Saved the combined data to %s", self.path)
+            return True
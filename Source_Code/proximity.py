@@ -0,0 +1,251 @@
+"""
+Offline ZIP code geography: centroids, distances in miles and a proximity index of the children.
+
+The centroid of every ZIP code is read from `zip_centroids.csv`, bundled next to this
+module, so no address is ever sent to a geocoding service. The table shipped holds the
+principal Utah ZIP codes only; `build_centroid_table` (`python cli.py centroids`) rebuilds
+it with every ZIP code of the service area from the Census ZCTA Gazetteer file (tab
+separated, with GEOID, INTPTLAT and INTPTLONG columns). A ZIP code missing from the table
+is placed at the mean centroid of its 3-digit prefix area, and is unknown otherwise:
+unknown ZIP codes are never ranked by distance, but reported by the callers.
+
+`ProximityIndex` answers radius and k-nearest queries over the combined data. Children
+share the few hundred distinct ZIP codes of the extracts, so a query computes the distance
+to every distinct ZIP centroid once, vectorized, then selects the rows of the ZIP codes in
+range with one pass over their ZIP numbers: a few milliseconds for 200k children, without
+a tree to build or keep in sync.
+"""
+import logging
+import math
+import os
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Bundled table of ZIP code centroids
+ZIP_CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zip_centroids.csv')
+
+# Mean radius of the Earth, in miles
+EARTH_RADIUS_MILES = 3958.8
+
+# Distance of a child or a nurse without a usable ZIP code to anything
+UNKNOWN_DISTANCE = 1e6
+
+# 3-digit ZIP prefixes of the service area (Utah) kept from the Census Gazetteer
+SERVICE_AREA_PREFIXES = ('840', '841', '843', '844', '845', '846', '847')
+
+# Column names of the supported centroid tables: bundled, then Census Gazetteer
+CENTROID_COLUMNS = [('ZIP', 'Latitude', 'Longitude'), ('GEOID', 'INTPTLAT', 'INTPTLONG')]
+
+# Locator of the bundled table, read on first use
+_default_locator = None
+
+
+def zip_codes(values):
+    """
+    The five-digit ZIP codes of some values, e.g. 84604, '84604-1234' or 84604.0.
+
+    Returns:
+        ndarray: The ZIP codes as text, '' when a value holds none.
+    """
+    text = pd.Series(values, dtype=object).astype(str).str.replace(r'\.0$', '', regex=True)
+    return text.str.extract(r'^\s*(\d{5})', expand=False).fillna('').to_numpy(dtype=object)
+
+
+def load_centroids(path=ZIP_CENTROIDS_PATH):
+    """
+    Read a table of ZIP code centroids.
+
+    Raises:
+        ValueError: When the table has none of the CENTROID_COLUMNS layouts.
+    Returns:
+        DataFrame: Latitude and Longitude in degrees, indexed by five-digit ZIP code.
+    """
+    table = pd.read_csv(path, sep=None, engine='python', dtype=str)
+    table.columns = table.columns.str.strip()
+    for zip_column, latitude, longitude in CENTROID_COLUMNS:
+        if {zip_column, latitude, longitude} <= set(table.columns):
+            break
+    else:
+        raise ValueError(f"{path} has no ZIP, Latitude and Longitude columns")
+    centroids = pd.DataFrame({
+        'Latitude': pd.to_numeric(table[latitude], errors='coerce').to_numpy(),
+        'Longitude': pd.to_numeric(table[longitude], errors='coerce').to_numpy(),
+    }, index=pd.Index(zip_codes(table[zip_column].str.zfill(5)), name='ZIP'))
+    centroids = centroids[(centroids.index != '') & centroids.notna().all(axis=1)]
+    centroids = centroids[~centroids.index.duplicated()]
+    logging.info("Read %s ZIP code centroids from %s", len(centroids), path)
+    return centroids
+
+
+def build_centroid_table(gazetteer_path, prefixes=SERVICE_AREA_PREFIXES, path=ZIP_CENTROIDS_PATH):
+    """
+    Write the centroid table of the service area from a Census ZCTA Gazetteer file.
+
+    Postconditions:
+        - `path` holds the ZIP, Latitude and Longitude of every ZIP code of the Gazetteer
+          starting with one of `prefixes`; the bundled table is read again on next use.
+
+    Raises:
+        ValueError: When the Gazetteer has no ZIP code of the service area.
+    Returns:
+        int: The number of ZIP codes written.
+    """
+    global _default_locator
+    centroids = load_centroids(gazetteer_path)
+    centroids = centroids[centroids.index.str[:3].isin(list(prefixes))].sort_index()
+    if centroids.empty:
+        raise ValueError(f"{gazetteer_path} has no ZIP code starting with {', '.join(prefixes)}")
+    centroids.round(6).to_csv(path)
+    _default_locator = None
+    logging.info("Wrote %s ZIP code centroids to %s", len(centroids), path)
+    return len(centroids)
+
+
+def haversine_miles(latitude, longitude, other_latitude, other_longitude):
+    """
+    Great-circle distances in miles between points given in degrees; arrays are broadcast.
+    """
+    latitude, longitude, other_latitude, other_longitude = (
+        np.radians(np.asarray(value, dtype=float)) for value in (latitude, longitude, other_latitude, other_longitude))
+    a = (np.sin((other_latitude - latitude) / 2) ** 2 +
+         np.cos(latitude) * np.cos(other_latitude) * np.sin((other_longitude - longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class ZipLocator:
+    """
+    Centroids of ZIP codes, falling back to the mean centroid of their 3-digit prefix.
+    """
+    def __init__(self, centroids):
+        """
+        Initialize the locator from a table returned by `load_centroids`.
+        """
+        self.centroids = centroids
+        self.prefixes = centroids.groupby(centroids.index.str[:3])[['Latitude', 'Longitude']].mean()
+
+    def locate(self, values):
+        """
+        The centroid of each ZIP code.
+
+        Returns:
+            tuple: (latitudes, longitudes) arrays, NaN where a ZIP code cannot be located.
+        """
+        zips = zip_codes(values)
+        exact = self.centroids.reindex(zips)
+        prefix = self.prefixes.reindex([code[:3] for code in zips])
+        latitudes = exact['Latitude'].to_numpy()
+        longitudes = exact['Longitude'].to_numpy()
+        missing = np.isnan(latitudes)
+        latitudes[missing] = prefix['Latitude'].to_numpy()[missing]
+        longitudes[missing] = prefix['Longitude'].to_numpy()[missing]
+        return latitudes, longitudes
+
+
+def default_locator():
+    """
+    The locator of the bundled centroid table, read once.
+    """
+    global _default_locator
+    if _default_locator is None:
+        _default_locator = ZipLocator(load_centroids())
+    return _default_locator
+
+
+def zip_distances(child_zips, nurse_zips, locator=None):
+    """
+    Distances in miles between the centroids of ZIP codes.
+
+    Returns:
+        ndarray: The distance between every child ZIP (rows) and nurse ZIP (columns);
+            UNKNOWN_DISTANCE when either cannot be located.
+    """
+    locator = locator or default_locator()
+    child_latitudes, child_longitudes = locator.locate(child_zips)
+    nurse_latitudes, nurse_longitudes = locator.locate(nurse_zips)
+    distances = haversine_miles(child_latitudes[:, None], child_longitudes[:, None],
+                                nurse_latitudes[None, :], nurse_longitudes[None, :])
+    return np.nan_to_num(distances, nan=UNKNOWN_DISTANCE)
+
+
+class ProximityIndex:
+    """
+    Radius and nearest-neighbour queries over the ZIP codes of the combined data.
+
+    Queries take an origin, either a ZIP code or a (latitude, longitude) pair, and an
+    optional boolean mask aligned with the data, e.g. the unassigned children. Children
+    whose ZIP code cannot be located are never returned.
+
+    Attributes:
+        data (DataFrame): The combined data indexed; rebuild the index when it is replaced.
+    """
+    def __init__(self, data, locator=None):
+        """
+        Index the ZIP codes of the data.
+        """
+        self.data = data
+        self.locator = locator or default_locator()
+        values = data['ZIP'] if 'ZIP' in data.columns else [''] * len(data)
+        self._codes, self._zips = pd.factorize(zip_codes(values))
+        self._latitudes, self._longitudes = self.locator.locate(self._zips)
+        logging.info("Indexed %s rows in %s ZIP codes, %s located", len(data), len(self._zips),
+                     int((~np.isnan(self._latitudes)).sum()))
+
+    def _distances(self, origin):
+        """
+        The distance from the origin to every distinct ZIP code of the data, NaN if unknown.
+
+        Raises:
+            ValueError: When the origin is a ZIP code that cannot be located.
+        """
+        if isinstance(origin, tuple):
+            latitude, longitude = origin
+        else:
+            latitudes, longitudes = self.locator.locate([origin])
+            latitude, longitude = latitudes[0], longitudes[0]
+            if math.isnan(latitude):
+                raise ValueError(f"ZIP code '{origin}' cannot be located")
+        return haversine_miles(latitude, longitude, self._latitudes, self._longitudes)
+
+    def _rows(self, distances, selected, mask):
+        """
+        The rows in the selected ZIP codes and the mask, with their distance, the nearest first.
+        """
+        in_range = selected[self._codes]
+        if mask is not None:
+            in_range &= np.asarray(mask, dtype=bool)
+        positions = np.flatnonzero(in_range)
+        row_distances = distances[self._codes[positions]]
+        order = np.argsort(row_distances, kind='stable')
+        return pd.Series(row_distances[order], index=self.data.index[positions[order]], name='Distance')
+
+    def within(self, origin, miles, mask=None):
+        """
+        The children within `miles` of the origin.
+
+        Returns:
+            Series: The distance in miles of every child in range, indexed by row label, the nearest first.
+        """
+        distances = self._distances(origin)
+        with np.errstate(invalid='ignore'):
+            selected = distances <= miles
+        return self._rows(distances, selected, mask)
+
+    def nearest(self, origin, count, mask=None):
+        """
+        The `count` children nearest to the origin; children of one ZIP code are at the same distance.
+
+        Returns:
+            Series: The distance in miles of each child, indexed by row label, the nearest first.
+        """
+        distances = self._distances(origin)
+        codes = self._codes if mask is None else self._codes[np.asarray(mask, dtype=bool)]
+        counts = np.bincount(codes, minlength=len(self._zips))
+        order = np.argsort(np.nan_to_num(distances, nan=np.inf), kind='stable')
+        order = order[~np.isnan(distances[order])]
+        # The nearest ZIP codes holding at least `count` children
+        needed = np.searchsorted(np.cumsum(counts[order]), count) + 1
+        selected = np.zeros(len(self._zips), dtype=bool)
+        selected[order[:needed]] = True
+        return self._rows(distances, selected, mask).head(count)
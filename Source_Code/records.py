@@ -0,0 +1,98 @@
+"""
+Column projection and lazy loading of the combined data.
+
+Browsing, searching, assigning nurses and the statistical report only use a handful of
+columns. The combined data is therefore loaded with the BROWSE_COLUMNS only, and the
+other columns (address, phones, Case ID, tobacco/first-time flags, ...) are fetched by a
+`LazyRecords` accessor the first time a profile window or an export needs them.
+
+Columnar files (Parquet, Feather/Arrow IPC and the session snapshot) read the projected
+columns only, see `formats.read_table`. For .xlsx/.csv files the projection is applied while parsing: openpyxl still
+has to scan every cell of the sheet, so the load is not much faster, but the unused
+columns are never materialized.
+"""
+import logging
+import threading
+from lazy_imports import lazy_import
+from matching import RECORD_KEY
+
+pd = lazy_import('pandas')
+
+# Columns kept in memory for the combined data views, the batch assignment filters, the
+# statistical report and the incremental re-combine
+BROWSE_COLUMNS = ['Mother_ID', 'Mother_First_Name', 'Mother_Last_Name', 'Child_First_Name', 'Child_Last_Name',
+                  'Child_Date_of_Birth', 'Assigned Nurse', 'City', 'State', 'ZIP', RECORD_KEY]
+
+
+class LazyRecords:
+    """
+    Accessor completing projected combined data with the columns left on disk.
+
+    The projected data frame and the full one share their index labels (the row positions
+    of the source file), so the app may sort and filter the projected rows freely.
+
+    The remaining columns are loaded under a lock and never changed afterwards, so the
+    background saver may complete a copy of the data while a profile window loads them.
+
+    Attributes:
+        loader (callable): Returns the full data, indexed like the projected data.
+        loaded (bool): Whether the remaining columns were fetched.
+    """
+    def __init__(self, loader):
+        """
+        Initialize the accessor without reading anything.
+
+        Preconditions:
+            - `loader` returns a data frame whose index matches the projected data.
+        """
+        self.loader = loader
+        self.loaded = False
+        self._details = None
+        self._column_order = None
+        self._lock = threading.Lock()
+
+    def details(self, projected):
+        """
+        Fetch the columns missing from the projected data, once, whichever thread asks first.
+
+        Postconditions:
+            - A caller arriving during the load waits for it instead of loading again.
+
+        Returns:
+            DataFrame: The remaining columns, indexed like the projected data; never modified.
+        """
+        with self._lock:
+            if self._details is None:
+                full = self.loader()
+                self._column_order = list(full.columns)
+                self._details = full[[col for col in full.columns if col not in projected.columns]]
+                self.loaded = True
+                logging.info("Loaded %s more columns for %s records", self._details.shape[1], len(self._details))
+            return self._details
+
+    def record(self, projected, row):
+        """
+        Complete one row of the projected data with its remaining columns.
+
+        Args:
+            projected (DataFrame): The projected data the row belongs to.
+            row (Series): A row of `projected`, named by its index label.
+        Returns:
+            Series: Every column of the record; the projected values win over the file.
+        """
+        details = self.details(projected)
+        extra = details.loc[row.name] if row.name in details.index else pd.Series(index=details.columns, dtype=object)
+        return pd.concat([row, extra[[col for col in extra.index if col not in row.index]]])
+
+    def full_frame(self, projected):
+        """
+        Complete the projected data with every remaining column, e.g. before writing it.
+
+        Returns:
+            DataFrame: The projected rows and columns joined with the remaining columns, in the
+            column order of the source followed by the columns added in memory.
+        """
+        details = self.details(projected)
+        full = projected.join(details[[col for col in details.columns if col not in projected.columns]])
+        order = [col for col in self._column_order if col in full.columns]
+        return full[order + [col for col in full.columns if col not in order]]
@@ -0,0 +1,179 @@
+"""
+Compact dtypes for the source extracts and the combined data.
+
+Every column comes out of `read_excel` and the merge as object dtype, i.e. one Python object
+per cell: "UT" is stored 200k times. The schema maps the known columns to compact dtypes
+(categoricals for the low-cardinality columns, fixed-width integers for the IDs, booleans
+for the flags, datetime64 for the dates) and stores the remaining text as Arrow strings
+when pyarrow is installed. A column is only converted when every value survives the
+conversion; anything unexpected is left as it was.
+"""
+import logging
+from lazy_imports import lazy_import, is_available
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Low-cardinality text columns, stored as categoricals
+CATEGORY_COLUMNS = ['State', 'County', 'City', 'Assigned Nurse', 'Assigned_Nurse', 'Source']
+
+# Identifier columns, stored as the narrowest integer type holding them
+ID_COLUMNS = ['State_File_Number', 'Mother_ID', 'Child_ID', 'Case_ID']
+
+# Yes/no columns, stored as booleans
+FLAG_COLUMNS = ['Tobacco_Usage', 'Utah_First_Time_Man.']
+
+# Date columns, under their source and combined names, stored as datetime64
+DATE_COLUMNS = ['Child_Date_of_Birth', 'DOB', 'Child_DOB', 'Mother_DOB']
+
+
+def string_dtype():
+    """
+    The dtype of the remaining text columns: Arrow-backed strings when pyarrow is installed.
+
+    Returns:
+        The pandas dtype, or None to keep object columns.
+    """
+    return pd.StringDtype('pyarrow') if is_available('pyarrow') else None
+
+
+def _missing(column):
+    """
+    Cells treated as missing: NaN/None and the empty strings used to pad unmatched rows.
+    """
+    return column.isna() | (column.astype(object) == '')
+
+
+def to_category(column):
+    """
+    Convert a text column to a categorical; empty cells become missing values.
+    """
+    return column.mask(_missing(column)).astype('category')
+
+
+def to_id(column):
+    """
+    Convert an identifier column to int32 or int64 (nullable when values are missing).
+
+    Text identifiers with a leading zero, e.g. '00123', are kept as text: as integers they
+    would no longer equal the IDs of the source files.
+
+    Returns:
+        Series: The converted column, or None when a value is not an integer or has a leading zero.
+    """
+    missing = _missing(column)
+    if not pd.api.types.is_numeric_dtype(column):
+        text = column[~missing].astype(str).str.strip()
+        if text.str.match(r'[+-]?0\d').any():
+            return None
+    numbers = pd.to_numeric(column.mask(missing), errors='coerce')
+    if (numbers.isna() & ~missing).any() or (numbers.dropna() % 1 != 0).any():
+        return None
+    fits_int32 = numbers.dropna().between(np.iinfo(np.int32).min, np.iinfo(np.int32).max).all()
+    if missing.any():
+        return numbers.astype('Int32' if fits_int32 else 'Int64')
+    return numbers.astype(np.int32 if fits_int32 else np.int64)
+
+
+def to_flag(column):
+    """
+    Convert a yes/no column to bool (nullable 'boolean' when values are missing).
+
+    Returns:
+        Series: The converted column, or None when a value is not a boolean.
+    """
+    if column.dtype == bool:
+        return column
+    missing = _missing(column)
+    if pd.api.types.infer_dtype(column[~missing], skipna=False) not in ('boolean', 'empty'):
+        return None
+    return column.mask(missing).astype('boolean' if missing.any() else bool)
+
+
+def to_date(column):
+    """
+    Convert a date column to datetime64.
+
+    Returns:
+        Series: The converted column, or None when a value is not a date.
+    """
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column
+    missing = _missing(column)
+    values = column.mask(missing)
+    dates = pd.to_datetime(values, errors='coerce')
+    if (dates.isna() & ~missing).any():
+        # The format is inferred from the first value; parse mixed formats one by one
+        dates = pd.to_datetime(values, errors='coerce', format='mixed')
+    if (dates.isna() & ~missing).any():
+        return None
+    return dates
+
+
+def optimize_dtypes(df):
+    """
+    Convert the columns of a data frame to the compact dtypes of the schema.
+
+    Postconditions:
+        - `df` is not modified; unknown non-text columns and columns that cannot be converted
+          without losing values keep their dtype.
+
+    Returns:
+        DataFrame: A data frame with the same index, columns and values.
+    """
+    text_dtype = string_dtype()
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        if name in CATEGORY_COLUMNS:
+            converted = to_category(column)
+        elif name in ID_COLUMNS:
+            converted = to_id(column)
+        elif name in FLAG_COLUMNS:
+            converted = to_flag(column)
+        elif name in DATE_COLUMNS:
+            converted = to_date(column)
+        elif text_dtype is not None and column.dtype == object and \
+                pd.api.types.infer_dtype(column, skipna=True) == 'string':
+            converted = column.astype(text_dtype)
+        else:
+            converted = None
+        columns[name] = column if converted is None else converted
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_bytes(df):
+    """
+    Memory used by a data frame, counting the Python objects of object columns.
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+
+def apply_schema(df, label='data'):
+    """
+    Optimize the dtypes of a data frame and report the memory saved.
+
+    Returns:
+        tuple: (optimized data frame, dict with the memory in bytes before and after)
+    """
+    before = memory_bytes(df)
+    df = optimize_dtypes(df)
+    after = memory_bytes(df)
+    logging.info("Memory of %s: %.1f MB -> %.1f MB", label, before / 1024 ** 2, after / 1024 ** 2)
+    return df, {'before_bytes': before, 'after_bytes': after}
+
+
+def set_values(df, rows, column, value):
+    """
+    Assign a value to some rows of a column, extending its categories when needed.
+
+    Categoricals refuse values that are not among their categories, e.g. a nurse
+    assigned for the first time.
+
+    Postconditions:
+        - `df.loc[rows, column]` equals `value`; a missing column is created as object.
+    """
+    if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype) and value is not None \
+            and not pd.isna(value) and value not in df[column].cat.categories:
+        df[column] = df[column].cat.add_categories([value])
+    df.loc[rows, column] = value
@@ -1,11 +1,54 @@
+import argparse
+import math
+import os
 import pandas as pd
+import numpy as np
 from faker import Faker
 from datetime import timedelta, date
 import random
+from functools import lru_cache
+from formats import ChunkedFileWriter, EXCEL_MAX_ROWS, OUTPUT_FORMATS
+from proximity import SERVICE_AREA_PREFIXES, load_centroids
 
 # Initialize Faker instance
 fake = Faker()
 
+# Columns of the generated sheets
+DATABASE_COLUMNS = [
+    "Child Last Name", "Child First Name", "Child Middle Name", "DOB",
+    "Mother Last Name", "Mother First Name", "State File Number"
+]
+MEDICAID_COLUMNS = [
+    "Mother First Name", "Last Name", "Mother DOB", "Mother ID", "Child ID", "Child DOB",
+    "Case ID", "Phone #", "Mobile #", "Street", "City", "State", "ZIP",
+    "County", "Tobacco Usage", "Utah First Time Man."
+]
+
+
+# Oldest generated child, in days (3 years and 9 months)
+MAX_CHILD_AGE_DAYS = 365 * 3 + 9 * 30
+
+# Error types of the noise model. Typos, swapped names, shifted birth dates and hyphenated
+# surnames alter the Medicaid copy of a family; duplicate rows are re-sent rows on both sides;
+# twins add a sibling sharing the mother and birth date on both sides.
+NOISE_TYPES = ['typo', 'swapped_names', 'dob_off_by_one', 'hyphenated_surname', 'duplicate_row', 'twin']
+
+# Columns of the ground-truth match labels, named like the combined data columns
+LABEL_COLUMNS = ['State_File_Number', 'Child_ID', 'Noise']
+
+# Function to list the ZIP codes the generated addresses are drawn from
+@lru_cache(maxsize=1)
+def service_area_zip_codes():
+    """
+    The ZIP codes of the service area in the bundled centroid table, so that every
+    generated address can be located by `proximity.py`.
+
+    Returns:
+        tuple: The ZIP codes, sorted.
+    """
+    zips = load_centroids().index
+    return tuple(sorted(zips[zips.str[:3].isin(list(SERVICE_AREA_PREFIXES))]))
+
 # Function to generate birthdates of children under 4 years
 def generate_child_dob():
     today = date.today()
@@ -44,13 +87,16 @@ def generate_database_data(shared_data):
             entry["child_last_name"], entry["child_first_name"], entry["child_middle_name"], entry["child_dob"], 
             entry["mom_last_name"], entry["mom_first_name"], state_file_number
         ])
-    return pd.DataFrame(database_data, columns=[
-        "Child Last Name", "Child First Name", "Child Middle Name", "DOB", 
-        "Mother Last Name", "Mother First Name", "State File Number"
-    ])
+    return pd.DataFrame(database_data, columns=DATABASE_COLUMNS)
 
 # Function to generate the "Medicaid List" data with added Mother ID
-def generate_medicaid_data(shared_data, unmatched_entries=0, unmatched_target="both"):
+def generate_medicaid_data(shared_data, unmatched_entries=0, unmatched_target="both", noise=None, seed=0):
+    """
+    Generate the Database and Medicaid sheets from the shared families.
+
+    When `noise` maps error types of NOISE_TYPES to rates, the noise model is applied to the
+    shared families and the ground-truth match labels are returned as a third data frame.
+    """
     database_data = []
     medicaid_data = []
     for entry in shared_data:
@@ -62,7 +108,7 @@ def generate_medicaid_data(shared_data, unmatched_entries=0, unmatched_target="b
         street = fake.street_address()
         city = fake.city()
         state = "UT"
-        zip_code = fake.zipcode()
+        zip_code = fake.random_element(service_area_zip_codes())
         county = "Utah County"
         tobacco_usage = fake.boolean(chance_of_getting_true=10)
         utah_first_time_man = fake.boolean(chance_of_getting_true=20)
@@ -110,7 +156,7 @@ def generate_medicaid_data(shared_data, unmatched_entries=0, unmatched_target="b
             street = fake.street_address()
             city = fake.city()
             state = "UT"
-            zip_code = fake.zipcode()
+            zip_code = fake.random_element(service_area_zip_codes())
             county = "Utah County"
             tobacco_usage = fake.boolean(chance_of_getting_true=10)
             utah_first_time_man = fake.boolean(chance_of_getting_true=20)
@@ -120,17 +166,11 @@ def generate_medicaid_data(shared_data, unmatched_entries=0, unmatched_target="b
                 county, tobacco_usage, utah_first_time_man
             ])
     
-    return (
-        pd.DataFrame(database_data, columns=[
-            "Child Last Name", "Child First Name", "Child Middle Name", "DOB", 
-            "Mother Last Name", "Mother First Name", "State File Number"
-        ]),
-        pd.DataFrame(medicaid_data, columns=[
-            "Mother First Name", "Last Name", "Mother DOB", "Mother ID", "Child ID", "Child DOB", 
-            "Case ID", "Phone #", "Mobile #", "Street", "City", "State", "ZIP", 
-            "County", "Tobacco Usage", "Utah First Time Man."
-        ])
-    )
+    database_data = pd.DataFrame(database_data, columns=DATABASE_COLUMNS)
+    medicaid_data = pd.DataFrame(medicaid_data, columns=MEDICAID_COLUMNS)
+    if noise is None:
+        return database_data, medicaid_data
+    return apply_noise(database_data, medicaid_data, noise, np.random.default_rng(seed), matched_rows=len(shared_data))
 
 # Function to verify that all names are present in both sheets
 def verify_names(database_file, medicaid_data_file):
@@ -181,6 +221,405 @@ def generate_excel_files():
     # Verify that all names are present in both files
     verify_names(database_filename, medicaid_data_filename)
 
+# Function to pre-sample the value pools of the vectorized generator
+@lru_cache(maxsize=8)
+def build_pools(seed=0, pool_size=5000):
+    """
+    Sample names and address parts once with Faker, for vectorized sampling by row.
+
+    Faker draws names by frequency, so the pools keep realistic repetitions (common names
+    appear in many families). The same seed always gives the same pools; they are cached
+    and must not be modified.
+
+    Returns:
+        dict: Arrays of first names, last names, street names, cities and ZIP codes.
+    """
+    faker = Faker()
+    faker.seed_instance(seed)
+    return {
+        'first_names': np.array(sorted({faker.first_name() for _ in range(pool_size)}), dtype=object),
+        'last_names': np.array(sorted({faker.last_name() for _ in range(pool_size)}), dtype=object),
+        'streets': np.array(sorted({faker.street_name() for _ in range(pool_size // 5)}), dtype=object),
+        'cities': np.array(sorted({faker.city() for _ in range(pool_size // 5)}), dtype=object),
+        'zip_codes': np.array(service_area_zip_codes(), dtype=object),
+    }
+
+# Function to derive unique pseudo-random IDs from row positions
+def scrambled_ids(positions, seed, salt, digits=9):
+    """
+    Map row positions to unique IDs of `digits` digits with an affine bijection.
+
+    Every (seed, salt) pair gives a different permutation, and the ID of a row only depends
+    on its position, so chunks can be generated independently without repeating an ID.
+
+    Returns:
+        ndarray: int64 IDs aligned with `positions`.
+    """
+    space = 9 * 10 ** (digits - 1)
+    keys = np.random.default_rng([seed, salt]).integers(10 ** 5, 10 ** 7, size=2)
+    multiplier = int(keys[0])
+    while math.gcd(multiplier, space) != 1:
+        multiplier += 1
+    return 10 ** (digits - 1) + (positions.astype(np.int64) * multiplier + int(keys[1])) % space
+
+# Function to format day offsets before a reference date as 'YYYY-MM-DD' strings
+def days_before(reference_date, days):
+    return np.datetime_as_string(np.datetime64(reference_date, 'D') - days.astype('timedelta64[D]'), unit='D').astype(object)
+
+# Function to format random phone numbers like "(801)555-0123"
+def random_phone_numbers(rng, count):
+    # Build the ASCII bytes of every number at once, far cheaper than concatenating strings
+    digits = rng.integers(0, 10, size=(count, 10), dtype=np.uint8) + ord("0")
+    digits[:, [0, 3]] = rng.integers(2, 10, size=(count, 2), dtype=np.uint8) + ord("0")
+    text = np.empty((count, 13), dtype=np.uint8)
+    text[:, 0], text[:, 4], text[:, 8] = ord("("), ord(")"), ord("-")
+    text[:, 1:4], text[:, 5:8], text[:, 9:13] = digits[:, 0:3], digits[:, 3:6], digits[:, 6:10]
+    return text.view("S13").ravel().astype(str).astype(object)
+
+# Function to generate the families of a range of row positions, vectorized
+def generate_families(pools, rng, positions, seed, reference_date):
+    """
+    Draw every field of the families at `positions` from the pools.
+
+    Returns:
+        dict: One array per field, aligned with `positions`.
+    """
+    count = len(positions)
+
+    def pick(pool):
+        return pools[pool][rng.integers(0, len(pools[pool]), size=count)]
+
+    return {
+        "child_last_name": pick('last_names'),
+        "child_first_name": pick('first_names'),
+        "child_middle_name": pick('first_names'),
+        "mom_last_name": pick('last_names'),
+        "mom_first_name": pick('first_names'),
+        "child_dob": days_before(reference_date, rng.integers(0, MAX_CHILD_AGE_DAYS + 1, size=count)),
+        "mom_dob": days_before(reference_date, rng.integers(18 * 365, 50 * 365 + 1, size=count)),
+        "mother_id": scrambled_ids(positions, seed, 1),
+        "state_file_number": scrambled_ids(positions, seed, 2),
+        # Five digit Child IDs as in generate_medicaid_data cannot stay unique at scale
+        "child_id": scrambled_ids(positions, seed, 3),
+        "case_id": scrambled_ids(positions, seed, 4),
+        "phone_number": random_phone_numbers(rng, count),
+        "mobile_number": random_phone_numbers(rng, count),
+        "street": rng.integers(100, 10000, size=count).astype(str).astype(object) + " " + pick('streets'),
+        "city": pick('cities'),
+        "zip_code": pick('zip_codes'),
+        "tobacco_usage": rng.random(count) < 0.1,
+        "utah_first_time_man": rng.random(count) < 0.2,
+    }
+
+# Functions to lay out generated families as the two sheets
+def database_frame(families):
+    return pd.DataFrame(dict(zip(DATABASE_COLUMNS, [
+        families["child_last_name"], families["child_first_name"], families["child_middle_name"], families["child_dob"],
+        families["mom_last_name"], families["mom_first_name"], families["state_file_number"]
+    ])))
+
+def medicaid_frame(families):
+    count = len(families["mother_id"])
+    return pd.DataFrame(dict(zip(MEDICAID_COLUMNS, [
+        families["mom_first_name"], families["mom_last_name"], families["mom_dob"], families["mother_id"],
+        families["child_id"], families["child_dob"], families["case_id"], families["phone_number"],
+        families["mobile_number"], families["street"], families["city"], np.full(count, "UT", dtype=object),
+        families["zip_code"], np.full(count, "Utah County", dtype=object), families["tobacco_usage"],
+        families["utah_first_time_man"]
+    ])))
+
+# Function to introduce typos, vectorized on the code points of the strings
+def introduce_typos(values, rng):
+    """
+    Swap two adjacent letters or replace one letter by a random lower case letter in every value.
+
+    Returns:
+        ndarray: The altered strings (object dtype), aligned with `values`.
+    """
+    values = np.asarray(values, dtype=str)
+    count = len(values)
+    if count == 0:
+        return values.astype(object)
+    width = max(values.dtype.itemsize // 4, 2)
+    codes = values.astype(f"U{width}").view(np.uint32).reshape(count, width).copy()
+    lengths = np.char.str_len(values)
+    rows = np.arange(count)
+    position = np.minimum((rng.random(count) * np.maximum(lengths - 1, 1)).astype(int), width - 2)
+
+    transpose = (rng.random(count) < 0.5) & (lengths > 1)
+    left, right = codes[rows, position], codes[rows, position + 1]
+    codes[rows[transpose], position[transpose]] = right[transpose]
+    codes[rows[transpose], position[transpose] + 1] = left[transpose]
+
+    substitute = ~transpose & (lengths > 0)
+    letters = rng.integers(ord("a"), ord("z") + 1, size=count).astype(np.uint32)
+    codes[rows[substitute], position[substitute]] = letters[substitute]
+    return codes.view(f"U{width}").ravel().astype(object)
+
+# Function to apply the noise model to generated sheets
+def apply_noise(database_data, medicaid_data, rates, rng, matched_rows=None, new_ids=None):
+    """
+    Inject realistic matching errors into generated sheets and label the true matches.
+
+    Preconditions:
+        - The first `matched_rows` rows of both sheets are the same families, in the same order
+          (defaults to the whole Database sheet).
+        - `rates` maps error types of NOISE_TYPES to the share of families affected.
+    Postconditions:
+        - Twins and duplicate rows are appended to the sheets; the other errors alter the
+          Medicaid rows in place. Several errors can hit the same family.
+
+    Args:
+        new_ids (callable, optional): Called with the rows of the twinned families, returns the
+            (State File Numbers, Child IDs) of the twins. Defaults to numbers above the largest
+            existing ones.
+    Returns:
+        tuple: (database_data, medicaid_data, labels); `labels` pairs the State File Number and
+        Child ID of every true match with the comma separated errors of its family.
+    """
+    unknown = set(rates) - set(NOISE_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown noise types: {sorted(unknown)}")
+    matched_rows = len(database_data) if matched_rows is None else matched_rows
+    database_data = database_data.reset_index(drop=True)
+    medicaid_data = medicaid_data.reset_index(drop=True).copy()
+    masks = {noise_type: rng.random(matched_rows) < rates.get(noise_type, 0.0) for noise_type in NOISE_TYPES}
+    family = pd.RangeIndex(matched_rows)
+
+    def noisy(noise_type):
+        return family[masks[noise_type]]
+
+    # Errors made while typing the mother's name or the birth date on the Medicaid side
+    rows = noisy('typo')
+    typo_first = rng.random(len(rows)) < 0.5
+    for column, selected in [("Mother First Name", rows[typo_first]), ("Last Name", rows[~typo_first])]:
+        medicaid_data.loc[selected, column] = introduce_typos(medicaid_data.loc[selected, column], rng)
+
+    rows = noisy('swapped_names')
+    medicaid_data.loc[rows, ["Mother First Name", "Last Name"]] = medicaid_data.loc[rows, ["Last Name", "Mother First Name"]].to_numpy()
+
+    rows = noisy('dob_off_by_one')
+    shift = pd.to_timedelta(rng.choice([-1, 1], size=len(rows)), unit="D")
+    shifted = pd.to_datetime(medicaid_data.loc[rows, "Child DOB"]) + shift
+    # Keep the type of the sheet: text dates from the vectorized generator, dates from the legacy one
+    text_dates = len(rows) and isinstance(medicaid_data.at[rows[0], "Child DOB"], str)
+    medicaid_data.loc[rows, "Child DOB"] = shifted.dt.strftime("%Y-%m-%d") if text_dates else shifted.dt.date
+
+    rows = noisy('hyphenated_surname')
+    second = medicaid_data["Last Name"].to_numpy()[rng.integers(0, len(medicaid_data), size=len(rows))]
+    medicaid_data.loc[rows, "Last Name"] = medicaid_data.loc[rows, "Last Name"] + "-" + second
+
+    labels = pd.DataFrame({
+        'State_File_Number': database_data["State File Number"].to_numpy()[:matched_rows],
+        'Child_ID': medicaid_data["Child ID"].to_numpy()[:matched_rows],
+    })
+    applied = np.full(matched_rows, "", dtype=object)
+    for noise_type in NOISE_TYPES:
+        applied[masks[noise_type]] = applied[masks[noise_type]] + "," + noise_type
+    labels['Noise'] = pd.Series(applied).str.lstrip(",").to_numpy()
+
+    # Twins: a sibling with the same mother and birth date, on both sides
+    rows = noisy('twin')
+    if len(rows):
+        if new_ids is None:
+            new_ids = lambda rows: (int(database_data["State File Number"].max()) + 1 + np.arange(len(rows)),
+                                    int(medicaid_data["Child ID"].max()) + 1 + np.arange(len(rows)))
+        state_file_numbers, child_ids = new_ids(np.asarray(rows))
+        first_names = database_data["Child First Name"].to_numpy()
+        database_twins = database_data.loc[rows].assign(**{
+            "Child First Name": first_names[rng.integers(0, len(first_names), size=len(rows))],
+            "State File Number": state_file_numbers})
+        medicaid_twins = medicaid_data.loc[rows].assign(**{"Child ID": child_ids})
+        database_data = pd.concat([database_data, database_twins], ignore_index=True)
+        medicaid_data = pd.concat([medicaid_data, medicaid_twins], ignore_index=True)
+        labels = pd.concat([labels, pd.DataFrame({'State_File_Number': state_file_numbers, 'Child_ID': child_ids,
+                                                  'Noise': 'twin'})], ignore_index=True)
+
+    # Rows sent twice, on both sides
+    rows = noisy('duplicate_row')
+    if len(rows):
+        on_database = rng.random(len(rows)) < 0.5
+        database_data = pd.concat([database_data, database_data.loc[rows[on_database]]], ignore_index=True)
+        medicaid_data = pd.concat([medicaid_data, medicaid_data.loc[rows[~on_database]]], ignore_index=True)
+
+    return database_data, medicaid_data, labels[LABEL_COLUMNS]
+
+# Function to score the matches of a combine against the ground-truth labels
+def score_matches(combined_data, labels):
+    """
+    Compute the precision and recall of the combined data against the ground-truth labels.
+
+    Preconditions:
+        - `combined_data` has State_File_Number and Child_ID columns, as produced by CombineDataCommand.
+
+    Returns:
+        dict: Precision, recall, the true/false positive counts and the recall of every error type.
+    """
+    pairs = combined_data[['State_File_Number', 'Child_ID']].astype('int64').drop_duplicates()
+    truth = labels.astype({'State_File_Number': 'int64', 'Child_ID': 'int64'})
+    found = truth.merge(pairs, on=['State_File_Number', 'Child_ID'], how='left', indicator=True)['_merge'] == 'both'
+    true_positives = int(found.sum())
+
+    noise = truth['Noise'].fillna('')
+    recall_by_noise = {'clean': float(found[noise == ''].mean()) if (noise == '').any() else None}
+    for noise_type in NOISE_TYPES:
+        affected = noise.str.contains(noise_type, regex=False)
+        recall_by_noise[noise_type] = float(found[affected].mean()) if affected.any() else None
+
+    return {
+        'precision': true_positives / len(pairs) if len(pairs) else 1.0,
+        'recall': true_positives / len(truth) if len(truth) else 1.0,
+        'true_positives': true_positives,
+        'false_positives': len(pairs) - true_positives,
+        'false_negatives': len(truth) - true_positives,
+        'recall_by_noise': recall_by_noise,
+    }
+
+# Function to generate both sheets chunk by chunk
+def iter_generated_chunks(num_entries, unmatched_ratio=0.0, unmatched_target="both", seed=0, chunk_rows=100000,
+                          reference_date=None, pools=None, noise=None):
+    """
+    Generate the Database and Medicaid sheets in chunks with vectorized sampling.
+
+    Matching families come first, followed by the unmatched families of each side, like
+    `generate_medicaid_data`. The output only depends on the arguments (a fixed
+    `reference_date` makes it independent of the day of the run as well).
+
+    Args:
+        num_entries (int): Number of families present in both sheets.
+        unmatched_ratio (float): Unmatched families added per side, relative to `num_entries`.
+        unmatched_target (str): "database", "medicaid" or "both".
+        seed (int): Seed of the pools and of the sampling.
+        chunk_rows (int): Maximum number of rows generated at once.
+        reference_date (date, optional): Date the ages are relative to. Defaults to today.
+        noise (dict, optional): Rates of the error types of NOISE_TYPES applied to the matching
+            families, see `apply_noise`. Twins get 10 digit IDs, so they never collide with
+            the 9 digit IDs of the other families.
+    Yields:
+        tuple: (database chunk, medicaid chunk, labels chunk); either sheet chunk can be empty,
+        the labels chunk is None without a noise model.
+    """
+    reference_date = reference_date or date.today()
+    pools = pools or build_pools(seed)
+    unmatched_entries = int(round(num_entries * unmatched_ratio))
+    database_unmatched = unmatched_entries if unmatched_target in ["database", "both"] else 0
+    medicaid_unmatched = unmatched_entries if unmatched_target in ["medicaid", "both"] else 0
+
+    # Row position ranges of the matching families and of the unmatched families of each side
+    ranges = [(0, num_entries, True, True),
+              (num_entries, num_entries + database_unmatched, True, False),
+              (num_entries + database_unmatched, num_entries + database_unmatched + medicaid_unmatched, False, True)]
+    for start, stop, to_database, to_medicaid in ranges:
+        for chunk_start in range(start, stop, chunk_rows):
+            positions = np.arange(chunk_start, min(chunk_start + chunk_rows, stop))
+            rng = np.random.default_rng([seed, chunk_start])
+            families = generate_families(pools, rng, positions, seed, reference_date)
+            database_chunk = database_frame(families) if to_database else pd.DataFrame(columns=DATABASE_COLUMNS)
+            medicaid_chunk = medicaid_frame(families) if to_medicaid else pd.DataFrame(columns=MEDICAID_COLUMNS)
+            labels_chunk = None
+            if noise is not None:
+                if to_database and to_medicaid:
+                    def twin_ids(rows, positions=positions):
+                        return (scrambled_ids(positions[rows], seed, 5, digits=10),
+                                scrambled_ids(positions[rows], seed, 6, digits=10))
+                    database_chunk, medicaid_chunk, labels_chunk = apply_noise(database_chunk, medicaid_chunk, noise, rng,
+                                                                               new_ids=twin_ids)
+                else:
+                    labels_chunk = pd.DataFrame(columns=LABEL_COLUMNS)
+            yield database_chunk, medicaid_chunk, labels_chunk
+
+# Function to generate both sheets in memory with the vectorized generator
+def generate_data(num_entries, unmatched_ratio=0.0, unmatched_target="both", seed=0, chunk_rows=100000, reference_date=None,
+                  noise=None):
+    """
+    Generate the Database and Medicaid sheets in memory, see `iter_generated_chunks`.
+
+    Returns:
+        tuple: (database_data, medicaid_data) with the same columns as `generate_medicaid_data`,
+        followed by the ground-truth match labels when `noise` is given.
+    """
+    database_chunks, medicaid_chunks, labels_chunks = [], [], []
+    for database_chunk, medicaid_chunk, labels_chunk in iter_generated_chunks(
+            num_entries, unmatched_ratio, unmatched_target, seed, chunk_rows, reference_date, noise=noise):
+        database_chunks.append(database_chunk)
+        medicaid_chunks.append(medicaid_chunk)
+        labels_chunks.append(labels_chunk)
+    data = (
+        pd.concat([chunk for chunk in database_chunks if not chunk.empty] or [database_chunks[0]], ignore_index=True),
+        pd.concat([chunk for chunk in medicaid_chunks if not chunk.empty] or [medicaid_chunks[0]], ignore_index=True)
+    )
+    if noise is None:
+        return data
+    return data + (pd.concat([chunk for chunk in labels_chunks if not chunk.empty] or [labels_chunks[0]], ignore_index=True),)
+
+# Function to stream both generated sheets to disk
+def write_generated_files(num_entries, unmatched_ratio=0.0, unmatched_target="both", seed=0, output_format="xlsx",
+                          output_dir=".", chunk_rows=100000, reference_date=None, noise=None):
+    """
+    Generate both sheets chunk by chunk and append every chunk to its output file.
+
+    Postconditions:
+        - `database_data.<format>` and `medicaid_data.<format>` are written to `output_dir`;
+          memory use depends on `chunk_rows`, not on `num_entries`.
+        - With a noise model, the ground-truth labels are written to `match_labels.<format>`.
+
+    Returns:
+        tuple: (database file path, medicaid file path), followed by the labels file path when
+        `noise` is given.
+    """
+    paths = (os.path.join(output_dir, f"database_data.{output_format}"),
+             os.path.join(output_dir, f"medicaid_data.{output_format}"))
+    if noise is not None:
+        paths += (os.path.join(output_dir, f"match_labels.{output_format}"),)
+    writers = [ChunkedFileWriter(path, output_format) for path in paths]
+    try:
+        for chunks in iter_generated_chunks(num_entries, unmatched_ratio, unmatched_target, seed, chunk_rows, reference_date,
+                                            noise=noise):
+            for writer, chunk in zip(writers, chunks):
+                writer.write(chunk)
+    finally:
+        for writer in writers:
+            writer.close()
+    return paths
+
+# Function to parse the command-line arguments
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate synthetic Database and Medicaid sheets.")
+    parser.add_argument("--rows", type=int, default=1000, help="Number of families present in both sheets.")
+    parser.add_argument("--unmatched-ratio", type=float, default=0.0, help="Unmatched families per side, relative to --rows.")
+    parser.add_argument("--unmatched-target", choices=["database", "medicaid", "both"], default="both",
+                        help="Sheets receiving unmatched families.")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="xlsx", help="Output file format.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated data.")
+    parser.add_argument("--reference-date", type=date.fromisoformat, default=None,
+                        help="Date the ages are relative to (YYYY-MM-DD). Defaults to today.")
+    parser.add_argument("--chunk-rows", type=int, default=100000, help="Rows generated and written at once.")
+    parser.add_argument("--output-dir", default=".", help="Directory of the generated files.")
+    parser.add_argument("--interactive", action="store_true", help="Prompt for the settings and use the Faker generator.")
+    noise = parser.add_argument_group("noise model", "Share of the matching families affected by each error type. "
+                                      "Any rate writes the ground-truth labels to match_labels.<format>.")
+    noise.add_argument("--noise-rate", type=float, default=None, help="Default rate of every error type.")
+    for noise_type in NOISE_TYPES:
+        noise.add_argument(f"--{noise_type.replace('_', '-')}-rate", type=float, default=None, dest=f"{noise_type}_rate",
+                           help=f"Rate of the {noise_type.replace('_', ' ')} errors.")
+    return parser
+
+# Function to build the noise model from the parsed arguments, None when no rate is given
+def noise_from_args(args):
+    rates = {noise_type: getattr(args, f"{noise_type}_rate") for noise_type in NOISE_TYPES}
+    if args.noise_rate is None and all(rate is None for rate in rates.values()):
+        return None
+    return {noise_type: (args.noise_rate or 0.0) if rate is None else rate for noise_type, rate in rates.items()}
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.interactive:
+        generate_excel_files()
+        return
+    paths = write_generated_files(args.rows, args.unmatched_ratio, args.unmatched_target, args.seed, args.format,
+                                  args.output_dir, args.chunk_rows, args.reference_date, noise_from_args(args))
+    print(f"Files created: {', '.join(paths)}")
+
 # Run the program
 if __name__ == "__main__":
-    generate_excel_files()
+    main()
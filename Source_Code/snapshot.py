@@ -0,0 +1,169 @@
+"""
+Encrypted binary snapshot of the working session.
+
+Reloading `combined_matched_data.xlsx` means decrypting it on disk and parsing the whole
+workbook again. When the application closes, the combined data (assignments and the
+derived columns such as the parsed birth dates and ages included, with their dtypes) is
+also written as one Arrow IPC file, encrypted in memory with the application key. The
+next launch decrypts it into memory and reads it without copying or parsing. The snapshot
+records the size and modification time of the workbook it mirrors and is ignored as soon
+as the workbook changed, so the workbook stays the source of truth.
+"""
+import io
+import json
+import logging
+import os
+import pickle
+from datetime import datetime
+from lazy_imports import lazy_import, is_available
+from app_crypto import Crypto
+
+pd = lazy_import('pandas')
+
+# Snapshot of the session, next to the combined data workbook
+SNAPSHOT_PATH = 'session_snapshot.bin'
+
+# Bumped when the snapshot layout changes; other versions are ignored
+SNAPSHOT_VERSION = 1
+
+# Schema metadata key holding the snapshot description
+METADATA_KEY = b'session_snapshot'
+
+# Arrow IPC files start with this magic; pickled snapshots do not
+ARROW_MAGIC = b'ARROW1'
+
+
+def source_fingerprint(path):
+    """
+    Describe the current state of the workbook mirrored by the snapshot.
+
+    Returns:
+        dict: The size and modification time of `path`, or None when it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def serialize_frame(df, metadata):
+    """
+    Serialize a data frame and its snapshot description.
+
+    Postconditions:
+        - Frames Arrow can represent are written as an Arrow IPC file; frames with mixed type
+          object columns, or any frame when pyarrow is not installed, are pickled.
+
+    Returns:
+        bytes: The serialized snapshot.
+    """
+    if is_available('pyarrow'):
+        import pyarrow as pa
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            logging.info("Snapshot stored as a pickle, the data cannot be converted to Arrow: %s", e)
+        else:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                                   METADATA_KEY: json.dumps(metadata).encode()})
+            sink = io.BytesIO()
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            return sink.getvalue()
+    return pickle.dumps({'metadata': metadata, 'data': df}, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def deserialize_frame(payload, columns=None):
+    """
+    Read a snapshot written by `serialize_frame`.
+
+    Args:
+        columns (list, optional): Only convert these columns (those present), in snapshot order.
+    Returns:
+        tuple: (data frame, snapshot description)
+    """
+    if payload[:len(ARROW_MAGIC)] == ARROW_MAGIC:
+        import pyarrow as pa
+        # Zero-copy: the record batches point into the decrypted buffer
+        table = pa.ipc.open_file(pa.py_buffer(payload)).read_all()
+        metadata = json.loads(table.schema.metadata[METADATA_KEY])
+        if columns is not None:
+            # The index columns are kept so the rows keep their labels
+            index_columns = [name for name in json.loads(table.schema.metadata[b'pandas'])['index_columns']
+                             if isinstance(name, str)]
+            table = table.select([name for name in table.column_names if name in columns or name in index_columns])
+        # Text columns of the compact schema come back Arrow-backed, not as Python strings
+        with pd.option_context('mode.string_storage', 'pyarrow'):
+            return table.to_pandas(), metadata
+    snapshot = pickle.loads(payload)
+    data = snapshot['data']
+    if columns is not None:
+        data = data[[col for col in data.columns if col in columns]]
+    return data, snapshot['metadata']
+
+
+def write_snapshot(combined_data, source_path, key, snapshot_path=SNAPSHOT_PATH):
+    """
+    Write the encrypted snapshot of the combined data.
+
+    Preconditions:
+        - `source_path` is the workbook holding the same data, in its final state (already
+          encrypted when the session closes).
+    Postconditions:
+        - `snapshot_path` is replaced atomically; an interrupted write leaves the previous
+          snapshot in place.
+
+    Returns:
+        str: The path of the snapshot.
+    """
+    metadata = {
+        'version': SNAPSHOT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'rows': len(combined_data),
+        'source_path': os.path.abspath(source_path),
+        'source': source_fingerprint(source_path),
+    }
+    encrypted = Crypto.encrypt_bytes(serialize_frame(combined_data, metadata), key)
+    temporary_path = f"{snapshot_path}.tmp"
+    with open(temporary_path, 'wb') as file:
+        file.write(encrypted)
+    os.replace(temporary_path, snapshot_path)
+    logging.info("Session snapshot of %s rows saved to %s", len(combined_data), snapshot_path)
+    return snapshot_path
+
+
+def read_snapshot(source_path, key, snapshot_path=SNAPSHOT_PATH, columns=None):
+    """
+    Restore the combined data from the snapshot if it still mirrors the workbook.
+
+    Args:
+        source_path (str): The workbook mirrored by the snapshot, or None to skip the staleness
+            check, e.g. to fetch more columns of a snapshot restored earlier in the session.
+        columns (list, optional): Project the combined data on these columns.
+
+    Postconditions:
+        - A missing, stale, unreadable or outdated snapshot is ignored (and logged); the
+          caller then falls back to the workbook.
+
+    Returns:
+        DataFrame: The combined data, or None when the snapshot cannot be used.
+    """
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        with open(snapshot_path, 'rb') as file:
+            payload = Crypto.decrypt_bytes(file.read(), key)
+        combined_data, metadata = deserialize_frame(payload, columns)
+    except Exception as e:
+        logging.warning("Ignoring unreadable session snapshot %s: %s", snapshot_path, e)
+        return None
+
+    if metadata.get('version') != SNAPSHOT_VERSION:
+        logging.info("Ignoring session snapshot of version %s", metadata.get('version'))
+        return None
+    current = None if source_path is None else source_fingerprint(source_path)
+    if source_path is not None and (current is None or metadata.get('source') != current):
+        logging.info("Ignoring stale session snapshot, %s changed since %s", source_path, metadata.get('created'))
+        return None
+    logging.info("Session restored from %s (%s rows)", snapshot_path, len(combined_data))
+    return combined_data
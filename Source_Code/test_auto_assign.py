@@ -0,0 +1,150 @@
+import unittest
+import time
+import numpy as np
+import pandas as pd
+from nurse_roster import NurseRoster, CapacityError, assign_children
+from auto_assign import plan_assignments
+from invoker import NurseAssignmentCommand
+from schema import apply_schema
+
+
+def make_children(mothers, zips, nurses=None):
+    return pd.DataFrame({
+        'Mother_ID': mothers,
+        'Child_First_Name': [f"Child {row}" for row in range(len(mothers))],
+        'Child_Last_Name': 'Doe',
+        'ZIP': zips,
+        'Assigned Nurse': nurses if nurses is not None else [None] * len(mothers),
+    })
+
+
+def make_roster(combined_data, *nurses):
+    roster = NurseRoster()
+    for name, home_zip, capacity in nurses:
+        roster.add_nurse(name, home_zip, capacity)
+    roster.build_index(combined_data)
+    return roster
+
+
+def nurse_names(plan):
+    return plan.changes['Nurse'].to_dict()
+
+
+class TestPlanAssignments(unittest.TestCase):
+    def test_children_go_to_the_nearest_nurse_with_room(self):
+        combined_data = make_children([1, 2, 3, 4], ['84604', '84604', '84101', '84101'])
+        roster = make_roster(combined_data, ('Provo', '84604', 5), ('Salt Lake', '84101', 5))
+        plan = plan_assignments(combined_data, roster)
+        self.assertEqual(nurse_names(plan), {0: 'Provo', 1: 'Provo', 2: 'Salt Lake', 3: 'Salt Lake'})
+        self.assertEqual(list(plan.changes['Distance']), [0, 0, 0, 0])
+        self.assertEqual(len(plan.unplaced), 0)
+
+    def test_siblings_stay_together_within_capacity(self):
+        combined_data = make_children([1, 1, 1, 2, 3, 3], ['84604'] * 6)
+        roster = make_roster(combined_data, ('Near', '84604', 3), ('Far', '84790', 3))
+        plan = plan_assignments(combined_data, roster)
+
+        for mother, nurses in plan.changes.groupby('Mother_ID')['Nurse']:
+            self.assertEqual(nurses.nunique(), 1, mother)
+        self.assertEqual(plan.caseloads['After'].to_dict(), {'Near': 3, 'Far': 3})
+
+    def test_caseloads_are_balanced_before_filling_the_nearest_nurse(self):
+        combined_data = make_children(list(range(8)), ['84604'] * 8)
+        roster = make_roster(combined_data, ('Near', '84604', 10), ('Far', '84790', 10))
+        plan = plan_assignments(combined_data, roster)
+        self.assertEqual(plan.caseloads['Added'].to_dict(), {'Near': 4, 'Far': 4})
+
+        unbalanced = plan_assignments(combined_data, roster, balance=False)
+        self.assertEqual(unbalanced.caseloads['Added'].to_dict(), {'Near': 8, 'Far': 0})
+
+    def test_a_sibling_joins_the_nurse_of_an_assigned_sibling(self):
+        combined_data = make_children([1, 1, 2], ['84101', '84101', '84101'], ['Far', None, None])
+        roster = make_roster(combined_data, ('Near', '84101', 5), ('Far', '84790', 5))
+        plan = plan_assignments(combined_data, roster)
+        self.assertEqual(nurse_names(plan), {1: 'Far', 2: 'Near'})
+        self.assertEqual(plan.caseloads.loc['Far', 'Before'], 1)
+
+    def test_children_without_room_are_left_unplaced(self):
+        combined_data = make_children([1, 1, 1, 2], ['84604'] * 4)
+        roster = make_roster(combined_data, ('Small', '84604', 2))
+        plan = plan_assignments(combined_data, roster)
+        self.assertEqual(nurse_names(plan), {3: 'Small'})
+        self.assertEqual(list(plan.unplaced), [0, 1, 2])
+        self.assertIn("3 children left unassigned", plan.summary())
+
+    def test_unknown_zip_codes_are_reported_not_ranked(self):
+        combined_data = make_children([1, 2, 2, 3], ['84604', '99999', '99999', ''])
+        roster = make_roster(combined_data, ('Near', '84604', 5), ('Far', '84790', 5))
+        plan = plan_assignments(combined_data, roster)
+        self.assertEqual(nurse_names(plan), {0: 'Near'})
+        self.assertEqual(list(plan.unlocated), [1, 2, 3])
+        self.assertEqual(len(plan.unplaced), 0)
+        self.assertIn("3 children left unassigned (ZIP code not located)", plan.summary())
+
+        # A nurse whose home ZIP code cannot be located gets no children by proximity
+        roster = make_roster(combined_data, ('Unknown', '99999', 5))
+        plan = plan_assignments(combined_data, roster)
+        self.assertTrue(plan.changes.empty)
+        self.assertEqual(list(plan.unlocated), [0, 1, 2, 3])
+
+    def test_inactive_nurses_get_no_children(self):
+        combined_data = make_children([1, 2], ['84604', '84604'])
+        roster = make_roster(combined_data, ('Active', '84790', 5), ('Inactive', '84604', 5))
+        roster.update_nurse(roster.find('Inactive').nurse_id, active=False)
+        self.assertEqual(set(plan_assignments(combined_data, roster).changes['Nurse']), {'Active'})
+
+    def test_100k_children_are_planned_in_seconds(self):
+        rng = np.random.default_rng(0)
+        children = 100000
+        zips = rng.integers(84001, 84800, children).astype(str)
+        combined_data = make_children(rng.integers(0, 60000, children), zips)
+        nurses = [(f"Nurse {number}", str(84001 + number * 8), 1100) for number in range(100)]
+        roster = make_roster(combined_data, *nurses)
+
+        start = time.perf_counter()
+        plan = plan_assignments(combined_data, roster)
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 10)
+        self.assertEqual(len(plan.changes) + len(plan.unplaced) + len(plan.unlocated), children)
+        self.assertLessEqual(plan.caseloads['After'].max(), 1100)
+        self.assertEqual(plan.changes.groupby('Mother_ID')['Nurse'].nunique().max(), 1)
+
+
+def execute_plan(combined_data, roster, plan):
+    return NurseAssignmentCommand(None, combined_data, roster, plan.pending(roster), "Automatic assignment").execute()
+
+
+class TestApplyPlan(unittest.TestCase):
+    def test_plan_is_applied_to_the_roster_and_the_column(self):
+        combined_data = apply_schema(make_children([1, 2], ['84604', '84101']))[0]
+        roster = make_roster(combined_data, ('Provo', '84604', 5), ('Salt Lake', '84101', 5))
+        plan = plan_assignments(combined_data, roster)
+
+        self.assertEqual(execute_plan(combined_data, roster, plan), 2)
+        self.assertEqual(list(combined_data['Assigned Nurse']), ['Provo', 'Salt Lake'])
+        self.assertEqual(roster.counts().to_dict(), {'Provo': 1, 'Salt Lake': 1})
+
+    def test_rows_assigned_since_the_preview_keep_their_nurse(self):
+        combined_data = apply_schema(make_children([1, 2], ['84604', '84604']))[0]
+        roster = make_roster(combined_data, ('Provo', '84604', 5), ('Other', '84790', 5))
+        plan = plan_assignments(combined_data, roster, balance=False)
+        assign_children(combined_data, roster, [0], roster.find('Other').nurse_id)
+
+        self.assertEqual(execute_plan(combined_data, roster, plan), 1)
+        self.assertEqual(list(combined_data['Assigned Nurse']), ['Other', 'Provo'])
+
+    def test_nothing_is_applied_when_the_roster_no_longer_fits(self):
+        combined_data = apply_schema(make_children([1, 2], ['84604', '84101']))[0]
+        roster = make_roster(combined_data, ('Provo', '84604', 5), ('Salt Lake', '84101', 5))
+        plan = plan_assignments(combined_data, roster)
+        roster.update_nurse(roster.find('Salt Lake').nurse_id, active=False)
+
+        with self.assertRaises(CapacityError):
+            execute_plan(combined_data, roster, plan)
+        self.assertEqual(len(roster.counts()), 0)
+        self.assertTrue(combined_data['Assigned Nurse'].isna().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
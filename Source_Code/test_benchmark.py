@@ -0,0 +1,81 @@
+import unittest
+import os
+import json
+import tempfile
+import pandas as pd
+import benchmark
+from benchmark import BenchmarkRunner, generate_inputs, compare_results, parse_importtime, measure_import
+from invoker import CombineDataCommand
+from test_combine_modes import MockApp
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_inputs_are_reproducible_and_match(self):
+        database_data, medicaid_data = generate_inputs(50, seed=1, unmatched_ratio=0.1)
+        again, _ = generate_inputs(50, seed=1, unmatched_ratio=0.1)
+
+        self.assertEqual((len(database_data), len(medicaid_data)), (55, 55))
+        pd.testing.assert_frame_equal(database_data, again)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                combined_data = CombineDataCommand(MockApp(), [database_data, medicaid_data]).execute()
+            finally:
+                os.chdir(cwd)
+        # Every family matches; random unmatched rows may occasionally collide as well
+        self.assertGreaterEqual(len(combined_data), 50)
+
+    def test_run_records_every_case(self):
+        runner = BenchmarkRunner(repeat=1, seed=2)
+        document = runner.run([30])
+
+        self.assertEqual([result['case'] for result in document['results']], benchmark.CASES)
+        self.assertTrue(all(result['status'] == 'ok' and result['wall_median'] >= 0 for result in document['results']))
+        json.dumps(document)
+
+    def test_noise_rate_scores_matches(self):
+        runner = BenchmarkRunner(repeat=1, seed=2, cases=['combine'], noise_rate=0.2)
+        document = runner.run([200])
+
+        quality = document['match_quality'][0]
+        self.assertEqual(quality['rows'], 200)
+        self.assertEqual(quality['recall_by_noise']['clean'], 1.0)
+        self.assertLess(quality['recall'], 1.0)
+        json.dumps(document)
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        def document(seconds):
+            return {'results': [{'case': case, 'rows': 1000, 'status': 'ok', 'wall_median': value}
+                                for case, value in seconds.items()]}
+
+        baseline = document({'combine': 1.0, 'search': 0.001, 'report': 0.5})
+        current = document({'combine': 1.5, 'search': 0.003, 'report': 0.55})
+        comparison = {row['case']: row for row in compare_results(baseline, current, threshold=0.2)}
+
+        self.assertTrue(comparison['combine']['regression'])
+        # Tripled, but below the noise floor
+        self.assertFalse(comparison['search']['regression'])
+        self.assertFalse(comparison['report']['regression'])
+
+
+class TestStartup(unittest.TestCase):
+    def test_parse_importtime(self):
+        output = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       120 |        120 |     _io\n"
+                  "import time:      2000 |       2120 |   tkinter\n"
+                  "import time:       500 |       2620 | app\n")
+        modules = parse_importtime(output)
+        self.assertEqual([(entry['module'], entry['level']) for entry in modules], [('_io', 2), ('tkinter', 1), ('app', 0)])
+        self.assertAlmostEqual(modules[-1]['cumulative_seconds'], 0.00262)
+
+    def test_entry_points_defer_heavy_imports(self):
+        for module in benchmark.STARTUP_TARGETS:
+            measured = measure_import(module, repeat=1)
+            self.assertEqual(measured['heavy_modules'], [], module)
+            self.assertGreater(measured['wall_median'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import unittest
+import os
+import tempfile
+import time
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from nurse_roster import NurseRoster, CapacityError
+from bulk_import import plan_import, normalize_columns
+from invoker import NurseAssignmentCommand
+from schema import apply_schema
+from cryptography.fernet import Fernet
+from app import App
+
+
+def make_combined():
+    return apply_schema(pd.DataFrame({
+        'Mother_ID': [100, 100, 200, 300, 300],
+        'Child_First_Name': ['Alice', 'Bob', 'Carl', 'Dana', 'Dana'],
+        'Child_Last_Name': ['Doe', 'Doe', 'Roe', 'Poe', 'Poe'],
+        'Child_Date_of_Birth': pd.to_datetime(['2020-01-02', '2021-03-04', '2019-05-06', '2022-07-08', '2022-07-09']),
+        'Assigned Nurse': ['Nurse A', None, 'Nurse B', None, None],
+        'Record_Key': ['k0', 'k1', 'k2', 'k3', 'k4'],
+    }))[0]
+
+
+def make_roster(combined_data, capacity=5):
+    roster = NurseRoster()
+    roster.add_nurse('Nurse A', capacity=capacity)
+    roster.add_nurse('Nurse B', capacity=capacity)
+    roster.build_index(combined_data)
+    return roster
+
+
+class TestPlanImport(unittest.TestCase):
+    def test_sheet_columns_are_recognised(self):
+        sheet = normalize_columns(pd.DataFrame(columns=['mother id', 'Child First Name', 'DOB', 'Assigned_Nurse']))
+        self.assertEqual(list(sheet.columns), ['Mother_ID', 'Child_First_Name', 'Child_Date_of_Birth', 'Nurse'])
+
+    def test_children_are_matched_on_their_keys(self):
+        combined_data = make_combined()
+        roster = make_roster(combined_data)
+        sheet = pd.DataFrame({
+            'Mother ID': ['100', 100.0, 300],
+            'Child First Name': [' alice ', 'BOB', 'Dana'],
+            'DOB': ['2020-01-02', '2021-03-04', '07/09/2022'],
+            'Nurse': ['nurse b', 'Nurse A', 'Nurse B'],
+        })
+        assignment_import = plan_import(combined_data, roster, sheet)
+
+        self.assertEqual(assignment_import.problems.empty, True)
+        self.assertEqual(assignment_import.keys, ['Mother_ID', 'Child_First_Name', 'Child_Date_of_Birth'])
+        self.assertEqual(assignment_import.nurse_ids.to_dict(), {0: 2, 1: 1, 4: 2})
+        self.assertEqual(assignment_import.unchanged, 0)
+
+    def test_problems_are_reported_with_their_sheet_row(self):
+        combined_data = make_combined()
+        roster = make_roster(combined_data)
+        sheet = pd.DataFrame({
+            'Mother_ID': [100, 999, 300, None, 200, 100, 100],
+            'Child_First_Name': ['Alice', 'Zed', 'Dana', 'Carl', 'Carl', 'Bob', 'Bob'],
+            'Nurse': ['Nurse A', 'Nurse A', 'Nurse B', 'Nurse B', 'Nurse Bee', 'Nurse A', 'Nurse B'],
+        })
+        problems = plan_import(combined_data, roster, sheet).problems
+        self.assertEqual(list(problems['Row']), [3, 4, 5, 6, 7, 8])
+        self.assertEqual(problems['Problem'][0], "No child matches the keys")
+        self.assertEqual(problems['Problem'][1], "Several children match the keys")
+        self.assertIn("Missing", problems['Problem'][2])
+        self.assertIn("Nurse 'Nurse Bee' is not on the roster (did you mean Nurse B", problems['Problem'][3])
+        self.assertEqual(set(problems['Problem'][4:]), {"The child is given another nurse too"})
+
+    def test_sheet_without_keys_is_rejected(self):
+        combined_data = make_combined()
+        with self.assertRaises(ValueError):
+            plan_import(combined_data, make_roster(combined_data), pd.DataFrame({'Child_First_Name': ['Alice'],
+                                                                                'Nurse': ['Nurse A']}))
+
+
+def execute_import(combined_data, roster, assignment_import):
+    return NurseAssignmentCommand(None, combined_data, roster, assignment_import.nurse_ids, "Assignment import").execute()
+
+
+class TestApplyImport(unittest.TestCase):
+    def test_import_is_applied_as_one_transaction(self):
+        combined_data = make_combined()
+        # Both nurses are full: the import swaps their children
+        roster = make_roster(combined_data, capacity=1)
+        sheet = pd.DataFrame({'Record_Key': ['k0', 'k2'], 'Nurse': ['Nurse B', 'Nurse A']})
+        assignment_import = plan_import(combined_data, roster, sheet)
+        self.assertEqual(assignment_import.keys, ['Record_Key'])
+
+        self.assertEqual(execute_import(combined_data, roster, assignment_import), 2)
+        self.assertEqual(list(combined_data['Assigned Nurse'][[0, 2]]), ['Nurse B', 'Nurse A'])
+        self.assertEqual(roster.counts().to_dict(), {'Nurse A': 1, 'Nurse B': 1})
+
+    def test_nothing_is_applied_beyond_capacity(self):
+        combined_data = make_combined()
+        roster = make_roster(combined_data, capacity=2)
+        sheet = pd.DataFrame({'Record_Key': ['k1', 'k3', 'k4'], 'Nurse': ['Nurse A', 'Nurse B', 'Nurse A']})
+
+        with self.assertRaises(CapacityError):
+            execute_import(combined_data, roster, plan_import(combined_data, roster, sheet))
+        self.assertEqual(list(combined_data['Assigned Nurse'].astype(object).fillna('')),
+                         ['Nurse A', '', 'Nurse B', '', ''])
+        self.assertEqual(roster.counts().to_dict(), {'Nurse A': 1, 'Nurse B': 1})
+
+    def test_10k_assignments_take_about_a_second(self):
+        rng = np.random.default_rng(0)
+        children = 200000
+        combined_data = apply_schema(pd.DataFrame({
+            'Mother_ID': np.arange(children) // 2,
+            'Child_First_Name': np.where(np.arange(children) % 2, 'Ann', 'Ben'),
+            'Child_Date_of_Birth': pd.Timestamp('2020-01-01') + pd.to_timedelta(np.arange(children) % 700, unit='D'),
+            'Assigned Nurse': None,
+        }))[0]
+        roster = NurseRoster()
+        for number in range(50):
+            roster.add_nurse(f"Nurse {number}", capacity=1000)
+        roster.build_index(combined_data)
+        rows = rng.choice(children, 10000, replace=False)
+        sheet = pd.DataFrame({
+            'Mother_ID': combined_data['Mother_ID'].to_numpy()[rows],
+            'Child_First_Name': combined_data['Child_First_Name'].to_numpy()[rows],
+            'Nurse': [f"Nurse {number % 50}" for number in range(10000)],
+        })
+
+        start = time.perf_counter()
+        assignment_import = plan_import(combined_data, roster, sheet)
+        changed = execute_import(combined_data, roster, assignment_import)
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 5)
+        self.assertEqual(changed, 10000)
+        self.assertEqual(roster.counts().max(), 200)
+
+
+class TestAppImport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        with open('key.txt', 'wb') as file:
+            file.write(Fernet.generate_key())
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_sheet_is_imported_and_saved_once(self):
+        make_combined().to_excel('combined_matched_data.xlsx', index=False)
+        pd.DataFrame({'Record Key': ['k1', 'k3'], 'Assigned Nurse': ['Nurse B', 'Nurse A']}).to_csv('sheet.csv', index=False)
+        app = App(None)
+        with patch.object(App, 'show_combined_data'):
+            app.load_combined_data()
+        saver = app._App__saver
+        saver.delay = 60
+
+        with patch('app.filedialog.askopenfilename', return_value='sheet.csv'), \
+                patch('app.messagebox.askyesno', return_value=True), patch('app.messagebox.showinfo') as showinfo, \
+                patch('app.messagebox.showwarning'), patch.object(App, 'update_combined_names'):
+            app.import_assignments()
+
+        showinfo.assert_called_once_with("Success", "2 children reassigned.")
+        self.assertEqual(list(app._App__combined_data['Assigned Nurse'][[1, 3]]), ['Nurse B', 'Nurse A'])
+        self.assertTrue(saver.dirty)
+        self.assertTrue(saver.flush())
+        self.assertEqual(saver.writes, 1)
+        # The import is one step of the undo history
+        with patch('app.messagebox.showinfo'), patch.object(App, 'update_combined_names'):
+            app.undo_assignment()
+        self.assertEqual(list(app._App__combined_data['Assigned Nurse'].astype(object).fillna('')[[1, 3]]), ['', ''])
+
+    def test_import_with_problems_is_refused(self):
+        make_combined().to_excel('combined_matched_data.xlsx', index=False)
+        pd.DataFrame({'Record Key': ['k1', 'missing'], 'Assigned Nurse': ['Nurse A', 'Nurse A']}).to_csv('sheet.csv', index=False)
+        app = App(None)
+        with patch.object(App, 'show_combined_data'):
+            app.load_combined_data()
+
+        with patch('app.filedialog.askopenfilename', return_value='sheet.csv'), patch('app.messagebox') as messagebox, \
+                patch('app.tk'), patch('app.ttk'), patch('app.populate_treeview') as populate_treeview:
+            app.import_assignments()
+
+        self.assertEqual(list(populate_treeview.call_args[0][1]), [(3, "No child matches the keys")])
+        messagebox.askyesno.assert_not_called()
+        self.assertIsNone(app.roster().nurse_of(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import io
+import os
+import sys
+import json
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+import pandas as pd
+from app_crypto import Crypto
+from test_combine_modes import make_sources
+import cli
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        database_data, medicaid_data = make_sources()
+        database_data.rename(columns=lambda c: c.replace('_', ' ')).to_excel('database.xlsx', index=False)
+        medicaid_data.rename(columns=lambda c: c.replace('_', ' ')).to_excel('medicaid.xlsx', index=False)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def run_cli(self, *args):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = cli.main(['combine', 'database.xlsx', 'medicaid.xlsx'] + list(args))
+        return exit_code, json.loads(output.getvalue())
+
+    def test_combine_modes_report_metrics(self):
+        for mode in ['memory', 'partitioned', 'incremental']:
+            exit_code, metrics = self.run_cli('--mode', mode, '--no-encrypt', '--partitions', '2')
+            self.assertEqual(exit_code, 0)
+            self.assertEqual(metrics['status'], 'ok')
+            self.assertEqual(metrics['rows_in'], {'database': 4, 'medicaid': 4})
+            self.assertEqual(metrics['rows_out'], {'matched': 3, 'unmatched': 2})
+            self.assertIn('combine', metrics['stages'])
+            self.assertEqual(len(pd.read_excel('combined_matched_data.xlsx')), 3)
+
+    def test_sources_and_outputs_are_left_encrypted(self):
+        Crypto.generateKey()
+        key = Crypto.loadKey()
+        Crypto.encrypt_file('database.xlsx', key)
+
+        exit_code, metrics = self.run_cli()
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(metrics['report']['total_children'], 3)
+        self.assertLess(metrics['memory']['after_bytes'], metrics['memory']['before_bytes'])
+        for path in ['database.xlsx', 'medicaid.xlsx', 'combined_matched_data.xlsx', 'unmatched_data.xlsx']:
+            self.assertTrue(Crypto.is_encrypted(path), path)
+
+    def test_missing_source_fails(self):
+        exit_code, metrics = self.run_cli('--no-encrypt')
+        self.assertEqual(exit_code, 0)
+        os.remove('medicaid.xlsx')
+        exit_code, metrics = self.run_cli('--no-encrypt')
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(metrics['status'], 'error')
+        self.assertTrue(metrics['errors'])
+
+    def test_cli_does_not_import_tkinter(self):
+        result = subprocess.run(
+            [sys.executable, '-c', "import sys, cli; print('tkinter' in sys.modules)"],
+            cwd=SOURCE_DIRECTORY, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
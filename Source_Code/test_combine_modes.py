@@ -0,0 +1,300 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+import pandas as pd
+import matching
+from invoker import (CombineDataCommand, PartitionedCombineDataCommand, ParallelCombineDataCommand,
+                     IncrementalCombineDataCommand)
+
+
+class MockApp:
+    def __init__(self):
+        self.combined_data = None
+
+
+def make_sources():
+    database_data = pd.DataFrame({
+        'Child_Last_Name': ['Doe', 'Smith', 'Brown', 'Green'],
+        'Child_First_Name': ['Alice', 'Bob', 'Carl', 'Dana'],
+        'Child_Middle_Name': ['Marie', 'James', 'Lee', 'Ann'],
+        'DOB': ['2021-05-10', '2020-08-21', '2022-01-02', '2019-03-04'],
+        'Mother_Last_Name': ['Doe', 'Smith', 'Brown', 'Green'],
+        'Mother_First_Name': ['Jane', 'John', 'Beth', 'Gina'],
+        'State_File_Number': [12345, 67890, 11111, 22222]
+    })
+    medicaid_data = pd.DataFrame({
+        'Mother_First_Name': ['Jane', 'John', 'Beth', 'Zoe'],
+        'Last_Name': ['Doe', 'Smith', 'Brown', 'White'],
+        'Mother_DOB': ['1980-05-10', '1978-12-22', '1990-01-01', '1991-02-02'],
+        'Mother_ID': [98765, 54321, 33333, 44444],
+        'Child_ID': [1001, 1002, 1003, 1004],
+        'Child_DOB': ['2021-05-10', '2020-08-21', '2022-01-02', '2018-07-07'],
+        'City': ['Springfield', 'Mapleton', 'Provo', 'Orem'],
+        'State': ['UT', 'UT', 'UT', 'UT'],
+        'ZIP': ['84001', '84002', '84604', '84057'],
+    })
+    return database_data, medicaid_data
+
+
+class TestPartitionedCombine(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.matched_path = os.path.join(self.directory.name, 'matched.xlsx')
+        self.unmatched_path = os.path.join(self.directory.name, 'unmatched.xlsx')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_partitioned(self, partition_by):
+        database_data, medicaid_data = make_sources()
+        command = PartitionedCombineDataCommand(
+            MockApp(), [database_data, medicaid_data], num_partitions=3, partition_by=partition_by,
+            chunksize=2, matched_file_path=self.matched_path, unmatched_file_path=self.unmatched_path)
+        return command.execute()
+
+    def test_partitioned_matches_in_memory_combine(self):
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            expected = CombineDataCommand(MockApp(), list(make_sources())).execute()
+        finally:
+            os.chdir(cwd)
+
+        for partition_by in ['key', 'dob_month']:
+            summary = self.run_partitioned(partition_by)
+            self.assertIsNotNone(summary)
+            self.assertEqual(summary['matched_rows'], 3)
+            self.assertEqual(summary['unmatched_rows'], 2)
+
+            matched = pd.read_excel(self.matched_path)
+            self.assertEqual(sorted(matched['Mother_ID']), sorted(expected['Mother_ID']))
+            self.assertEqual(list(matched.columns), list(expected.columns))
+
+            unmatched = pd.read_excel(self.unmatched_path)
+            self.assertEqual(sorted(unmatched['Source']), ['Database', 'Medicaid'])
+
+    def test_partitioned_reads_excel_sources(self):
+        database_data, medicaid_data = make_sources()
+        database_path = os.path.join(self.directory.name, 'database.xlsx')
+        medicaid_path = os.path.join(self.directory.name, 'medicaid.xlsx')
+        database_data.rename(columns=lambda c: c.replace('_', ' ')).to_excel(database_path, index=False)
+        medicaid_data.rename(columns=lambda c: c.replace('_', ' ')).to_excel(medicaid_path, index=False)
+
+        command = PartitionedCombineDataCommand(
+            MockApp(), [database_path, medicaid_path], num_partitions=2, chunksize=3,
+            matched_file_path=self.matched_path, unmatched_file_path=self.unmatched_path)
+        summary = command.execute()
+
+        self.assertEqual(summary['database_rows'], 4)
+        self.assertEqual(summary['matched_rows'], 3)
+
+
+class TestDuplicateHandling(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_twins_and_duplicate_rows_do_not_fan_out(self):
+        database_data, medicaid_data = make_sources()
+        # Twins: two children of the same mother born the same day, on both sides
+        twin = database_data.iloc[[0]].assign(Child_First_Name='Amy', State_File_Number=99999)
+        database_data = pd.concat([database_data, twin], ignore_index=True)
+        twin = medicaid_data.iloc[[0]].assign(Child_ID=1005)
+        # The Medicaid twin row is also sent twice
+        medicaid_data = pd.concat([medicaid_data, twin, twin], ignore_index=True)
+
+        command = CombineDataCommand(MockApp(), [database_data, medicaid_data])
+        combined_data = command.execute()
+
+        self.assertEqual(len(combined_data), 4)
+        self.assertEqual(sorted(combined_data['Child_ID']), [1001, 1002, 1003, 1005])
+        report = command.duplicate_report
+        self.assertEqual(report['medicaid_exact_duplicates'], 1)
+        self.assertEqual(report['database_duplicate_keys'], 1)
+        self.assertEqual(report['medicaid_duplicate_keys'], 1)
+        self.assertEqual(report['cartesian_rows'], 6)
+        self.assertEqual(report['bounded_rows'], 4)
+
+    def test_extra_duplicate_is_reported_unmatched(self):
+        database_data, medicaid_data = make_sources()
+        triplet = database_data.iloc[[1, 1]].assign(Child_First_Name=['Cy', 'Di'])
+        database_data = pd.concat([database_data, triplet], ignore_index=True)
+
+        combined_data = CombineDataCommand(MockApp(), [database_data, medicaid_data]).execute()
+        unmatched = pd.read_excel('unmatched_data.xlsx')
+
+        self.assertEqual(len(combined_data), 3)
+        self.assertEqual((unmatched['Source'] == 'Database').sum(), 3)
+
+
+    def test_shared_child_name_only_pairs_duplicates(self):
+        database_data, medicaid_data = make_sources()
+        # The child's name is on both sides, typed differently in Medicaid
+        medicaid_data['Child_First_Name'] = ['ALICE ', 'bob', 'Carl', 'Zed']
+        twin = database_data.iloc[[0]].assign(Child_First_Name='Amy', State_File_Number=99999)
+        database_data = pd.concat([database_data, twin], ignore_index=True)
+        twin = medicaid_data.iloc[[0]].assign(Child_ID=1005, Child_First_Name='amy')
+        medicaid_data = pd.concat([medicaid_data, twin], ignore_index=True)
+
+        combined_data = CombineDataCommand(MockApp(), [database_data, medicaid_data]).execute()
+
+        self.assertEqual(len(combined_data), 4)
+        pairs = dict(zip(combined_data['State_File_Number'], combined_data['Child_ID']))
+        self.assertEqual(pairs, {12345: 1001, 99999: 1005, 67890: 1002, 11111: 1003})
+
+
+class TestIncrementalCombine(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_delta_is_rematched_and_assignments_carried_forward(self):
+        first = IncrementalCombineDataCommand(MockApp(), list(make_sources()))
+        previous_data = first.execute()
+        self.assertIsNone(first.delta)
+        self.assertTrue(os.path.exists('combine_state.pkl'))
+
+        # Nurses assigned in the app, then saved and reloaded from the workbook
+        previous_data['Assigned Nurse'] = ['Nurse A', 'Nurse B', 'Nurse C']
+        previous_data.to_excel('combined_matched_data.xlsx', index=False)
+        previous_data = pd.read_excel('combined_matched_data.xlsx')
+
+        # Next month: John's family moved, Beth's family left the list, Gina's family appeared
+        database_data, medicaid_data = make_sources()
+        medicaid_data.loc[1, 'City'] = 'Provo'
+        medicaid_data = medicaid_data.drop(index=2)
+        medicaid_data.loc[3, ['Mother_First_Name', 'Last_Name', 'Child_DOB']] = ['Gina', 'Green', '2019-03-04']
+
+        command = IncrementalCombineDataCommand(MockApp(), [database_data, medicaid_data], previous_data)
+        combined_data = command.execute()
+
+        self.assertEqual(command.delta['medicaid_changed'], 1)
+        self.assertEqual(command.delta['medicaid_removed'], 2)
+        self.assertEqual(command.delta['medicaid_added'], 1)
+        self.assertEqual(command.delta['retired_rows'], 1)
+        nurses = dict(zip(combined_data['Mother_First_Name'], combined_data['Assigned Nurse']))
+        self.assertEqual(nurses['Jane'], 'Nurse A')
+        self.assertEqual(nurses['John'], 'Nurse B')
+        self.assertNotIn('Beth', nurses)
+        self.assertTrue(pd.isna(nurses['Gina']))
+        self.assertEqual(combined_data.loc[combined_data['Mother_First_Name'] == 'John', 'City'].iloc[0], 'Provo')
+
+
+    def test_untouched_rows_are_rebuilt_from_the_sources(self):
+        IncrementalCombineDataCommand(MockApp(), list(make_sources())).execute()
+        expected = pd.read_excel('combined_matched_data.xlsx')
+        # Only the keys and assignments of the previous data, with a stale hand edit
+        previous_data = expected[['Record_Key']].assign(**{'Assigned Nurse': 'Nurse A'})
+        previous_data['City'] = 'Edited'
+
+        database_data, medicaid_data = make_sources()
+        medicaid_data.loc[1, 'City'] = 'Provo'
+        command = IncrementalCombineDataCommand(MockApp(), [database_data, medicaid_data], previous_data)
+        command.execute()
+        combined_data = pd.read_excel('combined_matched_data.xlsx')
+
+        self.assertEqual(command.delta['medicaid_changed'], 1)
+        self.assertEqual(list(combined_data.columns), list(expected.columns))
+        self.assertFalse(combined_data.drop(columns='Assigned Nurse').isna().any().any())
+        self.assertEqual(sorted(combined_data['City']), ['Provo', 'Provo', 'Springfield'])
+        self.assertEqual(set(combined_data['Assigned Nurse']), {'Nurse A'})
+
+    def test_new_sibling_keeps_the_keys_and_nurses_of_the_others(self):
+        def twins(names, child_ids):
+            database_data = pd.DataFrame({
+                'Child_Last_Name': 'Doe', 'Child_First_Name': names, 'DOB': '2021-05-10',
+                'Mother_Last_Name': 'Doe', 'Mother_First_Name': 'Jane', 'State_File_Number': range(len(names))})
+            medicaid_data = pd.DataFrame({
+                'Mother_First_Name': 'Jane', 'Last_Name': 'Doe', 'Mother_ID': 98765, 'Child_ID': child_ids,
+                'Child_DOB': '2021-05-10', 'City': 'Provo', 'State': 'UT', 'ZIP': '84604'})
+            return [database_data, medicaid_data]
+
+        previous_data = IncrementalCombineDataCommand(MockApp(), twins(['Alice', 'Carl'], [1001, 1005])).execute()
+        keys = dict(zip(previous_data['Child_First_Name'], previous_data['Record_Key']))
+        previous_data['Assigned Nurse'] = previous_data['Child_First_Name'].map({'Alice': 'Nurse A', 'Carl': 'Nurse C'})
+
+        # Bob sorts between his siblings on both sides
+        command = IncrementalCombineDataCommand(MockApp(), twins(['Alice', 'Bob', 'Carl'], [1001, 1003, 1005]),
+                                                previous_data)
+        combined_data = command.execute()
+
+        rows = combined_data.set_index('Child_First_Name')
+        self.assertEqual(rows.loc['Alice', 'Record_Key'], keys['Alice'])
+        self.assertEqual(rows.loc['Carl', 'Record_Key'], keys['Carl'])
+        self.assertEqual(rows.loc['Alice', 'Assigned Nurse'], 'Nurse A')
+        self.assertEqual(rows.loc['Carl', 'Assigned Nurse'], 'Nurse C')
+        self.assertTrue(pd.isna(rows.loc['Bob', 'Assigned Nurse']))
+        self.assertEqual(command.delta['retired_rows'], 0)
+
+    def test_only_the_touched_groups_are_matched_again(self):
+        IncrementalCombineDataCommand(MockApp(), list(make_sources())).execute()
+        expected = pd.read_excel('combined_matched_data.xlsx')
+        merged_rows = []
+        merge_prepared = matching.merge_prepared
+
+        def counting_merge(database_data, medicaid_data, keys):
+            merged_rows.append((len(database_data), len(medicaid_data)))
+            return merge_prepared(database_data, medicaid_data, keys)
+
+        with patch('matching.merge_prepared', counting_merge):
+            unchanged = IncrementalCombineDataCommand(MockApp(), list(make_sources()))
+            unchanged.execute()
+            self.assertEqual(merged_rows, [])
+            self.assertEqual(unchanged.delta['rematched_rows'], 0)
+            pd.testing.assert_frame_equal(pd.read_excel('combined_matched_data.xlsx'), expected)
+
+            database_data, medicaid_data = make_sources()
+            medicaid_data.loc[1, 'City'] = 'Provo'
+            changed = IncrementalCombineDataCommand(MockApp(), [database_data, medicaid_data])
+            changed.execute()
+        # John's family only: one row of each side
+        self.assertEqual(merged_rows, [(1, 1)])
+        self.assertEqual(changed.delta['rematched_rows'], 1)
+        combined_data = pd.read_excel('combined_matched_data.xlsx')
+        self.assertEqual(list(combined_data.columns), list(expected.columns))
+        self.assertEqual(sorted(combined_data['City']), ['Provo', 'Provo', 'Springfield'])
+        self.assertEqual(len(pd.read_excel('unmatched_data.xlsx')), 2)
+
+
+class TestParallelCombine(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_parallel_matches_in_memory_combine(self):
+        expected = CombineDataCommand(MockApp(), list(make_sources())).execute()
+        expected_unmatched = pd.read_excel('unmatched_data.xlsx')
+
+        app = MockApp()
+        combined_data = ParallelCombineDataCommand(app, list(make_sources()), max_workers=2, num_partitions=4,
+                                                   chunksize=2).execute()
+
+        self.assertIs(app.combined_data, combined_data)
+        columns = list(expected.columns)
+        self.assertEqual(list(combined_data.columns), columns)
+        pd.testing.assert_frame_equal(
+            combined_data.sort_values('Mother_ID').reset_index(drop=True),
+            expected.sort_values('Mother_ID').reset_index(drop=True), check_dtype=False)
+
+        unmatched = pd.read_excel('unmatched_data.xlsx')
+        self.assertEqual(sorted(unmatched['Source']), sorted(expected_unmatched['Source']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import os
+import tempfile
+import time
+from datetime import datetime
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from cryptography.fernet import Fernet
+from data_ops import (search_mask, assign_nurse, batch_assign, describe_ages, report_statistics, row_values, detail_lines,
+                      iter_row_values, combined_name_rows)
+from schema import apply_schema
+from app import App
+from test_combine_modes import make_sources
+
+
+def make_combined():
+    return pd.DataFrame({
+        'Mother_ID': [98765, 54321, 33333],
+        'Child_First_Name': ['Alice', 'Bob', 'Carl'],
+        'Child_Last_Name': ['Doe', 'Smith', 'Brown'],
+        'Child_Date_of_Birth': ['2024-05-20', '2023-06-01', None],
+        'City': ['Provo', 'Orem', 'provo'],
+        'State': ['UT', 'UT', 'UT'],
+        'ZIP': [84604, 84057, 84604],
+        'Assigned Nurse': [None, 'Nurse A', None],
+    })
+
+
+class TestDataOps(unittest.TestCase):
+    def test_search_matches_id_and_names_literally(self):
+        combined_data = make_combined()
+        self.assertEqual(list(search_mask(combined_data, 'BOB')), [False, True, False])
+        self.assertEqual(list(search_mask(combined_data, '333')), [False, False, True])
+        self.assertEqual(list(search_mask(combined_data, '.')), [False, False, False])
+        self.assertTrue(search_mask(combined_data, '').all())
+
+    def test_assignments(self):
+        combined_data = make_combined()
+        child = combined_data.iloc[1].to_dict()
+        self.assertEqual(assign_nurse(combined_data, child, 'Nurse B'), 1)
+        self.assertEqual(combined_data.at[1, 'Assigned Nurse'], 'Nurse B')
+
+        self.assertEqual(batch_assign(combined_data, 'Nurse C', city='provo', zip_code='84604'), 2)
+        self.assertEqual(list(combined_data['Assigned Nurse']), ['Nurse C', 'Nurse B', 'Nurse C'])
+
+    def test_report_statistics(self):
+        today = datetime(2024, 6, 1)
+        statistics = report_statistics(make_combined(), today)
+
+        self.assertEqual(statistics['total_children'], 3)
+        self.assertEqual(len(statistics['unassigned_children']), 2)
+        self.assertEqual(list(statistics['ages']), ['12 days', '1 years', 'Unknown'])
+        self.assertEqual(statistics['youngest_child']['Child_First_Name'], 'Alice')
+        self.assertEqual(statistics['average_age'], 0.5)
+
+    def test_describe_ages_matches_report_wording(self):
+        dates = pd.to_datetime(pd.Series(['2024-01-01', '2022-06-03', '2021-01-15']))
+        self.assertEqual(list(describe_ages(dates, datetime(2024, 6, 1))),
+                         ['5 months', '1 years, 12 months', '3 years, 4 months'])
+
+    def test_unmatched_rows_are_displayed_from_slices(self):
+        rows = 50000
+        unmatched_data = pd.DataFrame({
+            'Source': ['Medicaid'] * rows,
+            'Child_ID': np.arange(rows),
+            'Mother_First_Name': ['Jane'] * (rows - 1) + [None],
+            'City': ['Provo'] * rows,
+        })
+        columns = ['Source', 'Child_ID', 'Mother_First_Name', 'Mother_Last_Name']
+        started = time.perf_counter()
+        batch = row_values(unmatched_data, columns, rows - 500, rows)
+        lines = detail_lines(unmatched_data, rows - 1, columns)
+        self.assertLess(time.perf_counter() - started, 1)
+
+        self.assertEqual(len(batch), 500)
+        self.assertEqual(batch[-1], ('Medicaid', rows - 1, '', ''))
+        self.assertEqual(lines, ['City: Provo'])
+        self.assertEqual(list(iter_row_values(unmatched_data.head(3), ['Child_ID'], chunksize=2)), [(0,), (1,), (2,)])
+
+    def test_combined_name_rows(self):
+        combined_data = make_combined()
+        rows = list(combined_name_rows(combined_data, chunksize=2))
+        self.assertEqual(rows[1], (54321, 'Bob Smith', '2023-06-01', 'Nurse A'))
+        self.assertEqual(len(rows), 3)
+        rows = list(combined_name_rows(combined_data.drop(columns='Assigned Nurse')))
+        self.assertEqual(rows[0][3], 'None')
+        # Dates typed by the schema are shown as in the source files
+        rows = list(combined_name_rows(apply_schema(combined_data)[0]))
+        self.assertEqual([row[2] for row in rows], ['2024-05-20', '2023-06-01', ''])
+
+
+class TestUnmatchedData(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        with open('key.txt', 'wb') as file:
+            file.write(Fernet.generate_key())
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_app_keeps_the_unmatched_data_of_a_combine_in_memory(self):
+        app = App(None)
+        app._App__data_frames = list(make_sources())
+        with patch.object(App, 'show_combined_data'):
+            app.combine_data()
+        self.assertTrue(os.path.exists('unmatched_data.xlsx'))
+
+        with patch('app.read_table') as read_table:
+            unmatched_data = app.unmatched_data()
+        read_table.assert_not_called()
+        self.assertEqual(len(unmatched_data), 2)
+        self.assertEqual(sorted(unmatched_data['Source']), ['Database', 'Medicaid'])
+
+    def test_app_reads_the_unmatched_file_of_an_earlier_session_once(self):
+        pd.DataFrame({'Source': ['Medicaid'], 'Child_ID': [1004]}).to_excel('unmatched_data.xlsx', index=False)
+        app = App(None)
+        self.assertEqual(app.unmatched_data()['Child_ID'].tolist(), [1004])
+        os.remove('unmatched_data.xlsx')
+        self.assertEqual(len(app.unmatched_data()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
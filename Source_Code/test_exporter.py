@@ -0,0 +1,64 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+import pandas as pd
+from cryptography.fernet import Fernet
+import exporter
+from exporter import StreamingExcelWriter, export_outputs
+from test_combine_modes import make_sources
+from app import App
+
+
+class TestExporter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_streamed_workbook_reads_back_like_to_excel(self):
+        df = pd.DataFrame({
+            'Mother_ID': [98765, 54321, 33333],
+            'Child_Date_of_Birth': pd.to_datetime(['2024-05-20', None, '2022-01-15']),
+            'Note': ['=1+1', None, 'http://example.org'],
+        })
+        writer = StreamingExcelWriter('streamed.xlsx')
+        writer.write_frame(df.head(2))
+        writer.write_frame(df.tail(1)[['Note', 'Mother_ID', 'Child_Date_of_Birth']])
+        writer.close()
+        df.to_excel('expected.xlsx', index=False)
+
+        self.assertEqual(writer.rows_written, 3)
+        pd.testing.assert_frame_equal(pd.read_excel('streamed.xlsx'), pd.read_excel('expected.xlsx'))
+
+    def test_outputs_are_written_concurrently_once(self):
+        matched = pd.DataFrame({'Mother_ID': range(25)})
+        rows = export_outputs({'matched.xlsx': matched, 'unmatched.csv': matched.head(3), 'none.xlsx': None},
+                              chunksize=10)
+        self.assertEqual(rows, {'matched.xlsx': 25, 'unmatched.csv': 3})
+        self.assertEqual(pd.read_excel('matched.xlsx')['Mother_ID'].tolist(), list(range(25)))
+        self.assertFalse(os.path.exists('none.xlsx'))
+        export_outputs({'empty.xlsx': matched.head(0)})
+        self.assertEqual(list(pd.read_excel('empty.xlsx').columns), ['Mother_ID'])
+
+    def test_combine_writes_each_output_once(self):
+        with open('key.txt', 'wb') as file:
+            file.write(Fernet.generate_key())
+        app = App(None)
+        app._App__data_frames = list(make_sources())
+        with patch.object(App, 'show_combined_data'), \
+                patch('exporter.write_output', wraps=exporter.write_output) as write_output, \
+                patch.object(pd.DataFrame, 'to_excel') as to_excel:
+            app.combine_data()
+        self.assertEqual(sorted(call.args[1] for call in write_output.call_args_list),
+                         ['combined_matched_data.xlsx', 'unmatched_data.xlsx'])
+        to_excel.assert_not_called()
+        self.assertEqual(len(pd.read_excel('combined_matched_data.xlsx')), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import os
+import tempfile
+import pandas as pd
+from extract_diff import diff_extracts
+from invoker import ReadExcelCommand, CombineDataCommand, IncrementalCombineDataCommand
+from test_combine_modes import MockApp, make_sources
+
+
+class TestExtractDiff(unittest.TestCase):
+    def test_added_removed_and_changed_records(self):
+        _, old_data = make_sources()
+        new_data = old_data.copy()
+        new_data.loc[0, 'ZIP'] = '84003'
+        new_data.loc[0, 'City'] = 'American Fork'
+        new_data.loc[1, 'Mother_First_Name'] = ' JOHN '  # Same family after key normalization
+        new_data = new_data.drop(index=2)
+        new_data.loc[4] = ['Ivy', 'Stone', '1992-02-02', 55555, 1006, '2023-06-01', 'Lehi', 'UT', '84043']
+
+        diff = diff_extracts(old_data, new_data, side='medicaid')
+
+        self.assertEqual(list(diff.added['Mother_ID']), [55555])
+        self.assertEqual(list(diff.removed['Mother_ID']), [33333])
+        self.assertEqual(list(diff.changed['Mother_ID']), [98765])
+        self.assertEqual(diff.unchanged_count, 2)
+        self.assertEqual(diff.summary()['changed_columns'], {'City': 1, 'ZIP': 1})
+        self.assertTrue(diff.change_mask.loc[0, 'ZIP'])
+        self.assertFalse(diff.change_mask.loc[0, 'Mother_ID'])
+
+    def test_report_lists_changed_columns(self):
+        _, old_data = make_sources()
+        new_data = old_data.copy()
+        new_data.loc[3, 'City'] = 'Lindon'
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'changes.xlsx')
+            diff_extracts(old_data, new_data).to_excel(path)
+            changed = pd.read_excel(path, sheet_name='Changed')
+
+        self.assertEqual(list(changed['Changed_Columns']), ['City'])
+
+    def test_extracts_read_with_different_cities_are_compared(self):
+        _, old_data = make_sources()
+        new_data = old_data.copy()
+        new_data.loc[0, 'City'] = 'American Fork'
+        with tempfile.TemporaryDirectory() as directory:
+            old_path, new_path = os.path.join(directory, 'old.xlsx'), os.path.join(directory, 'new.xlsx')
+            old_data.to_excel(old_path, index=False)
+            new_data.to_excel(new_path, index=False)
+            old_read = ReadExcelCommand(MockApp()).execute(old_path)
+            new_read = ReadExcelCommand(MockApp()).execute(new_path)
+
+        self.assertIsInstance(new_read['City'].dtype, pd.CategoricalDtype)
+        diff = diff_extracts(old_read, new_read)
+        self.assertEqual(list(diff.changed['Mother_ID']), [98765])
+        self.assertEqual(diff.summary()['changed_columns'], {'City': 1})
+
+    def test_diffs_feed_incremental_combine(self):
+        database_data, medicaid_data = make_sources()
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                previous_data = CombineDataCommand(MockApp(), list(make_sources())).execute()
+                previous_data['Assigned Nurse'] = 'Nurse A'
+
+                new_medicaid = medicaid_data.copy()
+                new_medicaid.loc[1, 'City'] = 'Provo'
+                diffs = {'database': diff_extracts(database_data, database_data, side='database'),
+                         'medicaid': diff_extracts(medicaid_data, new_medicaid)}
+                command = IncrementalCombineDataCommand(MockApp(), [database_data.copy(), new_medicaid],
+                                                        previous_data, diffs=diffs)
+                combined_data = command.execute()
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(command.delta['medicaid_changed'], 1)
+        self.assertEqual(command.delta['rematched_rows'], 1)
+        self.assertEqual(list(combined_data['Assigned Nurse']), ['Nurse A'] * 3)
+
+
+    def test_diff_keys_match_the_combine_with_a_shared_secondary_key(self):
+        database_data, medicaid_data = make_sources()
+        medicaid_data['Child_First_Name'] = ['Alice', 'Bob', 'Carl', 'Zed']
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                previous_data = CombineDataCommand(MockApp(), [database_data.copy(), medicaid_data.copy()]).execute()
+                new_medicaid = medicaid_data.copy()
+                new_medicaid.loc[1, 'City'] = 'Provo'
+                diffs = {'database': diff_extracts(database_data, database_data, side='database'),
+                         'medicaid': diff_extracts(medicaid_data, new_medicaid)}
+                command = IncrementalCombineDataCommand(MockApp(), [database_data.copy(), new_medicaid],
+                                                        previous_data, diffs=diffs)
+                combined_data = command.execute()
+            finally:
+                os.chdir(cwd)
+
+        changed_keys = diffs['medicaid'].touched_keys()[2]
+        self.assertEqual(list(changed_keys), list(previous_data.loc[previous_data['Mother_ID'] == 54321, 'Record_Key']))
+        self.assertEqual(command.delta['rematched_rows'], 1)
+        self.assertEqual(combined_data.loc[combined_data['Mother_ID'] == 54321, 'City'].iloc[0], 'Provo')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+import pandas as pd
+from app_crypto import Crypto
+from formats import detect_format, read_table, write_table, iter_table_chunks, ChunkedFileWriter, arrow_compatible
+from invoker import ReadExcelCommand, CombineDataCommand, PartitionedCombineDataCommand
+from test_combine_modes import make_sources
+import cli
+
+
+class MockApp:
+    def show_error(self, title, message):
+        raise AssertionError(message)
+
+
+def write_sources(output_format):
+    paths = []
+    for name, df in zip(['database', 'medicaid'], make_sources()):
+        path = f"{name}.{output_format}"
+        write_table(df.rename(columns=lambda c: c.replace('_', ' ')), path, output_format)
+        paths.append(path)
+    return paths
+
+
+class TestFormats(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_format_is_detected_from_the_content(self):
+        database_data = make_sources()[0]
+        for output_format in ['xlsx', 'csv', 'parquet', 'arrow']:
+            write_table(database_data, f"export.{output_format}", output_format)
+            self.assertEqual(detect_format(f"export.{output_format}"), output_format)
+        # A Parquet export saved under the wrong name, and a CSV export without extension
+        os.replace('export.parquet', 'misnamed.xlsx')
+        self.assertEqual(detect_format('misnamed.xlsx'), 'parquet')
+        os.replace('export.csv', 'export')
+        self.assertEqual(detect_format('export'), 'csv')
+        with open('binary', 'wb') as file:
+            file.write(b'\x00\xff\xfe\x81')
+        with self.assertRaises(ValueError):
+            detect_format('binary')
+
+    def test_every_format_reads_like_excel(self):
+        expected = ReadExcelCommand(MockApp()).execute(write_sources('xlsx')[1])
+        for output_format in ['csv', 'parquet', 'arrow']:
+            with self.subTest(output_format=output_format):
+                data = ReadExcelCommand(MockApp()).execute(write_sources(output_format)[1])
+                self.assertEqual(list(data.columns), list(expected.columns))
+                self.assertEqual(data['State'].tolist(), expected['State'].tolist())
+                self.assertEqual(str(data['Mother_ID'].dtype), str(expected['Mother_ID'].dtype))
+                self.assertTrue(pd.api.types.is_datetime64_any_dtype(data['Child_DOB']))
+
+    def test_chunks_and_mixed_columns(self):
+        unmatched_data = pd.DataFrame({'Mother_ID': [98765, '', 54321], 'Case_ID': ['A-1', 7, ''],
+                                       'Source': ['Database', 'Medicaid', 'Medicaid']})
+        compatible = arrow_compatible(unmatched_data)
+        # The empty strings padding the unmatched rows are missing values; mixed values become text
+        self.assertEqual(compatible['Mother_ID'].tolist()[::2], [98765, 54321])
+        self.assertTrue(pd.isna(compatible['Mother_ID'][1]))
+        self.assertEqual(compatible['Case_ID'].tolist()[:2], ['A-1', '7'])
+        for output_format in ['csv', 'parquet', 'arrow']:
+            with self.subTest(output_format=output_format):
+                path = f"unmatched.{output_format}"
+                writer = ChunkedFileWriter(path)
+                writer.write(unmatched_data.head(2))
+                writer.write(unmatched_data.tail(1)[['Source', 'Case_ID', 'Mother_ID']])
+                writer.close()
+                chunks = list(iter_table_chunks(path, chunksize=2))
+                self.assertEqual(len(chunks), 2)
+                self.assertEqual(read_table(path)['Source'].tolist(), ['Database', 'Medicaid', 'Medicaid'])
+
+    def test_outputs_are_written_in_the_selected_format(self):
+        command = CombineDataCommand(MockApp(), list(make_sources()), output_format='parquet')
+        combined_data = command.execute()
+        self.assertEqual(len(read_table('combined_matched_data.parquet')), len(combined_data))
+        self.assertEqual(len(read_table('unmatched_data.parquet')), 2)
+        self.assertFalse(os.path.exists('combined_matched_data.xlsx'))
+
+        result = PartitionedCombineDataCommand(MockApp(), write_sources('csv'), num_partitions=2,
+                                               matched_file_path='matched.arrow', unmatched_file_path='unmatched.arrow').execute()
+        self.assertEqual(result['matched_rows'], 3)
+        self.assertEqual(len(read_table('matched.arrow')), 3)
+
+    def test_cli_reads_and_writes_other_formats_encrypted(self):
+        Crypto.generateKey()
+        database_path, medicaid_path = write_sources('csv')
+        Crypto.encrypt_file(database_path, Crypto.loadKey())
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = cli.main(['combine', database_path, medicaid_path, '--output-format', 'parquet'])
+        metrics = json.loads(output.getvalue())
+
+        self.assertEqual(exit_code, 0, metrics)
+        self.assertEqual(metrics['rows_out'], {'matched': 3, 'unmatched': 2})
+        for path in [database_path, medicaid_path, 'combined_matched_data.parquet', 'unmatched_data.parquet']:
+            self.assertTrue(Crypto.is_encrypted(path), path)
+
+
+if __name__ == '__main__':
+    unittest.main()
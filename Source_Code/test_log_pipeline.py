@@ -0,0 +1,88 @@
+import unittest
+import io
+import logging
+import threading
+from log_pipeline import RateLimitFilter, configure_logging, stop_logging
+
+
+class ThreadRecordingStream(io.StringIO):
+    """
+    Stream remembering the threads writing to it.
+    """
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def write(self, text):
+        self.threads.add(threading.current_thread())
+        return super().write(text)
+
+
+class CountingValue:
+    """
+    Log argument counting how often it is formatted.
+    """
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return 'value'
+
+
+def make_record(created, level=logging.INFO, lineno=10):
+    record = logging.LogRecord('root', level, 'module.py', lineno, 'Row %s', (1,), None)
+    record.created = created
+    return record
+
+
+class TestRateLimitFilter(unittest.TestCase):
+    def test_call_sites_are_sampled_per_period(self):
+        rate_limit = RateLimitFilter(burst=3, period=1.0)
+        kept = [rate_limit.filter(make_record(100 + index / 100)) for index in range(10)]
+        self.assertEqual(kept, [True] * 3 + [False] * 7)
+        self.assertTrue(rate_limit.filter(make_record(100.5, lineno=11)))
+        self.assertTrue(rate_limit.filter(make_record(100.5, level=logging.WARNING)))
+
+        record = make_record(101.5)
+        self.assertTrue(rate_limit.filter(record))
+        self.assertEqual(record.suppressed, 7)
+        self.assertFalse(hasattr(make_record(101.6), 'suppressed'))
+
+
+class TestLogPipeline(unittest.TestCase):
+    def setUp(self):
+        self.level = logging.getLogger().level
+        self.stream = ThreadRecordingStream()
+        configure_logging(logging.INFO, self.stream)
+
+    def tearDown(self):
+        stop_logging()
+        logging.getLogger().setLevel(self.level)
+
+    def test_records_are_written_by_the_listener_thread(self):
+        logging.info("Saved %s rows to %s", 3, 'combined.xlsx')
+        stop_logging()
+        self.assertIn(" - INFO - Saved 3 rows to combined.xlsx", self.stream.getvalue())
+        self.assertNotIn(threading.current_thread(), self.stream.threads)
+
+    def test_filtered_records_are_never_formatted(self):
+        value = CountingValue()
+        logging.debug("Details: %s", value)
+        stop_logging()
+        self.assertEqual(value.formatted, 0)
+        self.assertEqual(self.stream.getvalue(), '')
+
+    def test_hot_loops_are_sampled(self):
+        for row in range(10000):
+            logging.info("Inserted row %s", row)
+        logging.error("Combine failed")
+        stop_logging()
+        lines = self.stream.getvalue().splitlines()
+        self.assertLess(len(lines), 100)
+        self.assertIn("Inserted row 0", lines[0])
+        self.assertIn("Combine failed", lines[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import os
+import csv
+import json
+import tempfile
+import time
+from unittest.mock import patch
+import pandas as pd
+from cryptography.fernet import Fernet
+from metrics import MetricsRegistry, REGISTRY, count_rows, timed
+from invoker import CombineDataCommand, ReadExcelCommand
+from test_combine_modes import MockApp, make_sources
+from app import App
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_measure_records_times_rows_and_memory(self):
+        registry = MetricsRegistry()
+        registry.trace_memory = True
+        with registry.measure('outer'):
+            with registry.measure('inner') as record:
+                data = bytearray(4 * 1024 ** 2)
+                record['rows'] = 10
+            del data
+
+        inner, outer = registry.snapshot()
+        self.assertEqual((inner['stage'], outer['stage']), ('inner', 'outer'))
+        self.assertEqual(inner['rows'], 10)
+        self.assertGreaterEqual(inner['peak_memory_bytes'], 4 * 1024 ** 2)
+        # The inner stage must not hide its peak from the outer one
+        self.assertGreaterEqual(outer['peak_memory_bytes'], 4 * 1024 ** 2)
+        self.assertGreaterEqual(outer['wall_seconds'], inner['wall_seconds'])
+
+    def test_failed_stage_is_recorded(self):
+        registry = MetricsRegistry()
+        with self.assertRaises(ValueError):
+            with registry.measure('failing'):
+                raise ValueError("boom")
+        self.assertEqual(registry.snapshot()[0]['status'], 'error')
+        self.assertEqual(registry.summary()[0]['errors'], 1)
+        self.assertIsNone(registry.snapshot()[0]['peak_memory_bytes'])
+
+    def test_summary_and_exports(self):
+        registry = MetricsRegistry()
+        for rows in [5, 7]:
+            with registry.measure('stage', rows):
+                pass
+        summary = registry.summary()[0]
+        self.assertEqual((summary['calls'], summary['rows_total']), (2, 12))
+
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = os.path.join(directory, 'metrics.json')
+            csv_path = os.path.join(directory, 'metrics.csv')
+            registry.export_json(json_path)
+            registry.export_csv(csv_path)
+            with open(json_path) as file:
+                self.assertEqual(len(json.load(file)['records']), 2)
+            with open(csv_path, newline='') as file:
+                self.assertEqual([row['rows'] for row in csv.DictReader(file)], ['5', '7'])
+
+    def test_count_rows(self):
+        self.assertEqual(count_rows(pd.DataFrame({'a': [1, 2, 3]})), 3)
+        self.assertEqual(count_rows({'database_rows': 4, 'medicaid_rows': 5}), 9)
+        self.assertIsNone(count_rows(True))
+
+
+class TestCommandInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        REGISTRY.clear()
+
+    def tearDown(self):
+        REGISTRY.clear()
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_command_execute_is_measured(self):
+        CombineDataCommand(MockApp(), list(make_sources())).execute()
+        ReadExcelCommand(MockApp()).execute('combined_matched_data.xlsx')
+
+        stages = {record['stage']: record for record in REGISTRY.snapshot()}
+        self.assertEqual(stages['CombineDataCommand']['rows'], 3)
+        self.assertEqual(stages['ReadExcelCommand']['rows'], 3)
+
+    def test_timed_uses_qualified_name(self):
+        @timed()
+        def load():
+            return [1, 2]
+
+        self.assertEqual(load(), [1, 2])
+        self.assertTrue(REGISTRY.snapshot()[-1]['stage'].endswith('load'))
+
+
+    def test_window_handlers_do_not_measure_the_open_window(self):
+        with open('key.txt', 'wb') as file:
+            file.write(Fernet.generate_key())
+        app = App(None)
+        with patch('app.tk') as tk, patch('app.ttk'), patch('app.populate_treeview'):
+            tk.Toplevel.return_value.mainloop.side_effect = lambda: time.sleep(0.5)
+            app.display_unmatched_data(pd.DataFrame({'Source': ['Medicaid']}))
+
+        record = REGISTRY.snapshot()[-1]
+        self.assertEqual(record['stage'], 'App.display_unmatched_data')
+        self.assertLess(record['wall_seconds'], 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
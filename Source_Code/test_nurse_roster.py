@@ -0,0 +1,137 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from cryptography.fernet import Fernet
+from nurse_roster import NurseRoster, CapacityError, DEFAULT_CAPACITY, assign_children
+from schema import apply_schema
+from app import App
+
+
+def make_combined():
+    return pd.DataFrame({
+        'Mother_ID': [98765, 54321, 33333, 44444, 55555],
+        'Child_First_Name': ['Alice', 'Bob', 'Carl', 'Dana', 'Eve'],
+        'Assigned Nurse': ['Nurse A', 'nurse  a', None, 'None', 'Nurse B'],
+    })
+
+
+class TestNurseRoster(unittest.TestCase):
+    def test_names_are_matched_loosely_and_unique(self):
+        roster = NurseRoster()
+        nurse = roster.add_nurse(" Jane   Smith ", '84604', capacity=10)
+        self.assertEqual((nurse.nurse_id, nurse.name), (1, 'Jane Smith'))
+        self.assertIs(roster.find('jane smith'), nurse)
+        self.assertIsNone(roster.find('Jane Smyth'))
+        self.assertEqual(roster.suggest('Jane Smyth'), ['Jane Smith'])
+        with self.assertRaises(ValueError):
+            roster.add_nurse('JANE SMITH')
+
+    def test_index_is_built_from_the_assigned_nurse_column(self):
+        combined_data = make_combined()
+        roster = NurseRoster()
+        roster.add_nurse('Nurse A')
+        added = roster.build_index(combined_data)
+
+        self.assertEqual([nurse.name for nurse in added], ['Nurse B'])
+        self.assertEqual(roster.caseload(roster.find('Nurse A').nurse_id), {0, 1})
+        self.assertEqual(roster.counts().to_dict(), {'Nurse A': 2, 'Nurse B': 1})
+        self.assertIsNone(roster.nurse_of(3))
+
+    def test_assignments_move_rows_between_caseloads(self):
+        roster = NurseRoster()
+        first, second = roster.add_nurse('Nurse A'), roster.add_nurse('Nurse B')
+        roster.assign(7, first.nurse_id)
+        roster.assign(7, second.nurse_id)
+        self.assertEqual(roster.caseload(first.nurse_id), set())
+        self.assertIs(roster.nurse_of(7), second)
+        self.assertEqual(roster.unassign(7), second.nurse_id)
+        self.assertIsNone(roster.unassign(7))
+        self.assertEqual(len(roster.counts()), 0)
+
+    def test_capacity_and_active_flag_are_enforced(self):
+        combined_data = apply_schema(make_combined())[0]
+        roster = NurseRoster()
+        nurse = roster.add_nurse('Nurse C', capacity=2)
+        self.assertEqual(assign_children(combined_data, roster, [2, 3], nurse.nurse_id), [2, 3])
+        self.assertEqual(list(combined_data['Assigned Nurse'][[2, 3]]), ['Nurse C', 'Nurse C'])
+        # Rows already assigned to the nurse do not count twice
+        self.assertEqual(assign_children(combined_data, roster, [2], nurse.nurse_id), [])
+
+        with self.assertRaises(CapacityError):
+            assign_children(combined_data, roster, [0, 4], nurse.nurse_id)
+        self.assertEqual(combined_data['Assigned Nurse'][0], 'Nurse A')
+        self.assertEqual(roster.caseload(nurse.nurse_id), {2, 3})
+
+        roster.update_nurse(nurse.nurse_id, capacity=5, active=False)
+        with self.assertRaises(CapacityError):
+            roster.assign(0, nurse.nurse_id)
+
+    def test_added_nurses_can_hold_their_caseload(self):
+        combined_data = apply_schema(pd.DataFrame({
+            'Mother_ID': np.arange(DEFAULT_CAPACITY + 5),
+            'Assigned Nurse': ['Nurse A'] * (DEFAULT_CAPACITY + 2) + ['Nurse B', 'None', 'None'],
+        }))[0]
+        roster = NurseRoster()
+        roster.build_index(combined_data)
+        busy, new = roster.find('Nurse A'), roster.find('Nurse B')
+        self.assertEqual((busy.capacity, new.capacity), (DEFAULT_CAPACITY + 2, DEFAULT_CAPACITY))
+        # Moving a row off the busy nurse does not fail on its caseload being over the default
+        self.assertEqual(assign_children(combined_data, roster, [0], new.nurse_id), [0])
+        self.assertEqual(assign_children(combined_data, roster, [0], busy.nurse_id), [0])
+
+    def test_index_updates_do_not_depend_on_the_data_size(self):
+        rows = 200000
+        roster = NurseRoster()
+        roster.build_index(pd.DataFrame({'Assigned Nurse': np.where(np.arange(rows) % 2, 'Nurse A', 'Nurse B')}))
+        nurse = roster.find('Nurse A')
+        roster.update_nurse(nurse.nurse_id, capacity=rows)
+        for row in range(0, 2000, 2):
+            roster.assign(row, nurse.nurse_id)
+        self.assertEqual(roster.counts()['Nurse A'], rows // 2 + 1000)
+
+    def test_roster_file_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'nurse_roster.csv')
+            roster = NurseRoster(path)
+            roster.add_nurse('Nurse A', '08401', 12)
+            roster.add_nurse('Nurse B', active=False)
+            roster.save()
+
+            loaded = NurseRoster.load(path)
+            self.assertEqual([(nurse.nurse_id, nurse.name, nurse.home_zip, nurse.capacity, nurse.active) for nurse in loaded],
+                             [(1, 'Nurse A', '08401', 12, True), (2, 'Nurse B', '', DEFAULT_CAPACITY, False)])
+            self.assertEqual(len(NurseRoster.load(os.path.join(directory, 'missing.csv'))), 0)
+
+
+class TestAppRoster(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        with open('key.txt', 'wb') as file:
+            file.write(Fernet.generate_key())
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_app_indexes_the_loaded_assignments(self):
+        make_combined().to_excel('combined_matched_data.xlsx', index=False)
+        app = App(None)
+        with patch.object(App, 'show_combined_data'):
+            app.load_combined_data()
+
+        with patch('app.messagebox.showwarning') as showwarning:
+            roster = app.roster()
+        self.assertEqual(roster.counts().to_dict(), {'Nurse A': 2, 'Nurse B': 1})
+        self.assertEqual(len(NurseRoster.load('nurse_roster.csv')), 2)
+        # The nurses added to the roster are shown, not only logged
+        showwarning.assert_called_once()
+        self.assertIn('Nurse A\nNurse B', showwarning.call_args[0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
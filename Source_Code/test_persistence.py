@@ -0,0 +1,112 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+import pandas as pd
+from cryptography.fernet import Fernet
+from persistence import CombinedDataSaver
+from schema import set_values
+from app import App
+
+
+class TestCombinedDataSaver(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        self.data = pd.DataFrame({'Mother_ID': [98765, 54321], 'Assigned Nurse': ['None', 'None']})
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_burst_of_changes_is_written_once(self):
+        saver = CombinedDataSaver('combined.xlsx', lambda: self.data, delay=0.2)
+        for nurse in range(20):
+            self.data.loc[nurse % 2, 'Assigned Nurse'] = f"Nurse {nurse}"
+            saver.mark_dirty()
+        self.assertFalse(os.path.exists('combined.xlsx'))
+        deadline = time.time() + 10
+        while saver.writes == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.3)
+
+        self.assertEqual(saver.writes, 1)
+        self.assertFalse(saver.dirty)
+        self.assertEqual(pd.read_excel('combined.xlsx')['Assigned Nurse'].tolist(), ['Nurse 18', 'Nurse 19'])
+
+    def test_flush_writes_now_and_failures_keep_the_previous_file(self):
+        saver = CombinedDataSaver('combined.xlsx', lambda: self.data, delay=60)
+        self.assertTrue(saver.flush())
+        self.assertEqual(saver.writes, 0)
+        saver.mark_dirty()
+        self.assertTrue(saver.flush())
+        self.assertEqual(saver.writes, 1)
+
+        saver.source = lambda: 1 / 0
+        saver.mark_dirty()
+        self.assertFalse(saver.flush())
+        self.assertTrue(saver.dirty)
+        self.assertEqual(os.listdir('.'), ['combined.xlsx'])
+        self.assertEqual(len(pd.read_excel('combined.xlsx')), 2)
+        saver.cancel()
+        self.assertFalse(saver.dirty)
+
+    def test_cancel_waits_for_a_write_in_progress(self):
+        started = threading.Event()
+
+        def complete(data):
+            started.set()
+            time.sleep(0.5)
+            return data
+
+        saver = CombinedDataSaver('combined.xlsx', lambda: self.data, complete, delay=0)
+        saver.mark_dirty()
+        self.assertTrue(started.wait(10))
+        self.assertFalse(saver.cancel())
+        # The file written after cancel, e.g. by a combine, is never replaced by the old data
+        pd.DataFrame({'Mother_ID': [1]}).to_excel('combined.xlsx', index=False)
+        time.sleep(0.3)
+        self.assertEqual(pd.read_excel('combined.xlsx')['Mother_ID'].tolist(), [1])
+        self.assertEqual(saver.writes, 1)
+
+    def test_the_copy_taken_under_the_lock_is_written(self):
+        def complete(data):
+            # The UI thread changes the data once the lock is released
+            with saver.lock:
+                self.data.loc[0, 'Assigned Nurse'] = 'Nurse B'
+            return data
+
+        saver = CombinedDataSaver('combined.xlsx', lambda: self.data, complete, delay=60)
+        with saver.lock:
+            self.data.loc[0, 'Assigned Nurse'] = 'Nurse A'
+        saver.mark_dirty()
+        self.assertTrue(saver.flush())
+        self.assertEqual(pd.read_excel('combined.xlsx')['Assigned Nurse'][0], 'Nurse A')
+        self.assertEqual(self.data['Assigned Nurse'][0], 'Nurse B')
+
+    def test_app_saves_assignments_in_the_background_and_flushes_on_close(self):
+        with open('key.txt', 'wb') as file:
+            file.write(Fernet.generate_key())
+        self.data.to_excel('combined_matched_data.xlsx', index=False)
+        app = App(None)
+        with patch.object(App, 'show_combined_data'):
+            app.load_combined_data()
+        saver = app._App__saver
+        saver.delay = 60
+        set_values(app._App__combined_data, [1], 'Assigned Nurse', 'Nurse A')
+        saver.mark_dirty()
+
+        with patch('app.root', create=True):
+            app.on_closing()
+        self.assertEqual(saver.writes, 1)
+        app._App__combined_data = None
+        with patch.object(App, 'show_combined_data'):
+            app.load_combined_data()
+        self.assertEqual(app._App__combined_data['Assigned Nurse'][1], 'Nurse A')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from proximity import (ProximityIndex, load_centroids, default_locator, haversine_miles, zip_codes,
+                       zip_distances, build_centroid_table, UNKNOWN_DISTANCE)
+
+
+class TestZipGeography(unittest.TestCase):
+    def test_zip_codes_are_normalized(self):
+        self.assertEqual(list(zip_codes([84604, '84604-1234', 84604.0, None, 'n/a'])),
+                         ['84604', '84604', '84604', '', ''])
+
+    def test_haversine_distance(self):
+        # Provo to Salt Lake City is about 40 miles
+        self.assertAlmostEqual(float(haversine_miles(40.2338, -111.6585, 40.7608, -111.8910)), 38.5, delta=1.0)
+        self.assertEqual(float(haversine_miles(40.0, -111.0, 40.0, -111.0)), 0.0)
+
+    def test_unlisted_zip_codes_fall_back_to_their_prefix_area(self):
+        latitudes, longitudes = default_locator().locate(['84604', '84602', '99999', ''])
+        self.assertTrue(np.isclose(latitudes[0], 40.265))
+        self.assertTrue(39.0 < latitudes[1] < 41.0)
+        self.assertTrue(np.isnan(latitudes[2:]).all())
+
+        distances = zip_distances(['84604', '99999'], ['84601', '84770'])
+        self.assertLess(distances[0, 0], 5)
+        self.assertGreater(distances[0, 1], 200)
+        self.assertEqual(list(distances[1]), [UNKNOWN_DISTANCE] * 2)
+
+    def test_census_gazetteer_layout_is_read(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'gazetteer.txt')
+            with open(path, 'w') as file:
+                file.write("GEOID\tALAND\tINTPTLAT\tINTPTLONG                                 \n"
+                           "08401\t1000\t39.37\t-74.45\n84604\t2000\t40.30\t-111.63\n")
+            centroids = load_centroids(path)
+        self.assertEqual(list(centroids.index), ['08401', '84604'])
+        self.assertEqual(centroids.loc['84604', 'Longitude'], -111.63)
+
+    def test_centroid_table_of_the_service_area_is_built_from_the_gazetteer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            gazetteer, path = os.path.join(directory, 'gazetteer.txt'), os.path.join(directory, 'zip_centroids.csv')
+            with open(gazetteer, 'w') as file:
+                file.write("GEOID\tALAND\tINTPTLAT\tINTPTLONG\n"
+                           "08401\t1000\t39.37\t-74.45\n84602\t3000\t40.25\t-111.65\n84604\t2000\t40.30\t-111.63\n")
+            self.assertEqual(build_centroid_table(gazetteer, path=path), 2)
+            centroids = load_centroids(path)
+            with self.assertRaises(ValueError):
+                build_centroid_table(gazetteer, prefixes=['999'], path=path)
+        self.assertEqual(list(centroids.index), ['84602', '84604'])
+        self.assertEqual(centroids.loc['84602', 'Latitude'], 40.25)
+
+
+class TestProximityIndex(unittest.TestCase):
+    def setUp(self):
+        self.data = pd.DataFrame({
+            'Child_First_Name': ['Provo', 'Orem', 'Salt Lake', 'St George', 'Unknown', 'Provo 2'],
+            'ZIP': ['84604', 84057, '84101-1234', '84770', None, '84601'],
+        }, index=[10, 11, 12, 13, 14, 15])
+        self.index = ProximityIndex(self.data)
+
+    def test_radius_query(self):
+        distances = self.index.within('84604', 10)
+        self.assertEqual(list(distances.index), [10, 15, 11])
+        self.assertEqual(distances.iloc[0], 0)
+        self.assertEqual(list(self.index.within((40.756, -111.900), 1).index), [12])
+
+    def test_nearest_query_with_a_mask(self):
+        self.assertEqual(list(self.index.nearest('84604', 2).index), [10, 15])
+        unassigned = np.array([False, True, True, True, True, True])
+        self.assertEqual(list(self.index.nearest('84604', 3, unassigned).index), [15, 11, 12])
+        self.assertEqual(list(self.index.nearest('84604', 100).index), [10, 15, 11, 12, 13])
+
+    def test_unknown_origin_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.index.within('99999', 10)
+
+    def test_queries_take_milliseconds_at_scale(self):
+        rng = np.random.default_rng(0)
+        zips = rng.choice(load_centroids().index.to_numpy(), 200000)
+        index = ProximityIndex(pd.DataFrame({'ZIP': zips}))
+        mask = rng.random(200000) < 0.5
+
+        start = time.perf_counter()
+        within = index.within('84604', 15, mask)
+        nearest = index.nearest('84101', 500, mask)
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.5)
+        self.assertTrue(mask[within.index].all())
+        self.assertTrue((within <= 15).all())
+        self.assertEqual(len(nearest), 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
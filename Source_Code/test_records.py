@@ -0,0 +1,153 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+import pandas as pd
+from cryptography.fernet import Fernet
+from records import LazyRecords, BROWSE_COLUMNS
+from formats import read_table
+from snapshot import read_snapshot, write_snapshot
+from app import App
+from test_combine_modes import make_sources
+
+
+def make_combined():
+    return pd.DataFrame({
+        'Mother_ID': [98765, 54321, 33333],
+        'Mother_First_Name': ['Jane', 'Mary', 'Ann'],
+        'Child_First_Name': ['Alice', 'Bob', 'Carl'],
+        'Child_Last_Name': ['Doe', 'Smith', 'Brown'],
+        'Child_Date_of_Birth': pd.to_datetime(['2024-05-20', '2023-06-01', '2022-01-15']),
+        'Street': ['1 Main St', '2 Oak Ave', '3 Elm Rd'],
+        'Phone #': ['555-0100', '555-0101', '555-0102'],
+        'City': ['Provo', 'Orem', 'Provo'],
+        'Assigned Nurse': ['None', 'Nurse A', 'None'],
+    })
+
+
+class TestRecords(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_read_table_projects_every_format(self):
+        combined_data = make_combined()
+        combined_data.to_excel('data.xlsx', index=False)
+        combined_data.to_csv('data.csv', index=False)
+        combined_data.to_feather('data.feather')
+        combined_data.to_parquet('data.parquet', index=False)
+
+        for path in ('data.xlsx', 'data.csv', 'data.feather', 'data.parquet'):
+            with self.subTest(path=path):
+                projected = read_table(path, ['City', 'Mother_ID', 'Unknown'])
+                self.assertEqual(list(projected.columns), ['Mother_ID', 'City'])
+                self.assertEqual(list(projected['City']), ['Provo', 'Orem', 'Provo'])
+        self.assertEqual(list(read_table('data.feather').columns), list(combined_data.columns))
+
+    def test_lazy_records_follow_the_projected_rows(self):
+        full_data = make_combined()
+        loads = []
+        records = LazyRecords(lambda: loads.append(1) or full_data)
+        projected = full_data[[col for col in full_data.columns if col in BROWSE_COLUMNS]].copy()
+        projected.sort_values('Child_Date_of_Birth', inplace=True)
+        projected['Age'] = ['3 years', '2 years', '1 years']
+        projected.loc[0, 'Assigned Nurse'] = 'Nurse B'
+        self.assertFalse(records.loaded)
+
+        record = records.record(projected, projected.loc[1])
+        self.assertEqual(record['Street'], '2 Oak Ave')
+        self.assertEqual(record['Child_First_Name'], 'Bob')
+
+        full_frame = records.full_frame(projected)
+        self.assertEqual(list(full_frame.columns), list(full_data.columns) + ['Age'])
+        self.assertEqual(list(full_frame['Street']), ['3 Elm Rd', '2 Oak Ave', '1 Main St'])
+        self.assertEqual(full_frame.loc[0, 'Assigned Nurse'], 'Nurse B')
+        self.assertEqual(len(loads), 1)
+
+    def test_concurrent_threads_load_the_details_once(self):
+        full_data = make_combined()
+        loads = []
+
+        def loader():
+            loads.append(1)
+            time.sleep(0.2)
+            return full_data
+
+        records = LazyRecords(loader)
+        projected = full_data[[col for col in full_data.columns if col in BROWSE_COLUMNS]].copy()
+        # The saver thread completes a copy while the UI thread opens a profile
+        saver = threading.Thread(target=lambda: records.full_frame(projected.copy()))
+        saver.start()
+        record = records.record(projected, projected.loc[2])
+        saver.join()
+
+        self.assertEqual(record['Street'], '3 Elm Rd')
+        self.assertEqual(len(loads), 1)
+
+    def test_snapshot_projection(self):
+        key = Fernet.generate_key()
+        make_combined().to_excel('combined_matched_data.xlsx', index=False)
+        write_snapshot(make_combined(), 'combined_matched_data.xlsx', key)
+
+        projected = read_snapshot('combined_matched_data.xlsx', key, columns=['City', 'Mother_ID'])
+        self.assertEqual(list(projected.columns), ['Mother_ID', 'City'])
+        make_combined().head(1).to_excel('combined_matched_data.xlsx', index=False)
+        # Stale for the workbook, still readable when the staleness check is skipped
+        self.assertIsNone(read_snapshot('combined_matched_data.xlsx', key))
+        self.assertEqual(len(read_snapshot(None, key)), 3)
+
+    def test_app_keeps_the_browse_columns_and_saves_every_column(self):
+        with open('key.txt', 'wb') as file:
+            file.write(Fernet.generate_key())
+        make_combined().to_excel('combined_matched_data.xlsx', index=False)
+        app = App(None)
+        with patch.object(App, 'show_combined_data'):
+            app.load_combined_data()
+        self.assertNotIn('Street', app._App__combined_data.columns)
+        self.assertTrue(os.path.exists('session_snapshot.bin'))
+
+        row = app._App__combined_data.iloc[2]
+        self.assertEqual(app.complete_record(row)['Phone #'], '555-0102')
+        app._App__combined_data.loc[2, 'Assigned Nurse'] = 'Nurse A'
+        full_data = app.full_combined_data()
+        self.assertEqual(list(full_data.columns), list(make_combined().columns))
+        self.assertEqual(list(full_data['Assigned Nurse'])[1:], ['Nurse A', 'Nurse A'])
+
+
+    def test_update_after_a_projected_load_keeps_every_column(self):
+        with open('key.txt', 'wb') as file:
+            file.write(Fernet.generate_key())
+        app = App(None)
+        app._App__data_frames = list(make_sources())
+        with patch.object(App, 'show_combined_data'):
+            # The first update stores the state of the sources
+            app.update_combined_data()
+            expected = read_table('combined_matched_data.xlsx')
+            app._App__combined_data = None
+            app.load_combined_data()
+            self.assertNotIn('State_File_Number', app._App__combined_data.columns)
+            app.assign_nurses({0: app.roster().add_nurse('Nurse A').nurse_id}, "Assignment of nurse 'Nurse A'")
+
+            # One family moved; the others are untouched
+            database_data, medicaid_data = make_sources()
+            medicaid_data.loc[1, 'City'] = 'Provo'
+            app._App__data_frames = [database_data, medicaid_data]
+            app.update_combined_data()
+        app._App__saver.cancel()
+
+        combined_data = read_table('combined_matched_data.xlsx')
+        self.assertEqual(list(combined_data.columns), list(expected.columns))
+        self.assertFalse(combined_data.drop(columns='Assigned Nurse').isna().any().any())
+        self.assertEqual(sorted(combined_data['City']), ['Provo', 'Provo', 'Springfield'])
+        nurses = dict(zip(combined_data['Mother_ID'], combined_data['Assigned Nurse']))
+        self.assertEqual(nurses[expected.loc[0, 'Mother_ID']], 'Nurse A')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import pandas as pd
+from schema import apply_schema, optimize_dtypes, set_values
+from data_ops import search_mask, assign_nurse, batch_assign, report_statistics
+from snapshot import serialize_frame, deserialize_frame
+
+
+def make_combined():
+    return pd.DataFrame({
+        'Mother_ID': [98765, 54321, 33333],
+        'Child_ID': [123456789, 223456789, 323456789],
+        'Child_First_Name': ['Alice', 'Bob', 'Carl'],
+        'Child_Last_Name': ['Doe', 'Smith', 'Brown'],
+        'Child_Date_of_Birth': ['2024-05-20', '2023-06-01', None],
+        'City': ['Provo', 'Orem', 'Provo'],
+        'State': ['UT', 'UT', 'UT'],
+        'ZIP': ['84604', '84057', '84604'],
+        'Tobacco_Usage': [True, False, False],
+        'Assigned Nurse': [None, 'Nurse A', None],
+    })
+
+
+class TestSchema(unittest.TestCase):
+    def test_compact_dtypes(self):
+        combined_data, report = apply_schema(make_combined())
+
+        self.assertEqual(str(combined_data['Mother_ID'].dtype), 'int32')
+        self.assertEqual(str(combined_data['Tobacco_Usage'].dtype), 'bool')
+        self.assertEqual(str(combined_data['State'].dtype), 'category')
+        self.assertEqual(str(combined_data['Assigned Nurse'].dtype), 'category')
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(combined_data['Child_Date_of_Birth']))
+        self.assertTrue(pd.isna(combined_data['Child_Date_of_Birth'][2]))
+        self.assertGreater(report['before_bytes'], 0)
+        self.assertGreater(report['after_bytes'], 0)
+
+    def test_ids_with_leading_zeros_stay_text(self):
+        compact = optimize_dtypes(pd.DataFrame({'Mother_ID': ['00123', '456'], 'Child_ID': ['0', '789']}))
+
+        self.assertEqual(list(compact['Mother_ID']), ['00123', '456'])
+        self.assertEqual(str(compact['Child_ID'].dtype), 'int32')
+
+    def test_padded_and_unexpected_values_are_kept(self):
+        unmatched_data = pd.DataFrame({
+            'Mother_ID': [98765, ''],
+            'Case_ID': ['A-1', 7],
+            'Tobacco_Usage': [True, ''],
+            'Mother_DOB': ['1990-01-02', 'unknown'],
+            'Source': ['Database', 'Medicaid'],
+        })
+        compact = optimize_dtypes(unmatched_data)
+
+        self.assertEqual(str(compact['Mother_ID'].dtype), 'Int32')
+        self.assertTrue(pd.isna(compact['Mother_ID'][1]))
+        self.assertEqual(str(compact['Tobacco_Usage'].dtype), 'boolean')
+        self.assertEqual(list(compact['Case_ID']), ['A-1', 7])
+        self.assertEqual(list(compact['Mother_DOB']), ['1990-01-02', 'unknown'])
+        self.assertEqual(list(compact['Source']), ['Database', 'Medicaid'])
+
+    def test_data_operations_on_compact_dtypes(self):
+        combined_data = optimize_dtypes(make_combined())
+
+        self.assertEqual(list(search_mask(combined_data, 'BOB')), [False, True, False])
+        self.assertEqual(assign_nurse(combined_data, combined_data.iloc[0].to_dict(), 'Nurse B'), 0)
+        self.assertEqual(batch_assign(combined_data, 'Nurse C', city='orem'), 1)
+        self.assertEqual(combined_data['Assigned Nurse'].tolist()[:2], ['Nurse B', 'Nurse C'])
+
+        statistics = report_statistics(combined_data, pd.Timestamp('2025-01-01'))
+        # Nurse A lost its only child and must not be reported with a zero count
+        self.assertEqual(statistics['assigned_nurses'].to_dict(), {'Nurse B': 1, 'Nurse C': 1})
+        self.assertEqual(len(statistics['unassigned_children']), 1)
+        self.assertEqual(statistics['children_per_state'].to_dict(), {'UT': 3})
+
+    def test_set_values_on_missing_column(self):
+        combined_data = make_combined().drop(columns=['Assigned Nurse'])
+        set_values(combined_data, [1], 'Assigned Nurse', 'Nurse A')
+        self.assertEqual(combined_data['Assigned Nurse'][1], 'Nurse A')
+
+    def test_compact_dtypes_survive_the_snapshot(self):
+        combined_data = optimize_dtypes(make_combined())
+        restored, _ = deserialize_frame(serialize_frame(combined_data, {}))
+        pd.testing.assert_frame_equal(restored, combined_data)
+
+
+if __name__ == '__main__':
+    unittest.main()
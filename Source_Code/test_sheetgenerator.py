@@ -0,0 +1,94 @@
+import unittest
+import os
+import tempfile
+from datetime import date
+import numpy as np
+import pandas as pd
+import sheetgenerator
+from sheetgenerator import generate_data, write_generated_files, apply_noise, score_matches, introduce_typos, NOISE_TYPES
+
+REFERENCE_DATE = date(2024, 1, 1)
+
+
+class TestVectorizedGenerator(unittest.TestCase):
+    def test_generated_sheets(self):
+        database_data, medicaid_data = generate_data(200, unmatched_ratio=0.1, unmatched_target="medicaid", seed=3,
+                                                     chunk_rows=64, reference_date=REFERENCE_DATE)
+
+        self.assertEqual(list(database_data.columns), sheetgenerator.DATABASE_COLUMNS)
+        self.assertEqual(list(medicaid_data.columns), sheetgenerator.MEDICAID_COLUMNS)
+        self.assertEqual((len(database_data), len(medicaid_data)), (200, 220))
+        self.assertTrue(medicaid_data['Child ID'].is_unique and medicaid_data['Mother ID'].is_unique)
+        # The first rows of both sheets are the same families
+        self.assertEqual(list(database_data['Mother First Name']), list(medicaid_data['Mother First Name'][:200]))
+        self.assertEqual(list(database_data['DOB']), list(medicaid_data['Child DOB'][:200]))
+        ages = (pd.Timestamp(REFERENCE_DATE) - pd.to_datetime(database_data['DOB'])).dt.days
+        self.assertTrue(ages.between(0, sheetgenerator.MAX_CHILD_AGE_DAYS).all())
+
+    def test_same_seed_same_data(self):
+        first = generate_data(100, 0.2, seed=5, reference_date=REFERENCE_DATE)
+        second = generate_data(100, 0.2, seed=5, reference_date=REFERENCE_DATE)
+        other = generate_data(100, 0.2, seed=6, reference_date=REFERENCE_DATE)
+        pd.testing.assert_frame_equal(first[1], second[1])
+        self.assertFalse(first[1]['Mother ID'].equals(other[1]['Mother ID']))
+
+    def test_streamed_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for output_format in ['csv', 'xlsx']:
+                database_path, medicaid_path = write_generated_files(
+                    50, 0.1, seed=1, output_format=output_format, output_dir=directory, chunk_rows=16,
+                    reference_date=REFERENCE_DATE)
+                reader = pd.read_csv if output_format == 'csv' else pd.read_excel
+                self.assertEqual(len(reader(database_path)), 55)
+                self.assertEqual(len(reader(medicaid_path)), 55)
+
+
+class TestNoiseModel(unittest.TestCase):
+    def test_every_error_type_is_labelled(self):
+        rates = {noise_type: 0.2 for noise_type in NOISE_TYPES}
+        database_data, medicaid_data, labels = generate_data(500, 0.1, seed=4, chunk_rows=128,
+                                                             reference_date=REFERENCE_DATE, noise=rates)
+
+        clean_database, clean_medicaid = generate_data(500, 0.1, seed=4, chunk_rows=128, reference_date=REFERENCE_DATE)
+        # One label per matching family plus one per twin; twins get 10 digit IDs
+        twins = labels['Child_ID'] >= 10 ** 9
+        self.assertEqual(len(labels) - twins.sum(), 500)
+        self.assertTrue(labels['Child_ID'].is_unique and labels['State_File_Number'].is_unique)
+        self.assertTrue(set(labels.loc[twins, 'Child_ID']).issubset(set(medicaid_data['Child ID'])))
+        self.assertTrue(set(labels.loc[twins, 'State_File_Number']).issubset(set(database_data['State File Number'])))
+        self.assertGreater(len(database_data) + len(medicaid_data), len(clean_database) + len(clean_medicaid))
+        for noise_type in NOISE_TYPES:
+            self.assertTrue(labels['Noise'].str.contains(noise_type).any(), noise_type)
+
+        # Only the rows labelled with a name or birth date error differ from the clean sheet
+        altered = labels['Noise'].str.contains('typo|swapped_names|hyphenated_surname|dob_off_by_one')
+        noisy = medicaid_data.drop_duplicates('Child ID').set_index('Child ID').loc[labels['Child_ID'][~twins]]
+        clean = clean_medicaid.set_index('Child ID').loc[labels['Child_ID'][~twins]]
+        columns = ['Mother First Name', 'Last Name', 'Child DOB']
+        differs = (noisy[columns] != clean[columns]).any(axis=1).to_numpy()
+        self.assertFalse((differs & ~altered[~twins].to_numpy()).any())
+
+    def test_apply_noise_validates_rates(self):
+        database_data, medicaid_data = generate_data(10, seed=1, reference_date=REFERENCE_DATE)
+        with self.assertRaises(ValueError):
+            apply_noise(database_data, medicaid_data, {'misspelling': 0.1}, np.random.default_rng(0))
+
+    def test_introduce_typos_changes_one_position(self):
+        values = introduce_typos(['Martinez', 'Ana', 'Jo'], np.random.default_rng(1))
+        for original, typo in zip(['Martinez', 'Ana', 'Jo'], values):
+            self.assertEqual(len(original), len(typo))
+            self.assertLessEqual(sum(a != b for a, b in zip(original, typo)), 2)
+
+    def test_score_matches(self):
+        labels = pd.DataFrame({'State_File_Number': [1, 2, 3], 'Child_ID': [10, 20, 30], 'Noise': ['', 'typo', 'twin']})
+        combined = pd.DataFrame({'State_File_Number': [1, 2, 3], 'Child_ID': [10, 30, 20]})
+        scores = score_matches(combined, labels)
+        self.assertAlmostEqual(scores['precision'], 1 / 3)
+        self.assertAlmostEqual(scores['recall'], 1 / 3)
+        self.assertEqual(scores['recall_by_noise']['clean'], 1.0)
+        self.assertEqual(scores['recall_by_noise']['typo'], 0.0)
+        self.assertIsNone(scores['recall_by_noise']['duplicate_row'])
+
+
+if __name__ == '__main__':
+    unittest.main()
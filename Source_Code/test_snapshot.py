@@ -0,0 +1,80 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+import pandas as pd
+from cryptography.fernet import Fernet
+from snapshot import read_snapshot, write_snapshot, serialize_frame, deserialize_frame, ARROW_MAGIC
+from app import App
+
+
+def make_combined():
+    combined_data = pd.DataFrame({
+        'Mother_ID': [98765, 54321, 33333],
+        'Child_First_Name': ['Alice', 'Bob', 'Carl'],
+        'Child_Date_of_Birth': pd.to_datetime(['2024-05-20', '2023-06-01', '2022-01-15']),
+        'Assigned Nurse': [None, 'Nurse A', None],
+    }, index=[4, 2, 7])
+    combined_data['Age'] = ['7 months', '1 years', '2 years']
+    return combined_data
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        self.key = Fernet.generate_key()
+        make_combined().to_excel('combined_matched_data.xlsx', index=False)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_round_trip_keeps_dtypes_and_index(self):
+        write_snapshot(make_combined(), 'combined_matched_data.xlsx', self.key)
+        with open('session_snapshot.bin', 'rb') as file:
+            self.assertNotIn(b'Alice', file.read())
+
+        restored = read_snapshot('combined_matched_data.xlsx', self.key)
+        pd.testing.assert_frame_equal(restored, make_combined())
+
+    def test_mixed_types_fall_back_to_pickle(self):
+        combined_data = make_combined()
+        combined_data['ZIP'] = [84604, '84057', None]
+        payload = serialize_frame(combined_data, {'version': 1})
+        self.assertNotEqual(payload[:len(ARROW_MAGIC)], ARROW_MAGIC)
+        restored, metadata = deserialize_frame(payload)
+        pd.testing.assert_frame_equal(restored, combined_data)
+        self.assertEqual(metadata, {'version': 1})
+
+    def test_stale_wrong_key_or_missing_snapshot_is_ignored(self):
+        self.assertIsNone(read_snapshot('combined_matched_data.xlsx', self.key))
+        write_snapshot(make_combined(), 'combined_matched_data.xlsx', self.key)
+        self.assertIsNone(read_snapshot('combined_matched_data.xlsx', Fernet.generate_key()))
+
+        # The workbook changed after the snapshot was taken
+        make_combined().head(2).to_excel('combined_matched_data.xlsx', index=False)
+        self.assertIsNone(read_snapshot('combined_matched_data.xlsx', self.key))
+        os.remove('combined_matched_data.xlsx')
+        self.assertIsNone(read_snapshot('combined_matched_data.xlsx', self.key))
+
+    def test_app_restores_the_previous_session(self):
+        with open('key.txt', 'wb') as file:
+            file.write(self.key)
+        write_snapshot(make_combined(), 'combined_matched_data.xlsx', self.key)
+
+        app = App(None)
+        with patch.object(App, 'show_combined_data') as show_combined_data, \
+                patch('app.pd.read_excel') as read_excel:
+            self.assertTrue(app.restore_session())
+            app.load_combined_data()
+        self.assertEqual(show_combined_data.call_count, 2)
+        read_excel.assert_not_called()
+        # Only the browsed columns are kept in memory, the others are fetched on demand
+        pd.testing.assert_frame_equal(app._App__combined_data, make_combined().drop(columns=['Age']))
+        pd.testing.assert_frame_equal(app.full_combined_data(), make_combined())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import tkinter as tk
+import treeview_loader
+from treeview_loader import TreeviewLoader, populate_treeview, cancel_population
+
+
+class FakeTreeview:
+    """
+    Treeview stand-in running the scheduled callbacks on demand, like a Tk event loop.
+    """
+    def __init__(self):
+        self.items = []
+        self.scheduled = {}
+        self.exists = True
+        self._next_id = 0
+
+    def insert(self, parent, index, iid=None, values=()):
+        if not self.exists:
+            raise tk.TclError("invalid command name")
+        self.items.append((iid, tuple(values)))
+
+    def delete(self, *items):
+        self.items = []
+
+    def get_children(self):
+        return tuple(range(len(self.items)))
+
+    def winfo_exists(self):
+        return self.exists
+
+    def after(self, delay, callback):
+        self._next_id += 1
+        self.scheduled[self._next_id] = callback
+        return self._next_id
+
+    def after_cancel(self, after_id):
+        del self.scheduled[after_id]
+
+    def run_pending(self):
+        """
+        Run the callbacks scheduled so far; returns how many ran.
+        """
+        pending, self.scheduled = self.scheduled, {}
+        for callback in pending.values():
+            callback()
+        return len(pending)
+
+
+def rows(count):
+    return ((row, f"Child {row}") for row in range(count))
+
+
+class TestTreeviewLoader(unittest.TestCase):
+    def test_first_rows_are_shown_at_once_and_the_rest_in_slices(self):
+        treeview = FakeTreeview()
+        completed = []
+        loader = populate_treeview(treeview, rows(1000), on_complete=completed.append, first_batch=100, time_slice=0)
+        self.assertEqual(len(treeview.items), 100)
+        self.assertFalse(loader.done)
+
+        slices = 0
+        while treeview.run_pending():
+            slices += 1
+        self.assertGreater(slices, 1)
+        self.assertTrue(loader.done)
+        self.assertEqual(completed, [1000])
+        self.assertEqual(treeview.items[-1], (None, (999, "Child 999")))
+        self.assertNotIn(str(treeview), treeview_loader._loaders)
+
+    def test_small_results_are_inserted_at_once_with_their_ids(self):
+        treeview = FakeTreeview()
+        loader = populate_treeview(treeview, [("a",), ("b",)], iids=["0", "1"])
+        self.assertTrue(loader.done)
+        self.assertEqual(treeview.items, [("0", ("a",)), ("1", ("b",))])
+
+    def test_a_new_search_cancels_the_previous_loader(self):
+        treeview = FakeTreeview()
+        first = populate_treeview(treeview, rows(1000), first_batch=10)
+        second = populate_treeview(treeview, rows(5), first_batch=10)
+        self.assertTrue(first.cancelled)
+        self.assertTrue(second.done)
+        self.assertEqual(treeview.scheduled, {})
+        self.assertEqual(len(treeview.items), 5)
+
+    def test_loading_stops_with_the_window(self):
+        treeview = FakeTreeview()
+        loader = populate_treeview(treeview, rows(1000), first_batch=10, time_slice=0)
+        treeview.exists = False
+        treeview.run_pending()
+        self.assertTrue(loader.cancelled)
+        self.assertEqual(treeview.scheduled, {})
+
+        treeview = FakeTreeview()
+        loader = TreeviewLoader(treeview, rows(1000), first_batch=10).start()
+        cancel_population(treeview)
+        self.assertFalse(loader.cancelled)
+        loader.cancel()
+        self.assertEqual((len(treeview.items), treeview.scheduled), (10, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+import os
+import tempfile
+import time
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from cryptography.fernet import Fernet
+from invoker import Invoker, NurseAssignmentCommand
+from nurse_roster import NurseRoster, CapacityError
+from schema import apply_schema
+from app import App
+
+
+def make_combined(rows=5):
+    nurses = np.array(['Nurse A', None, 'Nurse B', None, None] * (rows // 5), dtype=object)
+    return apply_schema(pd.DataFrame({'Mother_ID': np.arange(rows), 'Assigned Nurse': nurses}))[0]
+
+
+def make_roster(combined_data, capacity=25):
+    roster = NurseRoster()
+    roster.add_nurse('Nurse A', capacity=capacity)
+    roster.add_nurse('Nurse B', capacity=capacity)
+    roster.add_nurse('Nurse C', capacity=capacity)
+    roster.build_index(combined_data)
+    return roster
+
+
+def nurse_column(combined_data):
+    return list(combined_data['Assigned Nurse'].astype(object).where(combined_data['Assigned Nurse'].notna(), None))
+
+
+class TestNurseAssignmentCommand(unittest.TestCase):
+    def test_undo_and_redo_restore_the_column_and_the_index(self):
+        combined_data = make_combined()
+        roster = make_roster(combined_data)
+        history = Invoker()
+        nurse_c = roster.find('Nurse C').nurse_id
+
+        changed = history.execute_command(NurseAssignmentCommand(None, combined_data, roster, dict.fromkeys([0, 1, 2], nurse_c)))
+        self.assertEqual(changed, 3)
+        self.assertEqual(nurse_column(combined_data), ['Nurse C', 'Nurse C', 'Nurse C', None, None])
+
+        command = history.undo()
+        self.assertEqual(nurse_column(combined_data), ['Nurse A', None, 'Nurse B', None, None])
+        self.assertEqual(roster.counts().to_dict(), {'Nurse A': 1, 'Nurse B': 1})
+        self.assertEqual(command.previous.tolist(), [1, -1, 2])
+
+        history.redo()
+        self.assertEqual(nurse_column(combined_data), ['Nurse C', 'Nurse C', 'Nurse C', None, None])
+        self.assertEqual(roster.caseload(nurse_c), {0, 1, 2})
+        self.assertIsNone(history.redo())
+
+    def test_only_the_delta_is_recorded(self):
+        combined_data = make_combined()
+        roster = make_roster(combined_data)
+        history = Invoker()
+        nurse_a = roster.find('Nurse A').nurse_id
+
+        command = NurseAssignmentCommand(None, combined_data, roster, dict.fromkeys([0, 3], nurse_a))
+        history.execute_command(command)
+        self.assertEqual(command.rows.tolist(), [3])
+        self.assertEqual(command.current.dtype, np.int32)
+
+        # A step changing nothing is not worth undoing
+        history.execute_command(NurseAssignmentCommand(None, combined_data, roster, {0: nurse_a}))
+        self.assertEqual(len(history.undo_stack), 1)
+
+    def test_new_step_clears_the_redo_stack(self):
+        combined_data = make_combined()
+        roster = make_roster(combined_data)
+        history = Invoker(history_limit=2)
+        nurse_c = roster.find('Nurse C').nurse_id
+        for row in [1, 3, 4]:
+            history.execute_command(NurseAssignmentCommand(None, combined_data, roster, {row: nurse_c}))
+        self.assertEqual(len(history.undo_stack), 2)
+
+        history.undo()
+        history.execute_command(NurseAssignmentCommand(None, combined_data, roster, {4: roster.find('Nurse A').nurse_id}))
+        self.assertEqual(history.redo_stack, [])
+        self.assertEqual(nurse_column(combined_data), ['Nurse A', 'Nurse C', 'Nurse B', 'Nurse C', 'Nurse A'])
+
+    def test_redo_beyond_a_lowered_capacity_is_refused(self):
+        combined_data = make_combined()
+        roster = make_roster(combined_data)
+        history = Invoker()
+        nurse_c = roster.find('Nurse C').nurse_id
+        history.execute_command(NurseAssignmentCommand(None, combined_data, roster, dict.fromkeys([1, 3], nurse_c)))
+        history.undo()
+        roster.update_nurse(nurse_c, capacity=1)
+
+        with self.assertRaises(CapacityError):
+            history.redo()
+        self.assertEqual(len(history.redo_stack), 1)
+        self.assertEqual(roster.caseload(nurse_c), set())
+
+    def test_20k_row_batch_is_undone_without_copying_the_data(self):
+        combined_data = make_combined(200000)
+        roster = make_roster(combined_data, capacity=200000)
+        history = Invoker()
+        rows = np.arange(0, 100000, 5).tolist() + np.arange(1, 50000, 5).tolist()
+        history.execute_command(NurseAssignmentCommand(None, combined_data, roster,
+                                                       dict.fromkeys(rows, roster.find('Nurse C').nurse_id)))
+        command = history.undo_stack[-1]
+        self.assertEqual(len(command.rows), 30000)
+        self.assertLess(command.rows.nbytes + command.previous.nbytes + command.current.nbytes, 500000)
+        codes = combined_data['Assigned Nurse'].array.codes
+
+        start = time.perf_counter()
+        history.undo()
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 1)
+        self.assertEqual(nurse_column(combined_data), nurse_column(make_combined(200000)))
+        self.assertEqual(roster.counts().to_dict(), {'Nurse A': 40000, 'Nurse B': 40000})
+        # The column was updated in place
+        self.assertTrue(np.shares_memory(combined_data['Assigned Nurse'].array.codes, codes))
+
+
+class TestAppUndo(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        with open('key.txt', 'wb') as file:
+            file.write(Fernet.generate_key())
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_assignments_are_undone_and_redone(self):
+        pd.DataFrame({'Mother_ID': [1, 2], 'Assigned Nurse': ['Nurse A', None]}).to_excel('combined_matched_data.xlsx',
+                                                                                        index=False)
+        app = App(None)
+        with patch.object(App, 'show_combined_data'):
+            app.load_combined_data()
+        app._App__saver.delay = 60
+        with patch('app.messagebox.showwarning'):
+            nurse_a = app.roster().find('Nurse A').nurse_id
+
+        self.assertEqual(app.assign_nurses({1: nurse_a}, "Assignment of nurse 'Nurse A'"), 1)
+        with patch('app.messagebox.showinfo') as showinfo, patch.object(App, 'update_combined_names'):
+            app.undo_assignment()
+            self.assertIsNone(app.roster().nurse_of(1))
+            showinfo.assert_called_with("Undo", "Undone: Assignment of nurse 'Nurse A' (1 children).")
+            app.redo_assignment()
+            self.assertEqual(app.roster().nurse_of(1).name, 'Nurse A')
+            app.redo_assignment()
+            showinfo.assert_called_with("Redo", "Nothing to redo.")
+        self.assertTrue(app._App__saver.dirty)
+        app._App__saver.cancel()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+Incremental population of Treeview widgets through the Tk event loop.
+
+Inserting every row of a large result in one loop blocks the event loop until the last row
+is in: the window stays blank, and scrolling and clicks wait. `populate_treeview` instead
+inserts the first rows at once and the others in time slices scheduled with `after`, so
+the user sees and scrolls the first rows while the rest loads. The rows are read from an
+iterator, e.g. a generator over the data frame, and only converted when inserted.
+
+A Treeview is filled by one loader at a time: populating it again, e.g. for a new search,
+cancels the loader still filling it, and a loader stops by itself once its widget is
+destroyed with its window.
+"""
+import logging
+import time
+import tkinter as tk
+
+# Rows inserted at once, before the event loop runs again
+FIRST_BATCH_ROWS = 200
+
+# Time spent inserting rows per event loop iteration, in seconds
+TIME_SLICE_SECONDS = 0.02
+
+# Rows inserted between two checks of the elapsed time
+CLOCK_CHECK_ROWS = 50
+
+# The loader filling each Treeview, by widget
+_loaders = {}
+
+
+class TreeviewLoader:
+    """
+    Time-sliced, cancellable filling of a Treeview from an iterator of rows.
+
+    Attributes:
+        treeview (ttk.Treeview): The widget filled.
+        inserted (int): Rows inserted so far.
+        done (bool): Whether every row was inserted.
+        cancelled (bool): Whether the loader was stopped before the last row.
+    """
+    def __init__(self, treeview, rows, iids=None, on_complete=None,
+                 first_batch=FIRST_BATCH_ROWS, time_slice=TIME_SLICE_SECONDS):
+        """
+        Initialize the loader; nothing is inserted until `start`.
+
+        Args:
+            rows (iterable): The values of each row, in display order.
+            iids (iterable, optional): The item id of each row; Tk names the items otherwise.
+            on_complete (callable, optional): Called with the number of rows once all are inserted.
+        """
+        self.treeview = treeview
+        self.inserted = 0
+        self.done = False
+        self.cancelled = False
+        self.on_complete = on_complete
+        self.first_batch = first_batch
+        self.time_slice = time_slice
+        self._rows = iter(rows) if iids is None else zip(iids, rows)
+        self._with_iids = iids is not None
+        self._after_id = None
+
+    def start(self):
+        """
+        Insert the first batch of rows now and schedule the others.
+
+        Returns:
+            TreeviewLoader: The loader, for chaining.
+        """
+        self._insert(self.first_batch, None)
+        return self
+
+    def cancel(self):
+        """
+        Stop inserting rows; the rows already inserted stay.
+        """
+        if self.done or self.cancelled:
+            return
+        self.cancelled = True
+        if self._after_id is not None:
+            try:
+                self.treeview.after_cancel(self._after_id)
+            except tk.TclError:
+                pass
+            self._after_id = None
+        self._release()
+
+    def _insert(self, max_rows, deadline):
+        """
+        Insert rows until `max_rows` are inserted or the deadline passes, then reschedule.
+        """
+        self._after_id = None
+        if self.cancelled:
+            return
+        try:
+            if not self.treeview.winfo_exists():
+                self.cancel()
+                return
+            count = 0
+            for row in self._rows:
+                if self._with_iids:
+                    self.treeview.insert("", "end", iid=row[0], values=row[1])
+                else:
+                    self.treeview.insert("", "end", values=row)
+                count += 1
+                if count == max_rows or (deadline is not None and count % CLOCK_CHECK_ROWS == 0
+                                         and time.perf_counter() >= deadline):
+                    break
+            else:
+                self.inserted += count
+                self._finish()
+                return
+            self.inserted += count
+            self._after_id = self.treeview.after(1, self._next_slice)
+        except tk.TclError as e:
+            # The window was closed between two slices
+            logging.debug("Stopped filling a destroyed Treeview: %s", e)
+            self.cancel()
+
+    def _next_slice(self):
+        """
+        Insert rows for one time slice.
+        """
+        self._insert(None, time.perf_counter() + self.time_slice)
+
+    def _finish(self):
+        """
+        Mark the loader done and report the number of rows inserted.
+        """
+        self.done = True
+        self._release()
+        if self.on_complete is not None:
+            self.on_complete(self.inserted)
+
+    def _release(self):
+        """
+        Forget the loader as the one filling its Treeview.
+        """
+        if _loaders.get(str(self.treeview)) is self:
+            del _loaders[str(self.treeview)]
+
+
+def cancel_population(treeview):
+    """
+    Stop the loader filling a Treeview, if any.
+    """
+    loader = _loaders.get(str(treeview))
+    if loader is not None:
+        loader.cancel()
+
+
+def populate_treeview(treeview, rows, iids=None, on_complete=None, clear=True, **options):
+    """
+    Fill a Treeview from an iterator of rows without blocking the event loop.
+
+    Preconditions:
+        - `rows` yields the values of one item at a time; it is consumed while the event
+          loop runs, so it must not depend on data modified in the meantime.
+    Postconditions:
+        - The loader still filling `treeview` is cancelled, and the Treeview is emptied
+          unless `clear` is False.
+        - The first rows are inserted before returning, the others in later time slices.
+
+    Returns:
+        TreeviewLoader: The started loader.
+    """
+    cancel_population(treeview)
+    if clear:
+        treeview.delete(*treeview.get_children())
+    loader = TreeviewLoader(treeview, rows, iids, on_complete, **options)
+    _loaders[str(treeview)] = loader
+    return loader.start()